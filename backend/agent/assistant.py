@@ -1,18 +1,28 @@
 from config.database import get_db_connection
 from langchain_community.utilities import SQLDatabase
-from typing import List, Dict, Optional, Any, Tuple
+from typing import List, Dict, Optional, Any, Set, Tuple
+import json
 from agent.llm_utils import ask_llm 
 from langchain.prompts import PromptTemplate
 import os
 from dotenv import load_dotenv  
 from agent.template_matcher.matcher import SemanticTemplateMatcher
+from agent.domain_classifier import DomainClassifier
 import re
 from pathlib import Path
 from agent.cache_manager import CacheManager
 from agent.cache_manager1 import CacheManager1
+from agent.embeddings import role_threshold
 import logging
-from config.database import get_db
-import traceback
+from services.children_scope import get_children_scope
+from security.sql_scope import SQLScopeError, scope_parent_query, validate_parent_access
+from agent.renderers import render
+from agent.pagination import RESULT_ROW_CAP
+from agent.sql_template import TemplateBindingError, bind_template
+from agent.single_flight import SingleFlight
+from agent.prompt_registry import (
+    DOMAIN_DESCRIPTIONS_FILE, DOMAIN_TABLES_FILE, RELATIONS_FILE, TEMPLATES_FILE, PromptRegistry, get_prompt_registry
+)
 
 logger = logging.getLogger(__name__)
 
@@ -150,6 +160,9 @@ Requête SQL :
 """
 )
 
+# Tables utilisées par presque toutes les requêtes, toujours incluses dans le schéma
+CORE_TABLES = ['personne', 'eleve', 'inscriptioneleve', 'classe', 'niveau', 'anneescolaire']
+
 # Template pour les parents (accès restreint aux enfants)
 PARENT_PROMPT_TEMPLATE = PromptTemplate(
     input_variables=["input", "table_info", "relevant_domain_descriptions", "relations", "user_id", "children_ids"],
@@ -245,463 +258,380 @@ Requête SQL :
 )
 
 class SQLAssistant:
-    def __init__(self, db=None):
+    def __init__(self, db=None, registry: Optional[PromptRegistry] = None):
         self.db = db if db is not None else get_db_connection()
-        self.relations_description = self._safe_load_relations()
-        self.domain_descriptions = self._safe_load_domain_descriptions()
-        self.domain_to_tables_mapping = self._safe_load_domain_to_tables_mapping()
+        # Templates, domaines, relations : servis depuis la mémoire, rechargés à chaud
+        self.registry = registry or get_prompt_registry()
         self.ask_llm = ask_llm
+        self.domain_classifier = DomainClassifier(self.domain_descriptions, ask_llm=self.ask_llm)
         self.cache = CacheManager()
         self.cache1 = CacheManager1()
+        # Générations parent identiques et simultanées : un seul appel LLM
+        self.llm_flights = SingleFlight()
         self.template_matcher = SemanticTemplateMatcher()
         
-        try:
-            self.templates_questions = self.load_question_templates()
-            if self.templates_questions:
-                print(f"✅ {len(self.templates_questions)} templates chargés")
-                self.template_matcher.load_templates(self.templates_questions)
-            else:
-                print("⚠️ Aucun template valide - fonctionnement en mode LLM seul")
-                
-        except ValueError as e:
-            print(f"❌ Erreur de chargement des templates: {str(e)}")
-            self.templates_questions = []
+        if self.templates_questions:
+            print(f"✅ {len(self.templates_questions)} templates chargés")
+            self.template_matcher.load_templates(self.templates_questions)
+        else:
+            print("⚠️ Aucun template valide - fonctionnement en mode LLM seul")
+        self.registry.subscribe(self._on_registry_change)
 
+    @property
+    def relations_description(self) -> str:
+        return self.registry.get(RELATIONS_FILE)
 
-    def get_user_children_ids(self, user_id: int) -> List[int]:
-        """Récupère les IDs des enfants d'un parent avec gestion robuste des connexions"""
-        connection = None
-        cursor = None
-        children_ids = []
+    @property
+    def domain_descriptions(self) -> Dict[str, str]:
+        return self.registry.get(DOMAIN_DESCRIPTIONS_FILE)
+
+    @property
+    def domain_to_tables_mapping(self) -> Dict[str, List[str]]:
+        return self.registry.get(DOMAIN_TABLES_FILE)
+
+    @property
+    def templates_questions(self) -> List[Dict[str, Any]]:
+        return self.registry.get(TEMPLATES_FILE)
+
+    def _on_registry_change(self, changed: Set[str]):
+        """Reconstruit ce qui dérive des fichiers modifiés (remplacement atomique des attributs)"""
+        if TEMPLATES_FILE in changed:
+            self.template_matcher.load_templates(self.templates_questions)
+        if DOMAIN_DESCRIPTIONS_FILE in changed:
+            self.domain_classifier = DomainClassifier(self.domain_descriptions, ask_llm=self.ask_llm)
 
-        try:
-            query = """
-            SELECT DISTINCT pe.id AS id_enfant
-            FROM personne p
-            JOIN parent pa ON p.id = pa.Personne
-            JOIN parenteleve pev ON pa.id = pev.Parent
-            JOIN eleve e ON pev.Eleve = e.id
-            JOIN personne pe ON e.IdPersonne = pe.id
-            WHERE p.id = %s
-            """
-            
-            # Get connection
-            connection = get_db()
-            cursor = connection.cursor()
-            
-            # Execute query
-            cursor.execute(query, (user_id,))
-            users = cursor.fetchall()
-            
-            # Process results
-            if users:
-                children_ids = [user['id_enfant'] for user in users]
-                logger.info(f"✅ Found {len(children_ids)} children for parent {user_id}")
-            
-            return children_ids
-        except Exception as e:
-            logger.error(f"❌ Error getting children for parent {user_id}: {str(e)}")
-            logger.error(traceback.format_exc())
-            return []
-        finally:
-            # Only close if we created a direct connection
-            try:
-                if cursor:
-                    cursor.close()
-                
-                # Check if this is a Flask-managed connection
-                from flask import current_app
-                is_flask_connection = current_app and hasattr(current_app, 'extensions') and 'mysql' in current_app.extensions and connection == current_app.extensions['mysql'].connection
-                
-                if connection and not is_flask_connection:
-                    connection.close()
-                    logger.debug("🔌 Closed direct MySQL connection")
-            except Exception as close_error:
-                logger.warning(f"⚠️ Error during cleanup: {str(close_error)}")
+
+    def get_user_children_ids(self, user_id: int) -> List[int]:
+        """Récupère les IDs des enfants d'un parent (résolveur partagé, en mémoire)"""
+        return get_children_scope().children_ids(user_id)
 
 
     def validate_parent_access(self, sql_query: str, children_ids: List[int]) -> bool:
-        # Validation des inputs
-        if not isinstance(children_ids, list):
-            raise TypeError("children_ids doit être une liste")
-            
-        if not children_ids:
-            return False
-            
-        try:
-            children_ids_str = [str(int(id)) for id in children_ids]
-        except (ValueError, TypeError):
-            raise ValueError("Tous les IDs enfants doivent être numériques")
-        
-        # Normalisation plus douce de la requête (garder un espace pour séparer les mots)
-        sql_lower = sql_query.lower().replace("\n", " ").replace("\t", " ")
-        # Normaliser les espaces multiples en un seul
-        import re
-        sql_lower = re.sub(r'\s+', ' ', sql_lower).strip()
-        
-        print(f"🔍 SQL normalisé: {sql_lower}")  # Debug
-        print(f"👶 IDs enfants: {children_ids_str}")  # Debug
-        
-        # Préparation des motifs de sécurité
-        security_patterns = set()
-        
-        # 1. Filtres directs avec plus de variantes
-        if len(children_ids_str) == 1:
-            child_id = children_ids_str[0]
-            security_patterns.update({
-                f"idpersonne = {child_id}",
-                f"idpersonne={child_id}",
-                f"e.idpersonne = {child_id}",
-                f"e.idpersonne={child_id}",
-                f"eleve.idpersonne = {child_id}",
-                f"eleve.idpersonne={child_id}",
-                f"idpersonne in ({child_id})"
-            })
-        else:
-            ids_joined = ",".join(children_ids_str)
-            ids_joined_spaced = ", ".join(children_ids_str)
-            security_patterns.update({
-                f"idpersonne in ({ids_joined})",
-                f"idpersonne in({ids_joined})",
-                f"idpersonne in ({ids_joined_spaced})",
-                f"e.idpersonne in ({ids_joined})",
-                f"e.idpersonne in({ids_joined})",
-                f"e.idpersonne in ({ids_joined_spaced})",
-                f"eleve.idpersonne in ({ids_joined})",
-                f"eleve.idpersonne in({ids_joined})",
-                f"eleve.idpersonne in ({ids_joined_spaced})",
-                f"id_personne in ({ids_joined})",
-                f"id_personne in({ids_joined})",
-                f"id_personne in ({ids_joined_spaced})"
-            })
-        
-        # 2. Sous-requêtes de sécurité (patterns plus complets)
-        for child_id in children_ids_str:
-            security_patterns.update({
-                f"eleve in (select id from eleve where idpersonne = {child_id}",
-                f"eleve in (select id from eleve where idpersonne={child_id}",
-                f"exists (select 1 from eleve where idpersonne = {child_id}",
-                f"exists (select 1 from eleve where idpersonne={child_id}",
-                f"exists(select 1 from eleve where idpersonne = {child_id}",
-                f"exists(select 1 from eleve where idpersonne={child_id}",
-                f"ed.idenelev IN (SELECT id FROM eleve WHERE IdPersonne IN {child_id})",
-                f"e.idpersonne in ({child_id})"
-            })
-        
-        # Pour les listes d'IDs
-        if len(children_ids_str) > 1:
-            ids_joined = ",".join(children_ids_str)
-            ids_joined_spaced = ", ".join(children_ids_str)
-            security_patterns.update({
-                f"eleve in (select id from eleve where idpersonne in ({ids_joined})",
-                f"eleve in (select id from eleve where idpersonne in({ids_joined})",
-                f"eleve in (select id from eleve where idpersonne in ({ids_joined_spaced})",
-                f"exists (select 1 from eleve where idpersonne in ({ids_joined})",
-                f"exists (select 1 from eleve where idpersonne in({ids_joined})",
-                f"exists (select 1 from eleve where idpersonne in ({ids_joined_spaced})",
-                f"exists(select 1 from eleve where idpersonne in ({ids_joined})",
-                f"exists(select 1 from eleve where idpersonne in({ids_joined})",
-                f"exists(select 1 from eleve where idpersonne in ({ids_joined_spaced})"
-            })
-        
-        print(f"🔒 Patterns de sécurité recherchés:")
-        for pattern in sorted(security_patterns):
-            print(f"   - '{pattern}'")
-        
-        # 3. Vérification des motifs
-        found_patterns = []
-        for pattern in security_patterns:
-            if pattern in sql_lower:
-                found_patterns.append(pattern)
-        
-        print(f"✅ Patterns trouvés: {found_patterns}")
-        
-        if not found_patterns:
-            logger.warning(f"Requête parent non sécurisée - Filtre enfants manquant: {sql_query}")
-            print(f"❌ Aucun pattern de sécurité trouvé dans la requête")
-            return False
-        
-        # 4. Vérification des injections potentielles
-        forbidden_patterns = {
-             "--", "/*", "*/", " drop ", " truncate ", " insert ", " update ", " delete "
-        }
-        found_forbidden = [pattern for pattern in forbidden_patterns if pattern in sql_lower]
-        
-        if found_forbidden:
-            logger.error(f"Tentative de requête non autorisée détectée: {found_forbidden}")
-            print(f"❌ Patterns interdits trouvés: {found_forbidden}")
-            return False
-        
-        print(f"✅ Validation parent réussie")
-        return True
+        """Requête restreinte aux enfants autorisés (contrôle sur l'arbre syntaxique)"""
+        return validate_parent_access(sql_query, children_ids)
 
     def ask_question(self, question: str, user_id: int, roles: List[str]) -> tuple[str, str]:
         """Version strictement authentifiée"""
+        plan = self.prepare_query(question, user_id, roles)
+        if plan['error']:
+            return plan['sql_query'], plan['error']
+
+        result = self.run_query(plan['sql_query'], scope=self.result_scope(plan), params=plan['sql_params'])
+        if not result['success']:
+            return plan['sql_query'], f"❌ Erreur d'exécution SQL : {result['error']}"
+
+        self.remember_query(question, plan)
+        return plan['sql_query'], self.format_rows(result['columns'], result['rows'], question)
+
+    def prepare_query(self, question: str, user_id: int, roles: List[str]) -> Dict[str, Any]:
+        """
+        Produit la requête SQL d'une question sans l'exécuter.
+        Returns:
+            dict: sql_query, role ('admin' ou 'parent'), from_cache et error
+            (message à renvoyer tel quel à l'utilisateur, None si tout va bien)
+        """
+        plan = self.plan_query(question, user_id, roles)
+        if plan['needs_llm']:
+            self.generate_query(question, plan)
+        return plan
+
+    def generate_query(self, question: str, plan: Dict[str, Any]):
+        """Seconde étape de prepare_query : génération LLM du plan (partagée entre parents simultanés)"""
+        def generate() -> Optional[Dict[str, str]]:
+            return self.share_plan(question, plan, self.ask_llm(self.build_prompt(question, plan)))
+        try:
+            if plan['role'] != 'parent':
+                generate()
+            else:
+                entry, shared = self.llm_flights.do(self.cache1.template_key(question), generate)
+                if shared and not self.plan_from_shared(question, plan, entry):
+                    generate()
+        except Exception as e:
+            plan['error'] = f"❌ Erreur : {str(e)}"
+
+    def plan_query(self, question: str, user_id: int, roles: List[str]) -> Dict[str, Any]:
+        """
+        Première étape de prepare_query : rôles, cache et périmètre parent.
+        Si la requête doit être générée, plan['needs_llm'] vaut True et la suite
+        est build_prompt() -> appel LLM -> finish_plan() (synchrone ou asyncio).
+        """
+        plan = {"sql_query": "", "sql_params": None, "role": None, "from_cache": False, "error": None,
+                "needs_llm": False, "user_id": user_id, "children_ids": None}
 
         # 1. Validation des rôles
         if not roles:
-            return "", "❌ Accès refusé : Aucun rôle fourni"
+            plan['error'] = "❌ Accès refusé : Aucun rôle fourni"
+            return plan
         
         valid_roles = ['ROLE_SUPER_ADMIN', 'ROLE_PARENT']
         has_valid_role = any(role in valid_roles for role in roles)
         
-        print(f"DEBUG - has_valid_role: {has_valid_role}")
+        logger.debug(f"has_valid_role: {has_valid_role}")
         
         if not has_valid_role:
-            return "", f"❌ Accès refusé : Rôles fournis {roles}, requis {valid_roles}"
+            plan['error'] = f"❌ Accès refusé : Rôles fournis {roles}, requis {valid_roles}"
+            return plan
 
         # 2. Traitement par rôle
         try:
             if 'ROLE_SUPER_ADMIN' in roles:
-                return self._process_admin_question(question)
+                plan['role'] = 'admin'
+                self._plan_admin_query(question, plan)
             elif 'ROLE_PARENT' in roles:
-                return self._process_parent_question(question, user_id)
+                plan['role'] = 'parent'
+                self._plan_parent_query(question, user_id, plan)
         except Exception as e:
-            return "", f"❌ Erreur : {str(e)}"
+            plan['error'] = f"❌ Erreur : {str(e)}"
+        return plan
 
-    def _process_admin_question(self, question: str) -> tuple[str, str]:
-        """Traite une question avec accès admin complet"""
-        
-        # 1. Vérifier le cache
-        cached = self.cache.get_cached_query(question)
-        if cached:
-            sql_template, variables = cached
-            sql_query = sql_template
-            for column, value in variables.items():
-                sql_query = sql_query.replace(f"{{{column}}}", value)
-                
-            
-            try:
-                result = self.db.run(sql_query)
-                formatted_result = self.format_result(result, question)
-                return sql_query, formatted_result
-            except Exception as db_error:
-                return sql_query, f"❌ Erreur d'exécution SQL : {str(db_error)}"
-        
-        # 3. Génération via LLM (template admin)
-        print("🔍 Génération LLM pour admin")
-        prompt = ADMIN_PROMPT_TEMPLATE.format(
+    def build_prompt(self, question: str, plan: Dict[str, Any], domains: Optional[List[str]] = None) -> str:
+        """Prompt de génération SQL du plan (domaines déjà classés ou classés ici)"""
+        schema_context = self.build_schema_context(question, domains)
+        if plan['role'] == 'admin':
+            logger.debug("🔍 Génération LLM pour admin")
+            return ADMIN_PROMPT_TEMPLATE.format(input=question, **schema_context)
+
+        return PARENT_PROMPT_TEMPLATE.format(
             input=question,
-            table_info=self.db.get_table_info(),
-            relevant_domain_descriptions="\n".join(self.domain_descriptions.values()),
-            relations=self.relations_description
+            user_id=plan['user_id'],
+            children_ids=','.join(map(str, plan['children_ids'])),
+            **schema_context
         )
 
-        llm_response = self.ask_llm(prompt)
-        sql_query = llm_response.replace("```sql", "").replace("```", "").strip()
+    def finish_plan(self, plan: Dict[str, Any], llm_response: str):
+        """Nettoie la réponse du LLM et applique les contrôles d'accès du rôle"""
+        sql_query = (llm_response or "").replace("```sql", "").replace("```", "").strip()
         
         if not sql_query:
-            return "", "❌ La requête générée est vide."
+            plan['error'] = "❌ La requête générée est vide."
+            return
 
+        # Périmètre des enfants ajouté par réécriture là où le LLM l'a oublié, puis contrôlé
+        if plan['role'] == 'parent':
+            try:
+                scoped = scope_parent_query(sql_query, plan['children_ids'])
+            except SQLScopeError as e:
+                logger.warning(f"⚠️ Réécriture du périmètre impossible : {e}")
+            else:
+                if scoped != sql_query:
+                    logger.info("🔒 Filtre enfants ajouté par réécriture de la requête générée")
+                sql_query = scoped
+        if plan['role'] == 'parent' and not self.validate_parent_access(sql_query, plan['children_ids']):
+            plan['error'] = "❌ Accès refusé: La requête ne respecte pas les restrictions parent."
+            return
+        plan['sql_query'] = sql_query
+
+    def share_plan(self, question: str, plan: Dict[str, Any], llm_response: str) -> Optional[Dict[str, str]]:
+        """
+        finish_plan, puis template de la requête d'un parent à partager avec
+        les parents qui attendent la même génération (None si rien à partager)
+        """
+        self.finish_plan(plan, llm_response)
+        if plan['error'] or plan['role'] != 'parent':
+            return None
+        return self.cache1.template_entry(question, plan['sql_query'], plan['children_ids'])
+
+    def plan_from_shared(self, question: str, plan: Dict[str, Any], entry: Optional[Dict[str, str]]) -> bool:
+        """
+        Requête d'un parent à partir du template généré pour un autre parent
+        (même question, en même temps), liée à ses propres enfants et revérifiée
+        comme un template du cache. Faux s'il faut la générer séparément.
+        """
+        if entry is None:
+            return False
+        cached = self.cache1.bind_entry(question, entry, plan['user_id'])
+        if not cached or not self.validate_parent_access(self._fill_template(*cached), plan['children_ids']):
+            return False
+        if not self._use_template(plan, *cached):
+            return False
+        logger.info("🤝 Requête parent partagée avec une génération en cours")
+        return True
+
+    def run_query(self, sql_query: str, limit: int = RESULT_ROW_CAP, offset: int = 0,
+                  scope: Optional[str] = None, params: Optional[Tuple[Any, ...]] = None) -> Dict[str, Any]:
+        """
+        Exécute la requête une seule fois, bornée à une page de `limit` lignes :
+        noms de colonnes + lignes en tuples typés, has_more et total.
+        `scope` (voir result_scope) cloisonne le cache de résultats ; `params`
+        accompagne une requête à marqueurs %s (template du cache, plan['sql_params']).
+        """
+        return self.db.execute_page(sql_query, limit, offset, scope, params)
+
+    @staticmethod
+    def result_scope(plan: Dict[str, Any]) -> str:
+        """Périmètre du cache de résultats : partagé entre admins, propre à chaque parent"""
+        return 'admin' if plan['role'] == 'admin' else f"parent:{plan['user_id']}"
+
+    def remember_query(self, question: str, plan: Dict[str, Any]):
+        """Met en cache une requête générée par le LLM une fois son exécution réussie"""
+        if plan['from_cache'] or not plan['sql_query']:
+            return
+        if plan['role'] == 'admin':
+            self.cache.cache_query(question, plan['sql_query'])
+        elif plan['role'] == 'parent':
+            self.cache1.cache_query(question, plan['sql_query'], plan.get('children_ids'))
+
+    def _plan_from_template(self, question: str, plan: Dict[str, Any]) -> bool:
+        """
+        Voie rapide sans LLM : template de templates_questions.json dont les
+        variables déclarées sont trouvées et valides, exécuté tel quel (valeurs
+        liées). Pour un parent, le template doit rester dans le périmètre de
+        ses enfants ({id_personne} lié à leurs IDs, IdPersonne parmi eux).
+        """
+        children: Dict[str, List[int]] = {}
+
+        def in_scope(template: Dict[str, Any], variables: Dict[str, Any]) -> bool:
+            if plan['role'] != 'parent':
+                return True
+            if 'ids' not in children:
+                children['ids'] = self.get_user_children_ids(plan['user_id'])
+            children_ids = children['ids']
+            if not children_ids:
+                return False
+            if '{id_personne}' in template['requete_template']:
+                variables['id_personne'] = children_ids
+            for name, value in variables.items():
+                if name.lower() == 'idpersonne' and int(value) not in children_ids:
+                    return False
+            return self.validate_parent_access(self._fill_template(template['requete_template'], variables),
+                                               children_ids)
+
+        matched = self.template_matcher.match(question, accept=in_scope)
+        if not matched:
+            return False
+        template, variables, score = matched
+        if not self._use_template(plan, template['requete_template'], variables):
+            return False
+        if 'ids' in children:
+            plan['children_ids'] = children['ids']
+        logger.info(f"📋 Template sans LLM ({score:.2f}) : {template['template_question']}")
+        return True
+
+    def _plan_admin_query(self, question: str, plan: Dict[str, Any]):
+        """Requête admin : template, puis cache, sinon à générer (accès complet)"""
+        
+        # 0. Templates de questions (sans LLM)
+        if self._plan_from_template(question, plan):
+            return
+        
+        # 1. Vérifier le cache, puis les paraphrases d'une question en cache (embeddings)
+        cached = (self.cache.get_cached_query(question)
+                  or self.cache.get_semantic_query(question, role_threshold('admin')))
+        if cached and self._use_template(plan, *cached):
+            return
+        
+        # 2. Génération via LLM (template admin)
+        plan['needs_llm'] = True
+
+    @staticmethod
+    def _use_template(plan: Dict[str, Any], sql_template: str, variables: Dict[str, Any]) -> bool:
+        """
+        Lie un template du cache aux valeurs de la question (paramètres typés,
+        jamais insérés dans le SQL). Faux si une valeur manque ou est invalide :
+        la requête est alors générée comme en l'absence de cache.
+        """
         try:
-            result = self.db.run(sql_query)
-            formatted_result = self.format_result(result, question)
-            self.cache.cache_query(question, sql_query)
-            return sql_query, formatted_result
-        except Exception as db_error:
-            return sql_query, f"❌ Erreur d'exécution SQL : {str(db_error)}"
-
-    def _process_parent_question(self, question: str, user_id: int) -> tuple[str, str]:
-        """Traite une question avec restrictions parent"""
+            sql_query, params = bind_template(sql_template, variables)
+        except TemplateBindingError as e:
+            logger.warning(f"⚠️ Template du cache inutilisable : {e}")
+            return False
+        plan.update(sql_query=sql_query, sql_params=params, from_cache=True)
+        return True
+
+    @staticmethod
+    def _fill_template(sql_template: str, variables: Dict[str, Any]) -> str:
+        """Template rempli en texte, pour les contrôles d'accès (jamais exécuté)"""
+        sql_query = sql_template
+        for column, value in variables.items():
+            if isinstance(value, (list, tuple)):
+                value = ','.join(map(str, value))
+            sql_query = sql_query.replace(f"{{{column}}}", str(value))
+        return sql_query
+
+    def _plan_parent_query(self, question: str, user_id: int, plan: Dict[str, Any]):
+        """Requête parent : template, puis cache, sinon à générer dans le périmètre des enfants"""
+        
+        if self._plan_from_template(question, plan):
+            return
         
-        self.cache1.clean_double_braces_in_cache()
-        cached = self.cache1.get_cached_query(question,user_id)
-        if cached:
-            sql_template, variables = cached
-            sql_query = sql_template
-            for column, value in variables.items():
-                sql_query = sql_query.replace(f"{{{column}}}", value)
-            
-            print("⚡ Requête parent récupérée depuis le cache")
-            try:
-                result = self.db.run(sql_query)
-                return sql_query, self.format_result(result, question)
-            except Exception as db_error:
-                return sql_query, f"❌ Erreur d'exécution SQL : {str(db_error)}"
-            
         children_ids = self.get_user_children_ids(user_id)
         if not children_ids:
-             return "", "❌ Aucun enfant trouvé pour ce parent  ou erreur d'accès."
+            plan['error'] = "❌ Aucun enfant trouvé pour ce parent  ou erreur d'accès."
+            return
         
-        print(f"🔒 Restriction parent - Enfants autorisés: {children_ids}")
+        # Templates partagés entre tous les parents : revérifiés avec les enfants du parent courant
+        self.cache1.clean_double_braces_in_cache()
+        cached = self.cache1.get_cached_query(question,user_id)
+        if cached and self.validate_parent_access(self._fill_template(*cached), children_ids):
+            if self._use_template(plan, *cached):
+                plan['children_ids'] = children_ids
+                logger.info("⚡ Requête parent récupérée depuis le cache")
+                return
         
-        # Génération via LLM avec template parent
-        children_ids_str = ','.join(map(str, children_ids))
+        # Paraphrase d'une question en cache (embeddings), toujours restreinte aux enfants
+        semantic = self.cache1.get_semantic_query(question, user_id, role_threshold('parent'))
+        if semantic and self.validate_parent_access(self._fill_template(*semantic), children_ids):
+            if self._use_template(plan, *semantic):
+                plan['children_ids'] = children_ids
+                return
         
-
-        prompt = PARENT_PROMPT_TEMPLATE.format(
-            input=question,
-            table_info=self.db.get_table_info(),
-            relevant_domain_descriptions="\n".join(self.domain_descriptions.values()),
-            relations=self.relations_description,
-            user_id=user_id,
-            children_ids=children_ids_str
-        )
-
-        llm_response = self.ask_llm(prompt)
-        sql_query = llm_response.replace("```sql", "").replace("```", "").strip()
+        logger.debug(f"🔒 Restriction parent - Enfants autorisés: {children_ids}")
         
-        if not sql_query:
-            return "", "❌ La requête générée est vide."
-
-        # Validation de sécurité pour les parents
-        if not self.validate_parent_access(sql_query, children_ids):
-            return "", "❌ Accès refusé: La requête ne respecte pas les restrictions parent."
-
-        try:
-            result = self.db.run(sql_query)
-            formatted_result = self.format_result(result, question)
-            self.cache1.cache_query(question, sql_query)
-            return sql_query, formatted_result
-        except Exception as db_error:
-            return sql_query, f"❌ Erreur d'exécution SQL : {str(db_error)}"
+        # Génération via LLM avec template parent
+        plan.update(children_ids=children_ids, needs_llm=True)
 
     
     def load_question_templates(self) -> list:
-        try:
-            templates_path = Path(__file__).parent / 'templates_questions.json'
-            
-            # Si c'est un résultat simple (nombre, etc.)
-            lines = result_str.strip().split('\n')
-            if len(lines) == 1:
-                return f"Résultat : {lines[0]}"
-            
-            # Si c'est un tableau de résultats
-            output = [f"**{question}**"] if question else []
-            output.extend(lines)
-
-            return "\n".join(output)        
-
-        def get_tables_from_domains(self, domains: List[str], domain_to_tables_map: Dict[str, List[str]]) -> List[str]:
-            """Retrieves all tables associated with the given domains."""
-            tables = []
-            for domain in domains:
-                tables.extend(domain_to_tables_map.get(domain, []))
-
-            return sorted(list(set(tables)))                
-
-        def format_result(self, result: str, question: str = "") -> str:
-            """
-            Formate les résultats SQL bruts en une table lisible
-            Args:
-                result: Le résultat brut de la requête SQL
-                question: La question originale (optionnelle)
-            Returns:
-                str: Le résultat formaté ou un message approprié
-            """
-            if not result or result.strip() in ["[]", ""] or "0 rows" in result.lower():
-                return "✅ Requête exécutée mais aucun résultat trouvé."
-
-            try:
-                lines = [line.strip() for line in result.split('\n') if line.strip()]
-                if len(lines) == 1 and lines[0].startswith('(') and lines[0].endswith(')'):
-                    value = lines[0][1:-1].strip()  
-                    return f"Résultat : {value}"
-
-                if len(lines) > 1:
-                    headers = [h.strip() for h in lines[0].split('|')]
-                    rows = []
-
-                    for line in lines[1:]:
-                        row = [cell.strip() for cell in line.split('|')]
-                        rows.append(row)
-
-                    formatted = []
-                    if question:
-                        formatted.append(f"Résultats pour: {question}\n")
-
-                    # En-tête
-                    header_line = " | ".join(headers)
-                    formatted.append(header_line)
-
-                    # Séparateur
-                    separator = "-+-".join(['-' * len(h) for h in headers])
-                    formatted.append(separator)
-
-                    # Données
-                    for row in rows:
-                        formatted.append(" | ".join(row))
-
-                    return "\n".join(formatted)
-
-                return f"{result}"
-
-            except Exception as e:
-                return f"❌ Erreur de formatage: {str(e)}\nRésultat brut:\n{result}"
+        """Templates de questions de templates_questions.json (version courante du registre)"""
+        return self.templates_questions
+
+    def get_tables_from_domains(self, domains: List[str], domain_to_tables_map: Dict[str, List[str]]) -> List[str]:
+        """Retrieves all tables associated with the given domains."""
+        tables = []
+        for domain in domains:
+            tables.extend(domain_to_tables_map.get(domain, []))
+
+        return sorted(list(set(tables)))                
+
+    def build_schema_context(self, question: str, domains: Optional[List[str]] = None) -> Dict[str, str]:
+        """
+        Construit table_info, relevant_domain_descriptions et relations pour le prompt
+        en se limitant aux domaines pertinents pour la question (classés ici
+        si `domains` n'est pas fourni). Sans domaine identifié, on retombe sur
+        le schéma complet.
+        """
+        if domains is None:
+            domains = self.domain_classifier.classify(question)
+        if not domains:
+            return {
+                "table_info": self.db.get_table_info(),
+                "relevant_domain_descriptions": "\n".join(self.domain_descriptions.values()),
+                "relations": self.relations_description
+            }
+
+        tables = self.get_tables_from_domains(domains, self.domain_to_tables_mapping)
+        usable = set(self.db.get_usable_table_names())
+        tables = sorted((set(tables) | set(CORE_TABLES)) & usable)
+
+        return {
+            "table_info": self.db.get_table_info(table_names=tables),
+            "relevant_domain_descriptions": "\n".join(
+                self.domain_descriptions[d] for d in domains if d in self.domain_descriptions
+            ),
+            "relations": self._filter_relations(tables)
+        }
 
-        def _safe_load_relations(self) -> str:
-            """Charge les relations avec gestion d'erreurs"""
-            try:
-                relations_path = Path(__file__).parent / 'prompts' / 'relations.txt'  
-                print(f"🔍 Tentative de chargement depuis : {relations_path.absolute()}")# Log du chemin
-
-                          
-                if relations_path.exists():
-                    content = relations_path.read_text(encoding='utf-8')
-                    print(f"✅ Contenu chargé (premières 50 lignes) :\n{content[:500]}...")  # Aperçu du contenu
-                    return content
-                else:
-                    print("⚠️ Fichier relations.txt non trouvé")
-                    return "# Aucune relation définie"
-                    
-            except Exception as e:
-                print(f"❌ Erreur lors du chargement : {str(e)}")
-
-                return "# Erreur chargement relations"                
-
-        def _safe_load_domain_descriptions(self) -> dict:
-            """Charge les descriptions de domaine avec gestion d'erreurs"""
-            try:
-                domain_path = Path(__file__).parent / 'prompts' / 'domain_descriptions.json'
-                if domain_path.exists():
-                    with open(domain_path, 'r', encoding='utf-8') as f:
-                        return json.load(f)
-                print("⚠️ Fichier domain_descriptions.json non trouvé")
-                return {}
-            except Exception as e:
-                print(f"❌ Erreur chargement domain descriptions: {e}")
-
-                return {}        
-
-        def _safe_load_domain_to_tables_mapping(self) -> dict:
-            """Charge le mapping domaine-tables avec gestion d'erreurs"""
-            try:
-                mapping_path = Path(__file__).parent / 'prompts' / 'domain_tables_mapping.json'
-                if mapping_path.exists():
-                    with open(mapping_path, 'r', encoding='utf-8') as f:
-                        return json.load(f)
-                print("⚠️ Fichier domain_tables_mapping.json non trouvé")
-                return {}
-            except Exception as e:
-                print(f"❌ Erreur chargement domain mapping: {e}")
-                return {}        
-
-
-        def _safe_load_question_templates(self) -> list:
-            """Charge les templates avec gestion d'erreurs robuste"""
-            try:
-                templates_path = Path(__file__).parent / 'templates_questions.json'
-                
-                if not templates_path.exists():
-                    print(f"⚠️ Création fichier templates: {templates_path}")
-                    templates_path.write_text('{"questions": []}', encoding='utf-8')
-                    return []
-
-                content = templates_path.read_text(encoding='utf-8').strip()
-                if not content:
-                    return []
-
-                data = json.loads(content)
-                if not isinstance(data.get("questions", []), list):
-                    return []
-                
-                valid_templates = []
-                for template in data["questions"]:
-                    if all(key in template for key in ["template_question", "requete_template"]):
-                        valid_templates.append(template)
-                
-                return valid_templates
-
-            except Exception as e:
-                print(f"❌ Erreur chargement templates: {e}")
-                return []
+    def _filter_relations(self, tables: List[str]) -> str:
+        """Garde uniquement les lignes de relations.txt qui concernent les tables retenues"""
+        kept = []
+        wanted = {t.lower() for t in tables}
+        for line in self.relations_description.split('\n'):
+            match = re.match(r'\s*-\s*([\w]+)\s+liée', line)
+            if match and match.group(1).lower() not in wanted:
+                continue
+            kept.append(line)
+        return "\n".join(kept)
+
+    def format_rows(self, columns: List[str], rows: List[Tuple], question: str = "", output_format: str = "text") -> str:
+        """Rend un résultat structuré (colonnes + tuples) en texte, JSON ou CSV"""
+        return render(columns, rows, output_format, question=question)
@@ -1,102 +1,48 @@
-import json
 from pathlib import Path
-from typing import Dict, Any, Optional, Tuple, List
+from typing import Dict, Any, Optional, Tuple, List, FrozenSet
 import hashlib
 import re
 from collections import defaultdict
 
+from agent.embeddings import get_embedder, same_polarity
+from agent.param_extractor import AUTO_PATTERNS, TRIMESTRE_MAPPING, extract_admin_parameters
+from agent.query_store import QueryStore
+from agent.template_index import EmbeddingIndex, TokenIndex
+
 class CacheManager:
-    def __init__(self, cache_file: str = "sql_query_cache.json"):
+    def __init__(self, cache_file: str = "sql_query_cache.json", embedder=None):
         self.cache_file = Path(cache_file)
-        self.cache = self._load_cache()
+        
+        # Index en mémoire des ensembles de mots, tenu à jour par le QueryStore
+        self.index = TokenIndex()
+        # Embeddings des templates pour les paraphrases, persistés à côté du cache
+        self.embeddings = EmbeddingIndex(embedder or get_embedder(), str(self.cache_file.with_suffix('.embeddings.npz')))
+        self.store = QueryStore(str(self.cache_file), on_change=self._index_entry, on_reset=self.index.clear)
+        self.embeddings.sync()
         
         # Patterns de base pour les valeurs structurées
-        self.auto_patterns = {
-            r'\b([A-Z]{3,})\s+([A-Z]{3,})\b': 'NomPrenom',
-            r'\b\d+[A-Z]\d+\b': 'CODECLASSEFR', 
-            r'\b(20\d{2}[/-]20\d{2})\b': 'AnneeScolaire',
-            r'\b\d{1,5}\b': 'IDPersonne' 
-        }
-        self.trimestre_mapping = {
-            '1er trimestre': 31,
-            '1ère trimestre': 31,
-            'premier trimestre': 31,
-            '2ème trimestre': 32,
-            'deuxième trimestre': 32,
-            '3ème trimestre': 33,
-            '3éme trimestre': 33,
-            'troisième trimestre': 33,
-            'trimestre 1': 31,
-            'trimestre 2': 32,
-            'trimestre 3': 33
-        }
+        self.auto_patterns = AUTO_PATTERNS
+        self.trimestre_mapping = TRIMESTRE_MAPPING
         self.discovered_patterns = defaultdict(list)
 
-    def _load_cache(self) -> Dict[str, Any]:
-        if not self.cache_file.exists():
-            return {}
-        try:
-            with open(self.cache_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError):
-            return {}
+    def _index_entry(self, key: str, entry: Optional[Dict[str, Any]]):
+        """Met à jour l'index pour une entrée chargée, ajoutée ou supprimée par le QueryStore"""
+        if entry is None:
+            self.index.remove(key)
+            self.embeddings.remove(key)
+        else:
+            self.index.add(key, self._tokenize(entry.get('question_template', '')))
+            if key not in self.embeddings:
+                self.embeddings.add(key, entry.get('question_template', ''))
+
+    @staticmethod
+    def _tokenize(normalized: str) -> FrozenSet[str]:
+        return frozenset(normalized.lower().split())
 
-    def _save_cache(self):
-        with open(self.cache_file, 'w', encoding='utf-8') as f:
-            json.dump(self.cache, f, indent=2, ensure_ascii=False)
     def _extract_parameters(self, text: str) -> Tuple[str, Dict[str, str]]:
-        """Détection intelligente des paramètres avec normalisation dynamique"""
-        variables = {}
-        normalized = text.lower()  # Normaliser en minuscules
-        
-        # 1. Détection des trimestres
-        for term, code in self.trimestre_mapping.items():
-            if term in normalized:
-                normalized = normalized.replace(term, "{codeperiexam}")
-                variables["codeperiexam"] = str(code)
-                break
-        
-        # 2. Détection des noms/prénoms (patterns plus flexibles)
-        # Pattern pour "nom prénom" ou "prénom nom"
-        name_patterns = [
-            r'\b([A-Z][a-zA-Zàâäéèêëïîôöùûüÿç]+)\s+([A-Z][a-zA-Zàâäéèêëïîôöùûüÿç]+)\b',  # Nom Prénom
-            r"élève\s+([A-Z][a-zA-Zàâäéèêëïîôöùûüÿç]+)\s+([A-Z][a-zA-Zàâäéèêëïîôöùûüÿç]+)",
-            r"de\s+l'élève\s+([A-Z][a-zA-Zàâäéèêëïîôöùûüÿç]+)\s+([A-Z][a-zA-Zàâäéèêëïîôöùûüÿç]+)",
-            r"de\s+([A-Z][a-zA-Zàâäéèêëïîôöùûüÿç]+)\s+([A-Z][a-zA-Zàâäéèêëïîôöùûüÿç]+)"
-        ]
-        
-        for pattern in name_patterns:
-            matches = list(re.finditer(pattern, text, re.IGNORECASE))
-            if matches:
-                for match in reversed(matches):
-                    nom, prenom = match.groups()
-                    full_match = match.group(0)
-                    # Remplacer dans le texte original (pas normalisé)
-                    normalized = normalized.replace(full_match.lower(), "{nomfr} {prenomfr}")
-                    variables.update({
-                        "NomFr": nom.capitalize(),
-                        "PrenomFr": prenom.capitalize()
-                    })
-                break
-        
-        # 3. Détection des codes de classe
-        classe_match = re.search(r'\b(\d+[A-Z]\d*)\b', text)
-        if classe_match:
-            code_classe = classe_match.group(1)
-            normalized = normalized.replace(code_classe.lower(), "{codeclassefr}")
-            variables["CODECLASSEFR"] = code_classe
-        
-        # 4. Détection des années scolaires
-        annee_match = re.search(r'\b(20\d{2}[/-]20\d{2})\b', text)
-        if annee_match:
-            annee = annee_match.group(1).replace("-", "/")
-            normalized = normalized.replace(annee_match.group(0).lower(), "{anneescolaire}")
-            variables["AnneeScolaire"] = annee
-        
-        # 5. Nettoyage final
-        normalized = re.sub(r'\s+', ' ', normalized).strip()
-        
-        return normalized, variables
+        """Détection des paramètres (extracteur compilé partagé, résultats mémorisés)"""
+        return extract_admin_parameters(text)
+
     def _normalize_template(self, text: str) -> str:
         """Normalise le texte pour la comparaison"""
         normalized, _ = self._extract_parameters(text)
@@ -105,35 +51,15 @@ class CacheManager:
         return normalized
 
     def find_similar_template(self, question: str, threshold: float = 0.8) -> Tuple[Optional[Dict], float]:
-        """Trouve un template similaire en utilisant une comparaison simple"""
-        """Trouve un template similaire en utilisant TF-IDF et cosine similarity"""
-        if not self.cache:
-            return None, 0.0
-            
-        norm_question = self._normalize_template(question)
-        best_match = None
-        best_score = 0.0
-        
-        for cache_key, cached_item in self.cache.items():
-            norm_template = self._normalize_template(cached_item['question_template'])
-            
-            # Calcul de similarité simple basé sur les mots communs
-            question_words = set(norm_question.split())
-            template_words = set(norm_template.split())
-            
-            if not question_words or not template_words:
-                continue
-                
-            intersection = question_words.intersection(template_words)
-            union = question_words.union(template_words)
-            
-            similarity = len(intersection) / len(union) if union else 0.0
-            
-            if similarity > best_score and similarity >= threshold:
-                best_score = similarity
-                best_match = cached_item
-        
-        return best_match, best_score
+        """Trouve un template similaire (Jaccard sur les mots, via l'index inversé)"""
+        matches = self.find_similar_templates(question, k=1, threshold=threshold)
+        return matches[0] if matches else (None, 0.0)
+
+    def find_similar_templates(self, question: str, k: int = 5, threshold: float = 0.8) -> List[Tuple[Dict, float]]:
+        """Les k templates les plus proches avec leur score"""
+        tokens = self._tokenize(self._normalize_template(question))
+        with self.store.lock:
+            return [(self.store.get(key), score) for key, score in self.index.search(tokens, k, threshold)]
 
     def _generate_cache_key(self, question: str) -> str:
         """Génère une clé basée sur la question normalisée"""
@@ -169,26 +95,28 @@ class CacheManager:
     def get_cached_query(self, question: str) -> Optional[Tuple[str, Dict[str, str]]]:
         """Récupération depuis le cache avec correspondance flexible"""
         try:
+            # 0. Intégrer les entrées ajoutées par les autres workers
+            self.store.refresh()
+            
             # 1. Extraire les paramètres de la question actuelle
             normalized_question, current_variables = self._extract_parameters(question)
             
             # 2. Générer la clé et chercher une correspondance exacte
             key = hashlib.md5(normalized_question.encode('utf-8')).hexdigest()
             
-            if key in self.cache:
-                cached = self.cache[key]
+            cached = self.store.get(key)
+            if cached:
                 print(f"💡 Cache hit exact pour: {question}")
                 return cached['sql_template'], current_variables
             
             # 3. Si pas de correspondance exacte, chercher une similarité
-            for cache_key, cached_item in self.cache.items():
-                template_question = cached_item['question_template']
-                
-                # Comparaison de similarité simple
-                if self._questions_similar(normalized_question, template_question):
-                    print(f"💡 Cache hit similaire pour: {question}")
-                    print(f"   Template trouvé: {template_question}")
-                    return cached_item['sql_template'], current_variables
+            with self.store.lock:
+                matches = self.index.search(self._tokenize(normalized_question), k=1, threshold=0.8)
+                cached_item = self.store.get(matches[0][0]) if matches else None
+            if cached_item:
+                print(f"💡 Cache hit similaire pour: {question}")
+                print(f"   Template trouvé: {cached_item['question_template']}")
+                return cached_item['sql_template'], current_variables
             
             return None
             
@@ -196,6 +124,29 @@ class CacheManager:
             print(f"❌ Erreur get_cached_query: {e}")
             return None
 
+    def get_semantic_query(self, question: str, threshold: float) -> Optional[Tuple[str, Dict[str, str]]]:
+        """
+        Dernier recours avant le LLM : template le plus proche au sens des
+        embeddings (paraphrases). Seuls les templates ayant exactement les
+        mêmes paramètres que la question sont réutilisables.
+        """
+        if threshold > 1:  # niveau sémantique désactivé (repli par n-grammes)
+            return None
+        try:
+            normalized_question, current_variables = self._extract_parameters(question)
+            placeholders = set(re.findall(r'\{\w+\}', normalized_question))
+            for key, score in self.embeddings.search(normalized_question, k=5, threshold=threshold):
+                cached_item = self.store.get(key)
+                if cached_item and set(re.findall(r'\{\w+\}', cached_item['question_template'])) == placeholders \
+                        and same_polarity(question, cached_item['question_template']):
+                    print(f"🧠 Cache hit sémantique ({score:.2f}) pour: {question}")
+                    print(f"   Template trouvé: {cached_item['question_template']}")
+                    return cached_item['sql_template'], current_variables
+            return None
+        except Exception as e:
+            print(f"❌ Erreur get_semantic_query: {e}")
+            return None
+
     def _questions_similar(self, q1: str, q2: str, threshold: float = 0.8) -> bool:
         """Compare la similarité entre deux questions normalisées"""
         q1_words = set(q1.split())
@@ -222,11 +173,11 @@ class CacheManager:
             # 3. Générer la clé de cache
             key = hashlib.md5(norm_question.encode('utf-8')).hexdigest()
             
-            # 4. Sauvegarder dans le cache
-            self.cache[key] = {
+            # 4. Sauvegarder dans le cache (une ligne ajoutée au journal)
+            self.store.put(key, {
                 'question_template': norm_question,
                 'sql_template': norm_sql
-            }
+            })
             
             print(f"💾 Cache ajouté:")
             print(f"   Question: {question}")
@@ -234,7 +185,5 @@ class CacheManager:
             print(f"   Variables: {vars_question}")
             print(f"   SQL: {norm_sql}")
             
-            self._save_cache()
-            
         except Exception as e:
             print(f"❌ Erreur cache_query: {e}")
\ No newline at end of file
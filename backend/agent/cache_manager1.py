@@ -1,172 +1,56 @@
-import json
 from pathlib import Path
-from typing import Dict, Any, Optional, Tuple, List
+from typing import Dict, Any, Optional, Tuple, List, Set
 import hashlib
 import re
 from collections import defaultdict
-import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import logging
-from config.database import get_db
-import traceback
+from security.sql_scope import children_scope_template
+from services.children_scope import get_children_scope
+from agent.embeddings import get_embedder, same_polarity
+from agent.param_extractor import AUTO_PATTERNS, TRIMESTRE_MAPPING, extract_parent_parameters
+from agent.query_store import QueryStore
+from agent.sql_template import CHILDREN_SLOTS
+from agent.template_index import EmbeddingIndex, VectorIndex
 
 logger = logging.getLogger(__name__)
 class CacheManager1:
-    def __init__(self, cache_file: str = "sql_query_cache1.json"):
+    def __init__(self, cache_file: str = "sql_query_cache1.json", embedder=None):
         self.cache_file = Path(cache_file)
-        self.cache = self._load_cache()
 
         
         # Patterns de base pour les valeurs structurées
-        self.auto_patterns = {
-            r'\b([A-Z]{3,})\s+([A-Z]{3,})\b': 'NomPrenom',
-            r'\b\d+[A-Z]\d+\b': 'CODECLASSEFR', 
-            r'\b(20\d{2}[/-]20\d{2})\b': 'AnneeScolaire',
-            r'\b\d{1,5}\b': 'IDPersonne'
-        }
-        self.trimestre_mapping = {
-            '1er trimestre': 31,
-            '1ère trimestre': 31,
-            'premier trimestre': 31,
-            '2ème trimestre': 32,
-            'deuxième trimestre': 32,
-            '3ème trimestre': 33,
-            '3éme trimestre': 33,
-            'troisième trimestre': 33,
-            'trimestre 1': 31,
-            'trimestre 2': 32,
-            'trimestre 3': 33
-        }
+        self.auto_patterns = AUTO_PATTERNS
+        self.trimestre_mapping = TRIMESTRE_MAPPING
         self.discovered_patterns = defaultdict(list)
         
-        # Initialisation du vectorizer TF-IDF
-        self.vectorizer = TfidfVectorizer()
-        self.template_vectors = None
-        self._init_similarity_search()
+        # Index TF-IDF incrémental (features hachées), rechargé depuis le disque :
+        # seules les entrées absentes de l'instantané des vecteurs sont vectorisées
+        self.index = VectorIndex(str(self.cache_file.with_suffix('.vectors.npz')))
+        self.embeddings = EmbeddingIndex(embedder or get_embedder(), str(self.cache_file.with_suffix('.embeddings.npz')))
+        self._double_brace_keys: Set[str] = set()
+        self.store = QueryStore(str(self.cache_file), on_change=self._index_entry)
+        self.index.flush()
+        self.embeddings.sync()
 
-    def _init_similarity_search(self):
-        """Initialise le système de recherche de similarité"""
-        if self.cache:
-            templates = [self._normalize_template(item['question_template']) 
-                        for item in self.cache.values()]
-            self.vectorizer.fit(templates)
-            self.template_vectors = self.vectorizer.transform(templates)
-
-    def _load_cache(self) -> Dict[str, Any]:
-        if not self.cache_file.exists():
-            return {}
-        try:
-            with open(self.cache_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError):
-            return {}
-
-    def _save_cache(self):
-        with open(self.cache_file, 'w', encoding='utf-8') as f:
-            json.dump(self.cache, f, indent=2, ensure_ascii=False)
-        self._init_similarity_search()  # Recharge les vecteurs après sauvegarde
-
-    def _extract_family_references(self, question: str) -> Dict[str, str]:
-        """Détecte les références familiales et les normalise"""
-        family_patterns = {
-            r'\b(?:mon|ma|mes)\s+(enfant|fille|fils|enfants)\b': 'id_personne',
-            r'\b(?:de|du|d\')\s*(?:mon|ma|mes)\s+(enfant|fille|fils|enfants)\b': 'id_personne',
-            r'\bmon\s+enfant\b': 'id_personne',
-            r'\bma\s+fille\b': 'id_personne', 
-            r'\bmon\s+fils\b': 'id_personne',
-            r'\bmes\s+enfants\b': 'id_personne'
-        }
-        
-        family_refs = {}
-        normalized_question = question.lower()
-        
-        for pattern, placeholder in family_patterns.items():
-            if re.search(pattern, normalized_question, re.IGNORECASE):
-                family_refs['family_relation'] = placeholder
-                break
-        
-        return family_refs
+    def _index_entry(self, key: str, entry: Optional[Dict[str, Any]]):
+        """Tient l'index vectoriel à jour pour chaque entrée chargée ou ajoutée par le QueryStore"""
+        if entry is None:
+            self.index.remove(key)
+            self.embeddings.remove(key)
+            self._double_brace_keys.discard(key)
+            return
+        if key not in self.index:
+            self.index.add(key, self._normalize_template(entry['question_template']))
+        if key not in self.embeddings:
+            self.embeddings.add(key, entry['question_template'])
+        if '{{id_personne}}' in entry.get('sql_template', ''):
+            self._double_brace_keys.add(key)
+        else:
+            self._double_brace_keys.discard(key)
 
-    def _normalize_sql_for_family(self, sql_query: str, children_ids: List[int]) -> str:
-        """Normalise le SQL en remplaçant les IDs enfants par des placeholders"""
-        normalized_sql = sql_query
-        
-        if not children_ids:
-            return normalized_sql
-        
-        # Convertir les IDs en strings pour les remplacements
-        children_ids_str = [str(id) for id in children_ids]
-        
-        # Patterns pour remplacer les IDs spécifiques par des variables
-        patterns_to_replace = [
-            # WHERE clauses avec IdPersonne (un seul ID)
-            (rf"\b(IdPersonne|e\.IdPersonne|eleve\.IdPersonne)\s*=\s*({'|'.join(children_ids_str)})\b", 
-            r'\1 = {id_personne}'),
-            
-            # WHERE clauses avec IN (un seul ID)
-            (rf"\b(IdPersonne|e\.IdPersonne|eleve\.IdPersonne)\s+IN\s*\(\s*({'|'.join(children_ids_str)})\s*\)", 
-            r'\1 IN ({id_personne})'),
-            
-            # WHERE clauses avec IN (plusieurs IDs)
-            (rf"\b(IdPersonne|e\.IdPersonne|eleve\.IdPersonne)\s+IN\s*\(\s*({',\s*'.join(children_ids_str)})\s*\)", 
-            r'\1 IN ({id_personne})'),
-        ]
-        
-        for pattern, replacement in patterns_to_replace:
-            normalized_sql = re.sub(pattern, replacement, normalized_sql, flags=re.IGNORECASE)
-        
-        return normalized_sql
-    
     def _extract_parameters(self, text: str) -> Tuple[str, Dict[str, str]]:
-        """Détection intelligente des paramètres"""
-        variables = {}
-        normalized = text
-
-        family_refs = self._extract_family_references(text)
-        if family_refs:
-            # Remplacer toutes les références familiales par un placeholder uniforme
-            family_patterns = [
-                r'\b(?:mon|ma|mes)\s+(?:enfant|fille|fils|enfants)\b',
-                r'\b(?:de|du|d\')\s*(?:mon|ma|mes)\s+(?:enfant|fille|fils|enfants)\b'
-            ]
-            
-            for pattern in family_patterns:
-                normalized = re.sub(pattern, '{family_relation}', normalized, flags=re.IGNORECASE)
-            
-            variables['id_personne'] = family_refs['family_relation']
-        
-        for term, code in self.trimestre_mapping.items():
-            if term in normalized.lower():
-                normalized = normalized.replace(term, "{codeperiexam}")
-                variables["codeperiexam"] = str(code)
-                break
-                
-        # 1. Détection des motifs connus
-        for pattern, param_type in self.auto_patterns.items():
-            matches = list(re.finditer(pattern, normalized))
-            for match in reversed(matches):  # Traiter de droite à gauche
-                full_match = match.group(0)
-                
-                if param_type == 'NomPrenom':
-                    nom, prenom = match.groups()
-                    normalized = normalized.replace(full_match, "{NomFr} {PrenomFr}")
-                    variables.update({"NomFr": nom, "PrenomFr": prenom})
-                else:
-                    value = match.group(1) if len(match.groups()) > 0 else full_match
-                    normalized = normalized.replace(full_match, f"{{{param_type}}}")
-                    variables[param_type] = value
-
-        # 2. Détection des valeurs entre quotes
-        quoted_values = re.findall(r"['\"]([^'\"]+)['\"]", normalized)
-        for val in quoted_values:
-            if val not in variables.values():  
-                if val.isupper() and len(val.split()) == 1:
-                    param_name = "NomFr" if "nom" in normalized.lower() else "Valeur"
-                    normalized = normalized.replace(f"'{val}'", f"'{{{param_name}}}'")
-                    variables[param_name] = val
-
-        return normalized, variables
+        """Détection des paramètres (extracteur compilé partagé, résultats mémorisés)"""
+        return extract_parent_parameters(text)
 
     def _normalize_template(self, text: str) -> str:
         """Normalise le texte pour la comparaison de similarité"""
@@ -176,21 +60,14 @@ class CacheManager1:
         return normalized
 
     def find_similar_template(self, question: str, threshold: float = 0.85) -> Tuple[Optional[Dict], float]:
-        """Trouve un template similaire en utilisant TF-IDF et cosine similarity"""
-        if not self.cache:
-            return None, 0.0
-            
+        """Trouve un template similaire (TF-IDF et similarité cosinus, index incrémental)"""
         norm_question = self._normalize_template(question)
         
         try:
-            question_vec = self.vectorizer.transform([norm_question])
-            similarities = cosine_similarity(question_vec, self.template_vectors)[0]
-            best_idx = np.argmax(similarities)
-            best_score = similarities[best_idx]
-            
-            if best_score >= threshold:
-                cache_key = list(self.cache.keys())[best_idx]
-                return self.cache[cache_key], best_score
+            for key, score in self.index.search(norm_question, k=3, threshold=threshold):
+                cached = self.store.get(key)
+                if cached:
+                    return cached, score
         except Exception as e:
             print(f"⚠️ Erreur lors de la recherche de template similaire: {str(e)}")
         
@@ -248,152 +125,137 @@ class CacheManager1:
 
 
     def get_user_children_ids(self, user_id: int) -> List[int]:
-        """Récupère les IDs des enfants d'un parent avec gestion robuste des connexions"""
-        connection = None
-        cursor = None
-        children_ids = []
+        """Récupère les IDs des enfants d'un parent (résolveur partagé, en mémoire)"""
+        return get_children_scope().children_ids(user_id)
 
-        try:
-            query = """
-            SELECT DISTINCT pe.id AS id_enfant
-            FROM personne p
-            JOIN parent pa ON p.id = pa.Personne
-            JOIN parenteleve pev ON pa.id = pev.Parent
-            JOIN eleve e ON pev.Eleve = e.id
-            JOIN personne pe ON e.IdPersonne = pe.id
-            WHERE p.id = %s
-            """
-            
-            # Get connection
-            connection = get_db()
-            cursor = connection.cursor()
-            
-            # Execute query
-            cursor.execute(query, (user_id,))
-            users = cursor.fetchall()
-            
-            # Process results
-            if users:
-                children_ids = [user['id_enfant'] for user in users]
-                logger.info(f"✅ Found {len(children_ids)} children for parent {user_id}")
-            
-            return children_ids
-        except Exception as e:
-            logger.error(f"❌ Error getting children for parent {user_id}: {str(e)}")
-            logger.error(traceback.format_exc())
-            return []
-        finally:
-            # Only close if we created a direct connection
-            try:
-                if cursor:
-                    cursor.close()
-                
-                # Check if this is a Flask-managed connection
-                from flask import current_app
-                is_flask_connection = current_app and hasattr(current_app, 'extensions') and 'mysql' in current_app.extensions and connection == current_app.extensions['mysql'].connection
-                
-                if connection and not is_flask_connection:
-                    connection.close()
-                    logger.debug("🔌 Closed direct MySQL connection")
-            except Exception as close_error:
-                logger.warning(f"⚠️ Error during cleanup: {str(close_error)}")
+    def template_key(self, question: str) -> str:
+        """Clé de la question normalisée (mêmes questions aux paramètres près)"""
+        normalized_question, _ = self._extract_parameters(question)
+        return hashlib.md5(normalized_question.encode()).hexdigest()
 
-    def cache_query(self, question: str, sql_query: str):
-        """Version finale de mise en cache"""
+    def template_entry(self, question: str, sql_query: str,
+                       children_ids: Optional[List[int]] = None) -> Optional[Dict[str, str]]:
+        """
+        Entrée de cache d'une requête générée. Pour un parent (children_ids),
+        ses filtres sur les enfants deviennent IN ({children_scope}) : l'entrée
+        ne contient aucun ID et sert à tous les parents posant la même question.
+        None si la requête est propre à ce parent (filtre partiel ou non reconnu).
+        """
+        if children_ids:
+            sql_query = children_scope_template(sql_query, children_ids)
+            if sql_query is None:
+                return None
         norm_question, vars_question = self._extract_parameters(question)
-        norm_sql = self._normalize_sql(sql_query, vars_question)
-        
-        key = hashlib.md5(norm_question.encode()).hexdigest()
-        self.cache[key] = {
+        return {
             'question_template': norm_question,
-            'sql_template': norm_sql
+            'sql_template': self._normalize_sql(sql_query, vars_question)
         }
-        self._save_cache()
 
-    def get_cached_query(self, question: str, current_user_id: int) -> Optional[Tuple[str, Dict[str, str]]]:
-        """Version modifiée qui gère le remplacement direct de l'ID enfant dans le SQL"""
+    def cache_query(self, question: str, sql_query: str, children_ids: Optional[List[int]] = None):
+        """Met en cache le template de la question (voir template_entry)"""
+        entry = self.template_entry(question, sql_query, children_ids)
+        if entry is None:
+            logger.info("⚠️ Requête propre à ce parent (filtre partiel ou non reconnu) : non mise en cache")
+            return
+        self.store.put(self.template_key(question), entry)
+
+    def bind_entry(self, question: str, entry: Dict[str, str],
+                   current_user_id: int) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Template d'une entrée (générée pour la même question) lié aux valeurs de la question et aux enfants"""
+        _, variables = self._extract_parameters(question)
+        return self._bind_children(entry['sql_template'], variables, current_user_id)
+
+    def _bind_children(self, sql_template: str, variables: Dict[str, Any],
+                       current_user_id: int) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Variables d'un template pour le parent courant : {{id_personne}} ramené à
+        {id_personne} ; {id_personne} et {children_scope} sont liés à la liste des
+        IDs de ses enfants (jamais ceux du template). None si le template en a
+        besoin et que le parent n'en a aucun.
+        """
+        sql_template = sql_template.replace('{{id_personne}}', '{id_personne}')
+        placeholders = re.findall(r'\{(\w+)\}', sql_template)
+        current_vars = {param: variables[param] for param in placeholders
+                        if param in variables and param not in CHILDREN_SLOTS}
+        slots = [slot for slot in CHILDREN_SLOTS if slot in placeholders]
+        if slots:
+            children_ids = self.get_user_children_ids(current_user_id)
+            if not children_ids:
+                return None
+            current_vars.update({slot: children_ids for slot in slots})
+        return sql_template, current_vars
+
+    def get_cached_query(self, question: str, current_user_id: int) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Template SQL en cache et ses variables (dont id_personne : IDs des
+        enfants du parent courant), à lier par agent.sql_template.bind_template
+        """
+        
+        # Entrées ajoutées par les autres workers
+        self.store.refresh()
         
         normalized_question, variables = self._extract_parameters(question)
         key = self._generate_cache_key(normalized_question)
         
-        if key in self.cache:
-            cached = self.cache[key]
-            sql_template = cached['sql_template']
-            
-            # Remplacer directement {id_personne} ou {{id_personne}} dans le SQL par les vrais IDs
-            if '{id_personne}' in sql_template or '{{id_personne}}' in sql_template:
-                children_ids = self.get_user_children_ids(current_user_id)
-                if children_ids:
-                    # Construire la valeur de remplacement selon le contexte
-                    if len(children_ids) == 1:
-                        id_replacement = str(children_ids[0])
-                    else:
-                        id_replacement = ','.join(str(id) for id in children_ids)
-                    
-                    # Remplacer les deux formats possibles
-                    sql_template = sql_template.replace('{{id_personne}}', id_replacement)
-                    sql_template = sql_template.replace('{id_personne}', id_replacement)
-            
-            # Gérer les autres variables normalement
-            current_vars = {}
-            for param in re.findall(r'\{(\w+)\}', sql_template):
-                if param in variables:
-                    current_vars[param] = variables[param]
-            
-            return sql_template, current_vars
+        cached = self.store.get(key)
+        if cached:
+            return self._bind_children(cached['sql_template'], variables, current_user_id)
         
         # Si pas de correspondance exacte, chercher un template similaire
         similar_template, score = self.find_similar_template(question)
         if similar_template:
-            print(f"🔍 Template similaire trouvé (score: {score:.2f})")
+            logger.debug(f"🔍 Template similaire trouvé (score: {score:.2f})")
             sql_template = similar_template['sql_template']
             
-            # Remplacer directement {id_personne} ou {{id_personne}} dans le SQL par les vrais IDs
-            if '{id_personne}' in sql_template or '{{id_personne}}' in sql_template:
-                children_ids = self.get_user_children_ids(current_user_id)
-                if children_ids:
-                    # Construire la valeur de remplacement selon le contexte
-                    if len(children_ids) == 1:
-                        id_replacement = str(children_ids[0])
-                    else:
-                        id_replacement = ','.join(str(id) for id in children_ids)
-                    
-                    # Remplacer les deux formats possibles
-                    sql_template = sql_template.replace('{{id_personne}}', id_replacement)
-                    sql_template = sql_template.replace('{id_personne}', id_replacement)
-            
-            # Gérer les autres variables
-            current_vars = {}
+            # Variables absentes de la question normalisée : valeur trouvée dans la question
+            variables = dict(variables)
             for param in re.findall(r'\{(\w+)\}', sql_template):
-                if param in variables:
-                    current_vars[param] = variables[param]
-                else:
-                    # Essaye de trouver une valeur correspondante dans la question
+                if param not in variables and param not in CHILDREN_SLOTS:
                     for pattern in self.auto_patterns:
                         match = re.search(pattern, question)
                         if match:
                             value = match.group(1) if len(match.groups()) > 0 else match.group(0)
-                            current_vars[param] = value
+                            variables[param] = value
                             break
             
-            return sql_template, current_vars
+            return self._bind_children(sql_template, variables, current_user_id)
         
         return None
         
+    def get_semantic_query(self, question: str, current_user_id: int,
+                           threshold: float) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Dernier recours avant le LLM : template le plus proche au sens des
+        embeddings (paraphrases), avec les mêmes paramètres que la question.
+        Les IDs des enfants sont ceux du parent courant, jamais ceux du template.
+        """
+        if threshold > 1:  # niveau sémantique désactivé (repli par n-grammes)
+            return None
+        try:
+            normalized_question, variables = self._extract_parameters(question)
+            placeholders = set(re.findall(r'\{\w+\}', normalized_question))
+            for key, score in self.embeddings.search(normalized_question, k=5, threshold=threshold):
+                cached = self.store.get(key)
+                if not cached or set(re.findall(r'\{\w+\}', cached['question_template'])) != placeholders \
+                        or not same_polarity(question, cached['question_template']):
+                    continue
+                logger.info(f"🧠 Cache hit sémantique parent ({score:.2f}) : {cached['question_template']}")
+                return self._bind_children(cached['sql_template'], variables, current_user_id)
+            return None
+        except Exception as e:
+            logger.error(f"❌ Erreur get_semantic_query: {e}")
+            return None
+
     def clean_double_braces_in_cache(self):
         """Nettoie le cache en remplaçant {{id_personne}} par {id_personne}"""
-        updated = False
-        
-        for key, item in self.cache.items():
-            sql_template = item.get("sql_template", "")
-            if "{{id_personne}}" in sql_template:
-                # Remplacer les doubles accolades par des simples
-                item["sql_template"] = sql_template.replace("{{id_personne}}", "{id_personne}")
-                updated = True
-                logger.info(f"✅ Nettoyé les doubles accolades dans le template: {key}")
-        
-        if updated:
-            self._save_cache()
-            logger.info("✅ Cache nettoyé et sauvegardé")
-        else:
-            logger.info("ℹ️ Aucune double accolade trouvée dans le cache")
\ No newline at end of file
+        # Seules les entrées repérées à l'indexation sont concernées (pas de parcours du cache)
+        for key in list(self._double_brace_keys):
+            item = self.store.get(key)
+            if item is None:
+                self._double_brace_keys.discard(key)
+                continue
+            self.store.put(key, {
+                **item,
+                "sql_template": item.get("sql_template", "").replace("{{id_personne}}", "{id_personne}")
+            })
+            logger.info(f"✅ Nettoyé les doubles accolades dans le template: {key}")
@@ -0,0 +1,129 @@
+import logging
+import re
+import unicodedata
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Mots-clés (sans accents, en minuscules) qui rattachent une question à un domaine
+DOMAIN_KEYWORDS = {
+    "ELEVES_INSCRIPTIONS": [
+        "eleve", "etudiant", "inscri", "nouveau", "nationalit", "naissance",
+        "medical", "representant", "situation famil"
+    ],
+    "SUIVI_SCOLARITE": [
+        "note", "moyenne", "absence", "absent", "retard", "blame", "avertissement",
+        "discipline", "resultat", "bulletin", "decision", "dossier scolaire", "rang",
+        "prix", "justifi", "sms", "admis", "redouble"
+    ],
+    "PARENTS": [
+        "parent", "pere", "mere", "tuteur", "famille", "mon fils", "ma fille",
+        "mon enfant", "mes enfants"
+    ],
+    "CANTINE": ["cantine", "menu", "repas", "dejeuner"],
+    "PERSONNEL_ENSEIGNEMENT": [
+        "enseignant", "professeur", "prof ", "surveillant", "personnel", "grade",
+        "qualification", "disponibilit", "matiere enseignee"
+    ],
+    "FINANCES_PAIEMENTS": [
+        "paiement", "paye", "tranche", "montant", "frais", "cheque", "echeanc",
+        "reglement", "caisse", "banque", "remise", "uniforme", "extra", "club",
+        "ttc", "restant", "impaye", "versement", "fournisseur"
+    ],
+    "EMPLOIS_DU_TEMPS": [
+        "emploi", "seance", "salle", "examen", "devoir", "homework", "horaire",
+        "semaine", "lundi", "mardi", "mercredi", "jeudi", "vendredi", "samedi",
+        "trimestre", "matiere"
+    ],
+    "GENERAL_ADMINISTRATION_CONFIG": [
+        "etablissement", "localite", "delegation", "gouvernorat", "utilisateur",
+        "privilege", "niveau", "section", "classe", "annee scolaire", "actualite",
+        "reclamation", "suggestion", "notification", "codepostal", "pays"
+    ],
+}
+
+# Nombre maximal de domaines retenus pour une question
+MAX_DOMAINS = 3
+
+DOMAIN_PROMPT = """Voici les domaines d'une base de données scolaire :
+{domains}
+
+Question : {question}
+
+Répondez UNIQUEMENT par les noms des domaines (au plus {max_domains}) nécessaires pour répondre, séparés par des virgules."""
+
+
+def strip_accents(text: str) -> str:
+    """Minuscules sans accents, pour comparer des mots-clés"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+class DomainClassifier:
+    """
+    Choisit les domaines métier pertinents pour une question : d'abord par
+    mots-clés (sans appel réseau), puis par un court appel LLM en dernier
+    recours. Une liste vide signifie "aucun domaine identifié".
+    """
+
+    def __init__(self, domain_descriptions: Dict[str, str], ask_llm: Optional[Callable[[str], str]] = None,
+                 keywords: Optional[Dict[str, List[str]]] = None, max_domains: int = MAX_DOMAINS):
+        self.domain_descriptions = domain_descriptions
+        self.ask_llm = ask_llm
+        self.max_domains = max_domains
+        self.keywords = {
+            domain: [strip_accents(k) for k in words]
+            for domain, words in (keywords or DOMAIN_KEYWORDS).items()
+            if domain in domain_descriptions
+        }
+
+    def classify(self, question: str) -> List[str]:
+        domains = self.classify_by_keywords(question)
+        if not domains and self.ask_llm:
+            domains = self._classify_by_llm(question)
+        logger.info(f"🧭 Domaines retenus pour la question : {domains or 'aucun'}")
+        return domains
+
+    async def classify_async(self, question: str, ask_llm_async: Callable[[str], Awaitable[str]]) -> List[str]:
+        """Comme classify(), avec un appel LLM asyncio en dernier recours (mode ASGI)"""
+        domains = self.classify_by_keywords(question)
+        if not domains:
+            try:
+                domains = self.parse_llm_answer(await ask_llm_async(self.llm_prompt(question)) or "")
+            except Exception as e:
+                logger.error(f"Erreur classification LLM des domaines : {e}")
+        logger.info(f"🧭 Domaines retenus pour la question : {domains or 'aucun'}")
+        return domains
+
+    def classify_by_keywords(self, question: str) -> List[str]:
+        text = f" {strip_accents(question)} "
+        scores = {}
+        for domain, words in self.keywords.items():
+            score = sum(1 for word in words if word in text)
+            if score:
+                scores[domain] = score
+        ranked = sorted(scores, key=lambda d: scores[d], reverse=True)
+        return ranked[:self.max_domains]
+
+    def _classify_by_llm(self, question: str) -> List[str]:
+        try:
+            answer = self.ask_llm(self.llm_prompt(question)) or ""
+        except Exception as e:
+            logger.error(f"Erreur classification LLM des domaines : {e}")
+            return []
+        return self.parse_llm_answer(answer)
+
+    def llm_prompt(self, question: str) -> str:
+        return DOMAIN_PROMPT.format(
+            domains="\n".join(f"- {name}: {desc}" for name, desc in self.domain_descriptions.items()),
+            question=question,
+            max_domains=self.max_domains
+        )
+
+    def parse_llm_answer(self, answer: str) -> List[str]:
+        names = re.findall(r"[A-Z_]{4,}", answer.upper())
+        domains = []
+        for name in names:
+            if name in self.domain_descriptions and name not in domains:
+                domains.append(name)
+        return domains[:self.max_domains]
@@ -0,0 +1,142 @@
+import logging
+import os
+import re
+import threading
+from typing import Dict, List, Set
+
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+
+logger = logging.getLogger(__name__)
+
+# Petit modèle de phrases multilingue (384 dimensions), exécuté sur CPU
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2')
+
+# Cosinus minimal pour réutiliser une requête en cache, par rôle : plus strict
+# pour les parents, dont une mauvaise correspondance sortirait de leur périmètre.
+# Surchargeable : EMBEDDING_THRESHOLDS="admin=0.9,parent=0.95"
+DEFAULT_THRESHOLDS = {
+    'admin': 0.90,
+    'parent': 0.93,
+}
+
+
+# Seuils du repli par n-grammes, qui ne reconnaît pas les paraphrases mais
+# rapproche des questions contraires (inscrits / non inscrits : 0.97) : niveau
+# sémantique désactivé par défaut (seuil > 1).
+# Surchargeable : EMBEDDING_NGRAM_THRESHOLDS="admin=0.99,parent=0.995"
+NGRAM_THRESHOLDS = {
+    'admin': 1.01,
+    'parent': 1.01,
+}
+
+
+def _thresholds_from_env(defaults: Dict[str, float], variable: str) -> Dict[str, float]:
+    thresholds = dict(defaults)
+    for item in os.getenv(variable, '').split(','):
+        role, _, value = item.partition('=')
+        try:
+            thresholds[role.strip().lower()] = float(value)
+        except ValueError:
+            continue
+    return thresholds
+
+
+EMBEDDING_THRESHOLDS = _thresholds_from_env(DEFAULT_THRESHOLDS, 'EMBEDDING_THRESHOLDS')
+EMBEDDING_NGRAM_THRESHOLDS = _thresholds_from_env(NGRAM_THRESHOLDS, 'EMBEDDING_NGRAM_THRESHOLDS')
+
+
+def role_threshold(role: str, embedder=None) -> float:
+    """Seuil de similarité sémantique pour un rôle ('admin' ou 'parent') et l'encodeur du processus"""
+    embedder = embedder or get_embedder()
+    thresholds = EMBEDDING_NGRAM_THRESHOLDS if isinstance(embedder, NgramEmbedder) else EMBEDDING_THRESHOLDS
+    return thresholds.get(role, max(thresholds.values()))
+
+
+# Négations et préfixes privatifs : "non inscrits", "impayés", "sans note"...
+_NEGATIONS = {'non', 'ne', 'n', 'pas', 'sans', 'jamais', 'aucun', 'aucune', 'ni', 'hors', 'not', 'no', 'without'}
+_NEGATIVE_PREFIXES = ('non', 'im', 'in', 'ir', 'il', 'dés', 'dé', 'des', 'mal')
+_WORD = re.compile(r'\w+')
+
+
+def _words(text: str) -> Set[str]:
+    return set(_WORD.findall(text.lower()))
+
+
+def same_polarity(question: str, template: str) -> bool:
+    """
+    Faux si l'une des deux questions est la négation de l'autre (négation
+    présente d'un seul côté, ou mot privatif : payés / impayés) : proches au
+    sens des embeddings, elles n'ont pas la même réponse
+    """
+    left, right = _words(question), _words(template)
+    if left & _NEGATIONS != right & _NEGATIONS:
+        return False
+    only_left, only_right = left - right, right - left
+    for word in only_left:
+        for other in only_right:
+            longer, shorter = (word, other) if len(word) > len(other) else (other, word)
+            if any(longer == prefix + shorter for prefix in _NEGATIVE_PREFIXES):
+                return False
+    return True
+
+
+class SentenceEmbedder:
+    """Modèle sentence-transformers local (CPU) ; vecteurs float32 normalisés L2"""
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device='cpu')
+        self.name = model_name
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vectors = self.model.encode(texts, batch_size=32, normalize_embeddings=True, convert_to_numpy=True)
+        return vectors.astype(np.float32, copy=False)
+
+
+class NgramEmbedder:
+    """
+    Repli sans modèle : n-grammes de caractères hachés (accents retirés),
+    vecteurs float32 normalisés L2. Tolère les variantes d'écriture
+    (accents, pluriels, fautes de frappe) mais pas les synonymes.
+    """
+
+    def __init__(self, dim: int = 1024):
+        self.name = f'char-ngrams-{dim}'
+        self.dim = dim
+        self._vectorizer = HashingVectorizer(
+            analyzer='char_wb', ngram_range=(3, 4), n_features=dim,
+            alternate_sign=False, norm='l2', strip_accents='unicode'
+        )
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self._vectorizer.transform(texts).toarray().astype(np.float32)
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    """Encodeur unique du processus : le modèle local, sinon le repli par n-grammes"""
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                _embedder = _load_embedder()
+    return _embedder
+
+
+def _load_embedder():
+    if EMBEDDING_MODEL:
+        try:
+            embedder = SentenceEmbedder(EMBEDDING_MODEL)
+            logger.info(f"✅ Modèle d'embeddings chargé : {EMBEDDING_MODEL} ({embedder.dim} dimensions)")
+            return embedder
+        except ImportError:
+            logger.warning("⚠️ sentence-transformers absent : embeddings par n-grammes de caractères")
+        except Exception as e:
+            logger.warning(f"⚠️ Modèle d'embeddings {EMBEDDING_MODEL} indisponible ({e}) : repli sur les n-grammes")
+    return NgramEmbedder()
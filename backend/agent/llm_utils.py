@@ -1,17 +1,299 @@
-from openai import OpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, OpenAI, DefaultHttpxClient
+import openai
+import httpx
+import asyncio
+import logging
 import os
+import random
+import threading
+import time
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Erreurs transitoires qui justifient une nouvelle tentative
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,   # inclut APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class _LLMSettings:
+    """Réglages et backoff communs aux clients LLM synchrone et asyncio"""
+
+    def __init__(self,
+                 model: Optional[str],
+                 timeout: Optional[float],
+                 connect_timeout: Optional[float],
+                 max_retries: Optional[int],
+                 backoff_base: Optional[float],
+                 backoff_max: Optional[float]):
+        self.model = model or os.getenv("LLM_MODEL", "gpt-4o-mini")
+        self.timeout = timeout if timeout is not None else _env_float("LLM_TIMEOUT", 30.0)
+        self.connect_timeout = connect_timeout if connect_timeout is not None else _env_float("LLM_CONNECT_TIMEOUT", 5.0)
+        self.max_retries = max_retries if max_retries is not None else _env_int("LLM_MAX_RETRIES", 3)
+        self.backoff_base = backoff_base if backoff_base is not None else _env_float("LLM_BACKOFF_BASE", 0.5)
+        self.backoff_max = backoff_max if backoff_max is not None else _env_float("LLM_BACKOFF_MAX", 8.0)
+
+    def _http_settings(self, pool_size: int) -> Dict[str, object]:
+        return {
+            "limits": httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=_env_float("LLM_KEEPALIVE_EXPIRY", 60.0)
+            ),
+            "timeout": httpx.Timeout(self.timeout, connect=self.connect_timeout)
+        }
+
+    def _backoff_delay(self, attempt: int, error: Exception) -> float:
+        """Backoff exponentiel "full jitter", en respectant Retry-After si présent"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        response = getattr(error, "response", None)
+        if response is not None:
+            try:
+                retry_after = float(response.headers.get("retry-after", 0))
+                delay = max(delay, min(retry_after, self.backoff_max))
+            except (TypeError, ValueError):
+                pass
+        return delay
+
+
+class LLMClient(_LLMSettings):
+    """
+    Client LLM partagé par tout le processus : un seul pool HTTP keep-alive,
+    des timeouts configurables, un nombre borné d'appels simultanés et des
+    nouvelles tentatives avec backoff exponentiel "full jitter".
+
+    Configuration (variables d'environnement) :
+        OPENAI_API_KEY, OPENAI_BASE_URL, LLM_MODEL,
+        LLM_TIMEOUT, LLM_CONNECT_TIMEOUT, LLM_POOL_SIZE, LLM_KEEPALIVE_EXPIRY,
+        LLM_MAX_CONCURRENCY, LLM_MAX_RETRIES, LLM_BACKOFF_BASE, LLM_BACKOFF_MAX
+    """
+
+    def __init__(self,
+                 api_key: Optional[str] = None,
+                 base_url: Optional[str] = None,
+                 model: Optional[str] = None,
+                 timeout: Optional[float] = None,
+                 connect_timeout: Optional[float] = None,
+                 pool_size: Optional[int] = None,
+                 max_concurrency: Optional[int] = None,
+                 max_retries: Optional[int] = None,
+                 backoff_base: Optional[float] = None,
+                 backoff_max: Optional[float] = None):
+        super().__init__(model, timeout, connect_timeout, max_retries, backoff_base, backoff_max)
+        self.pool_size = pool_size or _env_int("LLM_POOL_SIZE", 20)
+        self.max_concurrency = max_concurrency or _env_int("LLM_MAX_CONCURRENCY", 8)
+
+        # Un seul pool de connexions HTTP, réutilisé (keep-alive) par tous les appels
+        self._http_client = DefaultHttpxClient(**self._http_settings(self.pool_size))
+        self._client = OpenAI(
+            api_key=api_key or os.getenv("OPENAI_API_KEY"),
+            base_url=base_url or os.getenv("OPENAI_BASE_URL") or None,
+            http_client=self._http_client,
+            max_retries=0  # les nouvelles tentatives sont gérées ici, avec jitter
+        )
+        self._semaphore = threading.BoundedSemaphore(self.max_concurrency)
+
+    def chat(self,
+             messages: List[Dict[str, str]],
+             model: Optional[str] = None,
+             temperature: float = 0.1,
+             max_tokens: int = 300) -> str:
+        """Envoie une conversation et renvoie le contenu de la première réponse"""
+        response = self._with_retry(lambda: self._client.chat.completions.create(
+            model=model or self.model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens
+        ))
+        return response.choices[0].message.content or ""
+
+    def chat_stream(self,
+                    messages: List[Dict[str, str]],
+                    model: Optional[str] = None,
+                    temperature: float = 0.3,
+                    max_tokens: int = 400) -> Iterator[str]:
+        """Comme chat(), mais renvoie les fragments de texte au fur et à mesure"""
+        # Le créneau de concurrence est gardé pendant toute la durée du flux
+        with self._semaphore:
+            stream = self._with_retry(lambda: self._client.chat.completions.create(
+                model=model or self.model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True
+            ), acquire_slot=False)
+            try:
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                stream.close()
+
+    def _with_retry(self, call, acquire_slot: bool = True):
+        attempt = 0
+        while True:
+            try:
+                if not acquire_slot:
+                    return call()
+                with self._semaphore:
+                    return call()
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff_delay(attempt, e)
+                attempt += 1
+                logger.warning(f"⚠️ Appel LLM échoué ({type(e).__name__}), tentative {attempt}/{self.max_retries} dans {delay:.2f}s")
+                time.sleep(delay)
+
+    def close(self):
+        self._http_client.close()
+
+
+class AsyncLLMClient(_LLMSettings):
+    """
+    Équivalent asyncio de LLMClient pour le mode ASGI : une attente LLM
+    n'occupe pas de thread, le nombre d'appels simultanés n'est borné que
+    par LLM_ASYNC_MAX_CONCURRENCY (et la taille du pool HTTP, LLM_ASYNC_POOL_SIZE).
+    """
+
+    def __init__(self,
+                 api_key: Optional[str] = None,
+                 base_url: Optional[str] = None,
+                 model: Optional[str] = None,
+                 timeout: Optional[float] = None,
+                 connect_timeout: Optional[float] = None,
+                 pool_size: Optional[int] = None,
+                 max_concurrency: Optional[int] = None,
+                 max_retries: Optional[int] = None,
+                 backoff_base: Optional[float] = None,
+                 backoff_max: Optional[float] = None):
+        super().__init__(model, timeout, connect_timeout, max_retries, backoff_base, backoff_max)
+        self.max_concurrency = max_concurrency or _env_int("LLM_ASYNC_MAX_CONCURRENCY", 256)
+        self.pool_size = pool_size or _env_int("LLM_ASYNC_POOL_SIZE", self.max_concurrency)
+
+        self._http_client = DefaultAsyncHttpxClient(**self._http_settings(self.pool_size))
+        self._client = AsyncOpenAI(
+            api_key=api_key or os.getenv("OPENAI_API_KEY"),
+            base_url=base_url or os.getenv("OPENAI_BASE_URL") or None,
+            http_client=self._http_client,
+            max_retries=0
+        )
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def chat(self,
+                   messages: List[Dict[str, str]],
+                   model: Optional[str] = None,
+                   temperature: float = 0.1,
+                   max_tokens: int = 300) -> str:
+        response = await self._with_retry(lambda: self._client.chat.completions.create(
+            model=model or self.model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens
+        ))
+        return response.choices[0].message.content or ""
+
+    async def chat_stream(self,
+                          messages: List[Dict[str, str]],
+                          model: Optional[str] = None,
+                          temperature: float = 0.3,
+                          max_tokens: int = 400) -> AsyncIterator[str]:
+        async with self._semaphore:
+            stream = await self._with_retry(lambda: self._client.chat.completions.create(
+                model=model or self.model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True
+            ), acquire_slot=False)
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                await stream.close()
+
+    async def _with_retry(self, call, acquire_slot: bool = True):
+        attempt = 0
+        while True:
+            try:
+                if not acquire_slot:
+                    return await call()
+                async with self._semaphore:
+                    return await call()
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff_delay(attempt, e)
+                attempt += 1
+                logger.warning(f"⚠️ Appel LLM échoué ({type(e).__name__}), tentative {attempt}/{self.max_retries} dans {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    async def close(self):
+        await self._http_client.aclose()
+
+
+_client: Optional[LLMClient] = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """Renvoie le client LLM unique du processus (créé au premier appel)"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient()
+    return _client
+
+
+_async_client: Optional[AsyncLLMClient] = None
+
+
+def get_async_llm_client() -> AsyncLLMClient:
+    """Renvoie le client LLM asyncio unique du processus (mode ASGI, une seule boucle)"""
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncLLMClient()
+    return _async_client
+
+
+async def ask_llm_async(prompt: str) -> str:
+    try:
+        return await get_async_llm_client().chat(
+            [{"role": "user", "content": prompt}],
+            temperature=0.1,
+            max_tokens=300
+        )
+    except Exception as e:
+        print(f"❌ Erreur LLM: {str(e)}")
+        return ""
+
 
 def ask_llm(prompt: str) -> str:
     try:
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        
-        response = client.chat.completions.create(
-            model="gpt-4o-mini", 
-            messages=[{"role": "user", "content": prompt}],
+        return get_llm_client().chat(
+            [{"role": "user", "content": prompt}],
             temperature=0.1,
             max_tokens=300
         )
-        return response.choices[0].message.content
     except Exception as e:
         print(f"❌ Erreur LLM: {str(e)}")
         return ""
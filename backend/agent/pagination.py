@@ -0,0 +1,82 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+import zlib
+from typing import Any, Dict, Optional, Sequence
+
+# Nombre maximal de lignes lues pour une requête générée (une page)
+RESULT_ROW_CAP = int(os.getenv('RESULT_ROW_CAP', 200))
+
+# Durée de validité d'un page_token, en secondes
+PAGE_TOKEN_TTL = int(os.getenv('PAGE_TOKEN_TTL', 900))
+
+
+class InvalidPageToken(Exception):
+    """page_token illisible, falsifié, expiré ou émis pour un autre utilisateur"""
+
+
+def _secret() -> bytes:
+    secret = os.getenv('PAGE_TOKEN_SECRET') or os.getenv('JWT_SECRET_KEY')
+    if not secret:
+        raise InvalidPageToken("Aucun secret configuré pour signer les page_token")
+    return secret.encode('utf-8')
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def encode_page_token(sql_query: str, offset: int, user_id: Optional[int], question: str = "",
+                      scope: Optional[str] = None, params: Optional[Sequence[Any]] = None) -> str:
+    """
+    Jeton de page : la requête déjà validée, le décalage et l'utilisateur,
+    signés (HMAC-SHA256) pour que le client ne puisse pas les modifier. Le
+    contenu n'est que compressé (zlib + base64), pas chiffré : le client peut
+    y lire la requête et ses valeurs liées (dont les IDs de ses enfants).
+    La page suivante est servie sans nouvel appel LLM, `scope` (périmètre du
+    cache de résultats) et `params` (valeurs liées d'un template) étant ceux
+    de la première page.
+    """
+    payload = {
+        "q": sql_query,
+        "o": offset,
+        "u": user_id,
+        "t": question,
+        "s": scope,
+        "p": list(params) if params is not None else None,
+        "e": int(time.time()) + PAGE_TOKEN_TTL
+    }
+    body = zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+    signature = hmac.new(_secret(), body, hashlib.sha256).digest()
+    return f"{_b64encode(body)}.{_b64encode(signature)}"
+
+
+def decode_page_token(token: str, user_id: Optional[int]) -> Dict[str, Any]:
+    """Vérifie un page_token et retourne {sql_query, offset, question, scope, params}"""
+    try:
+        body_part, signature_part = token.split('.', 1)
+        body = _b64decode(body_part)
+        signature = _b64decode(signature_part)
+    except (ValueError, AttributeError):
+        raise InvalidPageToken("page_token mal formé")
+
+    expected = hmac.new(_secret(), body, hashlib.sha256).digest()
+    if not hmac.compare_digest(signature, expected):
+        raise InvalidPageToken("Signature du page_token invalide")
+
+    payload = json.loads(zlib.decompress(body))
+    if payload['e'] < time.time():
+        raise InvalidPageToken("page_token expiré")
+    if payload['u'] != user_id:
+        raise InvalidPageToken("page_token émis pour un autre utilisateur")
+
+    params = payload.get('p')
+    return {"sql_query": payload['q'], "offset": payload['o'], "question": payload['t'], "scope": payload.get('s'),
+            "params": tuple(params) if params is not None else None}
@@ -0,0 +1,265 @@
+import os
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Extraction des paramètres des questions pour les deux caches de requêtes
+# (admin : CacheManager, parent : CacheManager1). Tous les motifs sont compilés
+# une fois ; la détection produit des portées (début, fin, placeholder) sur le
+# texte d'origine et la question normalisée est reconstruite en une seule passe,
+# au lieu d'un str.replace par valeur trouvée. Les portées suivent l'ordre des
+# anciennes étapes (une portée qui chevauche une portée déjà prise est
+# ignorée) : les questions normalisées, donc les clés de cache, sont les mêmes.
+
+# Questions normalisées gardées en mémoire par extracteur
+PARAM_CACHE_SIZE = int(os.getenv('PARAM_CACHE_SIZE', 4096))
+
+TRIMESTRE_MAPPING = {
+    '1er trimestre': 31,
+    '1ère trimestre': 31,
+    'premier trimestre': 31,
+    '2ème trimestre': 32,
+    'deuxième trimestre': 32,
+    '3ème trimestre': 33,
+    '3éme trimestre': 33,
+    'troisième trimestre': 33,
+    'trimestre 1': 31,
+    'trimestre 2': 32,
+    'trimestre 3': 33
+}
+
+# Motifs de valeurs structurées du cache parent, appliqués dans cet ordre
+AUTO_PATTERNS = {
+    r'\b([A-Z]{3,})\s+([A-Z]{3,})\b': 'NomPrenom',
+    r'\b\d+[A-Z]\d+\b': 'CODECLASSEFR',
+    r'\b(20\d{2}[/-]20\d{2})\b': 'AnneeScolaire',
+    r'\b\d{1,5}\b': 'IDPersonne'
+}
+
+_LETTERS = 'a-zA-Zàâäéèêëïîôöùûüÿç'
+_NAME_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE) for pattern in (
+        rf'\b([A-Z][{_LETTERS}]+)\s+([A-Z][{_LETTERS}]+)\b',  # Nom Prénom
+        rf"élève\s+([A-Z][{_LETTERS}]+)\s+([A-Z][{_LETTERS}]+)",
+        rf"de\s+l'élève\s+([A-Z][{_LETTERS}]+)\s+([A-Z][{_LETTERS}]+)",
+        rf"de\s+([A-Z][{_LETTERS}]+)\s+([A-Z][{_LETTERS}]+)"
+    )
+]
+_CLASS_CODE = re.compile(r'\b(\d+[A-Z]\d*)\b')
+_SCHOOL_YEAR = re.compile(r'\b(20\d{2}[/-]20\d{2})\b')
+_WHITESPACE = re.compile(r'\s+')
+
+_FAMILY_WORDS = r'(?:enfant|fille|fils|enfants)'
+_FAMILY_REFERENCE = re.compile('|'.join([
+    rf'\b(?:mon|ma|mes)\s+{_FAMILY_WORDS}\b',
+    rf"\b(?:de|du|d\')\s*(?:mon|ma|mes)\s+{_FAMILY_WORDS}\b",
+    r'\bmon\s+enfant\b',
+    r'\bma\s+fille\b',
+    r'\bmon\s+fils\b',
+    r'\bmes\s+enfants\b'
+]), re.IGNORECASE)
+_FAMILY_REPLACED = [
+    re.compile(rf'\b(?:mon|ma|mes)\s+{_FAMILY_WORDS}\b', re.IGNORECASE),
+    re.compile(rf"\b(?:de|du|d\')\s*(?:mon|ma|mes)\s+{_FAMILY_WORDS}\b", re.IGNORECASE)
+]
+_QUOTED = re.compile(r"['\"]([^'\"]+)['\"]")
+
+
+# Portée (début, fin, placeholder) ; simples tuples, créés par milliers
+Span = Tuple[int, int, str]
+
+
+class TermMatcher:
+    """
+    Recherche de plusieurs termes littéraux en une passe (alternation compilée,
+    en anticipation pour voir aussi les occurrences qui se chevauchent).
+    first() rend le même terme qu'un parcours des termes dans l'ordre.
+    """
+
+    def __init__(self, terms: Iterable[str]):
+        self._priority = {term: rank for rank, term in enumerate(terms)}
+        alternation = '|'.join(re.escape(term) for term in self._priority)
+        self._pattern = re.compile(f'(?=({alternation}))')
+        # Mot commun à tous les termes (ex. "trimestre") : test préalable en C,
+        # la plupart des questions n'en contiennent aucun
+        common = set.intersection(*(set(term.split()) for term in self._priority)) if self._priority else set()
+        self._anchor = max(common, key=len) if common else ''
+
+    def first(self, text: str) -> Optional[str]:
+        """Le terme présent dans `text` qui vient en premier dans la liste"""
+        if self._anchor not in text:
+            return None
+        best = None
+        for match in self._pattern.finditer(text):
+            term = match.group(1)
+            if best is None or self._priority[term] < self._priority[best]:
+                best = term
+                if self._priority[best] == 0:
+                    break
+        return best
+
+
+_TRIMESTRES = TermMatcher(TRIMESTRE_MAPPING)
+
+
+def _literal_spans(text: str, value: str, placeholder: str) -> List[Span]:
+    """Toutes les occurrences (sans chevauchement) de `value`, comme str.replace"""
+    spans = []
+    start = text.find(value) if value else -1
+    while start != -1:
+        spans.append((start, start + len(value), placeholder))
+        start = text.find(value, start + len(value))
+    return spans
+
+
+def _overlaps(spans: List[Span], start: int, end: int) -> bool:
+    for span_start, span_end, _ in spans:
+        if start < span_end and span_start < end:
+            return True
+    return False
+
+
+def _claim(spans: List[Span], new_spans: List[Span]) -> List[Span]:
+    """Ajoute les portées qui ne chevauchent aucune portée déjà revendiquée"""
+    if not spans:
+        return new_spans
+    return spans + [span for span in new_spans if not _overlaps(spans, span[0], span[1])]
+
+
+def _apply(text: str, spans: List[Span]) -> str:
+    """Reconstruit le texte avec les placeholders, en une passe"""
+    if not spans:
+        return text
+    parts, position = [], 0
+    for start, end, placeholder in sorted(spans):
+        parts.append(text[position:start])
+        parts.append(placeholder)
+        position = end
+    parts.append(text[position:])
+    return ''.join(parts)
+
+
+def _extract_admin(text: str) -> Tuple[str, Dict[str, str]]:
+    variables: Dict[str, str] = {}
+    lowered = text.lower()
+    spans: List[Span] = []
+
+    # 1. Trimestre
+    term = _TRIMESTRES.first(lowered)
+    if term is not None:
+        spans = _literal_spans(lowered, term, "{codeperiexam}")
+        variables["codeperiexam"] = str(TRIMESTRE_MAPPING[term])
+
+    # 2. Noms/prénoms : premier motif qui trouve quelque chose ; les valeurs
+    # retenues sont celles de la première occurrence
+    for pattern in _NAME_PATTERNS:
+        matches = list(pattern.finditer(text))
+        if matches:
+            nom, prenom = matches[0].groups()
+            variables.update({"NomFr": nom.capitalize(), "PrenomFr": prenom.capitalize()})
+            spans = _claim(spans, [(*match.span(), "{nomfr} {prenomfr}") for match in matches])
+            break
+
+    # 3. Code de classe
+    classe_match = _CLASS_CODE.search(text)
+    if classe_match:
+        code_classe = classe_match.group(1)
+        spans = _claim(spans, _literal_spans(lowered, code_classe.lower(), "{codeclassefr}"))
+        variables["CODECLASSEFR"] = code_classe
+
+    # 4. Année scolaire
+    annee_match = _SCHOOL_YEAR.search(text)
+    if annee_match:
+        spans = _claim(spans, _literal_spans(lowered, annee_match.group(0).lower(), "{anneescolaire}"))
+        variables["AnneeScolaire"] = annee_match.group(1).replace("-", "/")
+
+    normalized = _WHITESPACE.sub(' ', _apply(lowered, spans)).strip()
+    return normalized, variables
+
+
+_AUTO_PATTERNS = [(re.compile(pattern), param_type) for pattern, param_type in AUTO_PATTERNS.items()]
+# Tous les motifs sauf NomPrenom exigent un chiffre : test préalable unique
+_NEEDS_DIGIT = {'CODECLASSEFR', 'AnneeScolaire', 'IDPersonne'}
+_DIGIT = re.compile(r'\d')
+
+
+def _extract_parent(text: str) -> Tuple[str, Dict[str, str]]:
+    variables: Dict[str, str] = {}
+    spans: List[Span] = []
+    lowered = text.lower()
+    has_digit = _DIGIT.search(text) is not None
+
+    # 1. Références familiales : un placeholder uniforme, les IDs viennent du parent
+    if _FAMILY_REFERENCE.search(lowered):
+        for pattern in _FAMILY_REPLACED:
+            spans = _claim(spans, [(*match.span(), '{family_relation}') for match in pattern.finditer(text)])
+        variables['id_personne'] = 'id_personne'
+
+    # 2. Trimestre (détecté sans tenir compte de la casse, remplacé tel quel)
+    term = _TRIMESTRES.first(lowered)
+    if term is not None:
+        spans = _claim(spans, _literal_spans(text, term, "{codeperiexam}"))
+        variables["codeperiexam"] = str(TRIMESTRE_MAPPING[term])
+
+    # 3. Motifs connus, hors des portées déjà prises ; les valeurs retenues
+    # sont celles de la première occurrence
+    for pattern, param_type in _AUTO_PATTERNS:
+        if param_type in _NEEDS_DIGIT and not has_digit:
+            continue
+        matches = list(pattern.finditer(text))
+        if spans:
+            matches = [match for match in matches if not _overlaps(spans, *match.span())]
+        if not matches:
+            continue
+        first = matches[0]
+        if param_type == 'NomPrenom':
+            placeholder = "{NomFr} {PrenomFr}"
+            variables.update({"NomFr": first.group(1), "PrenomFr": first.group(2)})
+        else:
+            placeholder = f"{{{param_type}}}"
+            variables[param_type] = first.group(1) if first.groups() else first.group(0)
+        # De droite à gauche, comme les remplacements successifs d'origine
+        for value in dict.fromkeys(match.group(0) for match in reversed(matches)):
+            spans = _claim(spans, _literal_spans(text, value, placeholder))
+
+    normalized = _apply(text, spans)
+
+    # 4. Valeurs entre guillemets (rares : traitées sur la question déjà normalisée)
+    quoted = _QUOTED.findall(normalized) if ("'" in normalized or '"' in normalized) else []
+    for val in quoted:
+        if val not in variables.values():
+            if val.isupper() and len(val.split()) == 1:
+                param_name = "NomFr" if "nom" in normalized.lower() else "Valeur"
+                normalized = normalized.replace(f"'{val}'", f"'{{{param_name}}}'")
+                variables[param_name] = val
+
+    return normalized, variables
+
+
+# Une même question est normalisée plusieurs fois par requête (clé exacte,
+# index lexical, embeddings, mise en cache) : résultats mémorisés
+_admin_cached = lru_cache(maxsize=PARAM_CACHE_SIZE)(lambda text: _frozen(_extract_admin(text)))
+_parent_cached = lru_cache(maxsize=PARAM_CACHE_SIZE)(lambda text: _frozen(_extract_parent(text)))
+
+
+def _frozen(result: Tuple[str, Dict[str, str]]) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    normalized, variables = result
+    return normalized, tuple(variables.items())
+
+
+def extract_admin_parameters(text: str) -> Tuple[str, Dict[str, str]]:
+    """
+    Cache admin : question en minuscules, trimestre, nom/prénom, code de classe
+    et année scolaire remplacés par leurs placeholders
+    """
+    normalized, variables = _admin_cached(text)
+    return normalized, dict(variables)
+
+
+def extract_parent_parameters(text: str) -> Tuple[str, Dict[str, str]]:
+    """
+    Cache parent : références familiales ("mon fils"...), trimestre, valeurs
+    structurées (AUTO_PATTERNS) puis valeurs entre guillemets ; casse conservée
+    """
+    normalized, variables = _parent_cached(text)
+    return normalized, dict(variables)
@@ -10,10 +10,74 @@ from pathlib import Path
 import arabic_reshaper
 from bidi.algorithm import get_display
 import logging
+import re
 from typing import Dict, Any
 
 logger = logging.getLogger(__name__)
 
+def validate_name(full_name):
+    """Valide le format du nom"""
+    return bool(re.match(r'^[A-Za-zÀ-ÿ\s\-\']{3,50}$', full_name))
+
+def attestation_for_question(question: str, engine) -> Dict[str, Any]:
+    """
+    Traite une demande "attestation de Nom Prénom" : recherche de l'élève puis
+    génération du PDF. Retourne le corps JSON de la réponse (Flask ou ASGI).
+    """
+    name_match = re.search(
+        r"(?:attestation\s+(?:de|pour)\s+)([A-Za-zÀ-ÿ\s\-\']+)", 
+        question, 
+        re.IGNORECASE
+    )
+    
+    if not name_match:
+        return {
+            "response": "Veuillez spécifier un nom (ex: 'attestation de Nom Prénom')"
+        }
+
+    full_name = name_match.group(1).strip()
+    
+    if not validate_name(full_name):
+        return {
+            "response": "Format de nom invalide. Utilisez uniquement des lettres et espaces"
+        }
+    print(f"Recherche élève pour nom complet : {full_name}")
+
+    # Récupération des données
+    student_data = engine.get_student_info_by_name(full_name)
+    
+    print(f"Résultat de recherche: {student_data}")
+    
+    if not student_data:
+        return {
+            "response": f"Aucun élève trouvé avec le nom '{full_name}'"
+        }
+
+    # Harmoniser les champs pour le PDF
+    student_data['nom_complet'] = student_data['nom']
+    student_data['lieu_naissance'] = student_data['lieu_de_naissance']
+    student_data['annee_scolaire'] = "2024/2025"
+
+    # Génération du PDF
+    try:
+        pdf_path = export_attestation_pdf(student_data)
+
+        filename = os.path.basename(pdf_path)
+        
+        return {
+            "response": (
+                f"✅ Attestation générée pour {student_data['nom_complet']}\n\n"
+                f"<a href='/static/attestations/{filename}' download>Télécharger</a>"
+            ),
+            "pdf_url": f"/static/attestations/{filename}"
+        }
+
+    except Exception as e:
+        logger.error(f"Erreur génération PDF: {str(e)}")
+        return {
+            "response": "Erreur lors de la génération du document"
+        }
+
 def export_attestation_pdf(donnees):
     pdf = FPDF()
     pdf.add_page()
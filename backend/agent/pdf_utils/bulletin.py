@@ -5,7 +5,7 @@ import arabic_reshaper
 from bidi.algorithm import get_display
 import logging
 from typing import Dict, List, Any, Optional, Union
-from config.database import get_db
+from config.database import fetch_all, fetch_one
 import os
 import re
 
@@ -79,13 +79,7 @@ class BulletinPDFGenerator:
         annee_scolaire = annee_scolaire or self.determine_annee_scolaire()
         trimestres = [trimestre_id] if trimestre_id else [31, 32, 33]
         
-        conn = None
-        cursor = None
-        
         try:
-            conn = get_db()
-            cursor = conn.cursor(dictionary=True)
-            
             # 1. Requête élève avec vérification de l'ID service
             student_query = """
             SELECT 
@@ -105,8 +99,7 @@ class BulletinPDFGenerator:
             WHERE e.IdPersonne = %s AND a.AnneeScolaire = %s
             LIMIT 1
             """
-            cursor.execute(student_query, (student_id, annee_scolaire))
-            student_info = cursor.fetchone()
+            student_info = fetch_one(student_query, (student_id, annee_scolaire))
             
             if not student_info:
                 logger.error(f"Élève {student_id} non trouvé pour {annee_scolaire}")
@@ -131,8 +124,7 @@ class BulletinPDFGenerator:
                     AND ed.moyemati IS NOT NULL
                     AND ed.moyemati != '0.00'
                 """
-                cursor.execute(notes_query, (student_info['id_service'], trim_id))
-                notes_data = cursor.fetchall()
+                notes_data = fetch_all(notes_query, (student_info['id_service'], trim_id))
                 
                 if not notes_data:
                     logger.warning(f"Aucune note trouvée pour {student_id} (Trimestre {trim_id})")
@@ -166,7 +158,7 @@ class BulletinPDFGenerator:
                         'nom': student_info['nom_complet'],
                         'periode': self._get_period_name(trim_id, annee_scolaire),
                         'moyenne_generale': moy_gen,
-                        'rang': self._get_student_ranking(cursor, student_info['inscription_id'], trim_id, moy_gen),
+                        'rang': self._get_student_ranking(student_info['inscription_id'], trim_id, moy_gen),
                         'mention': self._get_appreciation(moy_gen),
                         'trimestre_id': trim_id
                     },
@@ -178,9 +170,7 @@ class BulletinPDFGenerator:
         except Exception as e:
             logger.error(f"Erreur base de données: {str(e)}")
             return None
-        finally:
-            if cursor: cursor.close()
-            if conn: conn.close()
+
     def _get_appreciation(self, moyenne: float) -> str:
         """Retourne l'appréciation correspondant à la moyenne"""
         if moyenne >= 16:
@@ -193,7 +183,7 @@ class BulletinPDFGenerator:
             return "Passable"
         return "Insuffisant"
     
-    def _get_student_ranking(self, cursor, inscription_id: int, trimestre_id: int, moyenne_generale: float) -> tuple:
+    def _get_student_ranking(self, inscription_id: int, trimestre_id: int, moyenne_generale: float) -> tuple:
         """Calcule le rang de l'élève dans sa classe"""
         try:
             # Requête pour le rang
@@ -213,8 +203,7 @@ class BulletinPDFGenerator:
                 HAVING moyenne_gen > %s
             ) as classement
             """
-            cursor.execute(rang_query, (inscription_id, trimestre_id, moyenne_generale))
-            rang_result = cursor.fetchone()
+            rang_result = fetch_one(rang_query, (inscription_id, trimestre_id, moyenne_generale))
             rang = rang_result['rang'] if rang_result else 1
             
             # Requête pour l'effectif
@@ -225,8 +214,7 @@ class BulletinPDFGenerator:
             WHERE ie.Classe = (SELECT Classe FROM inscriptioneleve WHERE id = %s)
                 AND erc.codeperiexam = %s
             """
-            cursor.execute(effectif_query, (inscription_id, trimestre_id))
-            effectif_result = cursor.fetchone()
+            effectif_result = fetch_one(effectif_query, (inscription_id, trimestre_id))
             effectif = effectif_result['effectif'] if effectif_result else 0
             
             return rang, effectif
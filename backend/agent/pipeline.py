@@ -0,0 +1,230 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from agent.pagination import RESULT_ROW_CAP, decode_page_token, encode_page_token
+from agent.renderers import to_records
+from agent.single_flight import AsyncSingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Nombre de lignes envoyées par évènement "rows" en mode streaming
+ROW_CHUNK_SIZE = 50
+
+
+class PipelineExecutionError(Exception):
+    """Erreur d'exécution de la requête SQL générée"""
+
+    def __init__(self, sql_query: str, details: str):
+        super().__init__(details)
+        self.sql_query = sql_query
+        self.details = details
+
+
+class AskPipeline:
+    """
+    Pipeline unique de POST /api/ask : la requête SQL est générée une seule fois,
+    exécutée une seule fois, et le même jeu de résultats alimente à la fois la
+    réponse texte (SQLAssistant) et les données structurées / graphique (SQLAgent).
+    """
+
+    def __init__(self, assistant, engine, page_size: int = RESULT_ROW_CAP):
+        self.assistant = assistant
+        self.engine = engine
+        self.page_size = page_size
+
+    def run(self, question: str, user_id: int, roles: List[str], output_format: str = "text") -> Dict[str, Any]:
+        # 1. Génération (cache ou LLM) - une seule fois
+        plan = self.assistant.prepare_query(question, user_id, roles)
+        if plan['error']:
+            return {
+                "sql_query": plan['sql_query'],
+                "response": plan['error'],
+                "status": "error",
+                "question": question,
+                "data": None
+            }
+
+        sql_query, scope, params = plan['sql_query'], self.assistant.result_scope(plan), plan.get('sql_params')
+
+        # 2. Exécution - une seule fois (ou depuis le cache de résultats)
+        result = self.assistant.run_query(sql_query, self.page_size, scope=scope, params=params)
+        if not result['success']:
+            logger.error(f"Erreur d'exécution SQL : {result['error']}")
+            raise PipelineExecutionError(sql_query, result['error'])
+
+        self.assistant.remember_query(question, plan)
+
+        # 3. Deux rendus à partir des mêmes lignes
+        return self._respond(question, sql_query, result, 0, user_id, output_format, scope, params)
+
+    def run_page(self, page_token: str, user_id: int, output_format: str = "text") -> Dict[str, Any]:
+        """
+        Page suivante d'un résultat : la requête vient du page_token signé,
+        elle est ré-exécutée au décalage demandé sans nouvel appel LLM.
+        Lève InvalidPageToken si le jeton n'est pas valable pour cet utilisateur.
+        """
+        page = decode_page_token(page_token, user_id)
+        sql_query, offset, question, scope = page['sql_query'], page['offset'], page['question'], page['scope']
+        params = page['params']
+
+        result = self.assistant.run_query(sql_query, self.page_size, offset, scope, params)
+        if not result['success']:
+            logger.error(f"Erreur d'exécution SQL : {result['error']}")
+            raise PipelineExecutionError(sql_query, result['error'])
+
+        return self._respond(question, sql_query, result, offset, user_id, output_format, scope, params)
+
+    def _respond(self, question: str, sql_query: str, result: Dict[str, Any], offset: int,
+                 user_id: int, output_format: str, scope: Optional[str] = None,
+                 params: Optional[Tuple[Any, ...]] = None) -> Dict[str, Any]:
+        columns, rows = result['columns'], result['rows']
+        pagination = self._pagination(question, sql_query, result, offset, user_id, scope, params)
+
+        response = self.assistant.format_rows(columns, rows, question, output_format)
+        if result['has_more'] and output_format == "text":
+            total = pagination['total'] if pagination['total'] is not None else "plus"
+            response += f"\n\n📄 Lignes {offset + 1} à {offset + len(rows)} sur {total}"
+
+        return {
+            "sql_query": sql_query,
+            "response": response,
+            "status": "success",
+            "question": question,
+            "data": self.engine._format_results(to_records(columns, rows), user_query=question, sql_query=sql_query),
+            "pagination": pagination
+        }
+
+    def _pagination(self, question: str, sql_query: str, result: Dict[str, Any], offset: int, user_id: int,
+                    scope: Optional[str] = None, params: Optional[Tuple[Any, ...]] = None) -> Dict[str, Any]:
+        row_count = len(result['rows'])
+        next_token = None
+        if result['has_more']:
+            next_token = encode_page_token(sql_query, offset + row_count, user_id, question, scope, params)
+        return {
+            "offset": offset,
+            "row_count": row_count,
+            "total": result['total'],
+            "has_more": result['has_more'],
+            "next_page_token": next_token
+        }
+
+    def stream(self, question: str, user_id: int, roles: List[str]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Variante streaming de run() : produit des évènements (nom, données)
+        dans l'ordre status -> sql -> rows (par paquets) -> token (résumé) -> done.
+        Une erreur produit un unique évènement "error" et termine le flux.
+        """
+        # Premier octet envoyé immédiatement, avant l'appel LLM
+        yield "status", {"stage": "generating_sql"}
+
+        plan = self.assistant.prepare_query(question, user_id, roles)
+        if plan['error']:
+            yield "error", {"message": plan['error'], "sql_query": plan['sql_query']}
+            return
+
+        sql_query, scope, params = plan['sql_query'], self.assistant.result_scope(plan), plan.get('sql_params')
+        yield "sql", {"sql_query": sql_query}
+
+        result = self.assistant.run_query(sql_query, self.page_size, scope=scope, params=params)
+        if not result['success']:
+            logger.error(f"Erreur d'exécution SQL : {result['error']}")
+            yield "error", {"message": "Erreur d'exécution SQL", "sql_query": sql_query, "details": result['error']}
+            return
+
+        self.assistant.remember_query(question, plan)
+        columns, rows = result['columns'], result['rows']
+
+        for start in range(0, len(rows), ROW_CHUNK_SIZE):
+            chunk = to_records(columns, rows[start:start + ROW_CHUNK_SIZE])
+            yield "rows", {"offset": start, "rows": self.engine._serialize_data(chunk)}
+
+        summary = []
+        if rows:
+            try:
+                for token in self.engine.stream_summary(question, sql_query, to_records(columns, rows)):
+                    summary.append(token)
+                    yield "token", {"text": token}
+            except Exception as e:
+                logger.error(f"Erreur streaming du résumé : {e}")
+
+        yield "done", {
+            "row_count": len(rows),
+            "response": "".join(summary) or self.assistant.format_rows(columns, rows, question),
+            "pagination": self._pagination(question, sql_query, result, 0, user_id, scope, params)
+        }
+
+
+class AsyncAskPipeline(AskPipeline):
+    """
+    Variante asyncio de AskPipeline pour le mode ASGI : l'attente LLM et
+    l'exécution SQL ne bloquent aucun thread. Les étapes courtes et synchrones
+    de l'assistant (cache, périmètre parent, rendu pandas/graphique) passent
+    par asyncio.to_thread pour ne pas bloquer la boucle d'évènements.
+    """
+
+    def __init__(self, assistant, engine,
+                 ask_llm: Callable[[str], Awaitable[str]],
+                 execute_page: Callable[..., Awaitable[Dict[str, Any]]],
+                 page_size: int = RESULT_ROW_CAP):
+        super().__init__(assistant, engine, page_size)
+        self.ask_llm = ask_llm
+        self.execute_page = execute_page
+        # Générations parent identiques et simultanées : un seul appel LLM
+        self.llm_flights = AsyncSingleFlight()
+
+    async def prepare(self, question: str, user_id: int, roles: List[str]) -> Dict[str, Any]:
+        plan = await asyncio.to_thread(self.assistant.plan_query, question, user_id, roles)
+        if not plan['needs_llm'] or plan['error']:
+            return plan
+
+        async def generate() -> Optional[Dict[str, str]]:
+            domains = await self.assistant.domain_classifier.classify_async(question, self.ask_llm)
+            prompt = await asyncio.to_thread(self.assistant.build_prompt, question, plan, domains)
+            return self.assistant.share_plan(question, plan, await self.ask_llm(prompt))
+
+        try:
+            if plan['role'] != 'parent':
+                await generate()
+            else:
+                key = await asyncio.to_thread(self.assistant.cache1.template_key, question)
+                entry, shared = await self.llm_flights.do(key, generate)
+                if shared and not await asyncio.to_thread(self.assistant.plan_from_shared, question, plan, entry):
+                    await generate()
+        except Exception as e:
+            plan['error'] = f"❌ Erreur : {str(e)}"
+        return plan
+
+    async def run(self, question: str, user_id: int, roles: List[str], output_format: str = "text") -> Dict[str, Any]:
+        plan = await self.prepare(question, user_id, roles)
+        if plan['error']:
+            return {
+                "sql_query": plan['sql_query'],
+                "response": plan['error'],
+                "status": "error",
+                "question": question,
+                "data": None
+            }
+
+        sql_query, scope, params = plan['sql_query'], self.assistant.result_scope(plan), plan.get('sql_params')
+        result = await self.execute_page(sql_query, self.page_size, scope=scope, params=params)
+        if not result['success']:
+            logger.error(f"Erreur d'exécution SQL : {result['error']}")
+            raise PipelineExecutionError(sql_query, result['error'])
+
+        await asyncio.to_thread(self.assistant.remember_query, question, plan)
+        return await asyncio.to_thread(self._respond, question, sql_query, result, 0, user_id, output_format,
+                                       scope, params)
+
+    async def run_page(self, page_token: str, user_id: int, output_format: str = "text") -> Dict[str, Any]:
+        page = decode_page_token(page_token, user_id)
+        sql_query, offset, question, scope = page['sql_query'], page['offset'], page['question'], page['scope']
+        params = page['params']
+
+        result = await self.execute_page(sql_query, self.page_size, offset, scope, params)
+        if not result['success']:
+            logger.error(f"Erreur d'exécution SQL : {result['error']}")
+            raise PipelineExecutionError(sql_query, result['error'])
+
+        return await asyncio.to_thread(self._respond, question, sql_query, result, offset, user_id, output_format,
+                                       scope, params)
@@ -0,0 +1,261 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from config.database import fetch_all
+from security.sql_scope import SQLScopeError, parse_select
+
+logger = logging.getLogger(__name__)
+
+# Questions traitées en parallèle par un précalcul
+PRECOMPUTE_WORKERS = int(os.getenv('PRECOMPUTE_WORKERS', 4))
+# Plafond des workers demandés (API, ligne de commande) : chacun tient une connexion MySQL
+PRECOMPUTE_MAX_WORKERS = int(os.getenv('PRECOMPUTE_MAX_WORKERS', 16))
+# Appels LLM lancés par seconde pendant un précalcul (0 : sans limite) ;
+# les questions déjà en cache ne sont pas limitées
+PRECOMPUTE_LLM_RATE = float(os.getenv('PRECOMPUTE_LLM_RATE', 1.0))
+# Dossier des fichiers d'échecs des précalculs lancés par l'API
+PRECOMPUTE_DIR = os.getenv('PRECOMPUTE_DIR', 'precompute')
+# Durée de conservation du suivi d'un précalcul terminé, en secondes
+PRECOMPUTE_JOB_TTL = float(os.getenv('PRECOMPUTE_JOB_TTL', 3600))
+
+ROLES = {'admin': 'ROLE_SUPER_ADMIN', 'parent': 'ROLE_PARENT'}
+
+
+def clamp_workers(workers: int) -> int:
+    """Nombre de workers ramené entre 1 et PRECOMPUTE_MAX_WORKERS"""
+    return min(max(1, int(workers)), PRECOMPUTE_MAX_WORKERS)
+
+
+class RateLimiter:
+    """Espace les départs d'au moins 1/rate seconde, quel que soit le nombre de threads"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def _item(raw: Dict[str, Any], where: str) -> Dict[str, Any]:
+    question = str(raw.get('question') or '').strip()
+    role = str(raw.get('role') or '').strip().lower()
+    role = {full.lower(): short for short, full in ROLES.items()}.get(role, role)
+    if not question:
+        raise ValueError(f"{where} : question manquante")
+    if role not in ROLES:
+        raise ValueError(f"{where} : rôle {raw.get('role')!r} inconnu (attendu : {', '.join(ROLES)})")
+    try:
+        user_id = int(raw['user_id']) if raw.get('user_id') not in (None, '') else None
+    except (TypeError, ValueError):
+        raise ValueError(f"{where} : user_id {raw.get('user_id')!r} invalide")
+    # Parent représentatif : ses enfants bornent la requête, le template mis en cache n'en garde rien
+    if role == 'parent' and user_id is None:
+        raise ValueError(f"{where} : user_id requis pour une question parent")
+    return {'question': question, 'role': role, 'user_id': user_id}
+
+
+def parse_questions(text: str, file_format: str = 'jsonl') -> List[Dict[str, Any]]:
+    """
+    Questions à précalculer : JSON (liste), JSON Lines ou CSV à en-tête, avec
+    les champs question, role (admin / parent, ou ROLE_...) et user_id (parent).
+    Lève ValueError en indiquant la ligne fautive.
+    """
+    if file_format == 'csv':
+        rows = [(f"ligne {number}", row) for number, row in enumerate(csv.DictReader(text.splitlines()), start=2)]
+    elif file_format == 'json':
+        return questions_from_rows(json.loads(text))
+    else:
+        rows = [(f"ligne {number}", json.loads(line)) for number, line in enumerate(text.splitlines(), start=1)
+                if line.strip()]
+    return [_item(row, where) for where, row in rows]
+
+
+def questions_from_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Comme parse_questions, pour une liste déjà décodée (corps JSON de l'API)"""
+    if not isinstance(rows, list):
+        raise ValueError("Liste de questions attendue")
+    return [_item(row if isinstance(row, dict) else {}, f"élément {number}")
+            for number, row in enumerate(rows, start=1)]
+
+
+def load_questions(path: str) -> List[Dict[str, Any]]:
+    """parse_questions d'un fichier, au format donné par son extension (.csv, .json, sinon JSON Lines)"""
+    path = Path(path)
+    return parse_questions(path.read_text(encoding='utf-8'), path.suffix.lstrip('.').lower())
+
+
+def explain_query(sql_query: str, params: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
+    """Plan d'exécution de la requête (EXPLAIN) : vérifie qu'elle est exécutable sans la lancer"""
+    return fetch_all(f"EXPLAIN {sql_query.strip().rstrip(';')}", params)
+
+
+class BatchPrecompute:
+    """
+    Précalcul d'une liste de questions avant un pic de trafic (publication des
+    résultats...) : chaque question passe par le même chemin qu'une question
+    posée (templates, caches, LLM, contrôles du rôle), la requête obtenue est
+    vérifiée (SELECT unique, EXPLAIN) puis mise en cache comme après une
+    exécution réussie. Les questions sont traitées par `workers` threads, les
+    appels LLM limités à `llm_rate` par seconde.
+    """
+
+    def __init__(self, assistant, workers: int = PRECOMPUTE_WORKERS, llm_rate: float = PRECOMPUTE_LLM_RATE,
+                 explain: Callable[..., Any] = explain_query):
+        self.assistant = assistant
+        self.workers = clamp_workers(workers)
+        self.limiter = RateLimiter(llm_rate)
+        self.explain = explain
+
+    def run(self, items: List[Dict[str, Any]], failures_path: Optional[str] = None,
+            progress: Optional[Callable[[int, int, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Traite toutes les questions ; `progress(faites, total, résultat)` est
+        appelé après chacune. Les échecs sont écrits en JSON Lines dans
+        `failures_path`. Retourne le bilan : comptes par statut et échecs.
+        """
+        started = time.perf_counter()
+        report = {'total': len(items), 'generated': 0, 'cached': 0, 'failed': 0, 'failures': []}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='precompute') as executor:
+            futures = [executor.submit(self.process, item) for item in items]
+            for done, future in enumerate(as_completed(futures), start=1):
+                result = future.result()
+                report[result['status']] += 1
+                if result['status'] == 'failed':
+                    report['failures'].append(result)
+                if progress:
+                    progress(done, len(items), result)
+        report['duration'] = round(time.perf_counter() - started, 2)
+
+        if failures_path:
+            with open(failures_path, 'w', encoding='utf-8') as handle:
+                for failure in report['failures']:
+                    handle.write(json.dumps(failure, ensure_ascii=False, default=str) + '\n')
+        logger.info(f"✅ Précalcul : {report['generated']} générées, {report['cached']} déjà en cache, "
+                    f"{report['failed']} échecs en {report['duration']}s")
+        return report
+
+    def process(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Une question : statut generated, cached ou failed (avec l'étape et l'erreur)"""
+        question = item['question']
+        result = {**item, 'status': 'failed', 'stage': 'generation', 'error': None, 'sql_query': None}
+        try:
+            plan = self.assistant.plan_query(question, item['user_id'], [ROLES[item['role']]])
+            if plan['needs_llm'] and not plan['error']:
+                self.limiter.acquire()
+                self.assistant.generate_query(question, plan)
+            result['sql_query'] = plan['sql_query']
+            if plan['error']:
+                result['error'] = plan['error']
+                return result
+
+            result['stage'] = 'validation'
+            parse_select(plan['sql_query'])
+            result['stage'] = 'explain'
+            self.explain(plan['sql_query'], plan['sql_params'])
+
+            result['stage'] = 'cache'
+            self.assistant.remember_query(question, plan)
+        except SQLScopeError as e:
+            result['error'] = f"Requête refusée : {e}"
+            return result
+        except Exception as e:
+            result['error'] = str(e)
+            return result
+        result.update(status='cached' if plan['from_cache'] else 'generated', stage=None)
+        return result
+
+
+_jobs: Dict[str, Dict[str, Any]] = {}
+_jobs_lock = threading.Lock()
+
+
+def start_precompute(assistant, items: List[Dict[str, Any]], workers: int = PRECOMPUTE_WORKERS,
+                     llm_rate: float = PRECOMPUTE_LLM_RATE) -> str:
+    """Lance un précalcul en tâche de fond (API) ; son avancement est lu par precompute_status"""
+    job_id = uuid.uuid4().hex
+    job = {'id': job_id, 'status': 'running', 'total': len(items), 'done': 0, 'failed': 0, 'report': None,
+           'failures_file': str(Path(PRECOMPUTE_DIR) / f"{job_id}_failures.jsonl")}
+
+    def progress(done: int, total: int, result: Dict[str, Any]):
+        with _jobs_lock:
+            job['done'] = done
+            job['failed'] += result['status'] == 'failed'
+
+    def run():
+        try:
+            Path(PRECOMPUTE_DIR).mkdir(parents=True, exist_ok=True)
+            report = BatchPrecompute(assistant, workers, llm_rate).run(items, job['failures_file'], progress)
+            with _jobs_lock:
+                job.update(status='done', report=report, finished_at=time.time())
+        except Exception as e:
+            logger.error(f"❌ Précalcul {job_id} interrompu : {e}")
+            with _jobs_lock:
+                job.update(status='error', error=str(e), finished_at=time.time())
+
+    with _jobs_lock:
+        _prune_jobs()
+        _jobs[job_id] = job
+    threading.Thread(target=run, name=f"precompute-{job_id[:8]}", daemon=True).start()
+    return job_id
+
+
+def precompute_status(job_id: str) -> Optional[Dict[str, Any]]:
+    """Avancement d'un précalcul lancé par start_precompute (None si inconnu)"""
+    with _jobs_lock:
+        _prune_jobs()
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
+
+
+def _prune_jobs():
+    """Oublie les précalculs terminés depuis plus de PRECOMPUTE_JOB_TTL (appelée sous _jobs_lock)"""
+    expired = time.time() - PRECOMPUTE_JOB_TTL
+    for job_id in [job_id for job_id, job in _jobs.items() if job.get('finished_at', expired + 1) <= expired]:
+        del _jobs[job_id]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Précalcul des requêtes SQL d'une liste de questions")
+    parser.add_argument("questions", help="fichier .jsonl, .json ou .csv (question, role, user_id)")
+    parser.add_argument("--workers", type=int, default=PRECOMPUTE_WORKERS)
+    parser.add_argument("--llm-rate", type=float, default=PRECOMPUTE_LLM_RATE, help="appels LLM par seconde (0 : sans limite)")
+    parser.add_argument("--failures", default="precompute_failures.jsonl", help="échecs en JSON Lines")
+    args = parser.parse_args()
+
+    from agent.assistant import SQLAssistant
+
+    items = load_questions(args.questions)
+    args.workers = clamp_workers(args.workers)
+    print(f"📋 {len(items)} questions, {args.workers} workers, {args.llm_rate or 'sans limite'} appels LLM/s")
+
+    def progress(done: int, total: int, result: Dict[str, Any]):
+        icon = {'generated': '✅', 'cached': '⚡', 'failed': '❌'}[result['status']]
+        detail = f" [{result['stage']}] {result['error']}" if result['status'] == 'failed' else ''
+        print(f"[{done}/{total}] {icon} {result['role']} | {result['question'][:70]}{detail}")
+
+    report = BatchPrecompute(SQLAssistant(), args.workers, args.llm_rate).run(items, args.failures, progress)
+    print(f"🏁 {report['generated']} générées, {report['cached']} déjà en cache, {report['failed']} échecs "
+          f"en {report['duration']}s" + (f" (détail : {args.failures})" if report['failed'] else ""))
+    raise SystemExit(1 if report['failed'] else 0)
+
+
+if __name__ == "__main__":
+    main()
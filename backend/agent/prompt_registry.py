@@ -0,0 +1,173 @@
+import inspect
+import json
+import logging
+import os
+import threading
+import weakref
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Intervalle de vérification des fichiers (mtime), en secondes ; 0 désactive le rechargement
+REGISTRY_POLL_INTERVAL = float(os.getenv('REGISTRY_POLL_INTERVAL', 2.0))
+
+AGENT_DIR = Path(__file__).parent
+
+# Fichiers suivis (chemins relatifs au dossier agent/, qui servent aussi de clés)
+TEMPLATES_FILE = 'templates_questions.json'
+DOMAIN_DESCRIPTIONS_FILE = 'prompts/domain_descriptions.json'
+DOMAIN_TABLES_FILE = 'prompts/domain_tables_mapping.json'
+RELATIONS_FILE = 'prompts/relations.txt'
+PROMPTS_GLOB = 'prompts/*.txt'
+
+
+def _parse_templates(text: str) -> List[Dict[str, Any]]:
+    """Templates de questions valides (template_question et requete_template présents)"""
+    if not text.strip():
+        return []
+    questions = json.loads(text).get("questions", [])
+    if not isinstance(questions, list):
+        return []
+    return [template for template in questions
+            if all(key in template for key in ["template_question", "requete_template"])]
+
+
+# Lecture de chaque fichier et valeur tant qu'il est absent (ou illisible au premier chargement)
+_PARSERS: Dict[str, Tuple[Callable[[str], Any], Any]] = {
+    TEMPLATES_FILE: (_parse_templates, []),
+    DOMAIN_DESCRIPTIONS_FILE: (json.loads, {}),
+    DOMAIN_TABLES_FILE: (json.loads, {}),
+    RELATIONS_FILE: (str, "# Aucune relation définie"),
+}
+
+
+class PromptRegistry:
+    """
+    Templates de questions, domaines, relations et prompts de l'agent, lus une
+    fois et servis depuis la mémoire. Un thread vérifie les mtimes toutes les
+    `poll_interval` secondes ; les fichiers modifiés sont relus et l'ensemble
+    est publié d'un coup (nouveau dictionnaire, jamais modifié ensuite) : une
+    lecture ne prend aucun verrou et voit soit l'ancienne, soit la nouvelle
+    version de tous les fichiers. Un fichier devenu illisible (JSON en cours
+    d'édition...) garde sa dernière valeur valide.
+
+    subscribe(callback) : callback(fichiers modifiés) après chaque rechargement,
+    pour les objets construits à partir de ces fichiers (matcher, classifieur).
+    """
+
+    def __init__(self, base_dir: Path = AGENT_DIR, poll_interval: float = REGISTRY_POLL_INTERVAL):
+        self.base_dir = Path(base_dir)
+        self.poll_interval = poll_interval
+        self.version = 0
+        self._values: Dict[str, Any] = {}
+        self._signatures: Dict[str, Optional[Tuple[int, int]]] = {}
+        self._subscribers: List[Callable[[], Optional[Callable]]] = []
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.check()
+
+    def get(self, name: str) -> Any:
+        """Contenu courant d'un fichier suivi (KeyError s'il n'existe pas) ; sans verrou"""
+        return self._values[name]
+
+    def prompt(self, filename: str) -> str:
+        """Texte d'un prompt de agent/prompts/"""
+        return self._values[f'prompts/{filename}']
+
+    def subscribe(self, callback: Callable[[Set[str]], None]):
+        """Abonnement faible pour une méthode (oubliée avec son objet), fort sinon"""
+        ref = weakref.WeakMethod(callback) if inspect.ismethod(callback) else (lambda: callback)
+        with self._reload_lock:
+            self._subscribers.append(ref)
+
+    def _tracked(self) -> List[str]:
+        names = set(_PARSERS)
+        names.update(path.relative_to(self.base_dir).as_posix() for path in self.base_dir.glob(PROMPTS_GLOB))
+        names.update(name for name in self._signatures if name.startswith('prompts/'))
+        return sorted(names)
+
+    def _signature(self, name: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = (self.base_dir / name).stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def check(self) -> Set[str]:
+        """Relit les fichiers modifiés depuis la dernière vérification ; retourne leurs noms"""
+        with self._reload_lock:
+            changed = set()
+            values = dict(self._values)
+            for name in self._tracked():
+                signature = self._signature(name)
+                if name in self._signatures and signature == self._signatures[name]:
+                    continue
+                parser, default = _PARSERS.get(name, (str, None))
+                if signature is None:
+                    if default is None:
+                        values.pop(name, None)
+                    else:
+                        values[name] = default
+                else:
+                    try:
+                        values[name] = parser((self.base_dir / name).read_text(encoding='utf-8'))
+                    except Exception as e:
+                        # Pas de nouvelle signature : nouvel essai à la prochaine vérification
+                        logger.error(f"❌ {name} illisible, dernière version conservée : {e}")
+                        if name not in values:
+                            values[name] = default
+                            changed.add(name)
+                        continue
+                self._signatures[name] = signature
+                changed.add(name)
+            if not changed:
+                return changed
+            self._values = values  # publication atomique
+            self.version += 1
+            subscribers = [ref() for ref in self._subscribers]
+            self._subscribers = [ref for ref, callback in zip(self._subscribers, subscribers) if callback is not None]
+
+        if self.version > 1:
+            logger.info(f"🔄 Fichiers de l'agent rechargés : {', '.join(sorted(changed))}")
+        for callback in subscribers:
+            if callback is None:
+                continue
+            try:
+                callback(changed)
+            except Exception as e:
+                logger.error(f"❌ Erreur après rechargement de {', '.join(sorted(changed))} : {e}")
+        return changed
+
+    def start(self):
+        """Lance la surveillance des fichiers (thread démon)"""
+        if self.poll_interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._watch, name='prompt-registry', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"❌ Surveillance des fichiers de l'agent : {e}")
+
+
+_registry: Optional[PromptRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_prompt_registry() -> PromptRegistry:
+    """Registre unique du processus, surveillé en tâche de fond"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = PromptRegistry()
+                _registry.start()
+    return _registry
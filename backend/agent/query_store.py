@@ -0,0 +1,211 @@
+import json
+import logging
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou inter-processus, un seul worker
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Nombre d'ajouts dans le journal avant réécriture de l'instantané
+COMPACT_EVERY = int(os.getenv("QUERY_CACHE_COMPACT_EVERY", 200))
+
+
+class QueryStore:
+    """
+    Persistance d'un cache clé -> entrée (dict JSON) partagée entre workers :
+
+    - instantané `<nom>.json` (même format qu'avant : un objet JSON clé -> entrée),
+      remplacé atomiquement (fichier temporaire + os.replace) ;
+    - journal `<nom>.log.jsonl` en ajout seul, une ligne {"k": clé, "v": entrée}
+      par écriture, au lieu de réécrire tout le fichier à chaque nouvelle requête.
+      Sa première ligne porte une génération, changée à chaque compaction ;
+    - compaction toutes les COMPACT_EVERY lignes : instantané réécrit, journal
+      remplacé par un journal vide de nouvelle génération.
+
+    Ajouts et compaction se font sous un verrou fcntl exclusif sur `<nom>.lock`,
+    les rechargements complets sous un verrou partagé (instantané et journal
+    cohérents). refresh() relit seulement la fin du journal pour voir les
+    entrées des autres workers, et recharge tout si la génération a changé.
+
+    `on_change(clé, entrée)` est appelé pour chaque entrée chargée, ajoutée ou
+    supprimée (entrée None), `on_reset()` avant un rechargement complet, tous
+    deux sous `lock`, que l'appelant prend aussi pour lire son propre index.
+    """
+
+    def __init__(self,
+                 path: str,
+                 on_change: Optional[Callable[[str, Optional[Dict[str, Any]]], None]] = None,
+                 on_reset: Optional[Callable[[], None]] = None,
+                 compact_every: int = COMPACT_EVERY):
+        self.path = Path(path)
+        self.log_path = self.path.with_suffix(".log.jsonl")
+        self.lock_path = self.path.with_suffix(".lock")
+        self.compact_every = compact_every
+        self.lock = threading.RLock()
+        self._on_change = on_change or (lambda key, entry: None)
+        self._on_reset = on_reset or (lambda: None)
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._generation: Optional[str] = None
+        self._log_offset = 0
+        self._log_lines = 0
+        self._file_locked = False
+        self.reload()
+
+    # --- Lecture ---
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._entries.get(key)
+
+    def items(self) -> List[Tuple[str, Dict[str, Any]]]:
+        return list(self._entries.items())
+
+    def as_dict(self) -> Dict[str, Dict[str, Any]]:
+        return dict(self._entries)
+
+    def reload(self):
+        """Rechargement complet : instantané puis journal"""
+        with self.lock, self._file_lock(shared=True):
+            self._entries = {}
+            self._on_reset()
+            for key, entry in self._read_snapshot().items():
+                self._apply(key, entry)
+            self._generation, self._log_offset, self._log_lines = None, 0, 0
+            self._read_log(adopt=True)
+
+    def refresh(self):
+        """Intègre les entrées ajoutées par d'autres processus depuis la dernière lecture"""
+        with self.lock:
+            if not self._read_log():
+                # Journal créé ou compacté par un autre worker : l'instantané a pu changer
+                self.reload()
+
+    def _read_snapshot(self) -> Dict[str, Dict[str, Any]]:
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (json.JSONDecodeError, IOError) as e:
+            logger.warning(f"⚠️ Cache illisible ({self.path}) : {e}")
+            return {}
+
+    def _read_log(self, adopt: bool = False) -> bool:
+        """
+        Lit les lignes nouvelles du journal ; False s'il n'est plus de notre
+        génération (adopt : rechargement complet, on prend celle du fichier)
+        """
+        try:
+            with open(self.log_path, 'rb') as f:
+                header = f.readline()
+                generation = json.loads(header).get("generation")
+                if generation != self._generation:
+                    if not adopt:
+                        return False
+                    self._generation, self._log_offset = generation, len(header)
+                f.seek(self._log_offset)
+                chunk = f.read()
+        except FileNotFoundError:
+            return adopt or self._generation is None
+        except (ValueError, AttributeError) as e:
+            logger.warning(f"⚠️ En-tête de journal invalide ({self.log_path}) : {e}")
+            return True
+
+        # Une ligne incomplète (écriture en cours) sera relue au prochain refresh
+        end = chunk.rfind(b"\n") + 1
+        for line in chunk[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                self._apply(record["k"], record["v"])
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning(f"⚠️ Ligne de journal ignorée ({self.log_path}) : {e}")
+            self._log_lines += 1
+        self._log_offset += end
+        return True
+
+    def _apply(self, key: str, entry: Optional[Dict[str, Any]]):
+        if entry is None:
+            self._entries.pop(key, None)
+        else:
+            self._entries[key] = entry
+        self._on_change(key, entry)
+
+    # --- Écriture ---
+
+    def put(self, key: str, entry: Optional[Dict[str, Any]]):
+        """Ajoute (ou supprime si entry est None) une entrée : une ligne dans le journal"""
+        line = (json.dumps({"k": key, "v": entry}, ensure_ascii=False) + "\n").encode("utf-8")
+        with self.lock, self._file_lock():
+            # Rattraper les autres workers d'abord pour garder un offset exact
+            self.refresh()
+            if self._generation is None:
+                self._new_log()
+            fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+            self._log_offset += len(line)
+            self._log_lines += 1
+            self._apply(key, entry)
+
+            if self._log_lines >= self.compact_every:
+                self._compact()
+
+    def compact(self):
+        with self.lock, self._file_lock():
+            self.refresh()
+            self._compact()
+
+    def _compact(self):
+        """Réécrit l'instantané puis repart d'un journal vide (appelé sous le verrou exclusif)"""
+        snapshot_tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        try:
+            with open(snapshot_tmp, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, indent=2, ensure_ascii=False)
+            os.replace(snapshot_tmp, self.path)
+            self._new_log()
+            logger.info(f"🗜️ Cache compacté : {len(self._entries)} entrées ({self.path.name})")
+        except OSError as e:
+            logger.warning(f"⚠️ Compaction du cache impossible : {e}")
+            snapshot_tmp.unlink(missing_ok=True)
+
+    def _new_log(self):
+        """Journal vide de nouvelle génération, créé atomiquement"""
+        generation = uuid.uuid4().hex
+        header = (json.dumps({"generation": generation}) + "\n").encode("utf-8")
+        log_tmp = self.log_path.with_name(f"{self.log_path.name}.{os.getpid()}.tmp")
+        log_tmp.write_bytes(header)
+        os.replace(log_tmp, self.log_path)
+        self._generation, self._log_offset, self._log_lines = generation, len(header), 0
+
+    @contextmanager
+    def _file_lock(self, shared: bool = False) -> Iterator[None]:
+        # Réentrant sous self.lock : le reload() déclenché depuis put() garde le verrou exclusif
+        if fcntl is None or self._file_locked:
+            yield
+            return
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            self._file_locked = True
+            try:
+                yield
+            finally:
+                self._file_locked = False
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,83 @@
+import csv
+import io
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Sequence
+
+# Formats de sortie acceptés par render()
+OUTPUT_FORMATS = ("text", "json", "csv")
+
+
+def to_records(columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> List[Dict[str, Any]]:
+    """Lignes (tuples) -> liste de dictionnaires {colonne: valeur}"""
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def to_plain(value: Any) -> Any:
+    """Valeur MySQL typée -> valeur JSON (Decimal, dates, durées, octets)"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", errors="replace")
+    return value
+
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", errors="replace")
+    return str(value)
+
+
+def render_text(columns: Sequence[str], rows: Sequence[Sequence[Any]], question: str = "") -> str:
+    """Table texte lisible : en-tête, séparateur puis une ligne par résultat"""
+    if not rows:
+        return "✅ Requête exécutée mais aucun résultat trouvé."
+
+    if len(rows) == 1 and len(columns) == 1:
+        return f"Résultat : {_cell(rows[0][0])}"
+
+    formatted = []
+    if question:
+        formatted.append(f"Résultats pour: {question}\n")
+    formatted.append(" | ".join(columns))
+    formatted.append("-+-".join('-' * len(c) for c in columns))
+    for row in rows:
+        formatted.append(" | ".join(_cell(value) for value in row))
+    return "\n".join(formatted)
+
+
+def render_json(columns: Sequence[str], rows: Sequence[Sequence[Any]], question: str = "") -> str:
+    """Tableau JSON d'objets {colonne: valeur}"""
+    return json.dumps(
+        [{column: to_plain(value) for column, value in zip(columns, row)} for row in rows],
+        ensure_ascii=False
+    )
+
+
+def render_csv(columns: Sequence[str], rows: Sequence[Sequence[Any]], question: str = "") -> str:
+    """CSV avec ligne d'en-tête (les séparateurs dans les valeurs sont échappés)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    writer.writerows([_cell(value) for value in row] for row in rows)
+    return buffer.getvalue()
+
+
+RENDERERS: Dict[str, Callable[..., str]] = {
+    "text": render_text,
+    "json": render_json,
+    "csv": render_csv,
+}
+
+
+def render(columns: Sequence[str], rows: Sequence[Sequence[Any]], output_format: str = "text", question: str = "") -> str:
+    if output_format not in RENDERERS:
+        raise ValueError(f"Format de sortie inconnu : {output_format} (attendu : {', '.join(OUTPUT_FORMATS)})")
+    return RENDERERS[output_format](columns, rows, question=question)
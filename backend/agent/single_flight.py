@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import os
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Attente maximale d'une génération déjà en cours avant de générer soi-même, en secondes
+LLM_SINGLE_FLIGHT_WAIT = float(os.getenv('LLM_SINGLE_FLIGHT_WAIT', 120))
+# Regroupement des générations identiques simultanées (désactivable)
+LLM_SINGLE_FLIGHT = os.getenv('LLM_SINGLE_FLIGHT', 'true').lower() in ('1', 'true', 'yes')
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Une seule exécution en cours par clé : les appels concurrents de même clé
+    attendent celle du premier (le « leader ») et en partagent le résultat, ou
+    l'exception. do() retourne (résultat, partagé) ; partagé vaut False pour le
+    leader et pour un appel qui a attendu plus de `wait` secondes et a donc
+    exécuté `fn` lui-même. Rien n'est gardé une fois l'exécution terminée :
+    c'est au cache de servir les appels suivants.
+    """
+
+    def __init__(self, wait: float = LLM_SINGLE_FLIGHT_WAIT, enabled: bool = LLM_SINGLE_FLIGHT):
+        self.wait = wait
+        self.enabled = enabled
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self._stats = {'leaders': 0, 'shared': 0, 'timeouts': 0}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        if not self.enabled:
+            return fn(), False
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats['leaders'] += 1
+
+        if not leader:
+            if not call.done.wait(self.wait):
+                self._count('timeouts')
+                logger.warning(f"⏳ Génération en cours trop longue, génération séparée ({key})")
+                return fn(), False
+            self._count('shared')
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result, False
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'in_flight': len(self._calls), **self._stats}
+
+
+class AsyncSingleFlight(SingleFlight):
+    """Variante asyncio de SingleFlight (une boucle d'évènements, mode ASGI)"""
+
+    def __init__(self, wait: float = LLM_SINGLE_FLIGHT_WAIT, enabled: bool = LLM_SINGLE_FLIGHT):
+        super().__init__(wait, enabled)
+        self._futures: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        if not self.enabled:
+            return await fn(), False
+        future = self._futures.get(key)
+        if future is not None:
+            try:
+                # shield : l'expiration d'un appel suiveur n'annule pas la génération du leader
+                result = await asyncio.wait_for(asyncio.shield(future), self.wait)
+            except asyncio.TimeoutError:
+                self._count('timeouts')
+                logger.warning(f"⏳ Génération en cours trop longue, génération séparée ({key})")
+                return await fn(), False
+            except asyncio.CancelledError:
+                if not future.cancelled():  # c'est cet appel qui est annulé
+                    raise
+                return await fn(), False  # requête du leader annulée : génération séparée
+            self._count('shared')
+            return result, True
+
+        future = self._futures[key] = asyncio.get_running_loop().create_future()
+        self._count('leaders')
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # marquée comme lue : pas d'avertissement sans suiveur
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            self._futures.pop(key, None)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {**super().metrics(), 'in_flight': len(self._futures)}
@@ -1,4 +1,3 @@
-import openai
 import logging
 import re
 import json
@@ -9,6 +8,8 @@ from functools import lru_cache
 from decimal import Decimal
 from datetime import datetime
 from config.database import get_db_connection
+from agent.llm_utils import get_llm_client
+from agent.prompt_registry import get_prompt_registry
 from tabulate import tabulate
 import matplotlib.pyplot as plt
 import pandas as pd
@@ -56,22 +57,21 @@ class SQLAgent:
         extra_info = ""
 
         if any(word in query_lower for word in ["nom", "élève", "classe", "parent", "inscription"]):
-            path = "agent/prompts/prompt_eleve.txt"
+            filename = "prompt_eleve.txt"
         elif any(word in query_lower for word in ["note", "matière", "absence", "emploi", "moyenne"]):
-            path = "agent/prompts/prompt_pedagogie.txt"
+            filename = "prompt_pedagogie.txt"
             try:
                 extra_info = "\n\n" + self.db.get_simplified_relations_text()
             except Exception as e:
                 logger.error(f"Erreur récupération relations FK : {e}")
         elif any(word in query_lower for word in ["paiement", "tranche", "cantine", "montant", "transport"]):
-            path = "agent/prompts/prompt_finance.txt"
+            filename = "prompt_finance.txt"
         else:
-            path = "agent/prompts/prompt_eleve.txt"
+            filename = "prompt_eleve.txt"
 
         try:
-            with open(path, 'r', encoding='utf-8') as f:
-                prompt = f.read()
-            return prompt + extra_info
+            # Prompt servi depuis la mémoire (registre rechargé à chaud), sans lecture disque
+            return get_prompt_registry().prompt(filename) + extra_info
         except Exception as e:
             logger.error(f"Erreur chargement prompt: {e}")
             raise
@@ -83,14 +83,12 @@ class SQLAgent:
 
             messages = [{"role": "system", "content": prompt}]
 
-            response = openai.chat.completions.create(
+            raw_sql = get_llm_client().chat(
+                messages,
                 model=self.model,
-                messages=messages,
                 temperature=self.temperature,
                 max_tokens=self.max_tokens
             )
-
-            raw_sql = response.choices[0].message.content
             clean_sql = self._extract_sql(raw_sql)
 
             if not clean_sql or "SELECT" not in clean_sql.upper():
@@ -151,13 +149,13 @@ Erreur : {error_msg}
 Schéma disponible :
 {json.dumps(self.schema, indent=2)}
 """
-            response = openai.chat.completions.create(
+            response_text = get_llm_client().chat(
+                [{"role": "user", "content": correction_prompt}],
                 model=self.model,
-                messages=[{"role": "user", "content": correction_prompt}],
                 temperature=0,
                 max_tokens=500
             )
-            corrected_sql = self._extract_sql(response.choices[0].message.content)
+            corrected_sql = self._extract_sql(response_text)
             if self._validate_sql(corrected_sql):
                 return corrected_sql
         except Exception as e:
@@ -239,19 +237,14 @@ Schéma disponible :
                 if not db_results:
                     return {"response": "Aucun résultat."}
 
-                messages = [
-                    {"role": "system", "content": "Tu es un assistant pédagogique. Reformule les résultats SQL bruts en réponse naturelle, utile et claire."},
-                    {"role": "user", "content": f"Question: {user_query}\nRequête SQL générée: {self.last_generated_sql}\nRésultats:\n{json.dumps(db_results, ensure_ascii=False)[:800]}\n\nFormule une réponse claire et concise en français avec les données ci-dessus."}
-                ]
+                messages = self._summary_messages(user_query, self.last_generated_sql, db_results)
 
-                response = openai.chat.completions.create(
+                response_text = get_llm_client().chat(
+                    messages,
                     model=self.model,
-                    messages=messages,
                     temperature=0.3,
                     max_tokens=400
-                )
-
-                response_text = response.choices[0].message.content.strip()
+                ).strip()
                 response_tokens = self.count_tokens(response_text)
                 self.conversation_history.append({'role': 'assistant', 'content': response_text, 'tokens': response_tokens})
                 self._trim_history()
@@ -277,6 +270,22 @@ Schéma disponible :
 
 
 
+    def _summary_messages(self, user_query, sql_query, results):
+        return [
+            {"role": "system", "content": "Tu es un assistant pédagogique. Reformule les résultats SQL bruts en réponse naturelle, utile et claire."},
+            {"role": "user", "content": f"Question: {user_query}\nRequête SQL générée: {sql_query}\nRésultats:\n{json.dumps(results, ensure_ascii=False, default=str)[:800]}\n\nFormule une réponse claire et concise en français avec les données ci-dessus."}
+        ]
+
+    def stream_summary(self, user_query, sql_query, rows):
+        """Reformule les résultats en langage naturel, fragment par fragment"""
+        messages = self._summary_messages(user_query, sql_query, self._serialize_data(rows))
+        yield from get_llm_client().chat_stream(
+            messages,
+            model=self.model,
+            temperature=0.3,
+            max_tokens=400
+        )
+
     def generate_auto_graph(self, df, graph_type):
         if df.empty:
             return "Aucun résultat à afficher."
@@ -367,7 +376,8 @@ Schéma disponible :
 
 
 
-    def _format_results(self, data, user_query):
+    def _format_results(self, data, user_query, sql_query=None):
+            sql_query = sql_query or self.last_generated_sql
             serialized_data = self._serialize_data(data)
             print("🧪 Données brutes reçues:", data)
             print("🧪 Données sérialisées:", serialized_data)
@@ -377,7 +387,7 @@ Schéma disponible :
                     "status": "success",
                     "message": "Requête exécutée mais aucun résultat trouvé.",
                     "data": None,
-                    "sql_query": self.last_generated_sql
+                    "sql_query": sql_query
                 }
 
             df = pd.DataFrame(serialized_data)
@@ -388,7 +398,7 @@ Schéma disponible :
             response = {
                 "status": "success",
                 "question": user_query,
-                "sql_query": self.last_generated_sql,
+                "sql_query": sql_query,
                 "data": df.to_dict('records'),
                 "response": f"✅ {len(df)} résultats trouvés"
             }
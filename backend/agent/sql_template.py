@@ -0,0 +1,139 @@
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+# Liaison des templates SQL du cache : les placeholders {Param} deviennent des
+# marqueurs %s d'instruction préparée et les valeurs de la question sont
+# passées à part, converties dans leur type. Une valeur ne peut donc plus
+# modifier la requête (guillemet, "OR 1=1"...), et le texte SQL d'un template
+# est identique d'une question à l'autre : une seule préparation par connexion.
+
+# Templates compilés gardés en mémoire
+TEMPLATE_CACHE_SIZE = int(os.getenv('TEMPLATE_CACHE_SIZE', 1024))
+
+# Type de chaque placeholder connu ; les autres sont liés comme des chaînes
+PARAM_TYPES = {
+    'IDPersonne': 'int',
+    'codeperiexam': 'int',
+    'id_personne': 'int_list',  # IDs des enfants du parent, pour IN (...)
+    'children_scope': 'int_list',  # idem, posé à la mise en cache des templates parent
+    'CODECLASSEFR': 'str',
+    'AnneeScolaire': 'str',
+    'NomFr': 'str',
+    'PrenomFr': 'str',
+    'Valeur': 'str',
+}
+_TYPES_BY_NAME = {name.lower(): kind for name, kind in PARAM_TYPES.items()}
+# Placeholders toujours liés aux enfants du parent courant, jamais à la question
+CHILDREN_SLOTS = ('id_personne', 'children_scope')
+
+
+class TemplateBindingError(ValueError):
+    """Valeur absente ou du mauvais type pour un placeholder du template"""
+
+
+# Littéraux chaîne (quote doublée ou échappée) ou placeholder {Param} / {{Param}}
+_TOKENS = re.compile(r"""'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*"|\{\{?(\w+)\}?\}""")
+_PLACEHOLDER = re.compile(r'\{\{?(\w+)\}?\}')
+# "IdPersonne = {id_personne}" ne vaut que pour un enfant : toujours IN (...)
+_CHILDREN_EQUALS = re.compile(r"""=\s*(['"]?)\{\{?id_personne\}?\}\1""")
+
+
+def param_type(name: str) -> str:
+    """Type d'un placeholder, sans tenir compte de la casse ({IdPersonne} = {IDPersonne})"""
+    return _TYPES_BY_NAME.get(name.lower(), 'str')
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def compile_template(sql_template: str) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """
+    Découpe un template en morceaux de SQL et noms de paramètres, dans l'ordre :
+    chunks[0] name[0] chunks[1] ... name[n-1] chunks[n]. Un placeholder entre
+    guillemets ('{AnneeScolaire}') perd ses guillemets ; mêlé à du texte
+    ('%{NomFr}%'), le littéral devient CONCAT('%', ?, '%').
+    """
+    sql_template = _CHILDREN_EQUALS.sub('IN ({id_personne})', sql_template)
+    chunks: List[str] = []
+    names: List[str] = []
+    current: List[str] = []
+    position = 0
+    for match in _TOKENS.finditer(sql_template):
+        current.append(sql_template[position:match.start()])
+        position = match.end()
+        token = match.group(0)
+        if match.group(1):  # placeholder hors littéral
+            chunks.append(''.join(current))
+            names.append(match.group(1))
+            current = []
+            continue
+        quote, body = token[0], token[1:-1]
+        inner = list(_PLACEHOLDER.finditer(body))
+        if not inner:
+            current.append(token)
+            continue
+        pieces, start = [], 0
+        for placeholder in inner:
+            text = body[start:placeholder.start()]
+            if text:
+                pieces.append(f"{quote}{text}{quote}")
+            pieces.append(None)
+            names.append(placeholder.group(1))
+            start = placeholder.end()
+        tail = body[start:]
+        if tail:
+            pieces.append(f"{quote}{tail}{quote}")
+        if len(pieces) > 1:
+            current.append('CONCAT(')
+        for index, piece in enumerate(pieces):
+            if index:
+                current.append(', ')
+            if piece is None:
+                chunks.append(''.join(current))
+                current = []
+            else:
+                current.append(piece)
+        if len(pieces) > 1:
+            current.append(')')
+    current.append(sql_template[position:])
+    chunks.append(''.join(current))
+    return tuple(chunks), tuple(names)
+
+
+def coerce_param(name: str, value: Any) -> Any:
+    """Valeur convertie dans le type du placeholder ; TemplateBindingError sinon"""
+    kind = param_type(name)
+    try:
+        if kind == 'int':
+            return int(str(value).strip())
+        if kind == 'int_list':
+            values = value.split(',') if isinstance(value, str) else value
+            ids = [int(str(item).strip()) for item in values]
+            if not ids:
+                raise ValueError("liste vide")
+            return ids
+    except (TypeError, ValueError) as e:
+        raise TemplateBindingError(f"Valeur invalide pour {{{name}}} ({kind}) : {value!r}") from e
+    return str(value)
+
+
+def bind_template(sql_template: str, variables: Dict[str, Any]) -> Tuple[str, Tuple[Any, ...]]:
+    """
+    Template du cache + variables de la question -> (requête à marqueurs %s,
+    valeurs typées). Une liste (id_personne) occupe autant de marqueurs que
+    de valeurs. Lève TemplateBindingError si une valeur manque ou est invalide.
+    """
+    chunks, names = compile_template(sql_template)
+    parts, params = [chunks[0]], []
+    for name, chunk in zip(names, chunks[1:]):
+        if name not in variables:
+            raise TemplateBindingError(f"Aucune valeur pour {{{name}}}")
+        value = coerce_param(name, variables[name])
+        if isinstance(value, list):
+            parts.append(', '.join(['%s'] * len(value)))
+            params.extend(value)
+        else:
+            parts.append('%s')
+            params.append(value)
+        parts.append(chunk)
+    return ''.join(parts), tuple(params)
@@ -0,0 +1,475 @@
+import heapq
+import itertools
+import logging
+import math
+import os
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, FrozenSet, Hashable, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+logger = logging.getLogger(__name__)
+
+# Ajouts entre deux repondérations idf de VectorIndex
+REWEIGHT_EVERY = int(os.getenv("VECTOR_INDEX_REWEIGHT_EVERY", 50))
+
+
+class TokenIndex:
+    """
+    Index inversé mot -> clés pour la similarité de Jaccard entre ensembles de
+    mots, partagé par les caches de requêtes et le matcher de templates.
+
+    Les ensembles de mots sont calculés une fois à l'insertion (add/remove
+    incrémentaux, sans reconstruction). Une recherche ne parcourt que les
+    listes des mots les plus rares de la question : Jaccard >= t impose au
+    moins ceil(t*|q|) mots communs, donc toute clé valable contient l'un des
+    |q| - ceil(t*|q|) + 1 mots les plus rares. Filtre de taille en plus :
+    |c| <= |q| / t.
+    """
+
+    def __init__(self):
+        self._tokens: Dict[Hashable, FrozenSet[str]] = {}
+        self._postings: Dict[str, Set[Hashable]] = defaultdict(set)
+        # Ordre d'insertion : à score égal, la première clé insérée l'emporte
+        self._order: Dict[Hashable, int] = {}
+        self._counter = itertools.count()
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._tokens
+
+    def clear(self):
+        with self._lock:
+            self._tokens.clear()
+            self._postings.clear()
+            self._order.clear()
+
+    def add(self, key: Hashable, tokens: Iterable[str]):
+        """Indexe (ou réindexe) une clé"""
+        tokens = frozenset(tokens)
+        with self._lock:
+            self._unlink(key)
+            self._tokens[key] = tokens
+            self._order.setdefault(key, next(self._counter))
+            for token in tokens:
+                self._postings[token].add(key)
+
+    def remove(self, key: Hashable):
+        with self._lock:
+            self._unlink(key)
+            self._order.pop(key, None)
+
+    def _unlink(self, key: Hashable):
+        for token in self._tokens.pop(key, ()):
+            keys = self._postings.get(token)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[token]
+
+    def candidates(self, tokens: Iterable[str], min_shared: int = 1) -> Set[Hashable]:
+        """Clés ayant potentiellement au moins `min_shared` mots en commun avec `tokens`"""
+        tokens = frozenset(tokens)
+        if not tokens or min_shared > len(tokens):
+            return set()
+        with self._lock:
+            rarest = sorted(tokens, key=lambda t: len(self._postings.get(t, ())))
+            found: Set[Hashable] = set()
+            for token in rarest[:len(tokens) - max(min_shared, 1) + 1]:
+                found.update(self._postings.get(token, ()))
+            return found
+
+    def search(self, tokens: Iterable[str], k: int = 1, threshold: float = 0.0) -> List[Tuple[Hashable, float]]:
+        """Les k clés les plus proches (Jaccard >= threshold, > 0), par score décroissant"""
+        tokens = frozenset(tokens)
+        if not tokens or k <= 0:
+            return []
+        min_shared = max(1, math.ceil(threshold * len(tokens)))
+        max_size = len(tokens) / threshold if threshold > 0 else math.inf
+
+        with self._lock:
+            scored = []
+            for key in self.candidates(tokens, min_shared):
+                key_tokens = self._tokens[key]
+                if len(key_tokens) > max_size:
+                    continue
+                intersection = len(tokens & key_tokens)
+                similarity = intersection / (len(tokens) + len(key_tokens) - intersection)
+                if similarity >= threshold:
+                    scored.append((similarity, -self._order[key], key))
+        best = heapq.nlargest(k, scored, key=lambda item: item[:2])
+        return [(key, similarity) for similarity, _, key in best]
+
+
+class VectorIndex:
+    """
+    Index TF-IDF incrémental (cosinus) sur des features hachées, sans
+    vocabulaire à ajuster : un ajout vectorise une seule question et ajoute une
+    ligne ; les fréquences documentaires sont tenues à jour au fil de l'eau.
+
+    - correspondance clé -> ligne stable ; une clé supprimée ou remplacée laisse
+      une ligne morte, écartée des résultats puis purgée à la repondération ;
+    - repondération en tâche de fond (idf recalculé sur toutes les lignes) tous
+      les `reweight_every` ajouts ; entre deux, les nouvelles lignes sont
+      pondérées avec l'idf courant ;
+    - persistance des comptes bruts (`.npz`, remplacement atomique) après chaque
+      repondération : au démarrage seules les entrées absentes sont vectorisées.
+
+    Pondération identique à TfidfVectorizer (idf lissé, norme L2, termes inconnus
+    ignorés dans la requête), aux collisions de hachage près.
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self,
+                 path: Optional[str] = None,
+                 n_features: int = 2 ** 18,
+                 reweight_every: int = REWEIGHT_EVERY):
+        self.path = Path(path) if path else None
+        self.n_features = n_features
+        self.reweight_every = reweight_every
+        self._vectorizer = HashingVectorizer(n_features=n_features, alternate_sign=False, norm=None)
+        self._lock = threading.RLock()
+        self._reweighting = False
+        self._reset()
+        if self.path is not None:
+            self._load()
+
+    def _reset(self):
+        self._keys: List[Optional[Hashable]] = []
+        self._rows: Dict[Hashable, int] = {}
+        self._counts: List[sp.csr_matrix] = []
+        self._df = np.zeros(self.n_features, dtype=np.int64)
+        self._idf = self._smooth_idf(0, self._df)
+        self._weighted = sp.csr_matrix((0, self.n_features))
+        self._tail: List[sp.csr_matrix] = []
+        self._added_since_reweight = 0
+        self._version = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._rows
+
+    # --- Mise à jour ---
+
+    def add(self, key: Hashable, text: str):
+        """Ajoute (ou remplace) une entrée : une ligne de plus, sans reconstruction"""
+        counts = self._vectorizer.transform([text]).tocsr()
+        with self._lock:
+            self._discard(key)
+            self._rows[key] = len(self._keys)
+            self._keys.append(key)
+            self._counts.append(counts)
+            self._df[counts.indices] += 1
+            self._tail.append(self._weigh(counts, self._idf))
+            self._added_since_reweight += 1
+            self._version += 1
+            start_reweight = self._added_since_reweight >= self.reweight_every and not self._reweighting
+            if start_reweight:
+                self._reweighting = True
+        if start_reweight:
+            threading.Thread(target=self._background_reweight, daemon=True).start()
+
+    def remove(self, key: Hashable):
+        with self._lock:
+            self._discard(key)
+            self._version += 1
+
+    def _discard(self, key: Hashable):
+        row = self._rows.pop(key, None)
+        if row is not None:
+            self._keys[row] = None
+            self._df[self._counts[row].indices] -= 1
+
+    # --- Recherche ---
+
+    def search(self, text: str, k: int = 1, threshold: float = 0.0) -> List[Tuple[Hashable, float]]:
+        """Les k entrées de cosinus le plus élevé (>= threshold, > 0), par score décroissant"""
+        query = self._vectorizer.transform([text]).tocsr()
+        with self._lock:
+            if not self._rows or k <= 0:
+                return []
+            # Comme TfidfVectorizer : un terme absent de toutes les entrées ne compte pas
+            query.data *= self._df[query.indices] > 0
+            query.eliminate_zeros()
+            query = self._weigh(query, self._idf)
+            matrix = self._matrix()
+            keys = self._keys
+        if query.nnz == 0:
+            return []
+
+        scores = (matrix @ query.T).toarray().ravel()
+        hits = np.flatnonzero((scores >= threshold) & (scores > 0))
+        hits = hits[np.argsort(-scores[hits], kind='stable')]
+        results = []
+        for row in hits:
+            if keys[row] is not None:
+                results.append((keys[row], float(scores[row])))
+                if len(results) == k:
+                    break
+        return results
+
+    def _matrix(self) -> sp.csr_matrix:
+        if self._tail:
+            self._weighted = sp.vstack([self._weighted] + self._tail, format='csr')
+            self._tail = []
+        return self._weighted
+
+    # --- Pondération ---
+
+    @staticmethod
+    def _smooth_idf(n_docs: int, df: np.ndarray) -> np.ndarray:
+        return np.log((1 + n_docs) / (1 + df)) + 1
+
+    @staticmethod
+    def _weigh(counts: sp.csr_matrix, idf: np.ndarray) -> sp.csr_matrix:
+        return normalize(counts.multiply(idf).tocsr())
+
+    def reweight(self):
+        """Recalcule l'idf sur toutes les entrées, repondère la matrice et purge les lignes mortes"""
+        with self._lock:
+            version = self._version
+            keys = [key for key in self._keys if key is not None]
+            counts = [self._counts[self._rows[key]] for key in keys]
+            df = self._df.copy()
+
+        idf = self._smooth_idf(len(keys), df)
+        if counts:
+            stacked = sp.vstack(counts, format='csr')
+            weighted = self._weigh(stacked, idf)
+        else:
+            weighted = sp.csr_matrix((0, self.n_features))
+
+        with self._lock:
+            if version != self._version:
+                return False  # modifié entre-temps : le prochain ajout relancera
+            self._keys = keys
+            self._rows = {key: row for row, key in enumerate(keys)}
+            self._counts = counts
+            self._idf = idf
+            self._weighted = weighted
+            self._tail = []
+            self._added_since_reweight = 0
+        return True
+
+    def flush(self):
+        """Repondère et sauvegarde si des entrées ont été ajoutées depuis la dernière repondération"""
+        if self._added_since_reweight and self.reweight():
+            self.save()
+
+    def _background_reweight(self):
+        try:
+            # Des ajouts concurrents invalident le calcul : on recommence (ils sont rares)
+            for _ in range(5):
+                if self.reweight():
+                    self.save()
+                    break
+        except Exception as e:
+            logger.warning(f"⚠️ Repondération de l'index vectoriel impossible : {e}")
+        finally:
+            with self._lock:
+                self._reweighting = False
+
+    # --- Persistance ---
+
+    def save(self):
+        if self.path is None:
+            return
+        with self._lock:
+            keys = [key for key in self._keys if key is not None]
+            counts = [self._counts[self._rows[key]] for key in keys]
+        matrix = sp.vstack(counts, format='csr') if counts else sp.csr_matrix((0, self.n_features))
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez_compressed(
+                    f,
+                    version=self.FORMAT_VERSION,
+                    n_features=self.n_features,
+                    keys=np.array([str(key) for key in keys], dtype=str),
+                    data=matrix.data, indices=matrix.indices, indptr=matrix.indptr
+                )
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"⚠️ Impossible d'écrire l'index vectoriel : {e}")
+            tmp_path.unlink(missing_ok=True)
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                if int(data['version']) != self.FORMAT_VERSION or int(data['n_features']) != self.n_features:
+                    return
+                keys = [str(key) for key in data['keys']]
+                matrix = sp.csr_matrix(
+                    (data['data'], data['indices'], data['indptr']), shape=(len(keys), self.n_features)
+                )
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"⚠️ Index vectoriel illisible ({self.path}) : {e}")
+            return
+
+        with self._lock:
+            self._reset()
+            for row, key in enumerate(keys):
+                counts = matrix[row]
+                self._rows[key] = row
+                self._keys.append(key)
+                self._counts.append(counts)
+                self._df[counts.indices] += 1
+        self.reweight()
+
+
+class EmbeddingIndex:
+    """
+    Index d'embeddings denses pour la recherche de paraphrases : une matrice
+    float32 (une ligne normalisée par entrée, capacité doublée au besoin) et
+    une recherche top-k vectorisée (produit matrice-vecteur + argpartition).
+
+    add() ne fait que noter le texte : les textes en attente sont encodés par
+    lot au prochain sync() / search(), un seul appel au modèle. Une suppression
+    déplace la dernière ligne dans le trou, la matrice reste compacte.
+    Persistance (`.npz`, remplacement atomique) après chaque encodage, avec le
+    nom du modèle : au démarrage seules les entrées absentes sont encodées.
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, embedder, path: Optional[str] = None):
+        self.embedder = embedder
+        self.path = Path(path) if path else None
+        self._lock = threading.RLock()
+        self._matrix = np.zeros((0, embedder.dim), dtype=np.float32)
+        self._keys: List[Hashable] = []
+        self._rows: Dict[Hashable, int] = {}
+        self._pending: Dict[Hashable, str] = {}
+        if self.path is not None:
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._rows) + len(self._pending)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._rows or key in self._pending
+
+    # --- Mise à jour ---
+
+    def add(self, key: Hashable, text: str):
+        """Ajoute (ou remplace) une entrée, encodée au prochain sync()"""
+        with self._lock:
+            self._pending[key] = text
+
+    def remove(self, key: Hashable):
+        with self._lock:
+            self._pending.pop(key, None)
+            self._delete(key)
+
+    def _delete(self, key: Hashable):
+        row = self._rows.pop(key, None)
+        if row is None:
+            return
+        last = len(self._keys) - 1
+        if row != last:
+            moved = self._keys[last]
+            self._matrix[row] = self._matrix[last]
+            self._keys[row] = moved
+            self._rows[moved] = row
+        self._keys.pop()
+
+    def _append(self, key: Hashable, vector: np.ndarray):
+        size = len(self._keys)
+        if size == self._matrix.shape[0]:
+            grown = np.zeros((max(64, 2 * size), self._matrix.shape[1]), dtype=np.float32)
+            grown[:size] = self._matrix[:size]
+            self._matrix = grown
+        self._matrix[size] = vector
+        self._keys.append(key)
+        self._rows[key] = size
+
+    def sync(self) -> bool:
+        """Encode par lot les entrées en attente ; True si l'index a changé"""
+        with self._lock:
+            pending = list(self._pending.items())
+        if not pending:
+            return False
+
+        # Encodage hors verrou : les recherches continuent sur les lignes existantes
+        vectors = self.embedder.encode([text for _, text in pending])
+        with self._lock:
+            for (key, text), vector in zip(pending, vectors):
+                if self._pending.get(key) != text:
+                    continue  # supprimée ou remplacée entre-temps
+                del self._pending[key]
+                self._delete(key)
+                self._append(key, vector)
+        self.save()
+        return True
+
+    # --- Recherche ---
+
+    def search(self, text: str, k: int = 1, threshold: float = 0.0) -> List[Tuple[Hashable, float]]:
+        """Les k entrées de cosinus le plus élevé (>= threshold), par score décroissant"""
+        self.sync()
+        query = self.embedder.encode([text])[0]
+        with self._lock:
+            size = len(self._keys)
+            if not size or k <= 0:
+                return []
+            scores = self._matrix[:size] @ query
+            keys = list(self._keys)
+
+        if k < size:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(size)
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(keys[row], float(scores[row])) for row in top if scores[row] >= threshold]
+
+    # --- Persistance ---
+
+    def save(self):
+        if self.path is None:
+            return
+        with self._lock:
+            size = len(self._keys)
+            matrix = self._matrix[:size].copy()
+            keys = [str(key) for key in self._keys]
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, version=self.FORMAT_VERSION, model=self.embedder.name,
+                         keys=np.array(keys, dtype=str), vectors=matrix)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"⚠️ Impossible d'écrire l'index d'embeddings : {e}")
+            tmp_path.unlink(missing_ok=True)
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                if int(data['version']) != self.FORMAT_VERSION or str(data['model']) != self.embedder.name:
+                    return  # autre modèle : vecteurs incomparables, tout sera réencodé
+                keys = [str(key) for key in data['keys']]
+                vectors = data['vectors'].astype(np.float32, copy=False)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"⚠️ Index d'embeddings illisible ({self.path}) : {e}")
+            return
+        if vectors.shape != (len(keys), self.embedder.dim):
+            return
+
+        with self._lock:
+            self._matrix = vectors.copy()
+            self._keys = keys
+            self._rows = {key: row for row, key in enumerate(keys)}
@@ -1,37 +1,117 @@
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Callable, Dict, List, Optional, Tuple, Any
+import os
 import re
+import threading
+
+from agent.sql_template import TemplateBindingError, coerce_param
+from agent.template_index import TokenIndex
+
+# Similarité minimale (Jaccard sur les mots) pour servir un template sans LLM
+TEMPLATE_MATCH_THRESHOLD = float(os.getenv('TEMPLATE_MATCH_THRESHOLD', 0.75))
 
 class SemanticTemplateMatcher:
     def __init__(self):
-        self.templates = []
+        # (templates, index) remplacés ensemble au rechargement : une recherche
+        # en cours garde la paire qu'elle a lue
+        self._catalog: Tuple[List[Dict], TokenIndex] = ([], TokenIndex())
+        # Compteurs de la voie rapide, par template_question (conservés au rechargement)
+        self._lookups = 0
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._stats_lock = threading.Lock()
     
+    @property
+    def templates(self) -> List[Dict]:
+        return self._catalog[0]
+
+    @property
+    def index(self) -> TokenIndex:
+        return self._catalog[1]
+
     def load_templates(self, templates: List[Dict]):
-        """Charge les templates"""
-        self.templates = templates
+        """Charge les templates (nouvel index construit à part, puis publié d'un coup)"""
+        loaded, index = [], TokenIndex()
+        for template in templates:
+            index.add(len(loaded), self._normalize_text(template.get("template_question", "")).split())
+            loaded.append(template)
+        self._catalog = (loaded, index)
         print(f"✅ {len(templates)} templates chargés dans le matcher")
     
+    def add_template(self, template: Dict):
+        """Ajoute un template sans reconstruire l'index"""
+        templates, index = self._catalog
+        index.add(len(templates), self._normalize_text(template.get("template_question", "")).split())
+        templates.append(template)
+    
     def find_similar_template(self, question: str, threshold: float = 0.6) -> Tuple[Optional[Dict], float]:
-        """Trouve un template similaire en utilisant une comparaison simple"""
-        if not self.templates:
-            return None, 0.0
-        
-        question_normalized = self._normalize_text(question)
-        best_match = None
-        best_score = 0.0
-        
-        for template in self.templates:
-            template_text = template.get("template_question", "")
-            template_normalized = self._normalize_text(template_text)
-            
-            # Calcul de similarité basé sur les mots communs
-            similarity = self._calculate_similarity(question_normalized, template_normalized)
-            
-            if similarity > best_score and similarity >= threshold:
-                best_score = similarity
-                best_match = template
-        
-        return best_match, best_score
+        """Trouve le template le plus similaire (Jaccard sur les mots, via l'index inversé)"""
+        matches = self.find_similar_templates(question, k=1, threshold=threshold)
+        return matches[0] if matches else (None, 0.0)
+    
+    def find_similar_templates(self, question: str, k: int = 5, threshold: float = 0.6) -> List[Tuple[Dict, float]]:
+        """Les k templates les plus proches avec leur score"""
+        tokens = self._normalize_text(question).split()
+        templates, index = self._catalog
+        return [(templates[position], score) for position, score in index.search(tokens, k, threshold)]
     
+    def match(self, question: str, threshold: float = TEMPLATE_MATCH_THRESHOLD,
+              accept: Optional[Callable[[Dict, Dict[str, Any]], bool]] = None) -> Optional[Tuple[Dict, Dict[str, Any], float]]:
+        """
+        Voie rapide sans LLM : le template le plus proche dont toutes les
+        variables déclarées ont été trouvées dans la question et sont valides
+        (voir validate_variables), et que `accept` (ex. périmètre parent)
+        autorise. Retourne (template, variables, score) ou None.
+        """
+        with self._stats_lock:
+            self._lookups += 1
+        for template, score in self.find_similar_templates(question, k=3, threshold=threshold):
+            variables = self.validate_variables(template, self._extract_variables(question, template))
+            if variables is None or (accept is not None and not accept(template, variables)):
+                self._count(template, 'rejected')
+                continue
+            self._count(template, 'hits')
+            return template, variables, score
+        return None
+
+    def validate_variables(self, template: Dict, variables: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Variables déclarées par le template (liste `variables`, sinon les
+        placeholders de template_question), toutes présentes, non vides et du
+        bon type. Les valeurs extraites non déclarées sont écartées.
+        """
+        declared = template.get("variables") or re.findall(r'\{(\w+)\}', template.get("template_question", ""))
+        validated = {}
+        for name in declared:
+            value = variables.get(name)
+            if value is None or not str(value).strip():
+                return None
+            try:
+                coerce_param(name, value)
+            except TemplateBindingError:
+                return None
+            validated[name] = value
+        return validated
+
+    def _count(self, template: Dict, counter: str):
+        with self._stats_lock:
+            stats = self._stats.setdefault(template.get("template_question", ""), {'hits': 0, 'rejected': 0})
+            stats[counter] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        """Questions servies par chaque template (hit_rate : part de toutes les questions)"""
+        with self._stats_lock:
+            lookups = self._lookups
+            hits = sum(stats['hits'] for stats in self._stats.values())
+            return {
+                'templates_loaded': len(self.templates),
+                'lookups': lookups,
+                'hits': hits,
+                'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+                'templates': {
+                    question: {**stats, 'hit_rate': round(stats['hits'] / lookups, 4) if lookups else 0.0}
+                    for question, stats in self._stats.items()
+                }
+            }
+
     def _normalize_text(self, text: str) -> str:
         """Normalise le texte pour la comparaison"""
         # Supprime les placeholders
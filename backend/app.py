@@ -5,7 +5,7 @@ from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from datetime import timedelta
 from dotenv import load_dotenv
-from config.database import get_db
+from config.database import fetch_one, transaction
 
 
 from routes.agent import agent_bp
@@ -70,49 +70,34 @@ def create_app():
     
     @app.route('/api/notifications', methods=['GET'])
     def check_exam_notifications():
-        conn = get_db()
-        cursor = conn.cursor()
-
         try:
-            cursor.execute("SELECT * FROM notification_queue WHERE seen = 0")
-            notifications_non_vues = cursor.fetchall()
+            # Lecture et marquage dans une même transaction : chaque message n'est rendu qu'une fois
+            with transaction() as tx:
+                notifications_non_vues = tx.fetch_all("SELECT * FROM notification_queue WHERE seen = 0 FOR UPDATE")
 
-            messages = [{"id": notif["id"], "message": notif["message"]} for notif in notifications_non_vues]
+                messages = [{"id": notif["id"], "message": notif["message"]} for notif in notifications_non_vues]
 
 
-            if notifications_non_vues:
-                ids = [str(notif['id']) for notif in notifications_non_vues]
-                format_strings = ",".join(["%s"] * len(ids))
-                update_query = f"UPDATE notification_queue SET seen = 1 WHERE id IN ({format_strings})"
-                cursor.execute(update_query, ids)
-                conn.commit()
+                if notifications_non_vues:
+                    ids = [str(notif['id']) for notif in notifications_non_vues]
+                    format_strings = ",".join(["%s"] * len(ids))
+                    update_query = f"UPDATE notification_queue SET seen = 1 WHERE id IN ({format_strings})"
+                    tx.execute(update_query, ids)
 
             return jsonify(messages)
 
         except Exception as e:
-            conn.rollback()
             return jsonify({"error": str(e)}), 500
 
-        finally:
-            cursor.close()
-            # Ne PAS fermer conn ici
-
     # Route de santé avec test DB
     @app.route('/api/health')
     def health():
         try:
-            from config.database import get_db
-            conn = get_db()
-            if conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT 1 as test")
-                result = cursor.fetchone()
-                cursor.close()
-                if hasattr(conn, '_direct_connection'):
-                    conn.close()
-                return {"status": "OK", "database": "Connected", "test": result}
-            else:
-                return {"status": "OK", "database": "Disconnected"}, 503
+            from config.database import get_pool
+            from config.result_cache import get_result_cache
+            result = fetch_one("SELECT 1 as test")
+            return {"status": "OK", "database": "Connected", "test": result, "pool": get_pool().metrics(),
+                    "result_cache": get_result_cache().metrics()}
         except Exception as e:
             logger.error(f"❌ Health check failed: {e}")
             return {"status": "ERROR", "database": str(e)}, 503
@@ -121,19 +106,8 @@ def create_app():
     @app.route('/api/test-db')
     def test_db():
         try:
-            from config.database import get_db
-            conn = get_db()
-            if not conn:
-                return {"error": "No database connection"}, 500
-                
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) as count FROM user")
-            result = cursor.fetchone()
-            cursor.close()
-            
-            if hasattr(conn, '_direct_connection'):
-                conn.close()
-                
+            result = fetch_one("SELECT COUNT(*) as count FROM user")
+
             return {"status": "OK", "user_count": result['count']}
         except Exception as e:
             logger.error(f"❌ DB test failed: {e}")
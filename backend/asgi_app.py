@@ -0,0 +1,197 @@
+# asgi_app.py - Mode de service ASGI (FastAPI) pour /api/ask, /api/login et /api/health
+#
+#   uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+#
+# Même contrat HTTP que l'application Flask (app.py), mais les attentes LLM et
+# MySQL sont asynchrones : un seul processus garde des centaines de requêtes
+# /api/ask en vol au lieu d'un thread bloqué par requête.
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+
+load_dotenv()
+
+from agent.llm_utils import ask_llm_async, get_async_llm_client
+from agent.pagination import InvalidPageToken
+from agent.pdf_utils.attestation import attestation_for_question
+from agent.pipeline import AsyncAskPipeline, PipelineExecutionError
+from agent.renderers import OUTPUT_FORMATS
+from config.async_database import close_async_pool, execute_page, fetch_one, get_async_pool, init_async_pool
+from config.result_cache import get_result_cache
+from services.auth_service import AuthService
+from services.children_scope import CHILDREN_SCOPE_PRELOAD, children_claims, get_children_scope, prime_from_claims
+from utils.jwt_utils import create_access_token, decode_access_token
+
+logger = logging.getLogger(__name__)
+
+QUESTION_FIELDS = ['question', 'subject', 'query', 'text', 'message', 'prompt']
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from agent.assistant import SQLAssistant
+    from agent.sql_agent import SQLAgent
+
+    await init_async_pool()
+    # L'assistant (caches, instantané du schéma) reste synchrone : construit une fois, hors boucle
+    assistant = await asyncio.to_thread(SQLAssistant)
+    if CHILDREN_SCOPE_PRELOAD:
+        await asyncio.to_thread(get_children_scope().preload)
+    engine = SQLAgent(assistant.db)
+    app.state.engine = engine
+    app.state.pipeline = AsyncAskPipeline(assistant, engine, ask_llm=ask_llm_async, execute_page=execute_page)
+    logger.info("✅ Mode ASGI prêt")
+    try:
+        yield
+    finally:
+        await get_async_llm_client().close()
+        await close_async_pool()
+
+
+app = FastAPI(title="Assistant scolaire", lifespan=lifespan)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origin_regex=r"http://(localhost|127\.0\.0\.1)(:\d+)?",
+    allow_methods=["GET", "POST"],
+    allow_headers=["*"],
+)
+
+
+def get_current_user(request: Request) -> Optional[Dict[str, Any]]:
+    """JWT optionnel (même format que flask_jwt_extended) : None si absent ou invalide"""
+    header = request.headers.get('Authorization', '')
+    if not header.startswith('Bearer '):
+        return None
+    try:
+        claims = decode_access_token(header[len('Bearer '):])
+    except Exception as e:
+        logger.debug(f"JWT invalide : {e}")
+        return None
+    prime_from_claims(claims)
+    return {
+        'sub': claims.get('sub'),
+        'idpersonne': claims.get('idpersonne'),
+        'roles': claims.get('roles', []),
+        'username': claims.get('username', '')
+    }
+
+
+def extract_question(data: Dict[str, Any]) -> Optional[str]:
+    for field in QUESTION_FIELDS:
+        if field in data and data[field] and str(data[field]).strip():
+            return str(data[field]).strip()
+    return None
+
+
+@app.post('/api/login')
+async def login(request: Request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    if not data:
+        return JSONResponse({"error": "No data received"}, status_code=400)
+
+    login_identifier = data.get('login_identifier')
+    password = data.get('password')
+    if not login_identifier or not password:
+        return JSONResponse({"error": "Missing login_identifier or password"}, status_code=400)
+
+    user = await AuthService.authenticate_user_async(login_identifier, password)
+    if not user:
+        return JSONResponse({"message": "Invalid credentials"}, status_code=401)
+
+    token_data = {
+        'idpersonne': user['idpersonne'],
+        'roles': user['roles'],
+        'changepassword': user['changepassword']
+    }
+    claims = await asyncio.to_thread(children_claims, user)
+    return {
+        'token': create_access_token(str(user['idpersonne']), {**token_data, **claims}),
+        **token_data
+    }
+
+
+@app.post('/api/ask')
+async def ask_sql(request: Request):
+    current_user = get_current_user(request)
+
+    if 'application/json' not in request.headers.get('content-type', ''):
+        return JSONResponse({"error": "Content-Type application/json requis"}, status_code=415)
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    if not data:
+        return JSONResponse({"error": "Corps de requête JSON vide"}, status_code=400)
+
+    question = extract_question(data)
+    page_token = data.get('page_token')
+    if not question and not page_token:
+        return JSONResponse({
+            "error": "Question manquante",
+            "expected_fields": QUESTION_FIELDS,
+            "received_fields": list(data.keys())
+        }, status_code=422)
+
+    output_format = data.get('format', 'text')
+    if output_format not in OUTPUT_FORMATS:
+        return JSONResponse({
+            "error": "Format de sortie invalide",
+            "expected_formats": list(OUTPUT_FORMATS)
+        }, status_code=422)
+
+    user_id = current_user.get('idpersonne') if current_user else None
+    roles = current_user.get('roles', []) if current_user else []
+    pipeline: AsyncAskPipeline = request.app.state.pipeline
+
+    try:
+        if page_token:
+            result = await pipeline.run_page(page_token, user_id, output_format)
+        elif "attestation" in question.lower():
+            return await asyncio.to_thread(attestation_for_question, question, request.app.state.engine)
+        else:
+            result = await pipeline.run(question, user_id, roles, output_format)
+    except InvalidPageToken as e:
+        return JSONResponse({"error": "page_token invalide", "details": str(e)}, status_code=400)
+    except PipelineExecutionError as e:
+        return JSONResponse({
+            "error": "Erreur d'exécution SQL",
+            "sql_query": e.sql_query,
+            "details": e.details
+        }, status_code=500)
+    except Exception as e:
+        logger.error(f"Erreur traitement: {e}")
+        return JSONResponse({
+            "error": "Erreur de traitement",
+            "details": str(e),
+            "question": question
+        }, status_code=500)
+
+    if current_user:
+        result["user"] = current_user
+    return JSONResponse(jsonable_encoder(result))
+
+
+@app.get('/api/health')
+async def health():
+    try:
+        result = await fetch_one("SELECT 1 as test")
+        return {"status": "OK", "database": "Connected", "test": result, "pool": get_async_pool().metrics(),
+                "result_cache": get_result_cache().metrics(),
+                "templates": app.state.pipeline.assistant.template_matcher.metrics(),
+                "children_scope": get_children_scope().metrics(),
+                "llm_single_flight": app.state.pipeline.llm_flights.metrics()}
+    except Exception as e:
+        logger.error(f"❌ Health check failed: {e}")
+        return JSONResponse({"status": "ERROR", "database": str(e)}, status_code=503)
@@ -0,0 +1,157 @@
+# bench_param_extractor.py - Micro-benchmark de l'extraction des paramètres des caches de requêtes
+#
+# Compare, sur un corpus de questions synthétiques, les anciennes méthodes
+# _extract_parameters (copiées ci-dessous telles qu'avant) et l'extracteur
+# compilé de agent/param_extractor.py, sans mémorisation (questions toutes
+# nouvelles) puis avec (même question normalisée plusieurs fois par requête) ;
+# vérifie au passage que les deux donnent la même question normalisée (donc
+# la même clé de cache).
+#
+#   python bench_param_extractor.py --questions 2000 --repeat 5
+
+import argparse
+import random
+import re
+import time
+
+from agent import param_extractor
+from agent.param_extractor import AUTO_PATTERNS, TRIMESTRE_MAPPING, extract_admin_parameters, extract_parent_parameters
+
+SUBJECTS = ["donne moi les notes", "quelle est la moyenne", "liste des absences", "affiche l'emploi du temps",
+            "combien d'élèves", "donne moi l'état de paiement", "quels sont les enseignants", "nombre des eleves inscrits"]
+CHILDREN = ["de mon fils", "de ma fille", "de mes enfants", "du mon enfant", ""]
+CLASSES = ["7B2", "8A1", "9C3", "1S2", ""]
+YEARS = ["2023/2024", "2024-2025", ""]
+NAMES = ["Zeineb SASSI", "de l'élève Ahmed Ben Ali", "BENABDA SAMI", "'TRABELSI'", ""]
+
+
+def legacy_admin(text):
+    variables = {}
+    normalized = text.lower()
+    for term, code in TRIMESTRE_MAPPING.items():
+        if term in normalized:
+            normalized = normalized.replace(term, "{codeperiexam}")
+            variables["codeperiexam"] = str(code)
+            break
+    name_patterns = [
+        r'\b([A-Z][a-zA-Zàâäéèêëïîôöùûüÿç]+)\s+([A-Z][a-zA-Zàâäéèêëïîôöùûüÿç]+)\b',
+        r"élève\s+([A-Z][a-zA-Zàâäéèêëïîôöùûüÿç]+)\s+([A-Z][a-zA-Zàâäéèêëïîôöùûüÿç]+)",
+        r"de\s+l'élève\s+([A-Z][a-zA-Zàâäéèêëïîôöùûüÿç]+)\s+([A-Z][a-zA-Zàâäéèêëïîôöùûüÿç]+)",
+        r"de\s+([A-Z][a-zA-Zàâäéèêëïîôöùûüÿç]+)\s+([A-Z][a-zA-Zàâäéèêëïîôöùûüÿç]+)"
+    ]
+    for pattern in name_patterns:
+        matches = list(re.finditer(pattern, text, re.IGNORECASE))
+        if matches:
+            for match in reversed(matches):
+                nom, prenom = match.groups()
+                normalized = normalized.replace(match.group(0).lower(), "{nomfr} {prenomfr}")
+                variables.update({"NomFr": nom.capitalize(), "PrenomFr": prenom.capitalize()})
+            break
+    classe_match = re.search(r'\b(\d+[A-Z]\d*)\b', text)
+    if classe_match:
+        code_classe = classe_match.group(1)
+        normalized = normalized.replace(code_classe.lower(), "{codeclassefr}")
+        variables["CODECLASSEFR"] = code_classe
+    annee_match = re.search(r'\b(20\d{2}[/-]20\d{2})\b', text)
+    if annee_match:
+        annee = annee_match.group(1).replace("-", "/")
+        normalized = normalized.replace(annee_match.group(0).lower(), "{anneescolaire}")
+        variables["AnneeScolaire"] = annee
+    normalized = re.sub(r'\s+', ' ', normalized).strip()
+    return normalized, variables
+
+
+def legacy_parent(text):
+    variables = {}
+    normalized = text
+    family_patterns = {
+        r'\b(?:mon|ma|mes)\s+(enfant|fille|fils|enfants)\b': 'id_personne',
+        r'\b(?:de|du|d\')\s*(?:mon|ma|mes)\s+(enfant|fille|fils|enfants)\b': 'id_personne',
+        r'\bmon\s+enfant\b': 'id_personne',
+        r'\bma\s+fille\b': 'id_personne',
+        r'\bmon\s+fils\b': 'id_personne',
+        r'\bmes\s+enfants\b': 'id_personne'
+    }
+    family_refs = {}
+    for pattern, placeholder in family_patterns.items():
+        if re.search(pattern, text.lower(), re.IGNORECASE):
+            family_refs['family_relation'] = placeholder
+            break
+    if family_refs:
+        for pattern in [r'\b(?:mon|ma|mes)\s+(?:enfant|fille|fils|enfants)\b',
+                        r'\b(?:de|du|d\')\s*(?:mon|ma|mes)\s+(?:enfant|fille|fils|enfants)\b']:
+            normalized = re.sub(pattern, '{family_relation}', normalized, flags=re.IGNORECASE)
+        variables['id_personne'] = family_refs['family_relation']
+    for term, code in TRIMESTRE_MAPPING.items():
+        if term in normalized.lower():
+            normalized = normalized.replace(term, "{codeperiexam}")
+            variables["codeperiexam"] = str(code)
+            break
+    for pattern, param_type in AUTO_PATTERNS.items():
+        matches = list(re.finditer(pattern, normalized))
+        for match in reversed(matches):
+            full_match = match.group(0)
+            if param_type == 'NomPrenom':
+                nom, prenom = match.groups()
+                normalized = normalized.replace(full_match, "{NomFr} {PrenomFr}")
+                variables.update({"NomFr": nom, "PrenomFr": prenom})
+            else:
+                value = match.group(1) if len(match.groups()) > 0 else full_match
+                normalized = normalized.replace(full_match, f"{{{param_type}}}")
+                variables[param_type] = value
+    quoted_values = re.findall(r"['\"]([^'\"]+)['\"]", normalized)
+    for val in quoted_values:
+        if val not in variables.values():
+            if val.isupper() and len(val.split()) == 1:
+                param_name = "NomFr" if "nom" in normalized.lower() else "Valeur"
+                normalized = normalized.replace(f"'{val}'", f"'{{{param_name}}}'")
+                variables[param_name] = val
+    return normalized, variables
+
+
+def corpus(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    questions = []
+    for _ in range(count):
+        # Environ une question sur quatre porte sur un trimestre
+        period = rng.choice(list(TRIMESTRE_MAPPING)) if rng.random() < 0.25 else ""
+        parts = [rng.choice(SUBJECTS), rng.choice(CHILDREN), rng.choice(NAMES),
+                 period, rng.choice(CLASSES), rng.choice(YEARS)]
+        if rng.random() < 0.3:
+            parts.append(f"id {rng.randint(1, 99999)}")
+        questions.append(" ".join(part for part in parts if part) + rng.choice(["", " ?", "?"]))
+    return questions
+
+
+def timed(function, questions, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for question in questions:
+            function(question)
+        best = min(best, time.perf_counter() - started)
+    return best / len(questions) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark de l'extraction des paramètres")
+    parser.add_argument("--questions", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    questions = corpus(args.questions)
+    print(f"{len(questions)} questions, meilleur de {args.repeat} passes")
+    for label, legacy, uncached, compiled in [
+        ("admin", legacy_admin, param_extractor._extract_admin, extract_admin_parameters),
+        ("parent", legacy_parent, param_extractor._extract_parent, extract_parent_parameters),
+    ]:
+        same = sum(legacy(q) == compiled(q) for q in questions)
+        before = timed(legacy, questions, args.repeat)
+        cold = timed(uncached, questions, args.repeat)
+        warm = timed(compiled, questions, args.repeat)
+        print(f"{label:<7} avant {before:6.1f} µs  compilé {cold:6.1f} µs (x{before / cold:.2f})  "
+              f"mémorisé {warm:5.1f} µs (x{before / warm:.0f})  résultats identiques {same}/{len(questions)}")
+
+
+if __name__ == "__main__":
+    main()
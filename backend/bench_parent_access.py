@@ -0,0 +1,139 @@
+# bench_parent_access.py - Micro-benchmark du contrôle d'accès des requêtes parent
+#
+# Compare, sur des requêtes parent réalistes (templates du cache, requêtes
+# générées par le LLM) et des tentatives de contournement, l'ancienne
+# validation par motifs (copiée ci-dessous sans ses print) et le contrôle
+# sur l'arbre syntaxique de security/sql_scope.py : analyse à froid (cache
+# des arbres vidé) puis à chaud (requête déjà analysée, revalidée). Affiche
+# aussi le verdict des deux contrôles sur chaque forme de requête.
+#
+#   python bench_parent_access.py --repeat 200
+
+import argparse
+import random
+import re
+import time
+
+from security.sql_scope import check_parent_access, parse_select
+
+ALLOWED = [
+    """SELECT em.libematifr AS matiere, ed.moyemati AS moyenne, ex.codeperiexam AS codeTrimestre
+       FROM Eduperiexam ex, Edumoymaticopie ed, Edumatiere em, Eleve e
+       WHERE e.idedusrv = ed.idenelev AND ed.codemati = em.codemati AND ex.codeperiexam = ed.codeperiexam
+       AND e.Idpersonne IN ({ids}) AND ed.moyemati NOT LIKE '0.00' AND ed.codeperiexam = 31;""",
+    "SELECT p.NomFr, p.PrenomFr, p.Tel1, p.Tel2, p.AdresseFr FROM personne p "
+    "JOIN eleve e ON p.id = e.IdPersonne WHERE e.IdPersonne IN ({ids});",
+    "SELECT p.id, p.`Tranche`, p.`TotalTTC`, p.`MontantRestant` FROM paiement p WHERE p.`Inscription` IN "
+    "(SELECT id FROM inscriptioneleve WHERE Eleve IN (SELECT id FROM eleve WHERE IdPersonne IN ({ids})));",
+    "SELECT m.libematifr AS matiere, COUNT(*) AS absences FROM absence a JOIN edumatiere m ON m.codemati = a.Matiere "
+    "WHERE a.Inscription IN (SELECT ie.id FROM inscriptioneleve ie JOIN eleve e ON e.id = ie.Eleve "
+    "WHERE e.IdPersonne IN ({ids})) GROUP BY m.libematifr ORDER BY absences DESC",
+    "SELECT j.libelleJourFr, s.debut, s.fin, pe.NomFr, pe.PrenomFr, sa.nomSalleFr FROM emploidutemps edt "
+    "JOIN jour j ON edt.Jour = j.id JOIN seance s ON s.id = edt.SeanceDebut JOIN salle sa ON sa.id = edt.Salle "
+    "JOIN enseingant en ON en.id = edt.Enseignant JOIN personne pe ON pe.id = en.Personne "
+    "WHERE edt.Classe IN (SELECT ie.Classe FROM inscriptioneleve ie JOIN eleve e ON e.id = ie.Eleve "
+    "WHERE e.IdPersonne IN ({ids})) AND j.libelleJourFr = 'Mercredi'",
+]
+
+BYPASSES = [
+    "SELECT * FROM eleve e WHERE e.IdPersonne IN ({ids}) OR 1=1",
+    "SELECT p.NomFr, p.Tel1 FROM personne p, eleve e WHERE e.IdPersonne IN ({ids})",
+    "SELECT a.* FROM absence a JOIN inscriptioneleve ie ON ie.Classe = a.Classe "
+    "WHERE ie.Eleve IN (SELECT id FROM eleve WHERE IdPersonne IN ({ids}))",
+    "SELECT e.id, (SELECT NomFr FROM personne WHERE id = 1) FROM eleve e WHERE e.IdPersonne IN ({ids})",
+    "SELECT * FROM eleve WHERE idpersonne in ({ids}) INTO OUTFILE '/tmp/eleves'",
+]
+
+
+def legacy_validate(sql_query, children_ids):
+    children_ids_str = [str(int(child_id)) for child_id in children_ids]
+    sql_lower = re.sub(r'\s+', ' ', sql_query.lower().replace("\n", " ").replace("\t", " ")).strip()
+    security_patterns = set()
+    if len(children_ids_str) == 1:
+        child_id = children_ids_str[0]
+        security_patterns.update({
+            f"idpersonne = {child_id}", f"idpersonne={child_id}", f"e.idpersonne = {child_id}",
+            f"e.idpersonne={child_id}", f"eleve.idpersonne = {child_id}", f"eleve.idpersonne={child_id}",
+            f"idpersonne in ({child_id})"
+        })
+    else:
+        ids_joined = ",".join(children_ids_str)
+        ids_joined_spaced = ", ".join(children_ids_str)
+        for prefix in ("", "e.", "eleve.", "id_"):
+            column = "id_personne" if prefix == "id_" else f"{prefix}idpersonne"
+            security_patterns.update({f"{column} in ({ids_joined})", f"{column} in({ids_joined})",
+                                      f"{column} in ({ids_joined_spaced})"})
+    for child_id in children_ids_str:
+        security_patterns.update({
+            f"eleve in (select id from eleve where idpersonne = {child_id}",
+            f"eleve in (select id from eleve where idpersonne={child_id}",
+            f"exists (select 1 from eleve where idpersonne = {child_id}",
+            f"exists (select 1 from eleve where idpersonne={child_id}",
+            f"exists(select 1 from eleve where idpersonne = {child_id}",
+            f"exists(select 1 from eleve where idpersonne={child_id}",
+            f"ed.idenelev IN (SELECT id FROM eleve WHERE IdPersonne IN {child_id})",
+            f"e.idpersonne in ({child_id})"
+        })
+    if len(children_ids_str) > 1:
+        ids_joined = ",".join(children_ids_str)
+        ids_joined_spaced = ", ".join(children_ids_str)
+        for head in ("eleve in (select id from eleve", "exists (select 1 from eleve", "exists(select 1 from eleve"):
+            security_patterns.update({f"{head} where idpersonne in ({ids_joined})",
+                                      f"{head} where idpersonne in({ids_joined})",
+                                      f"{head} where idpersonne in ({ids_joined_spaced})"})
+    if not [pattern for pattern in security_patterns if pattern in sql_lower]:
+        return False
+    forbidden_patterns = {"--", "/*", "*/", " drop ", " truncate ", " insert ", " update ", " delete "}
+    return not [pattern for pattern in forbidden_patterns if pattern in sql_lower]
+
+
+def corpus(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        children = rng.sample(range(1000, 99999), rng.randint(1, 3))
+        template = rng.choice(ALLOWED + BYPASSES)
+        queries.append((template.format(ids=", ".join(map(str, children))), children))
+    return queries
+
+
+def timed(function, queries, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for sql, children in queries:
+            function(sql, children)
+        best = min(best, time.perf_counter() - started)
+    return best / len(queries) * 1e6
+
+
+def cold_check(sql, children):
+    parse_select.cache_clear()
+    return check_parent_access(sql, children)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark du contrôle d'accès parent")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    queries = corpus(args.queries)
+    longest = max(len(sql) for sql, _ in queries)
+    print(f"{len(queries)} requêtes (jusqu'à {longest} caractères), meilleur de {args.repeat} passes")
+    before = timed(legacy_validate, queries, args.repeat)
+    cold = timed(cold_check, queries, args.repeat)
+    warm = timed(check_parent_access, queries, args.repeat)
+    print(f"motifs {before:6.1f} µs  arbre à froid {cold:6.1f} µs  arbre à chaud {warm:6.1f} µs  (par requête)")
+
+    for label, templates in (("autorisées", ALLOWED), ("contournements", BYPASSES)):
+        for template in templates:
+            sql = template.format(ids="12, 13")
+            legacy = legacy_validate(sql, [12, 13])
+            reason = check_parent_access(sql, [12, 13])
+            print(f"{label:<15} motifs {'accepte' if legacy else 'refuse ':<7}  arbre "
+                  f"{'accepte' if reason is None else 'refuse : ' + reason}  | {' '.join(sql.split())[:60]}")
+
+
+if __name__ == "__main__":
+    main()
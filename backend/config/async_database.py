@@ -0,0 +1,198 @@
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import mysql.connector.aio as mysql_aio
+from mysql.connector import Error as MySQLError
+
+from config.database import (
+    ER_DUP_FIELDNAME, Row, connection_settings, count_query, page_query, page_statement, pool_settings
+)
+from config.pool import AsyncConnectionPool
+from config.prepared import statement_cache
+from config.result_cache import get_result_cache, notify_write, referenced_tables
+
+logger = logging.getLogger(__name__)
+
+# Mode ASGI : même driver (mysql-connector, API asyncio) et mêmes réglages
+# MYSQL_* / MYSQL_POOL_* que config.database, un pool par boucle d'évènements.
+_pool: Optional[AsyncConnectionPool] = None
+
+
+async def _connect():
+    return await mysql_aio.connect(**connection_settings())
+
+
+async def init_async_pool() -> AsyncConnectionPool:
+    """Crée et remplit le pool asyncio (à appeler au démarrage de l'application ASGI)"""
+    global _pool
+    if _pool is None:
+        _pool = AsyncConnectionPool(_connect, **pool_settings())
+        await _pool.warm()
+        logger.info(f"✅ Pool MySQL asyncio initialisé ({_pool.metrics()['size']} connexions)")
+    return _pool
+
+
+async def close_async_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close_all()
+        _pool = None
+
+
+def get_async_pool() -> AsyncConnectionPool:
+    if _pool is None:
+        raise RuntimeError("Pool MySQL asyncio non initialisé (init_async_pool)")
+    return _pool
+
+
+async def fetch_all(query: str, params: Optional[Sequence[Any]] = None) -> List[Row]:
+    """Exécute une requête de lecture et retourne toutes les lignes"""
+    async with get_async_pool().connection() as conn:
+        cursor = await conn.cursor(dictionary=True)
+        try:
+            await cursor.execute(query, params or ())
+            return await cursor.fetchall()
+        finally:
+            await cursor.close()
+
+
+async def fetch_one(query: str, params: Optional[Sequence[Any]] = None) -> Optional[Row]:
+    """Exécute une requête de lecture et retourne la première ligne (ou None)"""
+    rows = await fetch_all(query, params)
+    return rows[0] if rows else None
+
+
+async def fetch_table(query: str, params: Optional[Sequence[Any]] = None) -> Tuple[List[str], List[Tuple[Any, ...]]]:
+    """Exécute une requête de lecture et retourne (noms de colonnes, lignes en tuples typés)"""
+    async with get_async_pool().connection() as conn:
+        cursor = await conn.cursor()
+        try:
+            await cursor.execute(query, params or ())
+            rows = await cursor.fetchall()
+            columns = list(cursor.column_names) if cursor.description else []
+            return columns, rows
+        finally:
+            await cursor.close()
+
+
+async def execute(query: str, params: Optional[Sequence[Any]] = None) -> int:
+    """Exécute une requête d'écriture et retourne le nombre de lignes affectées"""
+    async with get_async_pool().connection() as conn:
+        cursor = await conn.cursor()
+        try:
+            await cursor.execute(query, params or ())
+            await conn.commit()
+            notify_write(query)
+            return cursor.rowcount
+        finally:
+            await cursor.close()
+
+
+async def fetch_prepared(query: str, params: Sequence[Any]) -> Tuple[List[str], List[Tuple[Any, ...]]]:
+    """Version asyncio de config.database.fetch_prepared (instruction préparée réutilisée par connexion)"""
+    async with get_async_pool().connection() as conn:
+        cache = statement_cache(conn)
+        found = cache.get(query)
+        if found is None:
+            statement, cursor = query, await conn.cursor(prepared=True)
+            for evicted in cache.put(statement, cursor):
+                await _close_cursor(evicted)
+        else:
+            statement, cursor = found
+        try:
+            await cursor.execute(statement, tuple(params))
+            rows = await cursor.fetchall()
+            columns = list(cursor.column_names) if cursor.description else []
+        except Exception:
+            cache.discard(statement)
+            await _close_cursor(cursor)
+            raise
+        if not cache.enabled:
+            await _close_cursor(cursor)
+        return columns, rows
+
+
+async def _close_cursor(cursor):
+    try:
+        await cursor.close()
+    except Exception as e:
+        logger.warning(f"⚠️ Fermeture d'une instruction préparée impossible : {e}")
+
+
+async def count_rows(query: str, params: Optional[Sequence[Any]] = None) -> Optional[int]:
+    try:
+        if params is None:
+            row = await fetch_one(count_query(query))
+            return int(row['total'])
+        _, rows = await fetch_prepared(count_query(query), params)
+        return int(rows[0][0])
+    except Exception as e:
+        logger.warning(f"⚠️ Comptage des lignes impossible : {e}")
+        return None
+
+
+async def fetch_page(query: str, limit: int, offset: int = 0, params: Optional[Sequence[Any]] = None) -> Dict[str, Any]:
+    """Version asyncio de config.database.fetch_page (même enveloppe LIMIT et même repli)"""
+    inner = query.strip().rstrip(';')
+    limit, offset = int(limit), int(offset)
+    try:
+        if params is None:
+            columns, rows = await fetch_table(page_query(inner, limit, offset))
+        else:
+            columns, rows = await fetch_prepared(page_statement(inner), (*params, limit + 1, offset))
+    except MySQLError as e:
+        if e.errno != ER_DUP_FIELDNAME:
+            raise
+        return await _fetch_page_streamed(inner, limit, offset, params)
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    total = await count_rows(inner, params) if has_more else offset + len(rows)
+    return {'columns': columns, 'rows': rows, 'has_more': has_more, 'total': total}
+
+
+async def _fetch_page_streamed(query: str, limit: int, offset: int,
+                               params: Optional[Sequence[Any]] = None) -> Dict[str, Any]:
+    async with get_async_pool().connection() as conn:
+        cursor = await (conn.cursor(buffered=False) if params is None else conn.cursor(prepared=True))
+        try:
+            if params is None:
+                await cursor.execute(query)
+            else:
+                await cursor.execute(query, tuple(params))
+            columns = list(cursor.column_names)
+            rows, seen = [], 0
+            while True:
+                batch = await cursor.fetchmany(500)
+                if not batch:
+                    break
+                for row in batch:
+                    if offset <= seen < offset + limit:
+                        rows.append(row)
+                    seen += 1
+            return {'columns': columns, 'rows': rows, 'has_more': seen > offset + len(rows), 'total': seen}
+        finally:
+            await cursor.close()
+
+
+async def execute_page(query: str, limit: int, offset: int = 0, scope: Any = None,
+                       params: Optional[Sequence[Any]] = None) -> Dict[str, Any]:
+    """Même contrat (et même cache de résultats) que ExtendedSQLDatabase.execute_page"""
+    cache = get_result_cache()
+    key = cache.key(query, scope, limit, offset, params)
+    cached = cache.get(key)
+    if cached is not None:
+        logger.info(f"[SQL CACHE] Page servie depuis le cache de résultats (limit={limit}, offset={offset})")
+        return cached
+    try:
+        logger.info(f"[SQL EXECUTE] Requête exécutée (limit={limit}, offset={offset}):\n{query}")
+        if params:
+            logger.info(f"[SQL PARAMS] Paramètres: {params}")
+        page = await fetch_page(query, limit, offset, params)
+        logger.info(f"[SQL RESULT] {len(page['rows'])} lignes retournées (total: {page['total']})")
+    except Exception as e:
+        logger.error(f"[SQL ERROR] Erreur d'exécution: {e}")
+        return {'success': False, 'error': str(e)}
+    result = {'success': True, **page}
+    cache.put(key, result, referenced_tables(query))
+    return result
@@ -1,111 +1,407 @@
-from flask_mysqldb import MySQL
 from langchain_community.utilities import SQLDatabase
-import MySQLdb
-from urllib.parse import quote_plus
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
 import os
 import logging
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
 from dotenv import load_dotenv
 import mysql.connector as mysql_connector
+from config.pool import ConnectionPool
+from config.prepared import statement_cache
+from config.result_cache import get_result_cache, notify_write, referenced_tables
+from config.schema_snapshot import SchemaSnapshot
 
 
 
 from contextlib import contextmanager
 load_dotenv()
-mysql = MySQL()
 logger = logging.getLogger(__name__)
 
+# Une ligne de résultat : {nom_colonne: valeur}
+Row = Dict[str, Any]
+
+# "Duplicate column name" : la requête ne peut pas servir de table dérivée
+ER_DUP_FIELDNAME = 1060
+
+# Durée maximale du COUNT(*) qui accompagne une page tronquée
+COUNT_TIMEOUT_MS = int(os.getenv('RESULT_COUNT_TIMEOUT_MS', 2000))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def connection_settings() -> Dict[str, Any]:
+    """Paramètres de connexion MySQL communs aux modes synchrone et asyncio"""
+    return {
+        'host': os.getenv('MYSQL_HOST'),
+        'port': int(os.getenv('MYSQL_PORT', 3306)),
+        'user': os.getenv('MYSQL_USER'),
+        'password': os.getenv('MYSQL_PASSWORD'),
+        'database': os.getenv('MYSQL_DATABASE'),
+        'autocommit': True,
+        'connection_timeout': 10,
+        'charset': 'utf8mb4'
+    }
+
+def pool_settings() -> Dict[str, Any]:
+    """Réglages du pool (MYSQL_POOL_*), communs aux modes synchrone et asyncio"""
+    return {
+        'min_size': int(os.getenv('MYSQL_POOL_MIN', 2)),
+        'max_size': int(os.getenv('MYSQL_POOL_MAX', 10)),
+        'idle_check_after': float(os.getenv('MYSQL_POOL_IDLE_CHECK', 30)),
+        'max_lifetime': float(os.getenv('MYSQL_POOL_MAX_LIFETIME', 1800)),
+        'acquire_timeout': float(os.getenv('MYSQL_POOL_TIMEOUT', 10))
+    }
+
+# Options des connexions du pool. Pas de buffered=True ici : un curseur préparé
+# (fetch_prepared) ou lu au fil de l'eau (stream, _fetch_page_streamed) est alors
+# impossible ou bufferisé malgré tout ; les lectures complètes le demandent
+# curseur par curseur.
+CONNECT_OPTIONS: Dict[str, Any] = {}
+
+def _connect():
+    """Ouvre une connexion MySQL brute (utilisée uniquement par le pool)"""
+    return mysql_connector.connect(**CONNECT_OPTIONS, **connection_settings())
+
+
+def get_pool():
+    """Pool de connexions MySQL unique du processus (créé au premier appel)"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(_connect, **pool_settings())
+    return _pool
+
+
 def init_db(app):
-    """Initialise la configuration MySQL pour Flask"""
+    """Initialise le pool MySQL et le rattache au cycle de vie des requêtes Flask"""
     try:
-        app.config['MYSQL_HOST'] = os.getenv('MYSQL_HOST')
-        app.config['MYSQL_USER'] = os.getenv('MYSQL_USER')
-        app.config['MYSQL_PASSWORD'] = os.getenv('MYSQL_PASSWORD')
-        app.config['MYSQL_DB'] = os.getenv('MYSQL_DATABASE')
-        app.config['MYSQL_CURSORCLASS'] = 'DictCursor'
-        app.config['MYSQL_AUTOCOMMIT'] = True
-        app.config['MYSQL_CONNECT_TIMEOUT'] = 60
-        
         # Validation des variables d'environnement
         required_vars = ['MYSQL_HOST', 'MYSQL_USER', 'MYSQL_PASSWORD', 'MYSQL_DATABASE']
         missing_vars = [var for var in required_vars if not os.getenv(var)]
         if missing_vars:
             raise ValueError(f"Variables d'environnement manquantes: {missing_vars}")
-        
-        mysql.init_app(app)
-        
-        # ✅ Test de connexion immédiat
-        test_connection = create_direct_connection()
-        if test_connection:
-            test_connection.close()
-            logger.info("✅ Configuration MySQL initialisée et testée")
-        else:
-            raise Exception("Impossible de se connecter à MySQL")
-            
-        return mysql
+
+        app.teardown_appcontext(close_db)
+
+        # ✅ Ouverture des connexions minimales (teste aussi la configuration)
+        pool = get_pool()
+        pool.warm()
+        logger.info(f"✅ Pool MySQL initialisé ({pool.metrics()['size']} connexions)")
+        return pool
     except Exception as e:
         logger.error(f"❌ Erreur init MySQL: {e}")
         raise
 
 def create_direct_connection():
-    """Crée une connexion MySQL directe (indépendante de Flask)"""
+    """Emprunte une connexion au pool (indépendante de Flask) ; close() la rend au pool"""
     try:
-        connection = MySQLdb.connect(
-            host=os.getenv('MYSQL_HOST'),
-            user=os.getenv('MYSQL_USER'),
-            passwd=os.getenv('MYSQL_PASSWORD'),
-            db=os.getenv('MYSQL_DATABASE'),
-            cursorclass=MySQLdb.cursors.DictCursor,
-            autocommit=True,
-            connect_timeout=10
-        )
-        # ✅ Marquer comme connexion directe pour savoir quand la fermer
-        connection._direct_connection = True
-        logger.debug("✅ Connexion MySQL directe créée")
-        return connection
+        return get_pool().acquire()
     except Exception as e:
         logger.error(f"❌ Erreur connexion MySQL directe: {e}")
         return None
 
 def get_db():
-    """Returns a MySQL connection - uses Flask connection if available, otherwise creates a direct connection"""
+    """
+    Retourne une connexion du pool. Dans une requête Flask, la même connexion
+    est réutilisée pendant toute la requête et rendue au pool au teardown
+    (close() est alors sans effet) ; hors contexte Flask, close() la rend au pool.
+    """
+    from flask import g, has_app_context
+
+    if has_app_context():
+        conn = g.get('_db_conn')
+        if conn is None or conn.closed:
+            conn = get_pool().acquire(request_scoped=True)
+            g._db_conn = conn
+        return conn
+    return get_pool().acquire()
+
+def close_db(exception=None):
+    """Rend au pool la connexion de la requête Flask courante"""
+    from flask import g
+
+    conn = g.pop('_db_conn', None)
+    if conn is not None:
+        conn.release()
+
+@contextmanager
+def connection():
+    """Connexion du pool le temps d'un bloc `with` (celle de la requête Flask si elle existe)"""
+    conn = get_db()
     try:
-        # First try Flask connection
-        from flask import current_app
-        if current_app and hasattr(current_app, 'extensions') and 'mysql' in current_app.extensions:
-            mysql_connection = current_app.extensions['mysql'].connection
-            if mysql_connection:
-                # Test connection
-                try:
-                    cursor = mysql_connection.cursor()
-                    cursor.execute("SELECT 1")
-                    cursor.close()
-                    logger.debug("✅ Using existing Flask MySQL connection")
-                    return mysql_connection
-                except Exception as test_error:
-                    logger.warning(f"⚠️ Flask connection test failed: {test_error}")
-                    # Continue to create new connection
+        yield conn
+    finally:
+        conn.close()
+
+def _fetch_rows(conn, query: str, params: Optional[Sequence[Any]] = None) -> List[Row]:
+    # buffered : comme l'ancien DictCursor MySQLdb, résultats lus côté client
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    try:
+        cursor.execute(query, params or ())
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+def _execute(conn, query: str, params: Optional[Sequence[Any]] = None) -> int:
+    cursor = conn.cursor(buffered=True)
+    try:
+        cursor.execute(query, params or ())
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+def fetch_all(query: str, params: Optional[Sequence[Any]] = None) -> List[Row]:
+    """Exécute une requête de lecture et retourne toutes les lignes"""
+    with connection() as conn:
+        return _fetch_rows(conn, query, params)
+
+def fetch_one(query: str, params: Optional[Sequence[Any]] = None) -> Optional[Row]:
+    """Exécute une requête de lecture et retourne la première ligne (ou None)"""
+    rows = fetch_all(query, params)
+    return rows[0] if rows else None
+
+def fetch_table(query: str, params: Optional[Sequence[Any]] = None) -> Tuple[List[str], List[Tuple[Any, ...]]]:
+    """Exécute une requête de lecture et retourne (noms de colonnes, lignes en tuples typés)"""
+    with connection() as conn:
+        cursor = conn.cursor(buffered=True)
+        try:
+            cursor.execute(query, params or ())
+            rows = cursor.fetchall()
+            columns = list(cursor.column_names) if cursor.description else []
+            return columns, rows
+        finally:
+            cursor.close()
+
+def page_query(query: str, limit: int, offset: int) -> str:
+    """Requête enveloppée lisant limit+1 lignes (la ligne en plus signale une suite)"""
+    return f"SELECT * FROM ({query}) AS _page LIMIT {int(limit) + 1} OFFSET {int(offset)}"
+
+def page_statement(query: str) -> str:
+    """Comme page_query pour une instruction préparée : LIMIT et OFFSET liés (même texte pour toutes les pages)"""
+    return f"SELECT * FROM ({query}) AS _page LIMIT %s OFFSET %s"
+
+def count_query(query: str) -> str:
+    """COUNT(*) d'une requête, borné par MAX_EXECUTION_TIME"""
+    return f"SELECT /*+ MAX_EXECUTION_TIME({COUNT_TIMEOUT_MS}) */ COUNT(*) AS total FROM ({query}) AS _count"
+
+def fetch_prepared(query: str, params: Sequence[Any]) -> Tuple[List[str], List[Tuple[Any, ...]]]:
+    """
+    Comme fetch_table, par une instruction préparée côté serveur : préparée une
+    fois par connexion puis réutilisée (voir config.prepared), les valeurs sont
+    envoyées typées par le protocole binaire, jamais insérées dans le SQL.
+    """
+    with connection() as conn:
+        cache = statement_cache(conn.raw)
+        found = cache.get(query)
+        if found is None:
+            statement, cursor = query, conn.cursor(prepared=True)
+            for evicted in cache.put(statement, cursor):
+                _close_cursor(evicted)
+        else:
+            statement, cursor = found
+        try:
+            cursor.execute(statement, tuple(params))
+            rows = cursor.fetchall()
+            columns = list(cursor.column_names) if cursor.description else []
+        except Exception:
+            # Instruction dans un état inconnu : re-préparée au prochain appel
+            cache.discard(statement)
+            _close_cursor(cursor)
+            raise
+        if not cache.enabled:  # cache désactivé : instruction à usage unique
+            _close_cursor(cursor)
+        return columns, rows
+
+def _close_cursor(cursor):
+    try:
+        cursor.close()
     except Exception as e:
-        logger.warning(f"⚠️ Flask context check failed: {e}")
+        logger.warning(f"⚠️ Fermeture d'une instruction préparée impossible : {e}")
 
-    # Fallback to direct connection
-    logger.info("🔄 Creating new direct MySQL connection")
-    return create_direct_connection()
+def fetch_page(query: str, limit: int, offset: int = 0, params: Optional[Sequence[Any]] = None) -> Dict[str, Any]:
+    """
+    Lit au plus `limit` lignes d'une requête à partir de `offset`, sans jamais
+    charger le reste du résultat : la requête est enveloppée dans
+    SELECT * FROM (...) LIMIT limit+1 OFFSET offset (la ligne en plus indique
+    s'il existe une suite). Le total n'est compté que si la page est tronquée.
+    Avec `params` (requête à marqueurs %s, ex. template du cache), la page et
+    le comptage passent par des instructions préparées réutilisées.
+    Returns:
+        dict: columns, rows (tuples typés), has_more, total (None si inconnu)
+    """
+    inner = query.strip().rstrip(';')
+    limit, offset = int(limit), int(offset)
+    try:
+        if params is None:
+            columns, rows = fetch_table(page_query(inner, limit, offset))
+        else:
+            columns, rows = fetch_prepared(page_statement(inner), (*params, limit + 1, offset))
+    except mysql_connector.Error as e:
+        if e.errno != ER_DUP_FIELDNAME:
+            raise
+        return _fetch_page_streamed(inner, limit, offset, params)
 
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    total = count_rows(inner, params) if has_more else offset + len(rows)
+    return {'columns': columns, 'rows': rows, 'has_more': has_more, 'total': total}
+
+def count_rows(query: str, params: Optional[Sequence[Any]] = None) -> Optional[int]:
+    """Nombre de lignes d'une requête, borné dans le temps (None si trop long ou impossible)"""
+    try:
+        if params is None:
+            row = fetch_one(count_query(query))
+            return int(row['total'])
+        _, rows = fetch_prepared(count_query(query), params)
+        return int(rows[0][0])
+    except Exception as e:
+        logger.warning(f"⚠️ Comptage des lignes impossible : {e}")
+        return None
+
+def _fetch_page_streamed(query: str, limit: int, offset: int, params: Optional[Sequence[Any]] = None) -> Dict[str, Any]:
+    """
+    Repli de fetch_page pour les requêtes qui ne peuvent pas être enveloppées
+    (colonnes homonymes) : lecture par paquets sur un curseur non bufferisé
+    jusqu'à la ligne qui suit la page, seules les lignes de la page sont
+    gardées en mémoire ; le total est compté à part (count_rows).
+    """
+    conn = get_pool().acquire()
+    cursor = None
+    clean = False
+    try:
+        # Curseur préparé à usage unique : ses lignes sont lues au fil de l'eau
+        cursor = conn.cursor(buffered=False) if params is None else conn.cursor(prepared=True)
+        if params is None:
+            cursor.execute(query)
+        else:
+            cursor.execute(query, tuple(params))
+        columns = list(cursor.column_names)
+        rows, seen = [], 0
+        while seen <= offset + limit:
+            batch = cursor.fetchmany(min(500, offset + limit + 1 - seen))
+            if not batch:
+                break
+            rows.extend(batch[max(0, offset - seen):max(0, offset + limit - seen)])
+            seen += len(batch)
+        has_more = seen > offset + limit
+        clean = not has_more
+    finally:
+        if clean:
+            try:
+                cursor.close()
+                conn.release()
+            except Exception as e:
+                logger.warning(f"⚠️ Connexion retirée du pool après une lecture par paquets : {e}")
+                conn.release(discard=True)
+        else:
+            # Suite du résultat non lue (ou erreur) : connexion fermée plutôt que vidée ligne à ligne
+            conn.release(discard=True)
+
+    total = count_rows(query, params) if has_more else offset + len(rows)
+    return {'columns': columns, 'rows': rows, 'has_more': has_more, 'total': total}
+
+def execute(query: str, params: Optional[Sequence[Any]] = None) -> int:
+    """Exécute une requête d'écriture et retourne le nombre de lignes affectées"""
+    with connection() as conn:
+        rowcount = _execute(conn, query, params)
+        conn.commit()
+        notify_write(query)
+        return rowcount
+
+class Transaction:
+    """Lectures et écritures d'un bloc transaction(), toutes sur sa connexion"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.writes: List[str] = []
+
+    def fetch_all(self, query: str, params: Optional[Sequence[Any]] = None) -> List[Row]:
+        return _fetch_rows(self.conn, query, params)
+
+    def fetch_one(self, query: str, params: Optional[Sequence[Any]] = None) -> Optional[Row]:
+        rows = _fetch_rows(self.conn, query, params)
+        return rows[0] if rows else None
+
+    def execute(self, query: str, params: Optional[Sequence[Any]] = None) -> int:
+        rowcount = _execute(self.conn, query, params)
+        self.writes.append(query)
+        return rowcount
+
+@contextmanager
+def transaction() -> Iterator[Transaction]:
+    """
+    Plusieurs requêtes dans une seule transaction, sur une seule connexion :
+    validées ensemble à la fin du bloc, annulées si une exception en sort.
+    Les caches ne sont invalidés (notify_write) qu'après la validation.
+    Vérifier puis écrire : lire avec SELECT ... FOR UPDATE pour bloquer les
+    requêtes concurrentes jusqu'à la validation.
+    """
+    with connection() as conn:
+        conn.start_transaction()
+        tx = Transaction(conn)
+        try:
+            yield tx
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        for query in tx.writes:
+            notify_write(query)
+
+def stream(query: str, params: Optional[Sequence[Any]] = None, batch_size: int = 500) -> Iterator[Row]:
+    """
+    Parcourt un résultat volumineux sans le charger en mémoire (curseur non
+    bufferisé, lecture par paquets). Utilise sa propre connexion du pool,
+    rendue à la fin du parcours ou à la fermeture du générateur.
+    """
+    conn = get_pool().acquire()
+    cursor = None
+    clean = False
+    try:
+        cursor = conn.cursor(dictionary=True, buffered=False)
+        cursor.execute(query, params or ())
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+        clean = True
+    finally:
+        try:
+            if not clean:
+                # Parcours interrompu : vider le résultat avant de rendre la connexion
+                conn.consume_results()
+            if cursor:
+                cursor.close()
+            conn.release()
+        except Exception as e:
+            logger.warning(f"⚠️ Connexion retirée du pool après un parcours interrompu : {e}")
+            conn.release(discard=True)
 
 def get_db_connection():
-    """Retourne une instance SQLDatabase de LangChain (pour l'assistant)"""
+    """Retourne une instance SQLDatabase de LangChain (pour l'assistant), branchée sur le pool partagé"""
     try:
         db_user = os.getenv('MYSQL_USER')
-        db_password = quote_plus(os.getenv('MYSQL_PASSWORD'))
         db_host = os.getenv('MYSQL_HOST')
         db_name = os.getenv('MYSQL_DATABASE')
         
         # Validation
-        if not all([db_user, db_password, db_host, db_name]):
+        if not all([db_user, os.getenv('MYSQL_PASSWORD'), db_host, db_name]):
             raise ValueError("Variables de connexion DB manquantes")
         
-        db_uri = f"mysql+pymysql://{db_user}:{db_password}@{db_host}/{db_name}"
-        db = SQLDatabase.from_uri(db_uri)
+        # Même driver et mêmes connexions que le reste de l'application :
+        # SQLAlchemy ne garde aucun pool propre, chaque connexion est empruntée
+        # au pool partagé et lui est rendue à la fermeture.
+        engine = create_engine(
+            f"mysql+mysqlconnector://{db_user}@{db_host}/{db_name}",
+            creator=lambda: get_pool().acquire(),
+            poolclass=NullPool
+        )
+        # La réflexion des tables est servie par l'instantané du schéma
+        db = ExtendedSQLDatabase(engine, lazy_table_reflection=True)
         
         # Test de connexion
         db.run("SELECT 1")
@@ -119,70 +415,94 @@ def get_db_connection():
 
 class ExtendedSQLDatabase(SQLDatabase):
     def __init__(self, engine, **kwargs):
+        self.schema_snapshot = SchemaSnapshot(self)
         super().__init__(engine, **kwargs)
-        self.config = {
-            'host': os.getenv('MYSQL_HOST'),
-            'user': os.getenv('MYSQL_USER'),
-            'password': os.getenv('MYSQL_PASSWORD'),
-            'database': os.getenv('MYSQL_DATABASE'),
-        }
+
+    def get_usable_table_names(self):
+        if self.schema_snapshot.building:
+            return super().get_usable_table_names()
+        try:
+            return self.schema_snapshot.table_names()
+        except Exception as e:
+            logger.warning(f"⚠️ Instantané du schéma indisponible : {e}")
+            return super().get_usable_table_names()
+
+    def get_table_info(self, table_names=None):
+        if self.schema_snapshot.building:
+            return super().get_table_info(table_names)
+        try:
+            return self.schema_snapshot.table_info(table_names)
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ Instantané du schéma indisponible : {e}")
+            return super().get_table_info(table_names)
 
     def get_schema(self):
         try:
-            return self.run("SHOW TABLES")
+            return self.schema_snapshot.table_names()
         except Exception as e:
             logger.error(f"Erreur get_schema : {e}")
-            return {}
-    def get_connection(self):
-        try:
-            conn = mysql_connector.connect(**self.config)
+            return []
 
-            conn.ping(reconnect=True)
-            logger.info("[🔗] Connexion à la base de données établie.")
-            return conn
-        except mysql.connector.Error as err:
-            logger.error(f"[❌] Erreur MySQL: {err}")
-            raise
+    def get_foreign_key_relations(self):
+        return self.schema_snapshot.foreign_keys()
 
     def execute_query(self, query, params=None, fetch=True):
-        conn = self.get_connection()
-        cursor = conn.cursor(dictionary=True)
         try:
             logger.info(f"[SQL EXECUTE] Requête exécutée:\n{query}")
             if params:
                 logger.info(f"[SQL PARAMS] Paramètres: {params}")
             
-            cursor.execute(query, params or ())
             if fetch:
-                results = cursor.fetchall()
-                conn.commit()
+                results = fetch_all(query, params)
                 logger.info(f"[SQL RESULT] {len(results)} lignes retournées")
                 return {'success': True, 'data': results}
-            conn.commit()
+            execute(query, params)
             return {'success': True}
         except Exception as e:
             logger.error(f"[SQL ERROR] Erreur d'exécution: {e}")
             return {'success': False, 'error': str(e)}
-        finally:
-            cursor.close()
-            conn.close()
+
+    def execute_table(self, query, params=None):
+        """Comme execute_query, mais retourne les noms de colonnes et des tuples typés"""
+        try:
+            logger.info(f"[SQL EXECUTE] Requête exécutée:\n{query}")
+            columns, rows = fetch_table(query, params)
+            logger.info(f"[SQL RESULT] {len(rows)} lignes retournées")
+            return {'success': True, 'columns': columns, 'rows': rows}
+        except Exception as e:
+            logger.error(f"[SQL ERROR] Erreur d'exécution: {e}")
+            return {'success': False, 'error': str(e)}
+
+    def execute_page(self, query, limit, offset=0, scope=None, params=None):
+        """
+        Comme execute_table, limité à une page de `limit` lignes à partir de `offset`.
+        Servi par le cache de résultats (clé : SQL normalisé + paramètres + périmètre
+        `scope`) si possible. Avec `params`, instructions préparées (voir fetch_page).
+        """
+        cache = get_result_cache()
+        key = cache.key(query, scope, limit, offset, params)
+        cached = cache.get(key)
+        if cached is not None:
+            logger.info(f"[SQL CACHE] Page servie depuis le cache de résultats (limit={limit}, offset={offset})")
+            return cached
+        try:
+            logger.info(f"[SQL EXECUTE] Requête exécutée (limit={limit}, offset={offset}):\n{query}")
+            if params:
+                logger.info(f"[SQL PARAMS] Paramètres: {params}")
+            page = fetch_page(query, limit, offset, params)
+            logger.info(f"[SQL RESULT] {len(page['rows'])} lignes retournées (total: {page['total']})")
+        except Exception as e:
+            logger.error(f"[SQL ERROR] Erreur d'exécution: {e}")
+            return {'success': False, 'error': str(e)}
+        result = {'success': True, **page}
+        cache.put(key, result, referenced_tables(query))
+        return result
 
     def get_simplified_relations_text(self):
         try:
-            fk_relations = self.get_foreign_key_relations()
-            simplified = {}
-            for row in fk_relations:
-                table = row['TABLE_NAME']
-                referenced_table = row['REFERENCED_TABLE_NAME']
-                if table not in simplified:
-                    simplified[table] = set()
-                simplified[table].add(referenced_table)
-
-            lines = ["Relations clés principales entre tables :\n"]
-            for table, references in simplified.items():
-                line = f"- {table} liée à " + ", ".join(sorted(references)) + "."
-                lines.append(line)
-            return "\n".join(lines)
+            return self.schema_snapshot.relations_text()
         except Exception as e:
             logger.error(f"Erreur get_simplified_relations_text : {e}")
             return ""
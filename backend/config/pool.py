@@ -0,0 +1,404 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    """Aucune connexion disponible dans le délai imparti"""
+
+
+class _PoolEntry:
+    __slots__ = ("raw", "created_at", "last_used")
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class PooledConnection:
+    """
+    Connexion empruntée au pool. S'utilise comme la connexion du driver ;
+    close() la rend au pool au lieu de la fermer (appel idempotent).
+    Une connexion "request_scoped" (liée à une requête Flask) ignore close() :
+    elle est rendue par le teardown de la requête.
+    """
+
+    __slots__ = ("_pool", "_entry", "request_scoped")
+
+    def __init__(self, pool: "ConnectionPool", entry: _PoolEntry, request_scoped: bool = False):
+        self._pool = pool
+        self._entry = entry
+        self.request_scoped = request_scoped
+
+    @property
+    def closed(self) -> bool:
+        return self._entry is None
+
+    @property
+    def raw(self):
+        if self._entry is None:
+            raise RuntimeError("Connexion déjà rendue au pool")
+        return self._entry.raw
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def __setattr__(self, name, value):
+        # Les attributs du driver (ex. autocommit) sont écrits sur la connexion réelle
+        if name in PooledConnection.__slots__:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.raw, name, value)
+
+    def close(self):
+        if not self.request_scoped:
+            self.release()
+
+    def release(self, discard: bool = False):
+        entry, self._entry = self._entry, None
+        if entry is not None:
+            self._pool._release(entry, discard=discard)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class _BasePool:
+    """Réglages, compteurs et métriques communs aux pools synchrone et asyncio"""
+
+    def __init__(self,
+                 min_size: int = 2,
+                 max_size: int = 10,
+                 idle_check_after: float = 30.0,
+                 max_lifetime: float = 1800.0,
+                 acquire_timeout: float = 10.0):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Tailles de pool invalides")
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_check_after = idle_check_after
+        self.max_lifetime = max_lifetime
+        self.acquire_timeout = acquire_timeout
+
+        self._idle = deque()
+        self._size = 0
+        self._stats = {
+            "created": 0,
+            "closed": 0,
+            "recycled": 0,
+            "health_checks": 0,
+            "health_check_failures": 0,
+            "acquired": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "wait_time_total": 0.0,
+        }
+
+    def _build_metrics(self, stats: Dict[str, Any], idle: int, size: int) -> Dict[str, Any]:
+        waits = stats.pop("wait_time_total")
+        stats.update({
+            "size": size,
+            "idle": idle,
+            "in_use": size - idle,
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "avg_wait_ms": round(waits * 1000 / stats["waits"], 2) if stats["waits"] else 0.0,
+        })
+        return stats
+
+
+class ConnectionPool(_BasePool):
+    """
+    Pool de connexions partagé et thread-safe.
+
+    - min_size connexions ouvertes dès warm(), jamais plus de max_size ;
+    - une connexion inactive depuis plus de idle_check_after secondes est
+      vérifiée (ping) avant d'être prêtée, les autres sont prêtées sans aller-retour ;
+    - une connexion plus vieille que max_lifetime secondes est recyclée ;
+    - metrics() expose l'état du pool et des compteurs cumulés.
+    """
+
+    def __init__(self,
+                 connect: Callable[[], Any],
+                 min_size: int = 2,
+                 max_size: int = 10,
+                 idle_check_after: float = 30.0,
+                 max_lifetime: float = 1800.0,
+                 acquire_timeout: float = 10.0,
+                 ping: Optional[Callable[[Any], None]] = None):
+        super().__init__(min_size, max_size, idle_check_after, max_lifetime, acquire_timeout)
+        self._connect = connect
+        self._ping = ping or (lambda raw: raw.ping(reconnect=False))
+        self._cond = threading.Condition()
+
+    def warm(self):
+        """Ouvre les connexions jusqu'à min_size"""
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                entry = self._open()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            self._release(entry)
+
+    def acquire(self, timeout: Optional[float] = None, request_scoped: bool = False) -> PooledConnection:
+        timeout = self.acquire_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        entry = None
+
+        with self._cond:
+            waited = False
+            while True:
+                if self._idle:
+                    entry = self._idle.pop()  # LIFO : la connexion la plus récemment utilisée
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeoutError(f"Aucune connexion MySQL disponible après {timeout}s")
+                waited = True
+                self._cond.wait(remaining)
+            self._stats["acquired"] += 1
+            if waited:
+                self._stats["waits"] += 1
+                self._stats["wait_time_total"] += time.monotonic() - started
+
+        try:
+            entry = self._validate(entry) if entry is not None else self._open()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        return PooledConnection(self, entry, request_scoped=request_scoped)
+
+    def _open(self) -> _PoolEntry:
+        entry = _PoolEntry(self._connect())
+        with self._cond:
+            self._stats["created"] += 1
+        return entry
+
+    def _validate(self, entry: _PoolEntry) -> _PoolEntry:
+        now = time.monotonic()
+        if now - entry.created_at > self.max_lifetime:
+            self._close_raw(entry.raw)
+            with self._cond:
+                self._stats["recycled"] += 1
+            return self._open()
+
+        if now - entry.last_used > self.idle_check_after:
+            with self._cond:
+                self._stats["health_checks"] += 1
+            try:
+                self._ping(entry.raw)
+            except Exception as e:
+                logger.warning(f"⚠️ Connexion inactive invalide, remplacement : {e}")
+                self._close_raw(entry.raw)
+                with self._cond:
+                    self._stats["health_check_failures"] += 1
+                return self._open()
+        return entry
+
+    def _release(self, entry: _PoolEntry, discard: bool = False):
+        if not discard:
+            try:
+                # Ne jamais rendre une transaction entamée (ou un résultat non lu) à un autre emprunteur
+                if getattr(entry.raw, "in_transaction", False) or getattr(entry.raw, "unread_result", False):
+                    entry.raw.rollback()
+            except Exception:
+                discard = True
+
+        if discard:
+            self._close_raw(entry.raw)
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            return
+
+        entry.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+
+    def _close_raw(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._stats["closed"] += 1
+
+    def close_all(self):
+        """Ferme les connexions inactives (les connexions prêtées seront fermées à leur retour)"""
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+        for entry in idle:
+            self._close_raw(entry.raw)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = dict(self._stats)
+            idle = len(self._idle)
+            size = self._size
+        return self._build_metrics(stats, idle, size)
+
+
+class AsyncConnectionPool(_BasePool):
+    """
+    Équivalent asyncio de ConnectionPool (mêmes réglages et métriques), pour
+    un driver dont connect/ping/rollback/close sont des coroutines.
+    À utiliser depuis une seule boucle d'évènements :
+
+        async with pool.connection() as conn:
+            ...
+    """
+
+    def __init__(self,
+                 connect: Callable[[], Awaitable[Any]],
+                 min_size: int = 2,
+                 max_size: int = 10,
+                 idle_check_after: float = 30.0,
+                 max_lifetime: float = 1800.0,
+                 acquire_timeout: float = 10.0,
+                 ping: Optional[Callable[[Any], Awaitable[Any]]] = None):
+        super().__init__(min_size, max_size, idle_check_after, max_lifetime, acquire_timeout)
+        self._connect = connect
+        self._ping = ping or (lambda raw: raw.ping(reconnect=False))
+        self._cond = asyncio.Condition()
+
+    async def warm(self):
+        """Ouvre les connexions jusqu'à min_size"""
+        while self._size < self.min_size:
+            self._size += 1
+            try:
+                entry = await self._open()
+            except Exception:
+                self._size -= 1
+                raise
+            await self._release(entry)
+
+    @asynccontextmanager
+    async def connection(self, timeout: Optional[float] = None) -> AsyncIterator[Any]:
+        entry = await self._acquire(timeout)
+        try:
+            yield entry.raw
+        finally:
+            await self._release(entry)
+
+    async def _acquire(self, timeout: Optional[float]) -> _PoolEntry:
+        timeout = self.acquire_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        entry = None
+
+        async with self._cond:
+            waited = False
+            while True:
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeoutError(f"Aucune connexion MySQL disponible après {timeout}s")
+                waited = True
+                try:
+                    await asyncio.wait_for(self._cond.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+            self._stats["acquired"] += 1
+            if waited:
+                self._stats["waits"] += 1
+                self._stats["wait_time_total"] += time.monotonic() - started
+
+        try:
+            return await self._validate(entry) if entry is not None else await self._open()
+        except BaseException:
+            async with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    async def _open(self) -> _PoolEntry:
+        entry = _PoolEntry(await self._connect())
+        self._stats["created"] += 1
+        return entry
+
+    async def _validate(self, entry: _PoolEntry) -> _PoolEntry:
+        now = time.monotonic()
+        if now - entry.created_at > self.max_lifetime:
+            await self._close_raw(entry.raw)
+            self._stats["recycled"] += 1
+            return await self._open()
+
+        if now - entry.last_used > self.idle_check_after:
+            self._stats["health_checks"] += 1
+            try:
+                await self._ping(entry.raw)
+            except Exception as e:
+                logger.warning(f"⚠️ Connexion inactive invalide, remplacement : {e}")
+                await self._close_raw(entry.raw)
+                self._stats["health_check_failures"] += 1
+                return await self._open()
+        return entry
+
+    async def _release(self, entry: _PoolEntry):
+        discard = False
+        try:
+            # Ne jamais rendre une transaction entamée (ou un résultat non lu) à un autre emprunteur
+            if getattr(entry.raw, "in_transaction", False) or getattr(entry.raw, "unread_result", False):
+                await entry.raw.rollback()
+        except Exception:
+            discard = True
+
+        async with self._cond:
+            if discard:
+                self._size -= 1
+            else:
+                entry.last_used = time.monotonic()
+                self._idle.append(entry)
+            self._cond.notify()
+        if discard:
+            await self._close_raw(entry.raw)
+
+    async def _close_raw(self, raw):
+        try:
+            await raw.close()
+        except Exception:
+            pass
+        self._stats["closed"] += 1
+
+    async def close_all(self):
+        """Ferme les connexions inactives"""
+        async with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+        for entry in idle:
+            await self._close_raw(entry.raw)
+
+    def metrics(self) -> Dict[str, Any]:
+        return self._build_metrics(dict(self._stats), len(self._idle), self._size)
@@ -0,0 +1,71 @@
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+
+# Instructions préparées côté serveur gardées ouvertes par connexion (LRU)
+PREPARED_STATEMENTS_PER_CONNECTION = int(os.getenv('PREPARED_STATEMENTS_PER_CONNECTION', 64))
+
+
+class StatementCache:
+    """
+    Curseurs préparés (conn.cursor(prepared=True)) d'une connexion, par texte
+    SQL, au plus `capacity` (éviction LRU). Le driver ne re-prépare pas une
+    instruction si on lui repasse le même objet str qu'à la préparation :
+    get() rend donc le texte mémorisé avec son curseur, à passer tel quel à
+    cursor.execute(). Les curseurs évincés sont rendus par put() pour que
+    l'appelant les ferme (synchrone ou asyncio). Avec capacity <= 0, rien
+    n'est gardé : l'appelant ferme le curseur après usage (voir enabled).
+    """
+
+    def __init__(self, capacity: int = PREPARED_STATEMENTS_PER_CONNECTION):
+        self.capacity = capacity
+        self._statements: "OrderedDict[str, Tuple[str, Any]]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def __len__(self) -> int:
+        return len(self._statements)
+
+    def get(self, sql: str) -> Optional[Tuple[str, Any]]:
+        found = self._statements.get(sql)
+        if found is not None:
+            self._statements.move_to_end(sql)
+        return found
+
+    def put(self, sql: str, cursor: Any) -> List[Any]:
+        """Mémorise le curseur préparé de `sql` ; retourne les curseurs évincés"""
+        evicted = []
+        if not self.enabled:
+            return evicted
+        previous = self._statements.pop(sql, None)
+        if previous is not None and previous[1] is not cursor:
+            evicted.append(previous[1])
+        self._statements[sql] = (sql, cursor)
+        while len(self._statements) > self.capacity:
+            _, (_, oldest) = self._statements.popitem(last=False)
+            evicted.append(oldest)
+        return evicted
+
+    def discard(self, sql: str) -> Optional[Any]:
+        """Oublie l'instruction (ex. après une erreur) ; retourne son curseur"""
+        found = self._statements.pop(sql, None)
+        return found[1] if found is not None else None
+
+
+# Un cache par connexion réelle du driver : il disparaît avec elle (connexion
+# recyclée ou retirée du pool), comme ses instructions côté serveur
+_caches: "weakref.WeakKeyDictionary[Any, StatementCache]" = weakref.WeakKeyDictionary()
+_caches_lock = threading.Lock()
+
+
+def statement_cache(raw_connection: Any) -> StatementCache:
+    """Cache des instructions préparées d'une connexion du driver (pas du PooledConnection)"""
+    with _caches_lock:
+        cache = _caches.get(raw_connection)
+        if cache is None:
+            cache = _caches[raw_connection] = StatementCache()
+        return cache
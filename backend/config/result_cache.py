@@ -0,0 +1,239 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set
+
+from security.sql_scope import SQLScopeError, read_tables
+
+logger = logging.getLogger(__name__)
+
+# Budget mémoire du cache de résultats (0 pour le désactiver) et TTL par défaut
+RESULT_CACHE_MAX_BYTES = int(os.getenv('RESULT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+RESULT_CACHE_TTL = float(os.getenv('RESULT_CACHE_TTL', 300))
+
+# TTL plus courts pour les tables souvent modifiées hors de cette application.
+# Surchargeable : RESULT_CACHE_TABLE_TTLS="paiement=30,inscriptioneleve=120"
+DEFAULT_TABLE_TTLS = {
+    'paiement': 60,
+    'paiementmotif': 60,
+    'inscriptioneleve': 120,
+    'absence': 120,
+    'notification': 30,
+}
+
+_TABLE_NAME = r"`?(?:\w+`?\.`?)?(\w+)`?"
+_JOINED_TABLES = re.compile(rf"\bJOIN\s+{_TABLE_NAME}", re.IGNORECASE)
+# Clause FROM jusqu'au mot-clé suivant, pour les jointures implicites : FROM a x, b y
+_FROM_CLAUSE = re.compile(
+    r"\bFROM\s+(.+?)(?=\b(?:WHERE|GROUP|ORDER|HAVING|LIMIT|UNION|INNER|LEFT|RIGHT|CROSS|NATURAL|JOIN)\b|\)|;|$)",
+    re.IGNORECASE | re.DOTALL
+)
+_FROM_KEYWORD = re.compile(r"\bFROM\b", re.IGNORECASE)
+_LEADING_TABLE = re.compile(_TABLE_NAME)
+_WRITTEN_TABLES = re.compile(
+    rf"^\s*(?:INSERT(?:\s+IGNORE)?\s+INTO|REPLACE\s+INTO|UPDATE|DELETE\s+FROM|TRUNCATE(?:\s+TABLE)?|ALTER\s+TABLE|DROP\s+TABLE)\s+{_TABLE_NAME}",
+    re.IGNORECASE
+)
+
+
+def _table_ttls_from_env() -> Dict[str, float]:
+    ttls = dict(DEFAULT_TABLE_TTLS)
+    for item in os.getenv('RESULT_CACHE_TABLE_TTLS', '').split(','):
+        table, _, ttl = item.partition('=')
+        try:
+            ttls[table.strip().lower()] = float(ttl)
+        except ValueError:
+            continue
+    return ttls
+
+
+def normalize_sql(sql: str) -> str:
+    """Forme canonique pour la clé : espaces compactés, sans point-virgule final"""
+    return re.sub(r'\s+', ' ', sql).strip().rstrip(';').strip()
+
+
+def referenced_tables(sql: str) -> Set[str]:
+    """
+    Tables lues par une requête, tables dérivées et sous-requêtes comprises
+    (arbre syntaxique de security.sql_scope) ; à défaut (requête que l'analyseur
+    refuse), relevé des FROM / JOIN, y compris les jointures par virgule
+    """
+    try:
+        return set(read_tables(sql))
+    except SQLScopeError:
+        pass
+    tables = {name.lower() for name in _JOINED_TABLES.findall(sql)}
+    # Chaque FROM séparément : celui d'une table dérivée est inclus dans la clause englobante
+    for keyword in _FROM_KEYWORD.finditer(sql):
+        clause = _FROM_CLAUSE.match(sql, keyword.start())
+        for part in (clause.group(1).split(',') if clause else []):
+            match = _LEADING_TABLE.match(part.strip())
+            if match:  # une sous-requête "(SELECT ..." a sa propre clause FROM
+                tables.add(match.group(1).lower())
+    return tables
+
+
+def written_tables(sql: str) -> Set[str]:
+    """Table modifiée par une requête d'écriture (ensemble vide pour une lecture)"""
+    return {name.lower() for name in _WRITTEN_TABLES.findall(sql)}
+
+
+class _Entry:
+    __slots__ = ('value', 'size', 'expires_at', 'tables')
+
+    def __init__(self, value: Dict[str, Any], size: int, expires_at: float, tables: Set[str]):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+        self.tables = tables
+
+
+class ResultCache:
+    """
+    Cache des pages de résultats SQL devant l'exécution, clé = SQL normalisé +
+    paramètres liés + périmètre (rôle / parent) + page. Borné en octets avec
+    éviction LRU ; TTL de chaque entrée = le plus court des TTL des tables
+    lues ; une écriture sur une table (invalidate_tables) supprime toutes les
+    entrées qui la lisent.
+
+    L'invalidation ne voit que les écritures de ce processus : les TTL par table
+    bornent la fraîcheur pour les modifications faites ailleurs.
+    """
+
+    def __init__(self,
+                 max_bytes: int = RESULT_CACHE_MAX_BYTES,
+                 default_ttl: float = RESULT_CACHE_TTL,
+                 table_ttls: Optional[Dict[str, float]] = None):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.table_ttls = _table_ttls_from_env() if table_ttls is None else table_ttls
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._by_table: Dict[str, Set[str]] = defaultdict(set)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key(sql: str, scope: Any = None, limit: Optional[int] = None, offset: int = 0,
+            params: Optional[Sequence[Any]] = None) -> str:
+        bound = list(params) if params is not None else None
+        raw = json.dumps([normalize_sql(sql), scope, limit, offset, bound], default=str, ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return dict(entry.value)
+
+    def put(self, key: str, value: Dict[str, Any], tables: Iterable[str]):
+        if not self.enabled:
+            return
+        tables = {table.lower() for table in tables}
+        size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        if size > self.max_bytes:
+            return
+        ttl = min((self.table_ttls.get(table, self.default_ttl) for table in tables), default=self.default_ttl)
+        if ttl <= 0:
+            return
+
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = _Entry(value, size, time.monotonic() + ttl, tables)
+            self._bytes += size
+            for table in tables:
+                self._by_table[table].add(key)
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats['evictions'] += 1
+
+    def invalidate_tables(self, tables: Iterable[str]) -> int:
+        """Supprime les entrées qui lisent l'une de ces tables ; retourne leur nombre"""
+        tables = {table.lower() for table in tables}
+        removed = 0
+        with self._lock:
+            for table in tables:
+                for key in list(self._by_table.get(table, ())):
+                    self._remove(key)
+                    removed += 1
+            self._stats['invalidations'] += removed
+        if removed:
+            logger.info(f"🧹 Cache de résultats : {removed} entrées invalidées ({', '.join(tables)})")
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+            self._bytes = 0
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size
+        for table in entry.tables:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'max_bytes': self.max_bytes, **self._stats}
+
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+_write_listeners: List[Callable[[Set[str]], None]] = []
+
+
+def get_result_cache() -> ResultCache:
+    """Cache de résultats unique du processus"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache()
+    return _cache
+
+
+def on_write(callback: Callable[[Set[str]], None]):
+    """Abonne un autre cache aux écritures : callback(tables modifiées)"""
+    _write_listeners.append(callback)
+
+
+def notify_write(sql: str):
+    """Crochet d'écriture : invalide les résultats qui dépendent de la table modifiée"""
+    tables = written_tables(sql)
+    if not tables:
+        return
+    get_result_cache().invalidate_tables(tables)
+    for callback in list(_write_listeners):
+        try:
+            callback(tables)
+        except Exception as e:
+            logger.error(f"❌ Invalidation après écriture sur {', '.join(sorted(tables))} : {e}")
@@ -0,0 +1,217 @@
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+DEFAULT_SNAPSHOT_PATH = Path(__file__).parent.parent / 'schema_snapshot.json.gz'
+
+# Une seule ligne : nombre de tables/colonnes, checksum des colonnes et dernière création de table.
+# CREATE_TIME (et non UPDATE_TIME) : UPDATE_TIME bouge à chaque écriture de données,
+# ce qui invaliderait l'instantané en permanence.
+FINGERPRINT_QUERY = """
+SELECT
+    (SELECT COUNT(*) FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE()) AS nb_tables,
+    (SELECT MAX(CREATE_TIME) FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE()) AS derniere_creation,
+    COUNT(*) AS nb_colonnes,
+    SUM(CRC32(CONCAT_WS('|', c.TABLE_NAME, c.COLUMN_NAME, c.COLUMN_TYPE, c.IS_NULLABLE, c.COLUMN_KEY))) AS checksum_colonnes
+FROM information_schema.COLUMNS c
+WHERE c.TABLE_SCHEMA = DATABASE()
+"""
+
+COLUMNS_QUERY = """
+SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY
+FROM information_schema.COLUMNS
+WHERE TABLE_SCHEMA = DATABASE()
+ORDER BY TABLE_NAME, ORDINAL_POSITION
+"""
+
+FOREIGN_KEYS_QUERY = """
+SELECT TABLE_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME
+FROM information_schema.KEY_COLUMN_USAGE
+WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL
+ORDER BY TABLE_NAME, COLUMN_NAME
+"""
+
+
+class SchemaSnapshot:
+    """
+    Instantané du schéma MySQL (tables, colonnes, clés étrangères, DDL + lignes
+    d'exemple rendues pour les prompts) construit une seule fois, conservé en
+    mémoire et sérialisé sur disque (JSON compressé).
+
+    L'instantané est invalidé par une empreinte du schéma, vérifiée au plus
+    une fois toutes les `check_interval` secondes (SCHEMA_CHECK_INTERVAL).
+    """
+
+    def __init__(self, db, path: Optional[str] = None, check_interval: Optional[float] = None):
+        self.db = db
+        self.path = Path(path or os.getenv('SCHEMA_SNAPSHOT_PATH') or DEFAULT_SNAPSHOT_PATH)
+        self.check_interval = check_interval if check_interval is not None else float(os.getenv('SCHEMA_CHECK_INTERVAL', 300))
+        self._building = threading.local()
+        self._data: Optional[Dict[str, Any]] = None
+        self._checked_at = 0.0
+        self._relations_text: Optional[str] = None
+        self._lock = threading.RLock()
+
+    @property
+    def building(self) -> bool:
+        """
+        Vrai dans le thread qui reconstruit l'instantané (ses appels à la
+        réflexion passent par la base) ; les autres threads attendent le verrou
+        """
+        return getattr(self._building, 'active', False)
+
+    # --- Accès en lecture (mémoire) ---
+
+    def table_names(self) -> List[str]:
+        return list(self.data()['usable_tables'])
+
+    def table_info(self, table_names: Optional[List[str]] = None) -> str:
+        data = self.data()
+        names = data['usable_tables'] if table_names is None else table_names
+        missing = set(names).difference(data['table_info'])
+        if missing:
+            raise ValueError(f"table_names {missing} not found in database")
+        return "\n\n".join(sorted(data['table_info'][name] for name in names))
+
+    def columns(self, table_name: str) -> List[Dict[str, str]]:
+        return self.data()['tables'].get(table_name, {}).get('columns', [])
+
+    def foreign_keys(self) -> List[Dict[str, str]]:
+        return self.data()['foreign_keys']
+
+    def relations_text(self) -> str:
+        """Texte "table liée à ..." calculé une seule fois par version du schéma"""
+        data = self.data()
+        if self._relations_text is None:
+            simplified = {}
+            for row in data['foreign_keys']:
+                simplified.setdefault(row['TABLE_NAME'], set()).add(row['REFERENCED_TABLE_NAME'])
+            lines = ["Relations clés principales entre tables :\n"]
+            for table, references in simplified.items():
+                lines.append(f"- {table} liée à " + ", ".join(sorted(references)) + ".")
+            self._relations_text = "\n".join(lines)
+        return self._relations_text
+
+    # --- Cycle de vie ---
+
+    def data(self) -> Dict[str, Any]:
+        if self._data is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return self._data
+        with self._lock:
+            if self._data is None or time.monotonic() - self._checked_at >= self.check_interval:
+                self._refresh()
+                self._checked_at = time.monotonic()
+        return self._data
+
+    def invalidate(self):
+        """Force une vérification de l'empreinte au prochain accès"""
+        self._checked_at = 0.0
+
+    def _refresh(self):
+        try:
+            fingerprint = self.compute_fingerprint()
+        except Exception as e:
+            if self._data is None:
+                self._data = self._load()
+            if self._data is None:
+                raise
+            logger.warning(f"⚠️ Empreinte du schéma indisponible, instantané existant conservé : {e}")
+            return
+
+        if self._data is not None and self._data['fingerprint'] == fingerprint:
+            return
+        if self._data is None:
+            on_disk = self._load()
+            if on_disk and on_disk['fingerprint'] == fingerprint:
+                logger.info(f"✅ Instantané du schéma chargé depuis {self.path}")
+                self._data = on_disk
+                return
+
+        logger.info("🔄 Schéma absent ou modifié : reconstruction de l'instantané")
+        self._data = self._build(fingerprint)
+        self._relations_text = None
+        self._save(self._data)
+
+    def compute_fingerprint(self) -> str:
+        row = self._query(FINGERPRINT_QUERY)[0]
+        return "{nb_tables}:{nb_colonnes}:{checksum_colonnes}:{derniere_creation}".format(**row)
+
+    def _build(self, fingerprint: str) -> Dict[str, Any]:
+        from langchain_community.utilities import SQLDatabase
+
+        started = time.monotonic()
+        tables = {}
+        for row in self._query(COLUMNS_QUERY):
+            tables.setdefault(row['TABLE_NAME'], {'columns': []})['columns'].append({
+                'name': row['COLUMN_NAME'],
+                'type': row['COLUMN_TYPE'],
+                'nullable': row['IS_NULLABLE'] == 'YES',
+                'key': row['COLUMN_KEY']
+            })
+
+        foreign_keys = self._query(FOREIGN_KEYS_QUERY)
+
+        # Rendu LangChain (DDL + lignes d'exemple), une table à la fois, une seule fois
+        self._building.active = True
+        try:
+            usable_tables = sorted(SQLDatabase.get_usable_table_names(self.db))
+            table_info = {}
+            for name in usable_tables:
+                try:
+                    table_info[name] = SQLDatabase.get_table_info(self.db, [name])
+                except Exception as e:
+                    logger.warning(f"⚠️ Table {name} ignorée dans l'instantané : {e}")
+        finally:
+            self._building.active = False
+
+        logger.info(f"✅ Instantané du schéma construit ({len(table_info)} tables) en {time.monotonic() - started:.1f}s")
+        return {
+            'version': SNAPSHOT_VERSION,
+            'fingerprint': fingerprint,
+            'created_at': datetime.now().isoformat(),
+            'usable_tables': [name for name in usable_tables if name in table_info],
+            'tables': tables,
+            'foreign_keys': foreign_keys,
+            'table_info': table_info
+        }
+
+    def _query(self, sql: str) -> List[Dict[str, Any]]:
+        result = self.db.execute_query(sql)
+        if not result['success']:
+            raise RuntimeError(result['error'])
+        return result['data']
+
+    # --- Persistance ---
+
+    def _load(self) -> Optional[Dict[str, Any]]:
+        if not self.path.exists():
+            return None
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != SNAPSHOT_VERSION:
+                return None
+            return data
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Instantané du schéma illisible ({self.path}) : {e}")
+            return None
+
+    def _save(self, data: Dict[str, Any]):
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        try:
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, separators=(',', ':'), default=str)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"⚠️ Impossible d'écrire l'instantané du schéma : {e}")
+            tmp_path.unlink(missing_ok=True)
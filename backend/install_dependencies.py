@@ -27,8 +27,7 @@ def install_basic_requirements():
         "flask-cors==4.0.0",
 
         # DB + ORM
-        "mysql-connector-python==8.2.0",
-        "PyMySQL==1.1.0",
+        "mysql-connector-python==9.1.0",
         "SQLAlchemy==2.0.23",
 
         # Config et logs
@@ -47,6 +46,7 @@ def install_extended_requirements():
         "pandas",
         "matplotlib",
         "tabulate",
+        "scikit-learn",
 
         # API alternative (FastAPI)
         "fastapi",
@@ -67,7 +67,8 @@ def install_optional_requirements():
         ("tiktoken", "Tokenizer OpenAI"), 
         ("langchain", "Framework Langchain"),
         ("langchain-community", "Langchain Community"),
-        ("openai", "Client OpenAI")
+        ("openai", "Client OpenAI"),
+        ("sentence-transformers", "Embeddings locaux (cache sémantique)")
     ]
     
     print("\n📦 Installation des packages IA optionnels...")
@@ -114,6 +115,7 @@ def test_imports():
         ("pandas", "Pandas"),
         ("matplotlib", "Matplotlib"),
         ("tabulate", "Tabulate"),
+        ("sklearn", "scikit-learn"),
         ("pydantic", "Pydantic"),
         ("fastapi", "FastAPI"),
         ("uvicorn", "Uvicorn")
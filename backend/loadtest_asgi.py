@@ -0,0 +1,218 @@
+# loadtest_asgi.py - Charge concurrente : attentes LLM bloquantes (threads) vs asyncio
+#
+# Mode "stub" (par défaut, autonome) : un faux LLM local répond en --latency secondes ;
+# on envoie --requests appels avec
+#   - le client synchrone partagé et --threads threads (modèle Flask : un thread par requête) ;
+#   - le client asyncio du mode ASGI, tous les appels lancés d'un coup.
+#
+#   python loadtest_asgi.py --requests 200 --latency 2.0 --threads 16
+#
+# Le gain attendu est borné par le CPU disponible : avec des centaines de connexions
+# ouvertes d'un coup, le coût client (httpx/openai) domine sur une machine à un cœur.
+#
+# Mode "http" : même charge contre un serveur déjà lancé (Flask ou uvicorn asgi_app:app),
+# pour comparer les deux modes de service de bout en bout :
+#
+#   python loadtest_asgi.py --url http://localhost:5000/api/ask --token <JWT> --requests 200
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+MESSAGES = [{"role": "user", "content": "Combien d'élèves sont inscrits ?"}]
+
+
+class StubLLM:
+    """
+    Faux /v1/chat/completions asyncio (keep-alive) à latence fixe, dans son
+    propre processus pour ne pas disputer le GIL aux clients mesurés.
+    """
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.port = None
+        self._in_flight = multiprocessing.Value("i", 0)
+        self._max_in_flight = multiprocessing.Value("i", 0)
+        self._process = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    @property
+    def max_in_flight(self):
+        return self._max_in_flight.value
+
+    @max_in_flight.setter
+    def max_in_flight(self, value):
+        self._max_in_flight.value = value
+
+    def start(self):
+        ports = multiprocessing.Queue()
+        self._process = multiprocessing.Process(target=self._run, args=(ports,), daemon=True)
+        self._process.start()
+        self.port = ports.get(timeout=10)
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+
+    def _run(self, ports):
+        async def serve():
+            server = await asyncio.start_server(self._handle, "127.0.0.1", 0, backlog=4096)
+            ports.put(server.sockets[0].getsockname()[1])
+            async with server:
+                await server.serve_forever()
+
+        asyncio.run(serve())
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                length = 0
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header.decode("latin-1").partition(":")
+                    if name.strip().lower() == "content-length":
+                        length = int(value.strip())
+                body = json.loads(await reader.readexactly(length)) if length else {}
+
+                self._in_flight.value += 1
+                self._max_in_flight.value = max(self._max_in_flight.value, self._in_flight.value)
+                try:
+                    await asyncio.sleep(self.latency)
+                finally:
+                    self._in_flight.value -= 1
+
+                payload = json.dumps({
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "stub"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "SELECT COUNT(*) FROM eleve"},
+                        "finish_reason": "stop"
+                    }],
+                    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+                }).encode("utf-8")
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(payload)}\r\n\r\n".encode("ascii")
+                    + payload
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def report(label: str, latencies, elapsed: float, errors: int = 0, max_in_flight=None):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0.0
+    line = (f"{label:<10} {len(latencies):>5} ok  {errors:>4} erreurs  "
+            f"{len(latencies) / elapsed:>8.1f} req/s  "
+            f"p50 {statistics.median(latencies) if latencies else 0:.2f}s  p95 {p95:.2f}s  "
+            f"durée {elapsed:.1f}s")
+    if max_in_flight is not None:
+        line += f"  en vol max {max_in_flight}"
+    print(line)
+
+
+def run_sync(stub: StubLLM, requests: int, threads: int):
+    from agent.llm_utils import LLMClient
+
+    client = LLMClient(api_key="stub", base_url=stub.base_url, max_concurrency=threads, pool_size=threads)
+    stub.max_in_flight = 0
+
+    def call(_):
+        started = time.perf_counter()
+        client.chat(MESSAGES)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = list(executor.map(call, range(requests)))
+    report("threads", latencies, time.perf_counter() - started, max_in_flight=stub.max_in_flight)
+    client.close()
+
+
+async def run_async(stub: StubLLM, requests: int):
+    from agent.llm_utils import AsyncLLMClient
+
+    client = AsyncLLMClient(api_key="stub", base_url=stub.base_url, max_concurrency=requests)
+    stub.max_in_flight = 0
+
+    async def call():
+        started = time.perf_counter()
+        await client.chat(MESSAGES)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(call() for _ in range(requests)))
+    report("asyncio", latencies, time.perf_counter() - started, max_in_flight=stub.max_in_flight)
+    await client.close()
+
+
+async def run_http(url: str, token: str, question: str, requests: int, concurrency: int):
+    import httpx
+
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async with httpx.AsyncClient(timeout=120, limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def call():
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.post(url, json={"question": question}, headers=headers)
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - started)
+                except httpx.HTTPError:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(call() for _ in range(requests)))
+    report("http", latencies, time.perf_counter() - started, errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge du mode ASGI")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=2.0, help="latence du faux LLM (s)")
+    parser.add_argument("--threads", type=int, default=16, help="threads du scénario synchrone")
+    parser.add_argument("--url", help="mode http : URL de /api/ask d'un serveur lancé")
+    parser.add_argument("--token", default="", help="mode http : JWT Bearer")
+    parser.add_argument("--question", default="Combien d'élèves sont inscrits ?")
+    parser.add_argument("--concurrency", type=int, default=200, help="mode http : requêtes simultanées")
+    args = parser.parse_args()
+
+    if args.url:
+        asyncio.run(run_http(args.url, args.token, args.question, args.requests, args.concurrency))
+        return
+
+    stub = StubLLM(args.latency)
+    stub.start()
+    print(f"Faux LLM sur {stub.base_url}, latence {args.latency}s, {args.requests} requêtes")
+    try:
+        run_sync(stub, args.requests, args.threads)
+        asyncio.run(run_async(stub, args.requests))
+    finally:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
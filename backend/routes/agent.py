@@ -4,38 +4,45 @@ from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_req
 import time
 import logging
 import traceback
-from config.database import init_db, get_db, get_db_connection
+from config.database import get_db_connection
 import re 
 from agent.sql_agent import SQLAgent 
-from agent.pdf_utils.attestation import export_attestation_pdf
+from agent.pipeline import AskPipeline, PipelineExecutionError
+from agent.renderers import OUTPUT_FORMATS
+from agent.pagination import InvalidPageToken
+from agent.pdf_utils.attestation import attestation_for_question
+from agent.precompute import (PRECOMPUTE_LLM_RATE, PRECOMPUTE_WORKERS, clamp_workers, parse_questions,
+                              precompute_status, questions_from_rows, start_precompute)
 import os
 
-from flask import Blueprint, request, jsonify,g
+from flask import Blueprint, request, jsonify, g, Response, stream_with_context
 from flask_jwt_extended import get_jwt_identity,verify_jwt_in_request,get_jwt, get_jwt_identity
 import logging
 import traceback
 import datetime
+import json
 from routes.auth import login
 from services.auth_service import AuthService
+from services.children_scope import CHILDREN_SCOPE_PRELOAD, get_children_scope, prime_from_claims
 
 agent_bp = Blueprint('agent_bp', __name__)
 logger = logging.getLogger(__name__)
 
 
 assistant = None
+pipeline = None
 engine = SQLAgent(get_db_connection())
-def validate_name(full_name):
-    """Valide le format du nom"""
-    return bool(re.match(r'^[A-Za-zÀ-ÿ\s\-\']{3,50}$', full_name))
-
 def initialize_assistant():
     """Initialise l'assistant avec gestion d'erreurs"""
-    global assistant
+    global assistant, pipeline
     try:
         from agent.assistant import SQLAssistant
         
         # Tentative d'initialisation
         assistant = SQLAssistant()
+        pipeline = AskPipeline(assistant, engine)
+        if CHILDREN_SCOPE_PRELOAD:
+            get_children_scope().preload()
         
         if assistant and assistant.db:
             print("✅ Assistant initialisé avec succès")
@@ -47,15 +54,14 @@ def initialize_assistant():
     except Exception as e:
         print(f"❌ Erreur initialisation assistant: {e}")
         assistant = None
+        pipeline = None
         return False
 
 # Initialisation au chargement du module
 initialize_assistant()
 
-@agent_bp.route('/ask', methods=['POST'])
-def ask_sql():
-    """Version corrigée pour lire le JWT avec claims"""
-    
+def get_current_user():
+    """Lit le JWT optionnel et renvoie (current_user, jwt_valid, jwt_error)"""
     jwt_valid = False
     current_user = None
     jwt_error = None
@@ -82,6 +88,7 @@ def ask_sql():
                         'roles': jwt_claims.get('roles', []),
                         'username': jwt_claims.get('username', '')
                     }
+                    prime_from_claims(jwt_claims)
                     jwt_valid = True
                     
             except Exception as jwt_exc:
@@ -92,6 +99,23 @@ def ask_sql():
     except Exception as e:
         jwt_error = str(e)
         print(f"DEBUG - Erreur générale JWT: {jwt_error}")
+
+    return current_user, jwt_valid, jwt_error
+
+QUESTION_FIELDS = ['question', 'subject', 'query', 'text', 'message', 'prompt']
+
+def extract_question(data):
+    """Renvoie la question du corps JSON (premier champ connu non vide)"""
+    for field in QUESTION_FIELDS:
+        if field in data and data[field] and str(data[field]).strip():
+            return str(data[field]).strip()
+    return None
+
+@agent_bp.route('/ask', methods=['POST'])
+def ask_sql():
+    """Version corrigée pour lire le JWT avec claims"""
+    
+    current_user, jwt_valid, jwt_error = get_current_user()
     
     try:
         if not request.is_json:
@@ -101,21 +125,24 @@ def ask_sql():
         if not data:
             return jsonify({"error": "Corps de requête JSON vide"}), 400
         
-        # Extraction de la question
-        question = None
-        possible_fields = ['question', 'subject', 'query', 'text', 'message', 'prompt']
+        # Extraction de la question (inutile pour une page suivante : page_token)
+        question = extract_question(data)
+        page_token = data.get('page_token')
         
-        for field in possible_fields:
-            if field in data and data[field] and str(data[field]).strip():
-                question = str(data[field]).strip()
-                break
-        
-        if not question:
+        if not question and not page_token:
             return jsonify({
                 "error": "Question manquante",
-                "expected_fields": possible_fields,
+                "expected_fields": QUESTION_FIELDS,
                 "received_fields": list(data.keys())
             }), 422
+
+        # Format de la réponse texte : text (défaut), json ou csv
+        output_format = data.get('format', 'text')
+        if output_format not in OUTPUT_FORMATS:
+            return jsonify({
+                "error": "Format de sortie invalide",
+                "expected_formats": list(OUTPUT_FORMATS)
+            }), 422
         
         user_id = current_user.get('idpersonne') if current_user else None
         roles = current_user.get('roles', []) if current_user else []
@@ -129,90 +156,38 @@ def ask_sql():
                     "error": "Assistant non disponible",
                     "details": "Impossible d'initialiser l'assistant IA"
                 }), 503
-        if "attestation" in question.lower():
-            
-            name_match = re.search(
-                r"(?:attestation\s+(?:de|pour)\s+)([A-Za-zÀ-ÿ\s\-\']+)", 
-                question, 
-                re.IGNORECASE
-            )
-            
-            if not name_match:
-                return jsonify({
-                    "response": "Veuillez spécifier un nom (ex: 'attestation de Nom Prénom')"
-                })
-
-            full_name = name_match.group(1).strip()
-            
-            if not validate_name(full_name):
-                return jsonify({
-                    "response": "Format de nom invalide. Utilisez uniquement des lettres et espaces"
-                })
-            print(f"Recherche élève pour nom complet : {full_name}")
-
-
-
-            # Récupération des données
-            student_data = engine.get_student_info_by_name(full_name)
-            
-            print(f"Résultat de recherche: {student_data}")
-            
-            if not student_data:
-                return jsonify({
-                    "response": f"Aucun élève trouvé avec le nom '{full_name}'"
-                })
-
-            # Harmoniser les champs pour le PDF
-            student_data['nom_complet'] = student_data['nom']
-            student_data['lieu_naissance'] = student_data['lieu_de_naissance']
-            student_data['annee_scolaire'] = "2024/2025"
-
-
-            # Génération du PDF
-            try:
-                pdf_path = export_attestation_pdf(student_data)
-
-                filename = os.path.basename(pdf_path)
-                
-                return jsonify({
-                "response": (
-                    f"✅ Attestation générée pour {student_data['nom_complet']}\n\n"
-                    f"<a href='/static/attestations/{filename}' download>Télécharger</a>"
-                ),
-                "pdf_url": f"/static/attestations/{filename}"
-            })
-
-            except Exception as e:
-                logger.error(f"Erreur génération PDF: {str(e)}")
-                return jsonify({
-                    "response": "Erreur lors de la génération du document"
-                })
-
-        try:
-            sql_query, response = assistant.ask_question(question)
 
-            # 🔥 Exécution de la requête SQL
+        if page_token:
             try:
-                rows = engine.execute_natural_query(question)  # Doit retourner List[Dict]
-            except Exception as e:
-                logger.error(f"Erreur d'exécution SQL : {e}")
+                result = pipeline.run_page(page_token, user_id, output_format)
+            except InvalidPageToken as e:
+                return jsonify({"error": "page_token invalide", "details": str(e)}), 400
+            except PipelineExecutionError as e:
                 return jsonify({
                     "error": "Erreur d'exécution SQL",
-                    "sql_query": sql_query,
-                    "details": str(e)
+                    "sql_query": e.sql_query,
+                    "details": e.details
                 }), 500
+            if jwt_valid:
+                result["user"] = current_user
+            return jsonify(result), 200
+
+        if "attestation" in question.lower():
+            return jsonify(attestation_for_question(question, engine))
 
-            result = {
-                "sql_query": sql_query,
-                "response": response,
-                "status": "success",
-                "question": question,
-                "data": rows
-            }
+        try:
+            result = pipeline.run(question, user_id, roles, output_format)
             if jwt_valid:
                 result["user"] = current_user
 
             return jsonify(result), 200
+
+        except PipelineExecutionError as e:
+            return jsonify({
+                "error": "Erreur d'exécution SQL",
+                "sql_query": e.sql_query,
+                "details": e.details
+            }), 500
         
         except Exception as processing_error:
             logger.error(f"Erreur traitement: {processing_error}")
@@ -221,24 +196,6 @@ def ask_sql():
                 "details": str(processing_error),
                 "question": question
             }), 500
-    
-        
-        sql_query, response = assistant.ask_question(question, user_id, roles)
-        
-        result = {
-            "sql_query": sql_query,
-            "response": response,
-            "status": "success",
-            "question": question,
-            "debug": {
-                "jwt_valid": jwt_valid,
-                "jwt_error": jwt_error,
-                "user_id": user_id,
-                "roles": roles
-            }
-        }
-        
-        return jsonify(result), 200
         
     except Exception as e:
         logger.error(f"Erreur générale: {e}")
@@ -247,6 +204,58 @@ def ask_sql():
             "details": str(e)
         }), 500
 
+def sse_event(event, payload):
+    """Formate un évènement Server-Sent Events"""
+    data = json.dumps(payload, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {data}\n\n"
+
+@agent_bp.route('/ask/stream', methods=['POST'])
+def ask_sql_stream():
+    """Variante streaming (SSE) de /ask : sql, puis rows par paquets, puis le résumé token par token"""
+    current_user, jwt_valid, jwt_error = get_current_user()
+
+    if not request.is_json:
+        return jsonify({"error": "Content-Type application/json requis"}), 415
+
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "Corps de requête JSON vide"}), 400
+
+    question = extract_question(data)
+    if not question:
+        return jsonify({
+            "error": "Question manquante",
+            "expected_fields": QUESTION_FIELDS,
+            "received_fields": list(data.keys())
+        }), 422
+
+    if not assistant:
+        if not initialize_assistant():
+            return jsonify({
+                "error": "Assistant non disponible",
+                "details": "Impossible d'initialiser l'assistant IA"
+            }), 503
+
+    user_id = current_user.get('idpersonne') if current_user else None
+    roles = current_user.get('roles', []) if current_user else []
+
+    def generate():
+        try:
+            for event, payload in pipeline.stream(question, user_id, roles):
+                yield sse_event(event, payload)
+        except Exception as e:
+            logger.error(f"Erreur streaming: {e}")
+            yield sse_event("error", {"message": "Erreur de traitement", "details": str(e)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # désactive le buffering des proxys (nginx)
+        }
+    )
+
 @agent_bp.route('/ask', methods=['GET'])  # Doit correspondre au POST
 def ask_info():
     """Information sur l'endpoint"""
@@ -266,12 +275,59 @@ def health():
         "status": "OK",
         "assistant": "OK" if assistant else "ERROR",
         "database": "OK" if assistant and assistant.db else "ERROR",
-        "timestamp": "2024-01-01T00:00:00Z"  
+        "timestamp": "2024-01-01T00:00:00Z",
+        "templates": assistant.template_matcher.metrics() if assistant else None,
+        "children_scope": get_children_scope().metrics(),
+        "llm_single_flight": assistant.llm_flights.metrics() if assistant else None
     }
     
     status_code = 200 if assistant else 503
     return jsonify(health_status), status_code
 
+@agent_bp.route('/precompute', methods=['POST'])
+def precompute():
+    """
+    Précalcul des requêtes d'une liste de questions (super admin) : fichier
+    `questions` (.jsonl, .json, .csv) ou corps JSON {"questions": [...]}, avec
+    workers et llm_rate facultatifs. Lancé en tâche de fond : 202 + job_id.
+    """
+    current_user, jwt_valid, jwt_error = get_current_user()
+    if not current_user or 'ROLE_SUPER_ADMIN' not in current_user.get('roles', []):
+        return jsonify({"error": "Accès réservé aux super administrateurs", "details": jwt_error}), 403
+
+    if not assistant and not initialize_assistant():
+        return jsonify({"error": "Assistant non disponible"}), 503
+
+    data = request.get_json(silent=True) or {}
+    options = {**request.form.to_dict(), **data}
+    try:
+        upload = request.files.get('questions')
+        if upload is not None:
+            file_format = os.path.splitext(upload.filename or '')[1].lstrip('.').lower() or 'jsonl'
+            items = parse_questions(upload.read().decode('utf-8'), file_format)
+        else:
+            items = questions_from_rows(data.get('questions'))
+        workers = clamp_workers(options.get('workers', PRECOMPUTE_WORKERS))
+        llm_rate = float(options.get('llm_rate', PRECOMPUTE_LLM_RATE))
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"error": "Liste de questions invalide", "details": str(e)}), 422
+    if not items:
+        return jsonify({"error": "Aucune question à précalculer"}), 422
+
+    job_id = start_precompute(assistant, items, workers, llm_rate)
+    return jsonify({"job_id": job_id, "total": len(items)}), 202
+
+@agent_bp.route('/precompute/<job_id>', methods=['GET'])
+def precompute_progress(job_id):
+    """Avancement d'un précalcul : done / total, puis le bilan et les échecs"""
+    current_user, jwt_valid, jwt_error = get_current_user()
+    if not current_user or 'ROLE_SUPER_ADMIN' not in current_user.get('roles', []):
+        return jsonify({"error": "Accès réservé aux super administrateurs", "details": jwt_error}), 403
+    job = precompute_status(job_id)
+    if job is None:
+        return jsonify({"error": "Précalcul inconnu"}), 404
+    return jsonify(job), 200
+
 @agent_bp.route('/reinit', methods=['POST'])
 def reinitialize():
     """Endpoint pour réinitialiser l'assistant"""
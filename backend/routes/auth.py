@@ -2,6 +2,7 @@
 # from flask_jwt_extended import create_access_token
 # import json
 # from services.auth_service import AuthService
+from services.children_scope import children_claims
 
 # auth_bp = Blueprint('auth', __name__)
 
@@ -109,7 +110,7 @@ def login():
             'changepassword': user['changepassword']
         }
 
-        access_token = create_access_token(identity=identity,additional_claims=token_data)
+        access_token = create_access_token(identity=identity,additional_claims={**token_data, **children_claims(user)})
 
         # Construction de la réponse
         response_data = {
@@ -130,6 +130,9 @@
 from typing import List
 import logging
 
+# Contrôle d'accès parent : analyse syntaxique de la requête (security/sql_scope.py)
+from security.sql_scope import validate_parent_access
+
 
 logger = logging.getLogger(__name__)
 
@@ -140,54 +143,3 @@ def is_super_admin(roles: List[str]) -> bool:
 def is_parent(roles: List[str]) -> bool:
     """Vérifie si l'utilisateur est un parent"""
     return 'ROLE_PARENT' in [role.upper() for role in roles]
-
-def validate_parent_access(sql_query: str, children_ids: List[int]) -> bool:
-    if not isinstance(children_ids, list):
-        raise TypeError("children_ids doit être une liste")
-    if not children_ids:
-        return False
-
-    try:
-        children_ids_str = [str(int(id)) for id in children_ids]
-    except (ValueError, TypeError):
-        raise ValueError("Tous les IDs enfants doivent être numériques")
-
-    sql_lower = sql_query.lower().replace("\n", " ").replace("\t", " ")
-    import re
-    sql_lower = re.sub(r'\s+', ' ', sql_lower).strip()
-
-    ids_joined = ",".join(children_ids_str)
-    ids_joined_spaced = ", ".join(children_ids_str)
-
-    security_patterns = set([
-        f"idpersonne in ({ids_joined})",
-        f"idpersonne in({ids_joined})",
-        f"idpersonne in ({ids_joined_spaced})",
-        f"e.idpersonne in ({ids_joined})",
-        f"eleve.idpersonne in ({ids_joined})",
-        f"e.idpersonne in({ids_joined})",
-        f"eleve.idpersonne in({ids_joined})",
-        f"id_personne in ({ids_joined})",
-    ])
-
-    # Sous-requêtes
-    for child_id in children_ids_str:
-        security_patterns.update({
-            f"exists(select 1 from eleve where idpersonne = {child_id})",
-            f"exists (select 1 from eleve where idpersonne={child_id})",
-            f"e.idpersonne in ({child_id})",
-        })
-
-    for pattern in security_patterns:
-        if pattern in sql_lower:
-            break
-    else:
-        logger.warning("❌ Aucun filtre enfant trouvé dans la requête.")
-        return False
-
-    forbidden_patterns = {"--", "/*", "*/", " drop ", " truncate ", " insert ", " update ", " delete "}
-    if any(p in sql_lower for p in forbidden_patterns):
-        logger.error("❌ Requête parent invalide : tentative de modification ou injection détectée.")
-        return False
-
-    return True
\ No newline at end of file
@@ -0,0 +1,775 @@
+import logging
+import os
+import re
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Contrôle d'accès des requêtes parent sur l'arbre syntaxique : la requête est
+# analysée une seule fois (sous-requêtes, tables dérivées, CTE, UNION compris)
+# et chaque occurrence d'une table propre aux élèves doit être rattachée aux
+# enfants autorisés, soit par un filtre direct (e.IdPersonne IN (12, 13)),
+# soit par une sous-requête elle-même filtrée (ie.Eleve IN (SELECT id FROM
+# eleve WHERE ...)), soit par une jointure d'égalité sur une clé d'élève avec
+# une table déjà rattachée (ed.idenelev = e.idedusrv). Un filtre sous un OR
+# ou un NOT ne compte pas ; une jointure sur la classe ou l'année non plus.
+
+# Arbres syntaxiques gardés en mémoire (les templates reviennent souvent)
+SQL_SCOPE_CACHE_SIZE = int(os.getenv('SQL_SCOPE_CACHE_SIZE', 1024))
+
+# Tables de référence lisibles sans filtre (classes, matières, emploi du temps,
+# enseignants...) ; toute autre table est traitée comme propre aux élèves
+PUBLIC_TABLES = frozenset({
+    'anneescolaire', 'cantine', 'civilite', 'classe', 'codepostal', 'delegation', 'diplome', 'dre',
+    'disponibiliteenseignant', 'educlasse', 'educycleens', 'edumatiere', 'eduniveau', 'eduperiexam',
+    'edusection', 'edutypeepre', 'emploidutemps', 'enseigantmatiere', 'enseingant', 'etablissement',
+    'extracasier', 'extraclub', 'extravaucher', 'gouvernorat', 'grade', 'groupe', 'homeworkclasse',
+    'jour', 'jourfr', 'localite', 'matiere', 'matieresection', 'menu_cantine', 'menu_cantine_jour',
+    'modalite', 'modalitepaiement', 'modalitetranche', 'modereglement', 'nationalite', 'naturematiere',
+    'niveau', 'paiementmotif', 'pays', 'periodeexamen', 'qualite', 'repartitionexamen',
+    'repartitionsemaine', 'salle', 'seance', 'section', 'semaine', 'surveillant', 'trimestre',
+    'typeetablissement', 'typepre', 'uniformcouleur', 'uniformgenre', 'uniformmodel', 'uniformtaille',
+    'viewemploi',
+})
+# Personnel : une ligne de personne jointe sur leur id (nom de l'enseignant) reste lisible
+STAFF_TABLES = frozenset({'enseingant', 'surveillant'})
+
+# Entités qui appartiennent à un seul élève : une jointure d'égalité sur l'une
+# d'elles propage le rattachement aux enfants (clé vers l'élève many-to-one ou
+# one-to-one). Jamais classe, année, matière... ni parent : un parent est relié
+# à plusieurs élèves (co-parent, fratrie), la jointure mènerait à d'autres familles.
+ENTITY_KINDS = frozenset({'personne', 'eleve', 'inscriptioneleve', 'edusrv',
+                          'paiement', 'paiementextra', 'reglementeleve'})
+# Colonnes clés dont le nom n'est pas celui de l'entité référencée
+COLUMN_KINDS = {
+    'idpersonne': 'personne',
+    'id_personne': 'personne',
+    'ideleve': 'eleve',
+    'id_eleve': 'eleve',
+    'inscription': 'inscriptioneleve',
+    'idinscription': 'inscriptioneleve',
+    'id_inscription': 'inscriptioneleve',
+    'idedusrv': 'edusrv',
+    'idenelev': 'edusrv',
+}
+
+# Fonctions qui lisent des fichiers ou bloquent le serveur
+FORBIDDEN_FUNCTIONS = frozenset({'load_file', 'sleep', 'benchmark', 'get_lock', 'release_lock'})
+
+_TOKEN = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<comment>--|\#|/\*)
+  | (?P<string>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*")
+  | (?P<name>`(?:[^`]|``)+`)
+  | (?P<number>\d+(?:\.\d+)?(?:[eE][-+]?\d+)?(?![\w$]))
+  | (?P<word>[\w$]+)
+  | (?P<op><=>|<=|>=|<>|!=|:=|\|\||&&|[(),.;=<>+\-*/%!~^|&@?:])
+""", re.VERBOSE)
+
+_CLAUSES = frozenset({'from', 'where', 'group', 'having', 'order', 'limit', 'window'})
+# INTO OUTFILE / @variable, verrous (FOR UPDATE, LOCK IN SHARE MODE), PROCEDURE ANALYSE
+_FORBIDDEN_CLAUSES = frozenset({'into', 'for', 'lock', 'procedure'})
+_JOIN_WORDS = frozenset({'join', 'inner', 'left', 'right', 'cross', 'natural', 'straight_join', 'outer'})
+_NOT_ALIASES = _JOIN_WORDS | {'on', 'using', 'use', 'ignore', 'force', 'partition'}
+_SELECT_MODIFIERS = frozenset({'all', 'distinct', 'distinctrow', 'high_priority', 'straight_join', 'sql_small_result',
+                               'sql_big_result', 'sql_buffer_result', 'sql_no_cache', 'sql_calc_found_rows'})
+_SET_OPERATORS = frozenset({'union', 'except', 'intersect'})
+_COMMA = ('op', ',')
+_DOT = ('op', '.')
+
+Token = Tuple[str, str]
+Column = Tuple[Optional[str], str]
+
+
+class SQLScopeError(ValueError):
+    """Requête refusée pour un parent (motif lisible dans le message)"""
+
+
+class _Token(tuple):
+    """(type, texte) ; span = position (début, fin) dans la requête d'origine"""
+    span: Tuple[int, int]
+
+
+class _Group(list):
+    """Contenu d'une paire de parenthèses ; span = position des parenthèses comprises"""
+    span: Tuple[int, int]
+
+
+class _Query:
+    """SELECT, ou branches d'un UNION, précédées de leurs CTE"""
+    __slots__ = ('ctes', 'branches', 'trailing')
+
+    def __init__(self, ctes, branches, trailing):
+        self.ctes: List[Tuple[str, '_Query']] = ctes
+        self.branches: List[object] = branches  # _Select ou _Query entre parenthèses
+        self.trailing: List[list] = trailing  # ORDER BY / LIMIT après les branches
+
+
+class _Source:
+    """Table (ou table dérivée) de la clause FROM ; identité = occurrence"""
+    __slots__ = ('table', 'alias', 'query', 'span')
+
+    def __init__(self, table: Optional[str], query: Optional[_Query] = None):
+        self.table = table
+        self.alias: Optional[str] = None
+        self.query = query
+        self.span: Optional[Tuple[int, int]] = None  # nom de la table (base.table) dans le texte
+
+    def named(self, qualifier: str) -> bool:
+        return self.alias == qualifier or (self.alias is None and self.table == qualifier)
+
+
+class _Condition:
+    """Expression WHERE / ON ; targets = occurrences qu'elle restreint (None : toutes)"""
+    __slots__ = ('items', 'targets')
+
+    def __init__(self, items: list, targets: Optional[Tuple[_Source, ...]]):
+        self.items = items
+        self.targets = targets
+
+
+class _Select:
+    __slots__ = ('projections', 'sources', 'conditions', 'others')
+
+    def __init__(self):
+        self.projections: List[list] = []
+        self.sources: List[_Source] = []
+        self.conditions: List[_Condition] = []
+        self.others: List[list] = []  # GROUP BY, HAVING, ORDER BY, LIMIT
+
+
+# Analyse syntaxique
+
+def _tokenize(sql: str) -> List[_Token]:
+    tokens, position = [], 0
+    while position < len(sql):
+        match = _TOKEN.match(sql, position)
+        if match is None:
+            raise SQLScopeError(f"Caractère inattendu à la position {position} : {sql[position]!r}")
+        position = match.end()
+        kind = match.lastgroup
+        if kind == 'space':
+            continue
+        if kind == 'comment':
+            raise SQLScopeError("Commentaires interdits dans une requête parent")
+        text = match.group()
+        if kind == 'string':
+            text = text[1:-1]
+        elif kind == 'name':
+            text = text[1:-1].replace('``', '`').lower()
+        elif kind == 'word':
+            text = text.lower()
+            if text in FORBIDDEN_FUNCTIONS:
+                raise SQLScopeError(f"Fonction interdite : {text.upper()}")
+        token = _Token((kind, text))
+        token.span = match.span()
+        tokens.append(token)
+    return tokens
+
+
+def _nest(tokens: Sequence[_Token]) -> list:
+    stack: List[list] = [[]]
+    opening: List[_Token] = []
+    for token in tokens:
+        if token == ('op', '('):
+            stack.append(_Group())
+            opening.append(token)
+        elif token == ('op', ')'):
+            if len(stack) == 1:
+                raise SQLScopeError("Parenthèse fermante sans ouvrante")
+            group = stack.pop()
+            group.span = (opening.pop().span[0], token.span[1])
+            stack[-1].append(group)
+        else:
+            stack[-1].append(token)
+    if len(stack) != 1:
+        raise SQLScopeError("Parenthèse non fermée")
+    return stack[0]
+
+
+def _word(item) -> Optional[str]:
+    """Mot-clé ou identifiant non quoté, en minuscules"""
+    return item[1] if isinstance(item, tuple) and item[0] == 'word' else None
+
+
+def _name(item) -> str:
+    if isinstance(item, tuple) and item[0] in ('word', 'name'):
+        return item[1]
+    raise SQLScopeError("Identifiant attendu dans la clause FROM")
+
+
+def _split(items: Sequence, separator=_COMMA) -> List[list]:
+    parts, current = [], []
+    for item in items:
+        if item == separator:
+            parts.append(current)
+            current = []
+        else:
+            current.append(item)
+    parts.append(current)
+    return parts
+
+
+def _is_query(group) -> bool:
+    return bool(group) and _word(group[0]) in ('select', 'with')
+
+
+def _expression(items: Iterable) -> list:
+    """Éléments d'une expression, les sous-requêtes entre parenthèses analysées en _Query"""
+    result = []
+    for item in items:
+        if isinstance(item, _Group) and _is_query(item):
+            item = _parse_query(item)
+        elif isinstance(item, _Group):
+            group = _Group(_expression(item))
+            group.span = item.span
+            item = group
+        result.append(item)
+    return result
+
+
+def _parse_query(items: Sequence) -> _Query:
+    ctes, position = [], 0
+    if _word(items[0]) == 'with':
+        position = 2 if _word(items[1]) == 'recursive' else 1
+        while True:
+            name = _name(items[position])
+            position += 1
+            if isinstance(items[position], _Group):  # liste de colonnes
+                position += 1
+            if _word(items[position]) != 'as' or not isinstance(items[position + 1], _Group):
+                raise SQLScopeError("Clause WITH invalide")
+            ctes.append((name, _parse_query(items[position + 1])))
+            position += 2
+            if position < len(items) and items[position] == _COMMA:
+                position += 1
+                continue
+            break
+
+    branches, trailing, current = [], [], []
+    parts = []
+    for item in items[position:]:
+        if _word(item) in _SET_OPERATORS:
+            parts.append(current)
+            current = []
+        else:
+            current.append(item)
+    parts.append(current)
+    for part in parts:
+        if part and _word(part[0]) in ('all', 'distinct'):
+            part = part[1:]
+        if part and _word(part[0]) == 'select':
+            branches.append(_parse_select(part))
+        elif part and isinstance(part[0], _Group) and _is_query(part[0]):
+            branches.append(_parse_query(part[0]))
+            if len(part) > 1:
+                trailing.append(_expression(part[1:]))
+        else:
+            raise SQLScopeError("Seules les requêtes SELECT sont autorisées")
+    return _Query(ctes, branches, trailing)
+
+
+def _parse_select(items: Sequence) -> _Select:
+    clauses: Dict[str, list] = {'select': []}
+    current = clauses['select']
+    for item in items[1:]:
+        word = _word(item)
+        if word in _FORBIDDEN_CLAUSES:
+            raise SQLScopeError(f"Clause {word.upper()} interdite dans une requête parent")
+        if word in _CLAUSES and word not in clauses:
+            current = clauses[word] = []
+            continue
+        current.append(item)
+
+    projections = clauses['select']
+    while projections and _word(projections[0]) in _SELECT_MODIFIERS:
+        projections = projections[1:]
+    select = _Select()
+    select.projections = [_expression(part) for part in _split(projections)]
+    if 'from' in clauses:
+        _parse_from(clauses['from'], select.sources, select.conditions)
+    if 'where' in clauses:
+        select.conditions.append(_Condition(_expression(clauses['where']), None))
+    select.others = [_expression(clauses[clause]) for clause in ('group', 'having', 'order', 'limit', 'window')
+                     if clause in clauses]
+    return select
+
+
+def _starts_join(items: Sequence, position: int) -> bool:
+    """Début de la jointure suivante (LEFT(...) / RIGHT(...) sont des fonctions)"""
+    word = _word(items[position])
+    if word in ('left', 'right') and position + 1 < len(items) and isinstance(items[position + 1], _Group):
+        return False
+    return items[position] == _COMMA or word in _JOIN_WORDS
+
+
+def _parse_from(items: Sequence, sources: List[_Source], conditions: List[_Condition]):
+    join, position = 'inner', 0
+    while position < len(items):
+        first = len(sources)
+        position = _table_factor(items, position, sources, conditions)
+        if position < len(items) and _word(items[position]) == 'on':
+            end = position + 1
+            while end < len(items) and not _starts_join(items, end):
+                end += 1
+            # LEFT JOIN : le ON ne restreint que la table jointe ; RIGHT JOIN : que les précédentes
+            targets = {'left': tuple(sources[first:]), 'right': tuple(sources[:first])}.get(join)
+            conditions.append(_Condition(_expression(items[position + 1:end]), targets))
+            position = end
+        elif position < len(items) and _word(items[position]) == 'using':
+            position += 2  # USING (...) / NATURAL : aucune égalité exploitée
+        if position >= len(items):
+            break
+        if items[position] == _COMMA:
+            join, position = 'inner', position + 1
+            continue
+        words = set()
+        while position < len(items) and _word(items[position]) in _JOIN_WORDS:
+            words.add(_word(items[position]))
+            position += 1
+            if words & {'join', 'straight_join'}:
+                break
+        if not words & {'join', 'straight_join'}:
+            raise SQLScopeError("Clause FROM invalide")
+        join = 'left' if 'left' in words else 'right' if 'right' in words else 'inner'
+
+
+def _table_factor(items: Sequence, position: int, sources: List[_Source], conditions: List[_Condition]) -> int:
+    item = items[position]
+    position += 1
+    if isinstance(item, _Group):
+        if not _is_query(item):  # jointures entre parenthèses
+            _parse_from(item, sources, conditions)
+            return position
+        source = _Source(None, _parse_query(item))
+    else:
+        name = _name(item)
+        while position + 1 < len(items) and items[position] == _DOT:  # base.table
+            # Autre base : ses tables ne sont pas celles que le contrôle connaît
+            if name != (os.getenv('MYSQL_DATABASE') or '').lower():
+                raise SQLScopeError(f"Base {name} non autorisée")
+            name = _name(items[position + 1])
+            position += 2
+        source = _Source(name)
+        source.span = (item.span[0], items[position - 1].span[1])
+    if position < len(items) and _word(items[position]) == 'as':
+        source.alias = _name(items[position + 1])
+        position += 2
+    elif position < len(items) and isinstance(items[position], tuple) and items[position][0] in ('word', 'name') \
+            and _word(items[position]) not in _NOT_ALIASES:
+        source.alias = items[position][1]
+        position += 1
+    while position < len(items) and _word(items[position]) in ('use', 'ignore', 'force'):  # index hints
+        while position < len(items) and not isinstance(items[position], _Group):
+            position += 1
+        position += 1
+    sources.append(source)
+    return position
+
+
+@lru_cache(maxsize=SQL_SCOPE_CACHE_SIZE)
+def parse_select(sql: str) -> _Query:
+    """Arbre syntaxique d'une requête de lecture (une seule instruction) ; SQLScopeError sinon"""
+    items = _nest(_tokenize(sql))
+    while items and items[-1] == ('op', ';'):
+        items.pop()
+    if not items:
+        raise SQLScopeError("Requête vide")
+    if ('op', ';') in items:
+        raise SQLScopeError("Une seule instruction par requête")
+    try:
+        return _parse_query(items)
+    except IndexError:
+        raise SQLScopeError("Requête SQL incomplète") from None
+
+
+def read_tables(sql: str) -> FrozenSet[str]:
+    """
+    Tables lues par une requête de lecture, à toutes les profondeurs (tables
+    dérivées, sous-requêtes, CTE, UNION) ; les noms de CTE n'en font pas partie.
+    SQLScopeError si la requête n'est pas analysable.
+    """
+    tables, ctes = set(), set()
+
+    def walk(query: _Query):
+        for name, cte in query.ctes:
+            ctes.add(name)
+            walk(cte)
+        for branch in query.branches:
+            if isinstance(branch, _Query):
+                walk(branch)
+                continue
+            for source in branch.sources:
+                if source.query is not None:
+                    walk(source.query)
+                else:
+                    tables.add(source.table)
+            for items in [condition.items for condition in branch.conditions] + branch.projections + branch.others:
+                for subquery in _queries(items):
+                    walk(subquery)
+        for items in query.trailing:
+            for subquery in _queries(items):
+                walk(subquery)
+
+    walk(parse_select(sql))
+    return frozenset(tables - ctes)
+
+
+# Vérification du périmètre
+
+def _is_disjunction(items: Sequence) -> bool:
+    """OR, XOR ou || au premier niveau : AND liant plus fort, aucun terme ne restreint l'ensemble"""
+    return any(_word(item) in ('or', 'xor') or item == ('op', '||') for item in items)
+
+
+def _conjuncts(items: Sequence) -> List[list]:
+    """
+    Termes reliés par AND au premier niveau (parenthèses englobantes retirées) ;
+    une disjonction au premier niveau reste un seul terme
+    """
+    if _is_disjunction(items):
+        return [list(items)]
+    parts, current, between = [], [], False
+    for item in items:
+        word = _word(item)
+        if word == 'between':
+            between = True
+        elif word == 'and' or item == ('op', '&&'):
+            if between:
+                between = False
+            else:
+                parts.append(current)
+                current = []
+                continue
+        current.append(item)
+    parts.append(current)
+    result = []
+    for part in parts:
+        if len(part) == 1 and isinstance(part[0], _Group):
+            result.extend(_conjuncts(part[0]))
+        else:
+            result.append(part)
+    return result
+
+
+def _column(items: Sequence) -> Optional[Column]:
+    """(qualificatif, colonne) pour e.IdPersonne, IdPersonne ou base.e.IdPersonne"""
+    if any(not isinstance(item, tuple) for item in items):
+        return None
+    if len(items) == 1 and items[0][0] in ('word', 'name'):
+        return None, items[0][1]
+    if len(items) in (3, 5) and all(items[i] == _DOT for i in range(1, len(items), 2)) \
+            and all(items[i][0] in ('word', 'name') for i in range(0, len(items), 2)):
+        return items[-3][1], items[-1][1]
+    return None
+
+
+def _integer(item) -> Optional[int]:
+    if isinstance(item, tuple) and item[0] in ('number', 'string') and item[1].strip().isdigit():
+        return int(item[1])
+    return None
+
+
+def _term(part: Sequence):
+    """
+    Forme exploitable d'un terme : ('eq', col, col, None), ('ids', col, [entiers],
+    position de "IN (...)" / "= 12") ou ('in', col, _Query, None) ; None sinon
+    """
+    swapped = False
+    for index, item in enumerate(part):
+        if item == ('op', '='):
+            left, right = part[:index], part[index + 1:]
+            if _column(left) is None:  # 12 = e.IdPersonne
+                left, right, swapped = right, left, True
+            break
+        if _word(item) == 'in' and index and _word(part[index - 1]) != 'not':
+            left, right = part[:index], part[index + 1:]
+            break
+    else:
+        return None
+    column = _column(left)
+    if column is None:
+        return None
+    other = _column(right)
+    if other is not None:
+        return ('eq', column, other, None) if item == ('op', '=') else None
+    if len(right) != 1:
+        return None
+    value = right[0]
+    if isinstance(value, _Query):
+        return 'in', column, value, None
+    span = None if swapped else (item.span[0], value.span[1])
+    if isinstance(value, _Group):
+        ids = [_integer(element[0]) if len(element) == 1 else None for element in _split(value)]
+        return ('ids', column, ids, span) if ids and None not in ids else None
+    number = _integer(value)
+    return ('ids', column, [number], span) if number is not None else None
+
+
+def _queries(items: Iterable) -> Iterator[_Query]:
+    for item in items:
+        if isinstance(item, _Query):
+            yield item
+        elif isinstance(item, _Group):
+            yield from _queries(item)
+
+
+class _Scope:
+    __slots__ = ('sources', 'anchored', 'outputs', 'outer')
+
+    def __init__(self, sources: List[_Source], outer: Optional['_Scope']):
+        self.sources = sources
+        self.anchored = set()
+        self.outputs: Dict[_Source, List[Tuple[Optional[str], Optional[str]]]] = {}
+        self.outer = outer
+
+    def is_anchored(self, source: _Source) -> bool:
+        scope = self
+        while scope is not None:
+            if source in scope.anchored:
+                return True
+            scope = scope.outer
+        return False
+
+    def resolve(self, column: Column) -> Optional[_Source]:
+        qualifier, name = column
+        if qualifier is None:
+            if len(self.sources) == 1:
+                return self.sources[0]
+            # Colonne non qualifiée : la seule table propre aux élèves (ou table dérivée qui l'expose)
+            candidates = [source for source in self.sources
+                          if (source in self.outputs and self.kind(source, name))
+                          or (source not in self.outputs and source.table not in PUBLIC_TABLES)]
+            return candidates[0] if len(candidates) == 1 else None
+        scope = self
+        while scope is not None:
+            for source in scope.sources:
+                if source.named(qualifier):
+                    return source
+            scope = scope.outer
+        return None
+
+    def kind(self, source: _Source, name: str) -> Optional[str]:
+        """Entité d'élève désignée par la colonne (None : classe, année, valeur...)"""
+        scope = self
+        while scope is not None and source not in scope.sources:
+            scope = scope.outer
+        if scope is not None and source in scope.outputs:
+            return dict(scope.outputs[source]).get(name)
+        if name == 'id':
+            return source.table if source.table in ENTITY_KINDS else None
+        return COLUMN_KINDS.get(name) or (name if name in ENTITY_KINDS else None)
+
+
+class _Validator:
+    """unscoped : liste qui reçoit les occurrences non restreintes au lieu de lever SQLScopeError"""
+
+    def __init__(self, allowed: FrozenSet[int], unscoped: Optional[List[_Source]] = None):
+        self.allowed = allowed
+        self.filters: List[Tuple[Optional[Tuple[int, int]], FrozenSet[int]]] = []  # (position, IDs filtrés)
+        self.unscoped = unscoped
+
+    def query(self, query: _Query, outer: Optional[_Scope],
+              ctes: Dict[str, list]) -> List[Tuple[Optional[str], Optional[str]]]:
+        """Valide une requête ; retourne ses colonnes (nom, entité d'élève rattachée ou None)"""
+        ctes = dict(ctes)
+        for name, cte in query.ctes:
+            ctes[name] = self.query(cte, None, ctes)
+        outputs = [self.select(branch, outer, ctes) if isinstance(branch, _Select)
+                   else self.query(branch, outer, ctes) for branch in query.branches]
+        for items in query.trailing:
+            for subquery in _queries(items):
+                self.query(subquery, outer, ctes)
+        first = outputs[0]
+        # UNION : une colonne n'est rattachée que si elle l'est dans toutes les branches
+        return [(name, kind if all(len(other) > index and other[index][1] == kind for other in outputs) else None)
+                for index, (name, kind) in enumerate(first)]
+
+    def select(self, select: _Select, outer: Optional[_Scope],
+               ctes: Dict[str, list]) -> List[Tuple[Optional[str], Optional[str]]]:
+        scope = _Scope(select.sources, outer)
+        for source in select.sources:
+            if source.query is not None:
+                scope.outputs[source] = self.query(source.query, outer, ctes)
+            elif source.table in ctes:
+                scope.outputs[source] = ctes[source.table]
+            else:
+                continue
+            scope.anchored.add(source)  # déjà validée : ne contient que des lignes autorisées
+
+        edges, staff_linked, pending, nested = [], set(), [], []
+        for condition in select.conditions:
+            targets = select.sources if condition.targets is None else condition.targets
+            for part in _conjuncts(condition.items):
+                term = None if _is_disjunction(part) else _term(part)
+                if term is None:
+                    nested.extend(_queries(part))
+                    continue
+                form, column, value, span = term
+                source = scope.resolve(column)
+                if form == 'ids':
+                    if source in targets and scope.kind(source, column[1]) == 'personne' \
+                            and set(value) <= self.allowed:
+                        scope.anchored.add(source)
+                        self.filters.append((span, frozenset(value)))
+                elif form == 'in':
+                    pending.append((source, column[1], value, targets))
+                else:
+                    other = scope.resolve(value)
+                    if source is None or other is None:
+                        continue
+                    kind = scope.kind(source, column[1])
+                    if kind in ENTITY_KINDS and kind == scope.kind(other, value[1]):
+                        edges.append((source, other, targets))
+                        edges.append((other, source, targets))
+                        if kind == 'personne':
+                            staff_linked.update(a for a, b in ((source, other), (other, source))
+                                                if a in targets and a.table == 'personne'
+                                                and b.table in STAFF_TABLES)
+
+        self._propagate(scope, edges)
+        for source, name, subquery, targets in pending:
+            columns = self.query(subquery, scope, ctes)
+            if source in targets and len(columns) == 1 and columns[0][1] is not None \
+                    and columns[0][1] == scope.kind(source, name):
+                scope.anchored.add(source)
+        self._propagate(scope, edges)
+
+        for items in select.projections + select.others:
+            nested.extend(_queries(items))
+        for subquery in nested:
+            self.query(subquery, scope, ctes)
+
+        for source in select.sources:
+            if source in scope.anchored or source.table in PUBLIC_TABLES or source in staff_linked:
+                continue
+            if self.unscoped is not None:
+                self.unscoped.append(source)
+                continue
+            raise SQLScopeError(f"Table {source.table} non restreinte aux enfants autorisés")
+        return [self._output(scope, items) for items in select.projections]
+
+    @staticmethod
+    def _propagate(scope: _Scope, edges: List[Tuple[_Source, _Source, Sequence[_Source]]]):
+        changed = True
+        while changed:
+            changed = False
+            for source, other, targets in edges:
+                if other not in scope.anchored and other in scope.sources and other in targets \
+                        and scope.is_anchored(source):
+                    scope.anchored.add(other)
+                    changed = True
+
+    @staticmethod
+    def _output(scope: _Scope, items: list) -> Tuple[Optional[str], Optional[str]]:
+        alias = None
+        if len(items) > 2 and _word(items[-2]) == 'as':
+            alias, items = items[-1][1], items[:-2]
+        elif len(items) > 1 and isinstance(items[-1], tuple) and items[-1][0] in ('word', 'name', 'string') \
+                and items[-2] != _DOT and not (isinstance(items[-2], tuple) and items[-2][0] == 'op'):
+            alias, items = items[-1][1], items[:-1]
+        column = _column(items)
+        if column is None:
+            return (alias.lower() if alias else None), None
+        source = scope.resolve(column)
+        kind = scope.kind(source, column[1]) if source in scope.sources and source in scope.anchored else None
+        return (alias or column[1]).lower(), kind
+
+
+def check_parent_access(sql_query: str, children_ids: Sequence[int]) -> Optional[str]:
+    """Motif du refus, ou None si la requête ne lit que des données des enfants autorisés"""
+    try:
+        validator = _Validator(frozenset(children_ids))
+        validator.query(parse_select(sql_query), None, {})
+    except SQLScopeError as e:
+        return str(e)
+    if not validator.filters:
+        return "Aucun filtre sur les enfants autorisés"
+    return None
+
+
+# Restriction de chaque table propre aux élèves à ses lignes des enfants ({ids} :
+# leurs IDs personne), utilisée par scope_parent_query pour les tables non filtrées
+_PERSONNE_IN = "IdPersonne IN ({ids})"
+SCOPE_PREDICATES = {
+    'eleve': _PERSONNE_IN,
+    'personne': "id IN ({ids})",
+    'inscriptioneleve': f"Eleve IN (SELECT id FROM eleve WHERE {_PERSONNE_IN})",
+    'parenteleve': f"Eleve IN (SELECT id FROM eleve WHERE {_PERSONNE_IN})",
+    'paiement': f"Inscription IN (SELECT ie.id FROM inscriptioneleve ie JOIN eleve e ON e.id = ie.Eleve "
+                f"WHERE e.{_PERSONNE_IN})",
+    'edumoymaticopie': f"idenelev IN (SELECT idedusrv FROM eleve WHERE {_PERSONNE_IN})",
+    'eduresultatcopie': f"idenelev IN (SELECT idedusrv FROM eleve WHERE {_PERSONNE_IN})",
+}
+
+
+def scope_parent_query(sql_query: str, children_ids: Sequence[int]) -> str:
+    """
+    Ajoute le périmètre des enfants là où il manque : chaque occurrence d'une
+    table propre aux élèves qui n'est pas déjà restreinte devient une table
+    dérivée filtrée (FROM absence a -> FROM (SELECT * FROM absence WHERE ...) a),
+    les autres restent telles quelles (requête inchangée si rien ne manque).
+    Lève SQLScopeError si ce n'est pas un SELECT ou si une table n'a pas de
+    filtre connu dans SCOPE_PREDICATES.
+    """
+    allowed = [int(child_id) for child_id in children_ids]
+    if not allowed:
+        raise SQLScopeError("Aucun enfant autorisé")
+    unscoped: List[_Source] = []
+    _Validator(frozenset(allowed), unscoped).query(parse_select(sql_query), None, {})
+
+    ids = ', '.join(map(str, allowed))
+    rewritten = sql_query
+    # De la fin vers le début : les positions des occurrences précédentes restent valables
+    for source in sorted(set(unscoped), key=lambda source: source.span[0], reverse=True):
+        predicate = SCOPE_PREDICATES.get(source.table)
+        if predicate is None:
+            raise SQLScopeError(f"Table {source.table} non restreinte aux enfants autorisés (aucun filtre connu)")
+        start, end = source.span
+        table = rewritten[start:end]
+        alias = '' if source.alias else f" AS {table.split('.')[-1]}"
+        rewritten = (f"{rewritten[:start]}(SELECT * FROM {table} WHERE {predicate.format(ids=ids)}){alias}"
+                     f"{rewritten[end:]}")
+    return rewritten
+
+
+def children_scope_template(sql_query: str, children_ids: Sequence[int], slot: str = 'children_scope') -> Optional[str]:
+    """
+    Version partageable entre parents d'une requête validée : chaque filtre
+    direct sur les enfants (IdPersonne IN (12, 13), IdPersonne = 12) devient
+    IN ({children_scope}), à lier aux enfants du parent qui pose la question.
+    None si la requête n'est pas restreinte aux enfants, ou si un filtre ne
+    porte que sur une partie d'entre eux (requête propre à ce parent).
+    """
+    allowed = frozenset(int(child_id) for child_id in children_ids)
+    try:
+        validator = _Validator(allowed)
+        validator.query(parse_select(sql_query), None, {})
+    except SQLScopeError:
+        return None
+    if not validator.filters or any(span is None or ids != allowed for span, ids in validator.filters):
+        return None
+
+    template = sql_query
+    for start, end in sorted({span for span, _ in validator.filters}, reverse=True):
+        template = f"{template[:start]}IN ({{{slot}}}){template[end:]}"
+    return template
+
+
+def validate_parent_access(sql_query: str, children_ids: List[int]) -> bool:
+    """Vrai si la requête (SELECT unique) est restreinte aux enfants `children_ids`"""
+    if not isinstance(children_ids, list):
+        raise TypeError("children_ids doit être une liste")
+    if not children_ids:
+        return False
+    try:
+        allowed = [int(child_id) for child_id in children_ids]
+    except (ValueError, TypeError):
+        raise ValueError("Tous les IDs enfants doivent être numériques")
+
+    reason = check_parent_access(sql_query, allowed)
+    if reason:
+        logger.warning(f"❌ Requête parent refusée : {reason}")
+        return False
+    return True
@@ -1,13 +1,21 @@
 import json
 import logging
 from flask import current_app
-from config.database import get_db  
+from config.database import fetch_one
 import re
 
+logger = logging.getLogger(__name__)
+
+USER_QUERY = """
+    SELECT idpersonne, email, roles, changepassword 
+    FROM user 
+    WHERE email = %s OR idpersonne = %s
+"""
+
 class AuthService:
     @staticmethod
     def parse_roles(raw_roles):
-        current_app.logger.info(f"Raw roles received: {raw_roles} (type: {type(raw_roles)})")
+        logger.info(f"Raw roles received: {raw_roles} (type: {type(raw_roles)})")
         
         if raw_roles is None:
             return []
@@ -25,7 +33,7 @@ class AuthService:
                 return parsed if isinstance(parsed, list) else [parsed]
                 
         except json.JSONDecodeError as e:
-            current_app.logger.warning(f"JSON decode failed: {str(e)}")
+            logger.warning(f"JSON decode failed: {str(e)}")
             return [raw_roles] if raw_roles else []
         
         return [raw_roles] if raw_roles else []
@@ -34,49 +42,50 @@ class AuthService:
 
     @staticmethod
     def authenticate_user(login_identifier, password):
-        connection = None
-        cursor = None
-        
         try:
             current_app.logger.info(f"🔍 Tentative authentification: {login_identifier}")
             
-            connection = get_db()
-            
-            if connection is None:
-                current_app.logger.error("❌ Impossible d'obtenir une connexion DB")
-                return None
-                
-            cursor = connection.cursor(dictionary=True)  # ✅
-
-            current_app.logger.debug("✅ Curseur DB créé")
-
             # ✅ Requête avec logging
-            query = """
-                SELECT idpersonne, email, roles, changepassword 
-                FROM user 
-                WHERE email = %s OR idpersonne = %s
-            """
-            cursor.execute(query, (login_identifier, login_identifier))
-            current_app.logger.debug(f"✅ Requête exécutée: {query}")
+            user = fetch_one(USER_QUERY, (login_identifier, login_identifier))
+            current_app.logger.debug(f"✅ Requête exécutée: {USER_QUERY}")
 
-            user = cursor.fetchone()
             current_app.logger.debug(f"✅ Résultat DB: {'Utilisateur trouvé' if user else 'Aucun utilisateur'}")
 
             if not user:
                 current_app.logger.warning(f"❌ Utilisateur non trouvé: {login_identifier}")
                 return None
 
-            roles = AuthService.parse_roles(user['roles'])
+            authenticated = AuthService.user_payload(user)
 
-            current_app.logger.info(f"✅ Utilisateur authentifié: {user['idpersonne']} avec rôles: {roles}")
+            current_app.logger.info(f"✅ Utilisateur authentifié: {user['idpersonne']} avec rôles: {authenticated['roles']}")
             
-            return {
-                'idpersonne': user['idpersonne'],
-                'email': user['email'],
-                'roles': roles,
-                'changepassword': user['changepassword']
-            }
+            return authenticated
 
         except Exception as e:
             current_app.logger.error(f"❌ Erreur authentification: {str(e)}")
             return None
+
+    @staticmethod
+    async def authenticate_user_async(login_identifier, password):
+        """Version asyncio de authenticate_user (mode ASGI, pool config.async_database)"""
+        from config.async_database import fetch_one as fetch_one_async
+
+        try:
+            logger.info(f"🔍 Tentative authentification: {login_identifier}")
+            user = await fetch_one_async(USER_QUERY, (login_identifier, login_identifier))
+            if not user:
+                logger.warning(f"❌ Utilisateur non trouvé: {login_identifier}")
+                return None
+            return AuthService.user_payload(user)
+        except Exception as e:
+            logger.error(f"❌ Erreur authentification: {str(e)}")
+            return None
+
+    @staticmethod
+    def user_payload(user):
+        return {
+            'idpersonne': user['idpersonne'],
+            'email': user['email'],
+            'roles': AuthService.parse_roles(user['roles']),
+            'changepassword': user['changepassword']
+        }
@@ -0,0 +1,181 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from config.database import fetch_all
+from config.result_cache import on_write
+
+logger = logging.getLogger(__name__)
+
+# Durée de vie d'une association parent -> enfants en mémoire, en secondes
+CHILDREN_SCOPE_TTL = float(os.getenv('CHILDREN_SCOPE_TTL', 600))
+# Chargement de tous les parents en une requête au démarrage
+CHILDREN_SCOPE_PRELOAD = os.getenv('CHILDREN_SCOPE_PRELOAD', 'true').lower() in ('1', 'true', 'yes')
+# IDs des enfants ajoutés au JWT des parents à la connexion (claim CHILDREN_CLAIM)
+CHILDREN_IDS_IN_JWT = os.getenv('CHILDREN_IDS_IN_JWT', 'false').lower() in ('1', 'true', 'yes')
+CHILDREN_CLAIM = 'children_ids'
+
+# Tables dont une écriture peut changer les enfants d'un parent
+SCOPE_TABLES = {'parenteleve', 'parent', 'eleve'}
+
+_CHILDREN_JOIN = """
+    FROM personne p
+    JOIN parent pa ON p.id = pa.Personne
+    JOIN parenteleve pev ON pa.id = pev.Parent
+    JOIN eleve e ON pev.Eleve = e.id
+    JOIN personne pe ON e.IdPersonne = pe.id
+"""
+CHILDREN_QUERY = f"SELECT DISTINCT pe.id AS id_enfant {_CHILDREN_JOIN} WHERE p.id = %s"
+ALL_CHILDREN_QUERY = f"SELECT DISTINCT p.id AS id_parent, pe.id AS id_enfant {_CHILDREN_JOIN}"
+
+
+class ChildrenScopeResolver:
+    """
+    IDs des enfants de chaque parent, servis depuis la mémoire : la jointure
+    sur cinq tables n'est exécutée qu'au premier accès d'un parent puis une
+    fois par TTL (ou une seule fois pour tous les parents avec preload()).
+
+    invalidate() oublie un parent, ou tous, après une modification de
+    parenteleve ; les écritures faites par ce processus sur SCOPE_TABLES
+    l'appellent d'elles-mêmes. Les IDs portés par le JWT (prime) ne sont
+    acceptés que si le jeton est postérieur à la dernière invalidation et
+    émis depuis moins d'un TTL, ne valent que jusqu'à son émission + TTL et
+    ne remplacent jamais une lecture de la base.
+    """
+
+    def __init__(self, fetch: Callable[..., List[Dict[str, Any]]] = fetch_all, ttl: float = CHILDREN_SCOPE_TTL):
+        self.fetch = fetch
+        self.ttl = ttl
+        # parent -> (expiration, IDs des enfants, lu en base plutôt que dans un JWT)
+        self._entries: Dict[int, Tuple[float, Tuple[int, ...], bool]] = {}
+        self._invalidated_at: Dict[int, float] = {}
+        self._all_invalidated_at = 0.0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'primed': 0, 'invalidations': 0, 'preloaded': 0}
+
+    def children_ids(self, parent_id: int) -> List[int]:
+        """IDs des enfants du parent ; liste vide si aucun ou si la base est injoignable"""
+        parent_id = int(parent_id)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(parent_id)
+            if entry is not None and entry[0] > now:
+                self._stats['hits'] += 1
+                return list(entry[1])
+            self._stats['misses'] += 1
+
+        try:
+            rows = self.fetch(CHILDREN_QUERY, (parent_id,))
+        except Exception as e:
+            # Pas de mise en cache : nouvel essai à la prochaine question
+            logger.error(f"❌ Error getting children for parent {parent_id}: {e}")
+            return []
+        ids = tuple(sorted({int(row['id_enfant']) for row in rows or ()}))
+        self._store(parent_id, ids, started_at=now)
+        logger.info(f"✅ Found {len(ids)} children for parent {parent_id}")
+        return list(ids)
+
+    def preload(self) -> int:
+        """Charge tous les parents en une requête ; retourne le nombre de parents"""
+        started_at = time.time()
+        try:
+            rows = self.fetch(ALL_CHILDREN_QUERY)
+        except Exception as e:
+            logger.error(f"❌ Préchargement des enfants par parent impossible : {e}")
+            return 0
+        children: Dict[int, Set[int]] = {}
+        for row in rows or ():
+            children.setdefault(int(row['id_parent']), set()).add(int(row['id_enfant']))
+        for parent_id, ids in children.items():
+            self._store(parent_id, tuple(sorted(ids)), started_at=started_at)
+        with self._lock:
+            self._stats['preloaded'] += len(children)
+        logger.info(f"✅ Enfants de {len(children)} parents préchargés")
+        return len(children)
+
+    def prime(self, parent_id: int, children_ids: Iterable[int], issued_at: float):
+        """
+        IDs lus dans un JWT émis à `issued_at` ; ignorés si une invalidation est
+        plus récente, si le jeton a plus d'un TTL ou si le parent a déjà été lu en base
+        """
+        parent_id = int(parent_id)
+        ids = tuple(sorted({int(child) for child in children_ids}))
+        if issued_at <= time.time() - self.ttl:
+            return  # jeton plus vieux qu'un TTL : la base fait foi
+        if self._store(parent_id, ids, started_at=issued_at, from_db=False):
+            with self._lock:
+                self._stats['primed'] += 1
+
+    def invalidate(self, parent_id: Optional[int] = None):
+        """Oublie les enfants d'un parent, ou de tous les parents (parent_id=None)"""
+        now = time.time()
+        with self._lock:
+            if parent_id is None:
+                self._entries.clear()
+                self._invalidated_at.clear()
+                self._all_invalidated_at = now
+            else:
+                self._entries.pop(int(parent_id), None)
+                self._invalidated_at[int(parent_id)] = now
+            self._stats['invalidations'] += 1
+        logger.info(f"🧹 Enfants par parent invalidés ({'tous' if parent_id is None else parent_id})")
+
+    def _store(self, parent_id: int, ids: Tuple[int, ...], started_at: float, from_db: bool = True) -> bool:
+        """
+        Enregistre une lecture commencée à `started_at`, sauf si une invalidation
+        a eu lieu depuis (la lecture peut alors précéder la modification). Une
+        lecture de la base vaut un TTL, des IDs de JWT jusqu'à émission + TTL.
+        """
+        with self._lock:
+            if started_at < max(self._all_invalidated_at, self._invalidated_at.get(parent_id, 0.0)):
+                return False
+            entry = self._entries.get(parent_id)
+            if not from_db and entry is not None and (entry[2] or entry[0] > time.time()):
+                return False  # un JWT ne remplace ni une lecture de la base ni une entrée valide
+            expires_at = (time.time() if from_db else started_at) + self.ttl
+            self._entries[parent_id] = (expires_at, ids, from_db)
+            return True
+
+    def _on_write(self, tables: Set[str]):
+        if tables & SCOPE_TABLES:
+            self.invalidate()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'parents': len(self._entries), 'ttl': self.ttl, **self._stats}
+
+
+_resolver: Optional[ChildrenScopeResolver] = None
+_resolver_lock = threading.Lock()
+
+
+def get_children_scope() -> ChildrenScopeResolver:
+    """Résolveur unique du processus, invalidé par les écritures sur SCOPE_TABLES"""
+    global _resolver
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                _resolver = ChildrenScopeResolver()
+                on_write(_resolver._on_write)
+    return _resolver
+
+
+def children_claims(user: Dict[str, Any]) -> Dict[str, Any]:
+    """Claims à ajouter au JWT d'un parent à la connexion (vide si désactivé)"""
+    roles = [str(role).upper() for role in user.get('roles') or []]
+    if not CHILDREN_IDS_IN_JWT or 'ROLE_PARENT' not in roles:
+        return {}
+    return {CHILDREN_CLAIM: get_children_scope().children_ids(user['idpersonne'])}
+
+
+def prime_from_claims(claims: Dict[str, Any]):
+    """Alimente le résolveur avec les IDs d'enfants portés par un JWT valide"""
+    children_ids = claims.get(CHILDREN_CLAIM)
+    if children_ids is None or claims.get('idpersonne') is None:
+        return
+    try:
+        get_children_scope().prime(claims['idpersonne'], children_ids, float(claims.get('iat', 0)))
+    except (TypeError, ValueError) as e:
+        logger.debug(f"Claim {CHILDREN_CLAIM} ignoré : {e}")
@@ -0,0 +1,104 @@
+# test_children_scope.py - Tests du résolveur partagé des enfants de chaque parent
+
+import time
+
+import pytest
+
+from config import result_cache
+from services.children_scope import ALL_CHILDREN_QUERY, ChildrenScopeResolver
+
+
+class FakeDb:
+    def __init__(self, links):
+        self.links = links  # {parent: [enfants]}
+        self.queries = []
+
+    def __call__(self, query, params=None):
+        self.queries.append(query)
+        if query == ALL_CHILDREN_QUERY:
+            return [{"id_parent": p, "id_enfant": c} for p, children in self.links.items() for c in children]
+        return [{"id_enfant": c} for c in self.links.get(params[0], [])]
+
+
+def test_one_query_per_parent_until_ttl_or_invalidation():
+    db = FakeDb({7: [12, 11]})
+    resolver = ChildrenScopeResolver(fetch=db, ttl=60)
+    assert resolver.children_ids(7) == [11, 12]
+    assert resolver.children_ids("7") == [11, 12]
+    assert len(db.queries) == 1
+
+    db.links[7].append(13)  # parenteleve modifiée
+    resolver.invalidate(7)
+    assert resolver.children_ids(7) == [11, 12, 13]
+    assert len(db.queries) == 2
+
+    resolver.ttl = 0
+    resolver.invalidate()
+    resolver.children_ids(7)
+    resolver.children_ids(7)
+    assert len(db.queries) == 4
+
+
+def test_preload_serves_every_parent_from_one_query():
+    db = FakeDb({1: [10], 2: [20, 21], 3: []})
+    resolver = ChildrenScopeResolver(fetch=db)
+    assert resolver.preload() == 2
+    assert resolver.children_ids(2) == [20, 21] and resolver.children_ids(1) == [10]
+    assert db.queries == [ALL_CHILDREN_QUERY]
+    assert resolver.metrics()["hits"] == 2
+
+
+def test_jwt_claim_is_ignored_after_invalidation():
+    db = FakeDb({5: [50]})
+    resolver = ChildrenScopeResolver(fetch=db)
+    issued_at = time.time() - 10
+    resolver.invalidate(5)
+    resolver.prime(5, [99], issued_at)  # jeton émis avant la modification
+    assert resolver.children_ids(5) == [50]
+
+    resolver.invalidate(5)
+    resolver.prime(5, [50, 51], time.time() + 1)
+    assert resolver.children_ids(5) == [50, 51]
+    assert db.queries == [db.queries[0]]
+
+
+def test_jwt_claim_never_outlives_its_ttl_nor_replaces_the_database():
+    db = FakeDb({6: [60], 8: [80]})
+    resolver = ChildrenScopeResolver(fetch=db, ttl=60)
+    resolver.prime(6, [99], time.time() - 3600)  # jeton de 24 h réutilisé : trop ancien
+    assert resolver.children_ids(6) == [60]
+
+    resolver.prime(8, [80, 81], time.time() - 59.9)  # valable 0,1 s : émission + TTL
+    assert resolver.children_ids(8) == [80, 81]
+    time.sleep(0.2)
+    assert resolver.children_ids(8) == [80]
+    resolver.prime(8, [80, 81], time.time() - 30)  # lue en base depuis : le JWT ne la remplace plus
+    assert resolver.children_ids(8) == [80]
+
+    resolver.ttl = 0.1
+    resolver.invalidate(8)
+    resolver.children_ids(8)
+    time.sleep(0.2)
+    resolver.prime(8, [99], time.time())  # même expirée, une lecture de la base fait foi
+    assert resolver.children_ids(8) == [80]
+    assert len(db.queries) == 4 and resolver.metrics()["primed"] == 1
+
+
+def test_writes_to_parenteleve_invalidate_the_resolver():
+    db = FakeDb({4: [40]})
+    resolver = ChildrenScopeResolver(fetch=db)
+    result_cache.on_write(resolver._on_write)
+    try:
+        resolver.children_ids(4)
+        result_cache.notify_write("UPDATE paiement SET montant = 1")
+        resolver.children_ids(4)
+        assert len(db.queries) == 1
+        result_cache.notify_write("INSERT INTO parenteleve (Parent, Eleve) VALUES (1, 2)")
+        resolver.children_ids(4)
+        assert len(db.queries) == 2
+    finally:
+        result_cache._write_listeners.remove(resolver._on_write)
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,78 @@
+# test_embedding_index.py - Tests de l'index d'embeddings et du cache sémantique
+
+import numpy as np
+import pytest
+
+from agent.cache_manager import CacheManager
+from agent.cache_manager1 import CacheManager1
+from agent.embeddings import SentenceEmbedder, NgramEmbedder, role_threshold, same_polarity
+from agent.template_index import EmbeddingIndex
+
+
+def test_topk_matches_brute_force_after_removals(tmp_path):
+    embedder = NgramEmbedder(dim=256)
+    index = EmbeddingIndex(embedder, str(tmp_path / "vectors.npz"))
+    texts = {f"k{i}": f"nombre des élèves inscrits en classe {i} pour l'année {2000 + i % 7}" for i in range(120)}
+    for key, text in texts.items():
+        index.add(key, text)
+    for i in range(0, 120, 3):
+        index.remove(f"k{i}")
+        del texts[f"k{i}"]
+
+    query = "combien d'élèves inscrits en classe 42"
+    keys = list(texts)
+    scores = embedder.encode([texts[k] for k in keys]) @ embedder.encode([query])[0]
+    by_key = dict(zip(keys, scores))
+    expected = np.sort(scores)[::-1][:5]
+
+    def check(results):
+        # Mêmes scores que le calcul exhaustif (l'ordre des ex aequo peut varier)
+        assert np.allclose([score for _, score in results], expected, atol=1e-5)
+        assert all(abs(by_key[key] - score) < 1e-5 for key, score in results)
+
+    check(index.search(query, k=5))
+    # Rechargé depuis le disque sans réencoder
+    reloaded = EmbeddingIndex(embedder, str(tmp_path / "vectors.npz"))
+    assert len(reloaded) == len(texts)
+    check(reloaded.search(query, k=5))
+
+
+def test_other_model_discards_persisted_vectors(tmp_path):
+    path = str(tmp_path / "vectors.npz")
+    index = EmbeddingIndex(NgramEmbedder(dim=256), path)
+    index.add("a", "liste des enseignants")
+    index.sync()
+    assert len(EmbeddingIndex(NgramEmbedder(dim=128), path)) == 0
+
+
+def test_semantic_hit_requires_same_parameters(tmp_path):
+    cache = CacheManager(str(tmp_path / "cache.json"), embedder=NgramEmbedder())
+    cache.cache_query("liste des eleves de la classe 7B2", "SELECT * FROM eleve WHERE classe = '7B2'")
+
+    sql_template, variables = cache.get_semantic_query("liste des élèves de la classe 8A1", threshold=0.8)
+    assert "{CODECLASSEFR}" in sql_template and variables["CODECLASSEFR"] == "8A1"
+    # Texte proche mais sans classe : le template paramétré ne s'applique pas
+    assert cache.get_semantic_query("liste des élèves de la classe", threshold=0.5) is None
+
+
+@pytest.mark.parametrize("question, template", [
+    ("nombre d'élèves non inscrits en 2024/2025", "nombre d'élèves inscrits en {AnneeScolaire}"),
+    ("liste des paiements impayés", "liste des paiements payés"),
+])
+def test_opposite_questions_never_share_a_cached_answer(tmp_path, question, template):
+    assert not same_polarity(question, template)
+    cache = CacheManager1(str(tmp_path / "cache1.json"), embedder=NgramEmbedder())
+    cache.cache_query(template.replace("{AnneeScolaire}", "2023/2024"), "SELECT 1")
+    # Seuil des anciens réglages (0.90) : la paire est assez proche, seul le garde-fou la refuse
+    assert cache.get_semantic_query(question, 7, threshold=0.9) is None
+    assert cache.get_semantic_query(template.replace("{AnneeScolaire}", "2024/2025"), 7, threshold=0.9)
+
+
+def test_ngram_fallback_disables_the_semantic_tier():
+    ngrams = NgramEmbedder()
+    assert role_threshold("admin", ngrams) > 1 and role_threshold("parent", ngrams) > 1
+    assert role_threshold("parent", SentenceEmbedder.__new__(SentenceEmbedder)) == 0.93
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
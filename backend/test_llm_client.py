@@ -0,0 +1,165 @@
+# test_llm_client.py - Tests du client LLM partagé contre un serveur HTTP local
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("openai")
+
+from agent.llm_utils import LLMClient
+
+
+class StubChatServer(ThreadingHTTPServer):
+    """Serveur local imitant POST /v1/chat/completions"""
+
+    daemon_threads = True
+
+    def __init__(self, delay=0.0, failures=0):
+        super().__init__(("127.0.0.1", 0), StubChatHandler)
+        self.delay = delay
+        self.failures = failures
+        self.requests = 0
+        self.connections = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+
+class StubChatHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.requests += 1
+            server.connections.add(self.client_address)
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            should_fail = server.failures > 0
+            if should_fail:
+                server.failures -= 1
+        try:
+            time.sleep(server.delay)
+            if should_fail:
+                self._send(500, {"error": {"message": "stub failure", "type": "server_error"}})
+                return
+            if body.get("stream"):
+                self._send_stream(body["model"], ["Il y a ", "42 ", "élèves."])
+                return
+            self._send(200, {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "SELECT COUNT(*) FROM eleve"},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+            })
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _send_stream(self, model, tokens):
+        chunks = [{
+            "id": "chatcmpl-stub",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]
+        } for token in tokens]
+        data = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+        data = data.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def stub_server(request):
+    params = getattr(request, "param", {})
+    server = StubChatServer(**params)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_client(server, **kwargs):
+    kwargs.setdefault("backoff_base", 0.01)
+    return LLMClient(api_key="test", base_url=server.base_url, **kwargs)
+
+
+def test_chat_returns_content(stub_server):
+    client = make_client(stub_server)
+    assert client.chat([{"role": "user", "content": "Combien d'élèves?"}]) == "SELECT COUNT(*) FROM eleve"
+
+
+def test_connection_is_reused(stub_server):
+    client = make_client(stub_server)
+    for _ in range(5):
+        client.chat([{"role": "user", "content": "test"}])
+    assert stub_server.requests == 5
+    assert len(stub_server.connections) == 1
+
+
+def test_chat_stream_yields_tokens(stub_server):
+    client = make_client(stub_server)
+    tokens = list(client.chat_stream([{"role": "user", "content": "test"}]))
+    assert tokens == ["Il y a ", "42 ", "élèves."]
+
+
+@pytest.mark.parametrize("stub_server", [{"failures": 2}], indirect=True)
+def test_retries_transient_errors(stub_server):
+    client = make_client(stub_server, max_retries=3)
+    assert client.chat([{"role": "user", "content": "test"}]) == "SELECT COUNT(*) FROM eleve"
+    assert stub_server.requests == 3
+
+
+@pytest.mark.parametrize("stub_server", [{"failures": 5}], indirect=True)
+def test_gives_up_after_max_retries(stub_server):
+    import openai
+    client = make_client(stub_server, max_retries=1)
+    with pytest.raises(openai.InternalServerError):
+        client.chat([{"role": "user", "content": "test"}])
+    assert stub_server.requests == 2
+
+
+@pytest.mark.parametrize("stub_server", [{"delay": 0.2}], indirect=True)
+def test_concurrency_is_bounded(stub_server):
+    client = make_client(stub_server, max_concurrency=2)
+    threads = [threading.Thread(target=client.chat, args=([{"role": "user", "content": "test"}],)) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert stub_server.requests == 6
+    assert stub_server.max_in_flight == 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
@@ -1,13 +1,7 @@
-import MySQLdb
+from config.database import fetch_one
 
 try:
-    conn = MySQLdb.connect(
-        host="localhost",
-        user="root",
-        password="root",
-        database="bd_eduise2",
-        port=3306
-    )
+    fetch_one("SELECT 1")
     print("✅ Connexion MySQL réussie")
 except Exception as e:
     print(f"❌ Échec de connexion: {e}")
@@ -0,0 +1,161 @@
+# test_pagination.py - Tests des page_token et de la pagination du pipeline /api/ask
+
+import pytest
+
+import agent.pagination as pagination
+from agent.pagination import InvalidPageToken, decode_page_token, encode_page_token
+from agent.pipeline import AskPipeline
+from agent.renderers import render
+import config.database as database
+from config.database import CONNECT_OPTIONS
+from mysql.connector.connection import MySQLConnection
+from mysql.connector.cursor import MySQLCursorBuffered, MySQLCursorPrepared
+
+
+@pytest.fixture(autouse=True)
+def secret(monkeypatch):
+    monkeypatch.setenv("JWT_SECRET_KEY", "test-secret")
+    monkeypatch.delenv("PAGE_TOKEN_SECRET", raising=False)
+
+
+def test_token_round_trip():
+    token = encode_page_token("SELECT * FROM paiement WHERE IdPersonne IN (%s)", 200, 7,
+                              "liste des paiements", "parent:7", (12,))
+    assert decode_page_token(token, 7) == {
+        "sql_query": "SELECT * FROM paiement WHERE IdPersonne IN (%s)",
+        "offset": 200,
+        "question": "liste des paiements",
+        "scope": "parent:7",
+        "params": (12,)
+    }
+
+
+def test_token_is_bound_to_user():
+    token = encode_page_token("SELECT 1", 10, 7)
+    with pytest.raises(InvalidPageToken):
+        decode_page_token(token, 8)
+
+
+def test_tampered_token_is_rejected():
+    token = encode_page_token("SELECT 1", 10, 7)
+    forged = encode_page_token("SELECT * FROM user", 10, 7)
+    with pytest.raises(InvalidPageToken):
+        decode_page_token(forged.split(".")[0] + "." + token.split(".")[1], 7)
+    with pytest.raises(InvalidPageToken):
+        decode_page_token("pas-un-jeton", 7)
+
+
+def test_expired_token_is_rejected(monkeypatch):
+    monkeypatch.setattr(pagination, "PAGE_TOKEN_TTL", -1)
+    token = encode_page_token("SELECT 1", 10, 7)
+    with pytest.raises(InvalidPageToken):
+        decode_page_token(token, 7)
+
+
+class FakeAssistant:
+    """Table de 5 lignes servie page par page, comme ExtendedSQLDatabase.execute_page"""
+
+    def __init__(self):
+        self.table = [(i, f"eleve {i}") for i in range(5)]
+        self.prepared = 0
+        self.scopes = []
+        self.params = []
+
+    def prepare_query(self, question, user_id, roles):
+        self.prepared += 1
+        return {"sql_query": "SELECT id, nom FROM eleve WHERE classe = %s", "sql_params": ("7B2",),
+                "role": "admin", "from_cache": True, "error": None}
+
+    def result_scope(self, plan):
+        return plan["role"]
+
+    def run_query(self, sql_query, limit, offset=0, scope=None, params=None):
+        self.scopes.append(scope)
+        self.params.append(params)
+        rows = self.table[offset:offset + limit]
+        has_more = offset + len(rows) < len(self.table)
+        return {"success": True, "columns": ["id", "nom"], "rows": rows,
+                "has_more": has_more, "total": len(self.table)}
+
+    def remember_query(self, question, plan):
+        pass
+
+    def format_rows(self, columns, rows, question="", output_format="text"):
+        return render(columns, rows, output_format, question=question)
+
+
+class FakeEngine:
+    def _format_results(self, data, user_query, sql_query=None):
+        return data
+
+
+def test_pipeline_pages_through_results():
+    assistant = FakeAssistant()
+    pipeline = AskPipeline(assistant, FakeEngine(), page_size=2)
+
+    result = pipeline.run("liste des élèves", 7, ["ROLE_SUPER_ADMIN"])
+    seen = [row["id"] for row in result["data"]]
+    while result["pagination"]["has_more"]:
+        result = pipeline.run_page(result["pagination"]["next_page_token"], 7)
+        seen.extend(row["id"] for row in result["data"])
+
+    assert seen == [0, 1, 2, 3, 4]
+    assert result["pagination"]["total"] == 5
+    assert result["pagination"]["next_page_token"] is None
+    assert assistant.prepared == 1
+    assert assistant.scopes == ["admin"] * 3  # le périmètre suit les pages via le jeton
+    assert assistant.params == [("7B2",)] * 3  # les valeurs liées aussi
+
+
+def test_streamed_page_cursors_are_not_buffered():
+    # _fetch_page_streamed : avec les options des connexions du pool, les lignes sont lues au fil de l'eau
+    conn = MySQLConnection()
+    conn.is_connected = lambda: True
+    conn.config(**CONNECT_OPTIONS)
+    assert not isinstance(conn.cursor(buffered=False), MySQLCursorBuffered)
+    assert isinstance(conn.cursor(prepared=True), MySQLCursorPrepared)
+
+
+
+class StreamedConnection:
+    """Connexion du pool dont le curseur, comme celui du driver, refuse d'être fermé avec des lignes non lues"""
+
+    def __init__(self, total):
+        self.rows = [(i, i) for i in range(total)]
+        self.fetched = 0
+        self.released = []
+
+    def cursor(self, **options):
+        return self
+
+    def execute(self, query, params=()):
+        self.column_names = ("id", "id")
+
+    def fetchmany(self, size):
+        batch = self.rows[self.fetched:self.fetched + size]
+        self.fetched += len(batch)
+        return batch
+
+    def close(self):
+        if self.fetched < len(self.rows):
+            raise RuntimeError("Unread result found")
+
+    def release(self, discard=False):
+        self.released.append(discard)
+
+
+@pytest.mark.parametrize("total, has_more", [(10_000, True), (10, False)])
+def test_streamed_page_stops_after_the_page_and_frees_the_connection(monkeypatch, total, has_more):
+    conn = StreamedConnection(total)
+    monkeypatch.setattr(database, "get_pool", lambda: type("Pool", (), {"acquire": lambda self: conn})())
+    monkeypatch.setattr(database, "count_rows", lambda query, params=None: total)
+
+    page = database._fetch_page_streamed("SELECT e.id, p.id FROM eleve e JOIN personne p", 5, 5)
+    assert page["rows"] == [(i, i) for i in range(5, 10)]
+    assert (page["has_more"], page["total"]) == (has_more, total)
+    assert conn.fetched <= 11  # jamais tout le résultat pour le compter
+    assert conn.released == [has_more]  # lignes non lues : connexion fermée, pas rendue au pool
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
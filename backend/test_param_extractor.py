@@ -0,0 +1,46 @@
+# test_param_extractor.py - Tests de l'extracteur de paramètres compilé des caches de requêtes
+
+import pytest
+
+from agent.param_extractor import TermMatcher, extract_admin_parameters, extract_parent_parameters
+
+
+def test_term_matcher_keeps_list_priority():
+    matcher = TermMatcher(["1er trimestre", "trimestre 1", "trimestre 2"])
+    assert matcher.first("notes du trimestre 2 et du 1er trimestre") == "1er trimestre"
+    assert matcher.first("notes du trimestre 2") == "trimestre 2"
+    assert matcher.first("notes de l'année") is None
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("liste des élèves de 7B2 en 2023-2024",
+     ("{nomfr} {prenomfr} élèves de {codeclassefr} en {anneescolaire}",
+      {"NomFr": "Liste", "PrenomFr": "Des", "CODECLASSEFR": "7B2", "AnneeScolaire": "2023/2024"})),
+    ("Combien d'élèves?", ("combien d'élèves?", {})),
+])
+def test_admin_extraction(question, expected):
+    assert extract_admin_parameters(question) == expected
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("donne moi les notes de mon fils pour le 2ème trimestre",
+     ("donne moi les notes de {family_relation} pour le {codeperiexam}",
+      {"id_personne": "id_personne", "codeperiexam": "32"})),
+    ("paiements de BENABDA SAMI id 1234",
+     ("paiements de {NomFr} {PrenomFr} id {IDPersonne}",
+      {"NomFr": "BENABDA", "PrenomFr": "SAMI", "IDPersonne": "1234"})),
+    # L'année est prise avant les identifiants : ses chiffres ne deviennent pas des IDPersonne
+    ("absences en 2023/2024", ("absences en {AnneeScolaire}", {"AnneeScolaire": "2023/2024"})),
+])
+def test_parent_extraction(question, expected):
+    assert extract_parent_parameters(question) == expected
+
+
+def test_memoized_results_are_not_shared():
+    _, variables = extract_parent_parameters("notes de mon fils")
+    variables["id_personne"] = "modifié"
+    assert extract_parent_parameters("notes de mon fils")[1]["id_personne"] == "id_personne"
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
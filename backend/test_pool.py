@@ -0,0 +1,230 @@
+# test_pool.py - Tests du pool de connexions avec des connexions factices
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from config.pool import AsyncConnectionPool, ConnectionPool, PoolTimeoutError
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.pings = 0
+        self.closed = False
+        self.alive = True
+        self.in_transaction = False
+        self.rollbacks = 0
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+        if not self.alive:
+            raise ConnectionError("server has gone away")
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeFactory:
+    def __init__(self):
+        self.created = []
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            conn = FakeConnection(len(self.created))
+            self.created.append(conn)
+            return conn
+
+
+def make_pool(**kwargs):
+    factory = FakeFactory()
+    kwargs.setdefault("min_size", 0)
+    kwargs.setdefault("max_size", 2)
+    return ConnectionPool(factory, **kwargs), factory
+
+
+def test_connection_is_reused_without_ping():
+    pool, factory = make_pool(idle_check_after=60)
+    for _ in range(5):
+        conn = pool.acquire()
+        conn.close()
+    assert len(factory.created) == 1
+    assert factory.created[0].pings == 0
+
+
+def test_close_is_idempotent():
+    pool, _ = make_pool()
+    conn = pool.acquire()
+    conn.close()
+    conn.close()
+    assert pool.metrics()["idle"] == 1
+    assert pool.metrics()["size"] == 1
+
+
+def test_warm_opens_min_size():
+    pool, factory = make_pool(min_size=2, max_size=4)
+    pool.warm()
+    assert len(factory.created) == 2
+    assert pool.metrics()["idle"] == 2
+
+
+def test_acquire_times_out_when_exhausted():
+    pool, _ = make_pool(max_size=1)
+    held = pool.acquire()
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire(timeout=0.05)
+    held.close()
+    assert pool.metrics()["timeouts"] == 1
+
+
+def test_idle_connection_is_checked_and_replaced():
+    pool, factory = make_pool(idle_check_after=0.01)
+    conn = pool.acquire()
+    conn.close()
+    factory.created[0].alive = False
+    time.sleep(0.02)
+
+    conn = pool.acquire()
+    assert conn.number == 1
+    assert factory.created[0].closed
+    metrics = pool.metrics()
+    assert metrics["health_checks"] == 1
+    assert metrics["health_check_failures"] == 1
+    assert metrics["size"] == 1
+    conn.close()
+
+
+def test_old_connection_is_recycled():
+    pool, factory = make_pool(max_lifetime=0.01)
+    pool.acquire().close()
+    time.sleep(0.02)
+    conn = pool.acquire()
+    assert conn.number == 1
+    assert factory.created[0].closed
+    assert pool.metrics()["recycled"] == 1
+    conn.close()
+
+
+def test_open_transaction_is_rolled_back_on_release():
+    pool, factory = make_pool()
+    conn = pool.acquire()
+    factory.created[0].in_transaction = True
+    conn.close()
+    assert factory.created[0].rollbacks == 1
+
+    # Résultat non lu (curseur non bufferisé abandonné) : vidé avant de resservir la connexion
+    conn = pool.acquire()
+    factory.created[0].unread_result = True
+    conn.close()
+    assert factory.created[0].rollbacks == 2
+
+
+def test_request_scoped_connection_ignores_close():
+    pool, _ = make_pool()
+    conn = pool.acquire(request_scoped=True)
+    conn.close()
+    assert not conn.closed
+    conn.release()
+    assert conn.closed
+    assert pool.metrics()["idle"] == 1
+
+
+def test_concurrent_borrowers_never_exceed_max_size():
+    pool, factory = make_pool(max_size=3)
+    in_use = []
+    peak = [0]
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(20):
+            with pool.acquire() as conn:
+                with lock:
+                    in_use.append(conn.number)
+                    peak[0] = max(peak[0], len(in_use))
+                time.sleep(0.001)
+                with lock:
+                    in_use.remove(conn.number)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(factory.created) <= 3
+    assert peak[0] <= 3
+    assert pool.metrics()["in_use"] == 0
+
+
+class AsyncFakeConnection(FakeConnection):
+    """Même connexion factice, avec l'API coroutine de mysql.connector.aio"""
+
+    async def ping(self, reconnect=False):
+        FakeConnection.ping(self, reconnect)
+
+    async def rollback(self):
+        FakeConnection.rollback(self)
+
+    async def close(self):
+        FakeConnection.close(self)
+
+
+def make_async_pool(**kwargs):
+    created = []
+
+    async def connect():
+        conn = AsyncFakeConnection(len(created))
+        created.append(conn)
+        return conn
+
+    kwargs.setdefault("min_size", 0)
+    kwargs.setdefault("max_size", 2)
+    return AsyncConnectionPool(connect, **kwargs), created
+
+
+def test_async_pool_reuses_and_rolls_back():
+    async def scenario():
+        pool, created = make_async_pool(idle_check_after=60)
+        for _ in range(5):
+            async with pool.connection() as conn:
+                conn.in_transaction = True
+        assert len(created) == 1
+        assert created[0].rollbacks == 5
+        assert pool.metrics()["idle"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_async_pool_bounds_concurrent_tasks():
+    async def scenario():
+        pool, created = make_async_pool(max_size=3, acquire_timeout=0.05)
+        in_use, peak = set(), [0]
+
+        async def task():
+            async with pool.connection() as conn:
+                in_use.add(conn.number)
+                peak[0] = max(peak[0], len(in_use))
+                await asyncio.sleep(0.001)
+                in_use.discard(conn.number)
+
+        await asyncio.gather(*(task() for _ in range(30)))
+        assert len(created) <= 3 and peak[0] <= 3
+
+        async with pool.connection(), pool.connection(), pool.connection():
+            with pytest.raises(PoolTimeoutError):
+                async with pool.connection():
+                    pass
+        assert pool.metrics()["in_use"] == 0
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
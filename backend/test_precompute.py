@@ -0,0 +1,114 @@
+# test_precompute.py - Tests du précalcul des requêtes d'une liste de questions
+
+import json
+import threading
+import time
+
+import pytest
+
+from agent import precompute
+from agent.precompute import PRECOMPUTE_MAX_WORKERS, BatchPrecompute, RateLimiter, load_questions
+
+
+class FakeAssistant:
+    """Assistant de test : 'en cache' déjà servie, 'interdite' refusée, 'cassée' sans plan d'exécution"""
+
+    def __init__(self):
+        self.generated = []
+        self.remembered = []
+        self._lock = threading.Lock()
+
+    def plan_query(self, question, user_id, roles):
+        cached = "en cache" in question
+        return {"sql_query": "SELECT * FROM eleve WHERE classe = %s" if cached else "", "sql_params": ("7B2",),
+                "role": "parent" if "ROLE_PARENT" in roles else "admin", "from_cache": cached,
+                "error": None, "needs_llm": not cached, "user_id": user_id, "children_ids": [12]}
+
+    def generate_query(self, question, plan):
+        with self._lock:
+            self.generated.append(time.monotonic())
+        if "interdite" in question:
+            plan["error"] = "❌ Accès refusé: La requête ne respecte pas les restrictions parent."
+        elif "supprime" in question:
+            plan["sql_query"] = "DELETE FROM eleve"
+        else:
+            plan["sql_query"] = f"SELECT id FROM {'cassee' if 'cassée' in question else 'eleve'}"
+        plan["sql_params"] = None
+
+    def remember_query(self, question, plan):
+        with self._lock:
+            self.remembered.append(question)
+
+
+def explain(sql_query, params=None):
+    if "cassee" in sql_query:
+        raise RuntimeError("Table 'cassee' doesn't exist")
+    return [{"id": 1, "select_type": "SIMPLE"}]
+
+
+def test_questions_file_formats(tmp_path):
+    (tmp_path / "q.csv").write_text("question,role,user_id\nnotes de mon fils,parent,7\nliste des classes,admin,\n",
+                                    encoding="utf-8")
+    (tmp_path / "q.jsonl").write_text('{"question": "notes", "role": "ROLE_PARENT", "user_id": "7"}\n\n',
+                                      encoding="utf-8")
+    assert load_questions(str(tmp_path / "q.csv")) == [
+        {"question": "notes de mon fils", "role": "parent", "user_id": 7},
+        {"question": "liste des classes", "role": "admin", "user_id": None}]
+    assert load_questions(str(tmp_path / "q.jsonl")) == [{"question": "notes", "role": "parent", "user_id": 7}]
+
+    (tmp_path / "bad.json").write_text(json.dumps([{"question": "notes", "role": "parent"}]), encoding="utf-8")
+    with pytest.raises(ValueError, match="élément 1 : user_id requis"):
+        load_questions(str(tmp_path / "bad.json"))
+
+
+def test_batch_reports_and_writes_failures(tmp_path):
+    assistant = FakeAssistant()
+    questions = ["liste en cache", "notes du trimestre", "absences", "donnée interdite", "table cassée",
+                 "supprime tout"]
+    items = [{"question": question, "role": "parent", "user_id": 7} for question in questions]
+    progress = []
+    failures = tmp_path / "failures.jsonl"
+
+    report = BatchPrecompute(assistant, workers=3, llm_rate=0, explain=explain).run(
+        items, str(failures), lambda done, total, result: progress.append((done, total)))
+
+    assert (report["generated"], report["cached"], report["failed"]) == (2, 1, 3)
+    assert sorted(progress) == [(done, 6) for done in range(1, 7)]
+    assert sorted(assistant.remembered) == ["absences", "liste en cache", "notes du trimestre"]
+    stages = {line["question"]: line["stage"] for line in map(json.loads, failures.read_text().splitlines())}
+    assert stages == {"donnée interdite": "generation", "table cassée": "explain", "supprime tout": "validation"}
+
+
+def test_llm_calls_are_rate_limited():
+    assistant = FakeAssistant()
+    items = [{"question": f"question {n}", "role": "admin", "user_id": None} for n in range(5)]
+    BatchPrecompute(assistant, workers=5, llm_rate=20, explain=explain).run(items)
+    starts = sorted(assistant.generated)
+    assert min(b - a for a, b in zip(starts, starts[1:])) >= 0.04
+
+    limiter = RateLimiter(0)
+    started = time.monotonic()
+    for _ in range(100):
+        limiter.acquire()
+    assert time.monotonic() - started < 0.05
+
+
+def test_finished_jobs_expire_and_workers_are_capped(monkeypatch):
+    now = time.time()
+    monkeypatch.setattr(precompute, "_jobs", {
+        "ancien": {"id": "ancien", "status": "done", "finished_at": now - precompute.PRECOMPUTE_JOB_TTL - 1},
+        "échoué": {"id": "échoué", "status": "error", "finished_at": now - precompute.PRECOMPUTE_JOB_TTL - 1},
+        "récent": {"id": "récent", "status": "done", "finished_at": now},
+        "en cours": {"id": "en cours", "status": "running"}})
+    assert precompute.precompute_status("ancien") is None
+    assert precompute.precompute_status("récent")["status"] == "done"
+    assert sorted(precompute._jobs) == ["en cours", "récent"]
+
+    assert BatchPrecompute(FakeAssistant(), workers=10_000).workers == PRECOMPUTE_MAX_WORKERS
+    assert precompute.clamp_workers("0") == 1
+    with pytest.raises(ValueError):
+        precompute.clamp_workers("beaucoup")
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
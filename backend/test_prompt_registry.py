@@ -0,0 +1,66 @@
+# test_prompt_registry.py - Tests du registre des templates et prompts rechargé à chaud
+
+import json
+import os
+
+import pytest
+
+from agent.prompt_registry import DOMAIN_DESCRIPTIONS_FILE, RELATIONS_FILE, TEMPLATES_FILE, PromptRegistry
+
+
+def _write(path, text, tick=[0]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+    # mtime explicite : deux écritures rapprochées ont sinon la même date
+    tick[0] += 1
+    os.utime(path, ns=(tick[0] * 10 ** 9, tick[0] * 10 ** 9))
+
+
+def _templates(*questions):
+    return json.dumps({"questions": [{"template_question": q, "requete_template": "SELECT 1"} for q in questions]})
+
+
+@pytest.fixture
+def agent_dir(tmp_path):
+    _write(tmp_path / TEMPLATES_FILE, _templates("liste des classes"))
+    _write(tmp_path / DOMAIN_DESCRIPTIONS_FILE, json.dumps({"CANTINE": "repas"}))
+    _write(tmp_path / "prompts" / "prompt_eleve.txt", "prompt élève v1")
+    return tmp_path
+
+
+def test_loads_once_with_defaults_for_missing_files(agent_dir):
+    registry = PromptRegistry(agent_dir, poll_interval=0)
+    assert [t["template_question"] for t in registry.get(TEMPLATES_FILE)] == ["liste des classes"]
+    assert registry.get(RELATIONS_FILE) == "# Aucune relation définie"
+    assert registry.prompt("prompt_eleve.txt") == "prompt élève v1"
+    assert registry.check() == set()  # rien n'a changé : aucune relecture
+
+
+def test_reloads_changed_files_and_notifies(agent_dir):
+    registry = PromptRegistry(agent_dir, poll_interval=0)
+    before = registry.get(DOMAIN_DESCRIPTIONS_FILE)
+    notified = []
+    registry.subscribe(notified.append)
+
+    _write(agent_dir / TEMPLATES_FILE, _templates("liste des classes", "nombre des élèves"))
+    _write(agent_dir / "prompts" / "prompt_finance.txt", "prompt finance")
+    assert registry.check() == {TEMPLATES_FILE, "prompts/prompt_finance.txt"}
+    assert notified == [{TEMPLATES_FILE, "prompts/prompt_finance.txt"}]
+    assert len(registry.get(TEMPLATES_FILE)) == 2
+    assert registry.prompt("prompt_finance.txt") == "prompt finance"
+    assert registry.get(DOMAIN_DESCRIPTIONS_FILE) is before  # fichier inchangé : même objet
+
+
+def test_invalid_edit_keeps_last_good_version(agent_dir):
+    registry = PromptRegistry(agent_dir, poll_interval=0)
+    _write(agent_dir / DOMAIN_DESCRIPTIONS_FILE, '{"CANTINE": ')
+    assert registry.check() == set()
+    assert registry.get(DOMAIN_DESCRIPTIONS_FILE) == {"CANTINE": "repas"}
+
+    _write(agent_dir / DOMAIN_DESCRIPTIONS_FILE, json.dumps({"CANTINE": "menus"}))
+    assert registry.check() == {DOMAIN_DESCRIPTIONS_FILE}
+    assert registry.get(DOMAIN_DESCRIPTIONS_FILE) == {"CANTINE": "menus"}
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
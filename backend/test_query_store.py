@@ -0,0 +1,71 @@
+# test_query_store.py - Tests du journal en ajout seul du cache de requêtes et de son index
+
+import json
+import multiprocessing
+
+from agent.cache_manager import CacheManager
+from agent.query_store import QueryStore
+
+
+def test_entries_survive_reload_and_compaction(tmp_path):
+    path = tmp_path / "cache.json"
+    store = QueryStore(str(path), compact_every=3)
+    store.put("a", {"question_template": "q a", "sql_template": "SELECT 1"})
+    store.put("b", {"question_template": "q b", "sql_template": "SELECT 2"})
+    assert not path.exists()
+    assert len(store.log_path.read_text(encoding="utf-8").splitlines()) == 3  # en-tête + 2 lignes
+
+    store.put("c", {"question_template": "q c", "sql_template": "SELECT 3"})
+    # Compaction : instantané au format historique, journal vide
+    assert set(json.loads(path.read_text(encoding="utf-8"))) == {"a", "b", "c"}
+    assert len(store.log_path.read_text(encoding="utf-8").splitlines()) == 1  # en-tête seul
+
+    store.put("a", None)
+    assert set(QueryStore(str(path)).as_dict()) == {"b", "c"}
+
+
+def test_refresh_sees_other_writers(tmp_path):
+    path = str(tmp_path / "cache.json")
+    reader, writer = QueryStore(path, compact_every=2), QueryStore(path, compact_every=2)
+    writer.put("a", {"v": 1})
+    reader.refresh()
+    assert reader.get("a") == {"v": 1}
+
+    writer.put("b", {"v": 2})  # compaction par l'autre processus
+    writer.put("c", {"v": 3})
+    reader.refresh()
+    assert set(reader.as_dict()) == {"a", "b", "c"}
+
+
+def _append_many(path, worker, count):
+    store = QueryStore(path, compact_every=7)
+    for i in range(count):
+        store.put(f"{worker}-{i}", {"worker": worker, "i": i})
+
+
+def test_concurrent_workers_do_not_lose_writes(tmp_path):
+    path = str(tmp_path / "cache.json")
+    workers = [multiprocessing.Process(target=_append_many, args=(path, w, 40)) for w in range(4)]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join()
+    assert len(QueryStore(path)) == 160
+
+
+def test_fuzzy_lookup_matches_linear_scan(tmp_path):
+    cache = CacheManager(str(tmp_path / "cache.json"))
+    words = ["nombre", "élèves", "par", "classe", "niveau", "moyenne", "notes", "absences", "liste", "enseignants"]
+    for i in range(60):
+        template = " ".join(words[j % len(words)] for j in range(i % 7, i % 7 + 3 + i % 4))
+        cache.store.put(f"k{i}", {"question_template": f"{template} {i % 5}", "sql_template": "SELECT 1"})
+
+    for question in ["nombre élèves par classe 1", "moyenne notes absences 3", "liste enseignants nombre"]:
+        tokens = frozenset(question.split())
+        expected = max(
+            len(tokens & set(e["question_template"].split())) / len(tokens | set(e["question_template"].split()))
+            for _, e in cache.store.items()
+        )
+        matches = cache.index.search(tokens, threshold=0.5)
+        score = matches[0][1] if matches else 0.0
+        assert score == (expected if expected >= 0.5 else 0.0)
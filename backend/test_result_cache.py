@@ -0,0 +1,83 @@
+# test_result_cache.py - Tests du cache de résultats SQL (LRU en octets, TTL par table, invalidation)
+
+import pytest
+
+from config import result_cache
+from config.result_cache import ResultCache, normalize_sql, referenced_tables, written_tables
+
+
+def _page(rows):
+    return {"success": True, "columns": ["id"], "rows": rows, "has_more": False, "total": len(rows)}
+
+
+def test_key_ignores_whitespace_but_not_scope_or_page():
+    key = ResultCache.key
+    assert key("SELECT *\n  FROM eleve;", "admin", 10, 0) == key("SELECT * FROM eleve", "admin", 10, 0)
+    assert key("SELECT * FROM eleve", "admin", 10, 0) != key("SELECT * FROM eleve", "parent:7", 10, 0)
+    assert key("SELECT * FROM eleve", "admin", 10, 0) != key("SELECT * FROM eleve", "admin", 10, 10)
+    assert normalize_sql(" SELECT  1 ; ") == "SELECT 1"
+
+
+def test_table_extraction():
+    sql = """SELECT e.nom, SUM(p.montant) FROM eleve e, inscriptioneleve ie
+             LEFT JOIN paiement p ON p.inscription_id = ie.id
+             WHERE e.id IN (SELECT eleve_id FROM `ecole`.`absence`) GROUP BY e.nom"""
+    assert referenced_tables(sql) == {"eleve", "inscriptioneleve", "paiement", "absence"}
+    assert written_tables("INSERT INTO paiement (montant) VALUES (10)") == {"paiement"}
+    assert written_tables("update `inscriptioneleve` SET etat = 1") == {"inscriptioneleve"}
+    assert written_tables("SELECT * FROM paiement") == set()
+
+
+def test_nested_tables_are_extracted():
+    assert referenced_tables("SELECT a FROM (SELECT y FROM paiement) t") == {"paiement"}
+    sql = ("WITH m AS (SELECT id FROM eleve) SELECT * FROM m, (SELECT 1 FROM absence) x "
+           "WHERE EXISTS (SELECT 1 FROM retard r WHERE r.Eleve = m.id)")
+    assert referenced_tables(sql) == {"eleve", "absence", "retard"}
+    # Requête que l'analyseur refuse (commentaire) : relevé de chaque FROM
+    assert referenced_tables("SELECT a FROM (SELECT y FROM paiement) t -- total") == {"paiement"}
+
+
+def test_lru_eviction_is_bounded_in_bytes():
+    cache = ResultCache(max_bytes=2_000, default_ttl=60, table_ttls={})
+    for i in range(50):
+        cache.put(f"k{i}", _page([(j,) for j in range(20)]), {"eleve"})
+        cache.get("k0")  # k0 reste le plus récemment utilisé
+    metrics = cache.metrics()
+    assert metrics["bytes"] <= 2_000
+    assert metrics["evictions"] > 0
+    assert cache.get("k0") is not None
+    assert cache.get("k1") is None
+
+
+def test_ttl_is_shortest_of_referenced_tables(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_cache.time, "monotonic", lambda: now[0])
+    cache = ResultCache(max_bytes=1_000_000, default_ttl=300, table_ttls={"paiement": 30})
+    cache.put("a", _page([(1,)]), {"eleve"})
+    cache.put("b", _page([(1,)]), {"eleve", "paiement"})
+
+    now[0] += 31
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+
+
+def test_write_invalidates_dependent_entries(monkeypatch):
+    cache = ResultCache(max_bytes=1_000_000, default_ttl=300, table_ttls={})
+    monkeypatch.setattr(result_cache, "_cache", cache)
+    cache.put("a", _page([(1,)]), referenced_tables("SELECT * FROM eleve e JOIN inscriptioneleve i ON i.eleve_id = e.id"))
+    cache.put("b", _page([(2,)]), referenced_tables("SELECT * FROM eleve"))
+
+    result_cache.notify_write("INSERT INTO inscriptioneleve (eleve_id) VALUES (3)")
+    assert cache.get("a") is None
+    assert cache.get("b") == _page([(2,)])
+
+    # Périmètre parent réécrit en table dérivée (scope_parent_query)
+    scoped = ("SELECT p.TotalTTC FROM (SELECT * FROM paiement WHERE Inscription IN (SELECT ie.id FROM "
+              "inscriptioneleve ie JOIN eleve e ON e.id = ie.Eleve WHERE e.IdPersonne IN (12))) p")
+    cache.put("c", _page([(3,)]), referenced_tables(scoped))
+    result_cache.notify_write("UPDATE paiement SET TotalTTC = 0 WHERE id = 1")
+    assert cache.get("c") is None
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
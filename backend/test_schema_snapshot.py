@@ -0,0 +1,44 @@
+# test_schema_snapshot.py - Tests de l'instantané du schéma pendant sa reconstruction
+
+import threading
+import time
+
+import pytest
+from langchain_community.utilities import SQLDatabase
+
+from config.schema_snapshot import FINGERPRINT_QUERY, SchemaSnapshot
+
+
+class FakeDb:
+    def execute_query(self, sql):
+        if sql == FINGERPRINT_QUERY:
+            return {"success": True, "data": [{"nb_tables": 1, "nb_colonnes": 1, "checksum_colonnes": 42,
+                                               "derniere_creation": None}]}
+        return {"success": True, "data": []}
+
+
+def test_only_the_building_thread_bypasses_the_snapshot(tmp_path, monkeypatch):
+    snapshot = SchemaSnapshot(FakeDb(), path=str(tmp_path / "schema.json.gz"), check_interval=300)
+    started = threading.Event()
+    seen = []
+
+    def usable_tables(db):
+        seen.append(snapshot.building)
+        started.set()
+        time.sleep(0.2)  # réflexion lente : les autres threads arrivent pendant la reconstruction
+        return ["eleve"]
+
+    monkeypatch.setattr(SQLDatabase, "get_usable_table_names", usable_tables)
+    monkeypatch.setattr(SQLDatabase, "get_table_info", lambda db, names: "CREATE TABLE eleve (id INT)")
+
+    builder = threading.Thread(target=snapshot.table_names)
+    builder.start()
+    started.wait(5)
+    assert snapshot.building is False  # ce thread n'interroge pas la base : il attend l'instantané
+    assert snapshot.table_names() == ["eleve"]
+    builder.join()
+    assert seen == [True] and not snapshot.building
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
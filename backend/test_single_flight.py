@@ -0,0 +1,150 @@
+# test_single_flight.py - Tests du regroupement des générations LLM identiques et simultanées
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from agent.assistant import SQLAssistant
+from agent.cache_manager1 import CacheManager1
+from agent.embeddings import NgramEmbedder
+from agent.single_flight import AsyncSingleFlight, SingleFlight
+
+QUESTION = "les notes de mon fils au 2ème trimestre"
+CHILDREN = {1: [12, 13], 2: [40], 3: [50, 51], 4: [60], 5: [70], 6: [80]}
+
+
+class SlowLlm:
+    """LLM de test : répond après `delay` secondes avec la requête des enfants du prompt"""
+
+    def __init__(self, delay=0.3, answer="SELECT ed.moyemati FROM edumoymaticopie ed JOIN eleve e "
+                                         "ON e.idedusrv = ed.idenelev WHERE e.IdPersonne IN ({ids}) "
+                                         "AND ed.codeperiexam = 32"):
+        self.delay = delay
+        self.answer = answer
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt):
+        with self._lock:
+            self.prompts.append(prompt)
+        time.sleep(self.delay)
+        return self.answer.format(ids=prompt, first=prompt.split(",")[0])
+
+
+def _assistant(tmp_path, llm):
+    assistant = SQLAssistant.__new__(SQLAssistant)
+    assistant.cache1 = CacheManager1(str(tmp_path / "cache1.json"), embedder=NgramEmbedder())
+    assistant.cache1.get_user_children_ids = CHILDREN.get
+    assistant.llm_flights = SingleFlight(wait=5)
+    assistant.ask_llm = llm
+    assistant.plan_query = lambda question, user_id, roles: {
+        "sql_query": "", "sql_params": None, "role": "parent", "from_cache": False, "error": None,
+        "needs_llm": True, "user_id": user_id, "children_ids": CHILDREN[user_id]}
+    assistant.build_prompt = lambda question, plan: ", ".join(map(str, plan["children_ids"]))
+    return assistant
+
+
+def _ask_together(assistant, users):
+    plans = {}
+
+    def ask(user_id):
+        plans[user_id] = assistant.prepare_query(QUESTION, user_id, ["ROLE_PARENT"])
+
+    threads = [threading.Thread(target=ask, args=(user_id,)) for user_id in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return plans
+
+
+def test_concurrent_parents_share_one_generation(tmp_path):
+    llm = SlowLlm()
+    assistant = _assistant(tmp_path, llm)
+    plans = _ask_together(assistant, CHILDREN)
+
+    assert len(llm.prompts) == 1
+    for user_id, plan in plans.items():
+        assert plan["error"] is None
+        if plan["from_cache"]:  # suiveur : template lié à ses propres enfants et au trimestre
+            assert list(plan["sql_params"]) == CHILDREN[user_id] + [32]
+        else:
+            assert plan["sql_query"].count(", ".join(map(str, CHILDREN[user_id]))) == 1
+    assert sum(not plan["from_cache"] for plan in plans.values()) == 1
+    assert assistant.llm_flights.metrics() == {"in_flight": 0, "leaders": 1, "shared": 5, "timeouts": 0}
+
+
+def test_parent_specific_query_is_generated_separately(tmp_path):
+    # Requête sur un seul des deux enfants : rien à partager, chaque parent a sa génération
+    llm = SlowLlm(delay=0.2, answer="SELECT * FROM eleve e WHERE e.IdPersonne = {first} AND e.id > 0")
+    assistant = _assistant(tmp_path, llm)
+    plans = _ask_together(assistant, [1, 3])
+    assert len(llm.prompts) == 2
+    assert all(plan["error"] is None and not plan["from_cache"] for plan in plans.values())
+
+
+def test_followers_reject_a_leaking_generation(tmp_path):
+    # Filtre sous un OR de premier niveau : refusé pour le leader, rien n'est partagé aux suiveurs
+    llm = SlowLlm(delay=0.2, answer="SELECT a.* FROM absence a WHERE 1=1 OR 1=1 AND a.Eleve IN "
+                                    "(SELECT id FROM eleve WHERE IdPersonne IN ({ids}))")
+    assistant = _assistant(tmp_path, llm)
+    plans = _ask_together(assistant, [1, 2, 3])
+    assert len(llm.prompts) == 3
+    for plan in plans.values():
+        assert "restrictions parent" in plan["error"] and not plan["from_cache"]
+    assert len(assistant.cache1.store) == 0
+
+
+def test_errors_are_shared_and_nothing_is_kept():
+    flights = SingleFlight(wait=5)
+    calls = []
+
+    def failing():
+        calls.append(1)
+        time.sleep(0.2)
+        raise RuntimeError("LLM indisponible")
+
+    errors = []
+
+    def run():
+        try:
+            flights.do("clé", failing)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1 and errors == ["LLM indisponible"] * 4
+    assert flights.do("clé", lambda: "ok") == ("ok", False)
+
+
+def test_async_callers_share_one_generation():
+    calls = []
+
+    async def slow_llm():
+        calls.append(1)
+        await asyncio.sleep(0.2)
+        return "SELECT 1"
+
+    async def main():
+        flights = AsyncSingleFlight(wait=5)
+        results = await asyncio.gather(*(flights.do("clé", slow_llm) for _ in range(10)))
+        late = AsyncSingleFlight(wait=0.05)
+        slow = asyncio.ensure_future(late.do("clé", slow_llm))
+        await asyncio.sleep(0)
+        waited = await late.do("clé", slow_llm)  # attente dépassée : génération séparée
+        return results, waited, await slow
+
+    results, waited, slow = asyncio.run(main())
+    assert sorted(results, key=lambda result: result[1]) == [("SELECT 1", False)] + [("SELECT 1", True)] * 9
+    assert waited == ("SELECT 1", False) and slow == ("SELECT 1", False)
+    assert len(calls) == 3
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
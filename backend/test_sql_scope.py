@@ -0,0 +1,160 @@
+# test_sql_scope.py - Tests du contrôle d'accès parent sur l'arbre syntaxique des requêtes
+
+import pytest
+
+from agent.cache_manager1 import CacheManager1
+from agent.embeddings import NgramEmbedder
+from agent.sql_template import bind_template
+from security.sql_scope import (SQLScopeError, check_parent_access, children_scope_template, scope_parent_query,
+                                validate_parent_access)
+
+CHILDREN = [12, 13]
+
+
+@pytest.mark.parametrize("sql", [
+    # Template du cache : jointure sur la clé EduSrv depuis l'élève filtré
+    """SELECT em.libematifr AS matiere, ed.moyemati AS moyenne FROM Eduperiexam ex, Edumoymaticopie ed,
+       Edumatiere em, Eleve e WHERE e.idedusrv = ed.idenelev AND ed.codemati = em.codemati
+       AND ex.codeperiexam = ed.codeperiexam AND e.Idpersonne IN (12, 13) AND ed.codeperiexam = 31;""",
+    "SELECT p.NomFr, p.Tel1 FROM personne p JOIN eleve e ON p.id = e.IdPersonne WHERE e.IdPersonne = '12'",
+    "SELECT p.id, p.`TotalTTC` FROM paiement p WHERE p.`Inscription` IN (SELECT id FROM inscriptioneleve "
+    "WHERE Eleve IN (SELECT id FROM eleve WHERE IdPersonne = 12))",
+    # Noms des enseignants (personnel) dans l'emploi du temps de la classe de l'enfant
+    "SELECT pe.NomFr FROM emploidutemps edt JOIN enseingant en ON en.id = edt.Enseignant "
+    "JOIN personne pe ON pe.id = en.Personne WHERE edt.Classe = (SELECT ie.Classe FROM inscriptioneleve ie "
+    "JOIN eleve e ON e.id = ie.Eleve WHERE e.IdPersonne = 13 ORDER BY ie.id DESC LIMIT 1)",
+    "WITH mes AS (SELECT e.id AS eid FROM eleve e WHERE e.IdPersonne IN (12, 13)) "
+    "SELECT a.* FROM absence a JOIN inscriptioneleve ie ON ie.id = a.Inscription JOIN mes ON mes.eid = ie.Eleve",
+    "SELECT e.id, (SELECT COUNT(*) FROM absence a WHERE a.Eleve = e.id) AS nb FROM eleve e "
+    "LEFT JOIN retard r ON r.Eleve = e.id WHERE e.IdPersonne IN (12) AND e.id BETWEEN 1 AND 9",
+    # Disjonction entre parenthèses : le filtre sur les enfants reste au premier niveau
+    "SELECT * FROM eleve e WHERE e.IdPersonne IN (12) AND (e.id = 1 OR e.id = 2)",
+])
+def test_queries_restricted_to_the_children_pass(sql):
+    assert check_parent_access(sql, CHILDREN) is None
+
+
+@pytest.mark.parametrize("sql, reason", [
+    ("SELECT * FROM eleve e WHERE e.IdPersonne IN (12) OR 1=1", "eleve"),
+    ("SELECT * FROM eleve e WHERE NOT (e.IdPersonne = 12)", "eleve"),
+    ("SELECT * FROM eleve e WHERE e.IdPersonne IN (12, 99)", "eleve"),
+    ("SELECT p.NomFr, p.Tel1 FROM personne p, eleve e WHERE e.IdPersonne = 12", "personne"),
+    # Même classe que l'enfant : pas une clé d'élève
+    ("SELECT a.* FROM absence a JOIN inscriptioneleve ie ON ie.Classe = a.Classe "
+     "WHERE ie.Eleve IN (SELECT id FROM eleve WHERE IdPersonne = 12)", "absence"),
+    ("SELECT e.id, (SELECT NomFr FROM personne WHERE id = 1) FROM eleve e WHERE e.IdPersonne = 12", "personne"),
+    # Le ON d'un LEFT JOIN ne restreint pas la table de gauche
+    ("SELECT * FROM eleve e LEFT JOIN absence a ON a.Eleve = e.id AND e.IdPersonne = 12", "eleve"),
+    ("SELECT COUNT(*) FROM eleve", "eleve"),
+    # AND lie plus fort que OR : le filtre n'est qu'une branche de la disjonction
+    ("SELECT * FROM personne WHERE 1=1 OR 1=1 AND id IN (12)", "personne"),
+    ("SELECT * FROM eleve e WHERE e.IdPersonne IN (12) AND 1=1 OR 1=1", "eleve"),
+    ("SELECT * FROM eleve e WHERE e.IdPersonne IN (12) XOR 1", "eleve"),
+    ("SELECT * FROM eleve e JOIN absence a ON a.Eleve = e.id OR 1=1 WHERE e.IdPersonne = 12", "absence"),
+    ("SELECT m.libematifr FROM matiere m", "Aucun filtre"),
+    # Co-parent : le parent relie aussi les enfants d'autres familles
+    ("SELECT p2.NomFr, p2.Tel1 FROM eleve e JOIN parenteleve pe ON pe.Eleve = e.id "
+     "JOIN parent pa ON pa.id = pe.Parent JOIN parenteleve pe2 ON pe2.Parent = pa.id "
+     "JOIN eleve e2 ON e2.id = pe2.Eleve JOIN personne p2 ON p2.id = e2.IdPersonne WHERE e.IdPersonne IN (12)",
+     "parent"),
+    ("SELECT e2.id FROM eleve e JOIN parenteleve pe ON pe.Eleve = e.id JOIN parenteleve pe2 "
+     "ON pe2.Parent = pe.Parent JOIN eleve e2 ON e2.id = pe2.Eleve WHERE e.IdPersonne IN (12)", "parenteleve"),
+    # Tables d'une autre base : ni PUBLIC_TABLES ni filtres ne s'y appliquent
+    ("SELECT c.* FROM otherdb.classe c, personne p WHERE p.id IN (12)", "otherdb"),
+])
+def test_unrestricted_paths_are_rejected(sql, reason):
+    assert reason in check_parent_access(sql, CHILDREN)
+
+
+@pytest.mark.parametrize("sql", [
+    "DELETE FROM eleve WHERE IdPersonne = 12",
+    "SELECT * FROM eleve WHERE IdPersonne = 12; DROP TABLE eleve",
+    "SELECT * FROM eleve WHERE IdPersonne = 12 /*! OR 1=1 */",
+    "SELECT * FROM eleve WHERE IdPersonne = 12 INTO OUTFILE '/tmp/eleves'",
+    "SELECT * FROM eleve WHERE IdPersonne = 12 AND SLEEP(5)",
+    "SELECT * FROM eleve WHERE IdPersonne = 12 FOR UPDATE",
+])
+def test_only_single_select_statements_are_allowed(sql):
+    assert not validate_parent_access(sql, CHILDREN)
+
+
+def test_only_the_configured_database_may_qualify_a_table(monkeypatch):
+    monkeypatch.setenv("MYSQL_DATABASE", "Ecole")
+    assert check_parent_access("SELECT * FROM ecole.eleve e WHERE e.IdPersonne IN (12)", CHILDREN) is None
+    assert "mysql" in check_parent_access("SELECT * FROM mysql.user u, eleve e WHERE e.IdPersonne IN (12)",
+                                          CHILDREN)
+
+
+def test_input_checks_are_kept():
+    with pytest.raises(TypeError):
+        validate_parent_access("SELECT 1", (12,))
+    with pytest.raises(ValueError):
+        validate_parent_access("SELECT 1", ["douze"])
+    assert validate_parent_access("SELECT * FROM eleve WHERE IdPersonne = 12", []) is False
+
+
+def test_rewriting_wraps_only_the_unrestricted_tables():
+    sql = ("SELECT em.libematifr, ed.moyemati FROM edumoymaticopie ed JOIN edumatiere em "
+           "ON em.codemati = ed.codemati WHERE ed.codeperiexam = 32")
+    scoped = scope_parent_query(sql, CHILDREN)
+    assert scoped == ("SELECT em.libematifr, ed.moyemati FROM (SELECT * FROM edumoymaticopie WHERE idenelev IN "
+                      "(SELECT idedusrv FROM eleve WHERE IdPersonne IN (12, 13))) ed JOIN edumatiere em "
+                      "ON em.codemati = ed.codemati WHERE ed.codeperiexam = 32")
+    assert check_parent_access(scoped, CHILDREN) is None
+
+    # Occurrence non aliasée : l'alias garde le nom d'origine pour les colonnes qualifiées
+    scoped = scope_parent_query("SELECT Eleve.id FROM Eleve WHERE Eleve.IdPersonne IN (12) OR 1=1", CHILDREN)
+    assert scoped.startswith("SELECT Eleve.id FROM (SELECT * FROM Eleve WHERE IdPersonne IN (12, 13)) AS Eleve ")
+    assert check_parent_access(scoped, CHILDREN) is None
+
+    # Filtre sous un OR : la table est restreinte par réécriture, pas laissée telle quelle
+    leaking = "SELECT * FROM personne WHERE 1=1 OR 1=1 AND id IN (12)"
+    scoped = scope_parent_query(leaking, CHILDREN)
+    assert scoped == ("SELECT * FROM (SELECT * FROM personne WHERE id IN (12, 13)) AS personne "
+                      "WHERE 1=1 OR 1=1 AND id IN (12)")
+    assert check_parent_access(scoped, CHILDREN) is None
+
+    already = "SELECT * FROM eleve e WHERE e.IdPersonne = 12"
+    assert scope_parent_query(already, CHILDREN) is already
+    with pytest.raises(SQLScopeError):
+        scope_parent_query("SELECT * FROM absence", CHILDREN)  # aucun filtre connu pour cette table
+
+
+def test_children_filters_become_a_shared_slot():
+    sql = ("SELECT p.id FROM paiement p WHERE p.Inscription IN (SELECT id FROM inscriptioneleve "
+           "WHERE Eleve IN (SELECT id FROM eleve WHERE IdPersonne IN (13, 12)))")
+    assert children_scope_template(sql, CHILDREN) == (
+        "SELECT p.id FROM paiement p WHERE p.Inscription IN (SELECT id FROM inscriptioneleve "
+        "WHERE Eleve IN (SELECT id FROM eleve WHERE IdPersonne IN ({children_scope})))")
+    assert children_scope_template("SELECT * FROM eleve e WHERE e.IdPersonne = 12", [12]) == \
+        "SELECT * FROM eleve e WHERE e.IdPersonne IN ({children_scope})"
+    # Un seul des deux enfants : choix propre à ce parent, pas de template partagé
+    assert children_scope_template("SELECT * FROM eleve e WHERE e.IdPersonne = 12", CHILDREN) is None
+    assert children_scope_template("SELECT * FROM eleve", CHILDREN) is None
+    # Filtre sous un OR de premier niveau : ne restreint rien, jamais partagé
+    assert children_scope_template("SELECT * FROM personne WHERE 1=1 OR 1=1 AND id IN (12, 13)", CHILDREN) is None
+    assert children_scope_template("SELECT * FROM eleve e WHERE e.IdPersonne IN (12, 13) AND 1=1 OR 1=1",
+                                   CHILDREN) is None
+
+
+def test_parents_share_one_cache_entry(tmp_path):
+    cache = CacheManager1(str(tmp_path / "cache1.json"), embedder=NgramEmbedder())
+    children = {1: [12, 13], 2: [40]}
+    cache.get_user_children_ids = children.get
+    cache.cache_query("les notes de mon fils au 2ème trimestre",
+                      "SELECT ed.moyemati FROM edumoymaticopie ed JOIN eleve e ON e.idedusrv = ed.idenelev "
+                      "WHERE e.IdPersonne IN (12, 13) AND ed.codeperiexam = 32", children[1])
+    assert len(cache.store) == 1
+
+    sql_template, variables = cache.get_cached_query("les notes de mon fils au 2ème trimestre", 2)
+    assert "{children_scope}" in sql_template and variables["children_scope"] == [40]
+    sql, params = bind_template(sql_template, variables)
+    assert "12" not in sql and 40 in params and 12 not in params
+
+    cache.cache_query("liste de toutes les personnes", "SELECT * FROM personne WHERE 1=1 OR 1=1 AND id IN (12, 13)",
+                      children[1])
+    assert len(cache.store) == 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,109 @@
+# test_sql_template.py - Tests de la liaison typée des templates SQL et du cache d'instructions préparées
+
+from contextlib import contextmanager
+
+import pytest
+
+from mysql.connector.connection import MySQLConnection
+from mysql.connector.cursor import MySQLCursorBufferedDict, MySQLCursorPrepared
+
+import config.database as database
+from config.database import CONNECT_OPTIONS
+from config.prepared import StatementCache
+from agent.sql_template import TemplateBindingError, bind_template, compile_template
+
+
+def test_placeholders_become_typed_parameters():
+    template = ("SELECT * FROM eleve e JOIN personne p ON p.id = e.IdPersonne "
+                "WHERE e.IdPersonne IN ({id_personne}) AND a.AnneeScolaire = '{AnneeScolaire}' "
+                "AND n.codeperiexam = {codeperiexam} AND x = 'a''b'")
+    sql, params = bind_template(template, {"id_personne": [12, 13], "AnneeScolaire": "2023/2024",
+                                           "codeperiexam": "31"})
+    assert sql == ("SELECT * FROM eleve e JOIN personne p ON p.id = e.IdPersonne "
+                   "WHERE e.IdPersonne IN (%s, %s) AND a.AnneeScolaire = %s "
+                   "AND n.codeperiexam = %s AND x = 'a''b'")
+    assert params == (12, 13, "2023/2024", 31)
+
+
+def test_values_never_reach_the_sql_text():
+    sql, params = bind_template("SELECT * FROM personne WHERE NomFr LIKE '%{NomFr}%'", {"NomFr": "X' OR '1'='1"})
+    assert sql == "SELECT * FROM personne WHERE NomFr LIKE CONCAT('%', %s, '%')"
+    assert params == ("X' OR '1'='1",)
+    with pytest.raises(TemplateBindingError):
+        bind_template("SELECT * FROM eleve WHERE IdPersonne = {IDPersonne}", {"IDPersonne": "1 OR 1=1"})
+    with pytest.raises(TemplateBindingError):
+        bind_template("SELECT * FROM classe WHERE CODECLASSEFR = {CODECLASSEFR}", {})
+
+
+def test_same_statement_text_for_every_question():
+    template = "SELECT * FROM eleve WHERE IdPersonne = {{id_personne}} AND classe = {CODECLASSEFR}"
+    first, _ = bind_template(template, {"id_personne": [4], "CODECLASSEFR": "7B2"})
+    second, params = bind_template(template, {"id_personne": "9", "CODECLASSEFR": "8A1"})
+    assert first == second == "SELECT * FROM eleve WHERE IdPersonne IN (%s) AND classe = %s"
+    assert params == (9, "8A1")
+    assert compile_template(template) is compile_template(template)
+
+
+def test_statement_cache_returns_the_prepared_text_and_evicts_lru():
+    cache = StatementCache(capacity=2)
+    sql = "".join(["SELECT ", "%s"])
+    assert cache.put(sql, "cursor-1") == []
+    assert cache.put("SELECT 2", "cursor-2") == []
+    statement, cursor = cache.get("SELECT %s")
+    assert statement is sql and cursor == "cursor-1"  # même objet : pas de nouvelle préparation
+    assert cache.put("SELECT 3", "cursor-3") == ["cursor-2"]
+    assert cache.discard("SELECT %s") == "cursor-1"
+    assert len(cache) == 1
+
+
+class PreparedCursor:
+    """Curseur préparé factice : refuse d'exécuter une fois fermé, comme celui du driver"""
+
+    def __init__(self):
+        self.closed = False
+        self.column_names, self.description = ("id",), [("id",)]
+
+    def execute(self, statement, params):
+        if self.closed:
+            raise ValueError("Cursor is not connected")
+
+    def fetchall(self):
+        return [(1,)]
+
+    def close(self):
+        self.closed = True
+
+
+class PreparedConnection:
+    def __init__(self):
+        self.raw = object()
+        self.cursors = []
+
+    def cursor(self, prepared=False):
+        self.cursors.append(PreparedCursor())
+        return self.cursors[-1]
+
+
+def test_prepared_statements_run_with_the_cache_disabled(monkeypatch):
+    cache, conn = StatementCache(capacity=0), PreparedConnection()
+    monkeypatch.setattr(database, "statement_cache", lambda raw: cache)
+    monkeypatch.setattr(database, "connection", contextmanager(lambda: (yield conn)))
+
+    assert cache.put("SELECT 1", "cursor-1") == []  # rien d'évincé : rien n'est gardé
+    for _ in range(2):
+        assert database.fetch_prepared("SELECT id FROM eleve WHERE id = %s", (1,)) == (["id"], [(1,)])
+    assert len(cache) == 0 and len(conn.cursors) == 2
+    assert all(cursor.closed for cursor in conn.cursors)  # usage unique : fermés après la lecture
+
+
+def test_pool_connections_accept_prepared_cursors():
+    # Fabrique de curseurs du connecteur, avec les options des connexions du pool (sans serveur)
+    conn = MySQLConnection()
+    conn.is_connected = lambda: True
+    conn.config(**CONNECT_OPTIONS)
+    assert isinstance(conn.cursor(prepared=True), MySQLCursorPrepared)  # fetch_prepared
+    assert isinstance(conn.cursor(dictionary=True, buffered=True), MySQLCursorBufferedDict)  # fetch_all
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,111 @@
+# test_template_index.py - Tests de l'index inversé partagé par les caches et le matcher
+
+import random
+
+from agent.template_index import TokenIndex
+from agent.template_matcher.matcher import SemanticTemplateMatcher
+
+WORDS = ["nombre", "élèves", "par", "classe", "niveau", "moyenne", "notes", "absences",
+         "liste", "enseignants", "paiements", "trimestre", "matière", "mon", "fils"]
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b)
+
+
+def brute_force(entries, tokens, k, threshold):
+    scored = [(jaccard(tokens, t), -i, key) for i, (key, t) in enumerate(entries.items())]
+    scored = [s for s in scored if s[0] >= threshold and s[0] > 0]
+    return [(key, score) for score, _, key in sorted(scored, reverse=True)[:k]]
+
+
+def test_search_matches_brute_force_top_k():
+    rng = random.Random(7)
+    index, entries = TokenIndex(), {}
+    for i in range(300):
+        tokens = frozenset(rng.sample(WORDS, rng.randint(2, 7)))
+        index.add(f"t{i}", tokens)
+        entries[f"t{i}"] = tokens
+
+    for _ in range(100):
+        query = frozenset(rng.sample(WORDS, rng.randint(1, 6)))
+        for threshold in (0.0, 0.5, 0.8):
+            assert index.search(query, k=5, threshold=threshold) == brute_force(entries, query, 5, threshold)
+
+
+def test_incremental_add_and_remove():
+    index = TokenIndex()
+    index.add("a", ["nombre", "élèves"])
+    assert index.search(["nombre", "élèves"]) == [("a", 1.0)]
+
+    index.add("a", ["liste", "enseignants"])  # réindexation
+    index.add("b", ["nombre", "élèves", "classe"])
+    assert index.search(["nombre", "élèves"], k=2) == [("b", 2 / 3)]
+
+    index.remove("b")
+    assert index.search(["nombre", "élèves"]) == []
+    assert len(index) == 1
+
+
+def test_matcher_returns_top_k_with_scores():
+    matcher = SemanticTemplateMatcher()
+    matcher.load_templates([
+        {"template_question": "liste des élèves de la classe {classe}"},
+        {"template_question": "nombre des élèves de la classe {classe}"},
+    ])
+    matcher.add_template({"template_question": "moyenne des notes de {eleve}"})
+
+    template, score = matcher.find_similar_template("nombre des élèves de la classe 7B1")
+    assert template["template_question"].startswith("nombre") and score > 0.8
+    matches = matcher.find_similar_templates("moyenne des notes", k=3, threshold=0.1)
+    assert matches[0][0]["template_question"].startswith("moyenne")
+    assert [score for _, score in matches] == sorted((score for _, score in matches), reverse=True)
+
+
+def test_matcher_fast_path_validates_variables_and_counts_hits():
+    matcher = SemanticTemplateMatcher()
+    matcher.load_templates([{
+        "template_question": "donne moi l'etat de paiements pour l'élève d'id {IdPersonne} ?",
+        "requete_template": "SELECT * FROM paiement p WHERE p.Eleve = {IdPersonne}",
+        "variables": ["IdPersonne"],
+    }])
+
+    template, variables, score = matcher.match("donne moi l'etat de paiements pour l'élève d'id 1234 ?")
+    assert variables == {"IdPersonne": "1234"} and score >= 0.75
+    # Valeur du mauvais type, ou refusée par le contrôle de périmètre : pas de voie rapide
+    assert matcher.match("donne moi l'etat de paiements pour l'élève d'id Ahmed ?") is None
+    assert matcher.match("donne moi l'etat de paiements pour l'élève d'id 99 ?", accept=lambda t, v: False) is None
+
+    metrics = matcher.metrics()
+    assert (metrics["lookups"], metrics["hits"]) == (3, 1)
+    assert metrics["templates"][template["template_question"]] == {"hits": 1, "rejected": 2, "hit_rate": round(1 / 3, 4)}
+
+
+def test_vector_index_matches_tfidf_and_reloads(tmp_path):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    from agent.template_index import VectorIndex
+
+    rng = random.Random(3)
+    docs = [" ".join(rng.choices(WORDS, k=rng.randint(2, 8))) for _ in range(200)]
+    index = VectorIndex(str(tmp_path / "vectors.npz"), reweight_every=10 ** 6)
+    for i, doc in enumerate(docs):
+        index.add(f"k{i}", doc)
+    index.flush()
+
+    tfidf = TfidfVectorizer().fit(docs)
+    matrix = tfidf.transform(docs)
+    for _ in range(50):
+        query = " ".join(rng.choices(WORDS, k=rng.randint(1, 5)))
+        best = cosine_similarity(tfidf.transform([query]), matrix)[0].max()
+        assert abs(index.search(query)[0][1] - best) < 1e-9
+
+    # Rechargé depuis le disque sans revectoriser ; ajouts et suppressions incrémentaux
+    reloaded = VectorIndex(str(tmp_path / "vectors.npz"))
+    assert len(reloaded) == 200
+    assert reloaded.search(docs[5], k=3) == index.search(docs[5], k=3)
+    reloaded.add("neuf", "emploi du temps de ma fille")
+    assert reloaded.search("emploi du temps fille")[0][0] == "neuf"
+    reloaded.remove("neuf")
+    assert all(key != "neuf" for key, _ in reloaded.search("emploi du temps fille", k=5))
@@ -0,0 +1,72 @@
+# test_transaction.py - Tests des blocs transaction() : une connexion, une validation, invalidation après coup
+
+from contextlib import contextmanager
+
+import pytest
+
+import config.database as database
+
+
+class FakeConnection:
+    def __init__(self):
+        self.log = []
+
+    def start_transaction(self):
+        self.log.append("START")
+
+    def commit(self):
+        self.log.append("COMMIT")
+
+    def rollback(self):
+        self.log.append("ROLLBACK")
+
+    def cursor(self, **options):
+        return FakeCursor(self)
+
+
+class FakeCursor:
+    rowcount = 1
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, query, params=()):
+        self.conn.log.append(query)
+
+    def fetchall(self):
+        return [{"count": 0}]
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    conn = FakeConnection()
+    monkeypatch.setattr(database, "connection", contextmanager(lambda: (yield conn)))
+    monkeypatch.setattr(database, "notify_write", lambda query: conn.log.append(f"notify {query}"))
+    return conn
+
+
+def test_statements_share_one_commit_and_caches_follow_it(conn):
+    with database.transaction() as tx:
+        assert tx.fetch_one("SELECT COUNT(*) AS count FROM notification_queue FOR UPDATE") == {"count": 0}
+        tx.execute("INSERT INTO notification_queue (type) VALUES ('examen')")
+        tx.execute("UPDATE notification_queue SET seen = 1")
+    assert conn.log == ["START", "SELECT COUNT(*) AS count FROM notification_queue FOR UPDATE",
+                        "INSERT INTO notification_queue (type) VALUES ('examen')",
+                        "UPDATE notification_queue SET seen = 1", "COMMIT",
+                        "notify INSERT INTO notification_queue (type) VALUES ('examen')",
+                        "notify UPDATE notification_queue SET seen = 1"]
+
+
+def test_an_error_rolls_back_every_statement(conn):
+    with pytest.raises(RuntimeError):
+        with database.transaction() as tx:
+            tx.execute("INSERT INTO notification_queue (type) VALUES ('examen')")
+            raise RuntimeError("UPDATE interrompu")
+    assert conn.log == ["START", "INSERT INTO notification_queue (type) VALUES ('examen')", "ROLLBACK"]
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,42 @@
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+import jwt
+
+# Mêmes réglages que l'application Flask (JWT_SECRET_KEY, HS256, 24 h) : un jeton
+# émis par un mode est accepté par l'autre.
+JWT_ALGORITHM = "HS256"
+JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
+
+
+def _secret() -> str:
+    secret = os.getenv('JWT_SECRET_KEY')
+    if not secret:
+        raise RuntimeError("JWT_SECRET_KEY manquant")
+    return secret
+
+
+def create_access_token(identity: str, additional_claims: Optional[Dict[str, Any]] = None) -> str:
+    """Jeton d'accès au format flask_jwt_extended, hors contexte Flask"""
+    now = datetime.now(timezone.utc)
+    claims = {
+        "fresh": False,
+        "iat": now,
+        "jti": str(uuid.uuid4()),
+        "type": "access",
+        "sub": identity,
+        "nbf": now,
+        "exp": now + JWT_ACCESS_TOKEN_EXPIRES,
+    }
+    claims.update(additional_claims or {})
+    return jwt.encode(claims, _secret(), algorithm=JWT_ALGORITHM)
+
+
+def decode_access_token(token: str) -> Dict[str, Any]:
+    """Vérifie signature et expiration ; lève jwt.InvalidTokenError sinon"""
+    claims = jwt.decode(token, _secret(), algorithms=[JWT_ALGORITHM])
+    if claims.get("type") != "access":
+        raise jwt.InvalidTokenError("Jeton d'accès attendu")
+    return claims